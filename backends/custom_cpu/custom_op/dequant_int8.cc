@@ -0,0 +1,94 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <string>
+#include <vector>
+
+#include "kernels/funcs/int8_gemm.h"
+#include "paddle/extension.h"
+
+std::vector<std::vector<int64_t>> DequantInt8Shape(
+    const std::vector<int64_t>& input_shape) {
+  return {input_shape};
+}
+
+std::vector<paddle::DataType> DequantInt8Dtype(
+    const paddle::DataType& input_dtype,
+    const paddle::DataType& out_scale_dtype,
+    std::string dtype) {
+  paddle::DataType data_type;
+  if (dtype == "float32")
+    data_type = paddle::DataType::FLOAT32;
+  else if (dtype == "bfloat16")
+    data_type = paddle::DataType::BFLOAT16;
+  else if (dtype == "float16")
+    data_type = paddle::DataType::FLOAT16;
+  else
+    PD_THROW(
+        "NOT supported data type. "
+        "Only bfloat16, float16 and float32 are supported. ");
+  return {data_type};
+}
+
+// output = input * out_scale of the int32 product of an int8 matmul, with
+// one float32 scale per output channel, the last dim.
+std::vector<paddle::Tensor> DequantInt8(const paddle::Tensor& input,
+                                        const paddle::Tensor& out_scale,
+                                        std::string dtype) {
+  PD_CHECK(input.dtype() == paddle::DataType::INT32,
+           "The input of dequant_int8 must be int32.");
+  PD_CHECK(out_scale.dtype() == paddle::DataType::FLOAT32,
+           "The out_scale of dequant_int8 must be float32.");
+  const int64_t cols = input.shape().empty() ? 1 : input.shape().back();
+  PD_CHECK(out_scale.numel() == cols,
+           "out_scale of dequant_int8 holds %ld scales for %ld channels.",
+           out_scale.numel(),
+           cols);
+  const int64_t rows = cols > 0 ? input.numel() / cols : 0;
+  auto output_shape = DequantInt8Shape(input.shape());
+  auto output_dtype = DequantInt8Dtype(input.dtype(), out_scale.dtype(), dtype);
+  auto output = paddle::empty(output_shape[0], output_dtype[0], input.place());
+  switch (output_dtype[0]) {
+    case paddle::DataType::FLOAT32:
+      custom_kernel::DequantizeInt32(rows,
+                                     cols,
+                                     input.data<int32_t>(),
+                                     out_scale.data<float>(),
+                                     output.data<float>());
+      break;
+    case paddle::DataType::FLOAT16:
+      custom_kernel::DequantizeInt32(rows,
+                                     cols,
+                                     input.data<int32_t>(),
+                                     out_scale.data<float>(),
+                                     output.data<paddle::float16>());
+      break;
+    default:
+      custom_kernel::DequantizeInt32(rows,
+                                     cols,
+                                     input.data<int32_t>(),
+                                     out_scale.data<float>(),
+                                     output.data<paddle::bfloat16>());
+      break;
+  }
+  return {output};
+}
+
+PD_BUILD_OP(dequant_int8)
+    .Inputs({"intput", "out_scale"})
+    .Outputs({"output"})
+    .Attrs({"dtype: std::string"})
+    .SetKernelFn(PD_KERNEL(DequantInt8))
+    .SetInferShapeFn(PD_INFER_SHAPE(DequantInt8Shape))
+    .SetInferDtypeFn(PD_INFER_DTYPE(DequantInt8Dtype));
@@ -0,0 +1,96 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <string>
+#include <vector>
+
+#include "kernels/funcs/elementwise_program.h"
+#include "paddle/extension.h"
+
+namespace {
+
+std::vector<std::vector<int64_t>> Shapes(const std::vector<paddle::Tensor>& x) {
+  std::vector<std::vector<int64_t>> shapes;
+  for (const auto& t : x) {
+    shapes.push_back(t.shape());
+  }
+  return shapes;
+}
+
+template <typename T>
+void FusedElementwiseImpl(const std::vector<paddle::Tensor>& x,
+                          const std::string& program,
+                          paddle::Tensor* out) {
+  std::vector<const T*> inputs;
+  for (const auto& t : x) {
+    inputs.push_back(t.data<T>());
+  }
+  custom_kernel::RunElementwiseProgram(
+      program, inputs, Shapes(x), out->data<T>(), out->shape());
+}
+
+}  // namespace
+
+// A chain of elementwise ops over the broadcast inputs x, evaluated in one
+// pass as the elementwise fusion pass groups them. See RunElementwiseProgram
+// for the program.
+std::vector<paddle::Tensor> FusedElementwise(
+    const std::vector<paddle::Tensor>& x, const std::string& program) {
+  PD_CHECK(!x.empty(), "fused_elementwise needs at least one input.");
+  const auto dtype = x[0].dtype();
+  for (const auto& t : x) {
+    PD_CHECK(t.dtype() == dtype,
+             "The inputs of fused_elementwise must share one dtype.");
+  }
+  auto out = paddle::empty(
+      custom_kernel::BroadcastShape(Shapes(x)), dtype, x[0].place());
+  switch (dtype) {
+    case paddle::DataType::FLOAT32:
+      FusedElementwiseImpl<float>(x, program, &out);
+      break;
+    case paddle::DataType::FLOAT64:
+      FusedElementwiseImpl<double>(x, program, &out);
+      break;
+    case paddle::DataType::FLOAT16:
+      FusedElementwiseImpl<paddle::float16>(x, program, &out);
+      break;
+    case paddle::DataType::BFLOAT16:
+      FusedElementwiseImpl<paddle::bfloat16>(x, program, &out);
+      break;
+    default:
+      PD_THROW(
+          "NOT supported data type. "
+          "Only float32, float64, float16 and bfloat16 are supported. ");
+  }
+  return {out};
+}
+
+std::vector<std::vector<int64_t>> FusedElementwiseShape(
+    const std::vector<std::vector<int64_t>>& x_shapes,
+    const std::string& program) {
+  return {custom_kernel::BroadcastShape(x_shapes)};
+}
+
+std::vector<paddle::DataType> FusedElementwiseDtype(
+    const std::vector<paddle::DataType>& x_dtypes) {
+  return {x_dtypes[0]};
+}
+
+PD_BUILD_OP(fused_elementwise)
+    .Inputs({paddle::Vec("x")})
+    .Outputs({"out"})
+    .Attrs({"program: std::string"})
+    .SetKernelFn(PD_KERNEL(FusedElementwise))
+    .SetInferShapeFn(PD_INFER_SHAPE(FusedElementwiseShape))
+    .SetInferDtypeFn(PD_INFER_DTYPE(FusedElementwiseDtype));
@@ -0,0 +1,120 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <vector>
+
+#include "kernels/funcs/int8_gemm.h"
+#include "paddle/extension.h"
+
+namespace {
+
+template <typename T>
+void QuantInt8Impl(const paddle::Tensor& input,
+                   const paddle::optional<paddle::Tensor>& shift,
+                   const paddle::optional<paddle::Tensor>& smooth,
+                   float scale,
+                   int32_t round_type,
+                   float max_bound,
+                   float min_bound,
+                   paddle::Tensor* output) {
+  const int64_t cols = input.shape().empty() ? 1 : input.shape().back();
+  custom_kernel::QuantizeInt8(cols > 0 ? input.numel() / cols : 0,
+                              cols,
+                              input.data<T>(),
+                              shift ? shift->data<T>() : nullptr,
+                              smooth ? smooth->data<T>() : nullptr,
+                              scale,
+                              round_type,
+                              max_bound,
+                              min_bound,
+                              output->data<int8_t>());
+}
+
+}  // namespace
+
+// round(max_bound * scale * (input + shift) * smooth) clipped to int8, the
+// activation quantization in front of an int8 matmul.
+std::vector<paddle::Tensor> QuantInt8(
+    const paddle::Tensor& input,
+    const paddle::optional<paddle::Tensor>& shift,
+    const paddle::optional<paddle::Tensor>& smooth,
+    float scale,
+    int32_t round_type,
+    float max_bound,
+    float min_bound) {
+  auto output =
+      paddle::empty(input.shape(), paddle::DataType::INT8, input.place());
+  switch (input.dtype()) {
+    case paddle::DataType::FLOAT32:
+      QuantInt8Impl<float>(input,
+                           shift,
+                           smooth,
+                           scale,
+                           round_type,
+                           max_bound,
+                           min_bound,
+                           &output);
+      break;
+    case paddle::DataType::FLOAT16:
+      QuantInt8Impl<paddle::float16>(input,
+                                     shift,
+                                     smooth,
+                                     scale,
+                                     round_type,
+                                     max_bound,
+                                     min_bound,
+                                     &output);
+      break;
+    case paddle::DataType::BFLOAT16:
+      QuantInt8Impl<paddle::bfloat16>(input,
+                                      shift,
+                                      smooth,
+                                      scale,
+                                      round_type,
+                                      max_bound,
+                                      min_bound,
+                                      &output);
+      break;
+    default:
+      PD_THROW(
+          "NOT supported data type. "
+          "Only bfloat16, float16 and float32 are supported. ");
+  }
+  return {output};
+}
+
+std::vector<std::vector<int64_t>> QuantInt8Shape(
+    const std::vector<int64_t>& input_shape,
+    const paddle::optional<std::vector<int64_t>>& shift_shape,
+    const paddle::optional<std::vector<int64_t>>& smooth_shape) {
+  return {input_shape};
+}
+
+std::vector<paddle::DataType> QuantInt8Dtype(
+    const paddle::DataType& input_dtype,
+    const paddle::optional<paddle::DataType>& shift_dtype,
+    const paddle::optional<paddle::DataType>& smooth_dtype) {
+  return {paddle::DataType::INT8};
+}
+
+PD_BUILD_OP(quant_int8)
+    .Inputs({"intput", paddle::Optional("shift"), paddle::Optional("smooth")})
+    .Outputs({"output"})
+    .Attrs({"scale: float",
+            "round_type: int",
+            "max_bound: float",
+            "min_bound: float"})
+    .SetKernelFn(PD_KERNEL(QuantInt8))
+    .SetInferShapeFn(PD_INFER_SHAPE(QuantInt8Shape))
+    .SetInferDtypeFn(PD_INFER_DTYPE(QuantInt8Dtype));
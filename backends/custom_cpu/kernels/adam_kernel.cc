@@ -0,0 +1,386 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <type_traits>
+
+#include "kernels/funcs/cast.h"
+#include "kernels/funcs/optimizer.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+using TensorList = std::vector<const phi::DenseTensor*>;
+using OutputList = std::vector<phi::DenseTensor*>;
+
+TensorList ToList(const paddle::optional<phi::DenseTensor>& x) {
+  return x ? TensorList{x.get_ptr()} : TensorList{};
+}
+
+void CopyTensor(const phi::Context& dev_ctx,
+                const phi::DenseTensor& x,
+                phi::DenseTensor* out) {
+  const void* x_data = x.data<uint8_t>();
+  void* out_data = dev_ctx.Alloc(out, x.dtype());
+  if (out_data != x_data) {
+    CastData(x_data, x.dtype(), out_data, x.dtype(), x.numel());
+  }
+}
+
+template <typename T, typename MT>
+void AdamStep(const phi::Context& dev_ctx,
+              const TensorList& param,
+              const TensorList& grad,
+              const TensorList& learning_rate,
+              const TensorList& moment1,
+              const TensorList& moment2,
+              const TensorList& moment2_max,
+              const TensorList& beta1_pow,
+              const TensorList& beta2_pow,
+              const TensorList& master_param,
+              const AdamConfig& config,
+              double lr_ratio,
+              bool use_global_beta_pow,
+              const OutputList& param_out,
+              const OutputList& moment1_out,
+              const OutputList& moment2_out,
+              const OutputList& moment2_max_out,
+              const OutputList& beta1_pow_out,
+              const OutputList& beta2_pow_out,
+              const OutputList& master_param_out) {
+  const size_t n = param.size();
+  const bool use_master = !master_param.empty();
+  PD_CHECK(learning_rate.size() == 1 || learning_rate.size() == n,
+           "The number of learning rates must be 1 or %ld, but received %ld.",
+           static_cast<int64_t>(n),
+           static_cast<int64_t>(learning_rate.size()));
+
+  std::vector<AdamTensors<T, MT>> tensors(n);
+  for (size_t i = 0; i < n; ++i) {
+    auto& t = tensors[i];
+    t.numel = param[i]->numel();
+    t.grad = grad[i]->data<T>();
+    t.param = param[i]->data<T>();
+    t.moment1 = moment1[i]->data<MT>();
+    t.moment2 = moment2[i]->data<MT>();
+    t.param_out = dev_ctx.template Alloc<T>(param_out[i]);
+    t.moment1_out = dev_ctx.template Alloc<MT>(moment1_out[i]);
+    t.moment2_out = dev_ctx.template Alloc<MT>(moment2_out[i]);
+    t.master_param = nullptr;
+    t.master_param_out = nullptr;
+    if (use_master) {
+      t.master_param = master_param[i]->data<MT>();
+      t.master_param_out = dev_ctx.template Alloc<MT>(master_param_out[i]);
+    }
+    t.moment2_max = nullptr;
+    t.moment2_max_out = nullptr;
+    if (config.amsgrad) {
+      t.moment2_max = moment2_max[i]->data<MT>();
+      t.moment2_max_out = dev_ctx.template Alloc<MT>(moment2_max_out[i]);
+    }
+    auto lr = learning_rate[learning_rate.size() == 1 ? 0 : i];
+    t.lr = ScalarTensorValue(*lr) * lr_ratio;
+    t.beta1_pow = ScalarTensorValue(*beta1_pow[i]);
+    t.beta2_pow = ScalarTensorValue(*beta2_pow[i]);
+  }
+
+  AdamUpdate(config, tensors);
+
+  if (!use_global_beta_pow) {
+    for (size_t i = 0; i < n; ++i) {
+      SetScalarTensor(dev_ctx,
+                      tensors[i].beta1_pow * config.beta1,
+                      beta1_pow[i]->dtype(),
+                      beta1_pow_out[i]);
+      SetScalarTensor(dev_ctx,
+                      tensors[i].beta2_pow * config.beta2,
+                      beta2_pow[i]->dtype(),
+                      beta2_pow_out[i]);
+    }
+  }
+}
+
+// float16 and bfloat16 parameters keep fp32 moments under multi precision
+// training.
+template <typename T>
+void AdamDispatch(const phi::Context& dev_ctx,
+                  const TensorList& param,
+                  const TensorList& grad,
+                  const TensorList& learning_rate,
+                  const TensorList& moment1,
+                  const TensorList& moment2,
+                  const TensorList& moment2_max,
+                  const TensorList& beta1_pow,
+                  const TensorList& beta2_pow,
+                  const TensorList& master_param,
+                  const AdamConfig& config,
+                  double lr_ratio,
+                  bool use_global_beta_pow,
+                  const OutputList& param_out,
+                  const OutputList& moment1_out,
+                  const OutputList& moment2_out,
+                  const OutputList& moment2_max_out,
+                  const OutputList& beta1_pow_out,
+                  const OutputList& beta2_pow_out,
+                  const OutputList& master_param_out) {
+  using MPType = typename MPTypeTrait<T>::Type;
+  if (!std::is_same<T, MPType>::value &&
+      moment1[0]->dtype() == phi::capi::CppTypeToPDType<MPType>::Type()) {
+    AdamStep<T, MPType>(dev_ctx,
+                        param,
+                        grad,
+                        learning_rate,
+                        moment1,
+                        moment2,
+                        moment2_max,
+                        beta1_pow,
+                        beta2_pow,
+                        master_param,
+                        config,
+                        lr_ratio,
+                        use_global_beta_pow,
+                        param_out,
+                        moment1_out,
+                        moment2_out,
+                        moment2_max_out,
+                        beta1_pow_out,
+                        beta2_pow_out,
+                        master_param_out);
+  } else {
+    AdamStep<T, T>(dev_ctx,
+                   param,
+                   grad,
+                   learning_rate,
+                   moment1,
+                   moment2,
+                   moment2_max,
+                   beta1_pow,
+                   beta2_pow,
+                   master_param,
+                   config,
+                   lr_ratio,
+                   use_global_beta_pow,
+                   param_out,
+                   moment1_out,
+                   moment2_out,
+                   moment2_max_out,
+                   beta1_pow_out,
+                   beta2_pow_out,
+                   master_param_out);
+  }
+}
+
+// Shared by adam and adamw, which adds a decoupled weight decay and scales
+// the learning rate of the parameter by `lr_ratio`.
+template <typename T>
+void AdamwImpl(const phi::Context& dev_ctx,
+               const phi::DenseTensor& param,
+               const phi::DenseTensor& grad,
+               const phi::DenseTensor& learning_rate,
+               const phi::DenseTensor& moment1,
+               const phi::DenseTensor& moment2,
+               const paddle::optional<phi::DenseTensor>& moment2_max,
+               const phi::DenseTensor& beta1_pow,
+               const phi::DenseTensor& beta2_pow,
+               const paddle::optional<phi::DenseTensor>& master_param,
+               const paddle::optional<phi::DenseTensor>& skip_update,
+               const AdamConfig& config,
+               double lr_ratio,
+               bool multi_precision,
+               bool use_global_beta_pow,
+               phi::DenseTensor* param_out,
+               phi::DenseTensor* moment1_out,
+               phi::DenseTensor* moment2_out,
+               phi::DenseTensor* moment2_max_out,
+               phi::DenseTensor* beta1_pow_out,
+               phi::DenseTensor* beta2_pow_out,
+               phi::DenseTensor* master_param_out) {
+  if (skip_update && skip_update->data<bool>()[0]) {
+    CopyTensor(dev_ctx, param, param_out);
+    CopyTensor(dev_ctx, moment1, moment1_out);
+    CopyTensor(dev_ctx, moment2, moment2_out);
+    if (config.amsgrad) {
+      CopyTensor(dev_ctx, *moment2_max, moment2_max_out);
+    }
+    if (multi_precision && master_param) {
+      CopyTensor(dev_ctx, *master_param, master_param_out);
+    }
+    if (!use_global_beta_pow) {
+      CopyTensor(dev_ctx, beta1_pow, beta1_pow_out);
+      CopyTensor(dev_ctx, beta2_pow, beta2_pow_out);
+    }
+    return;
+  }
+  AdamDispatch<T>(dev_ctx,
+                  {&param},
+                  {&grad},
+                  {&learning_rate},
+                  {&moment1},
+                  {&moment2},
+                  ToList(moment2_max),
+                  {&beta1_pow},
+                  {&beta2_pow},
+                  multi_precision ? ToList(master_param) : TensorList{},
+                  config,
+                  lr_ratio,
+                  use_global_beta_pow,
+                  {param_out},
+                  {moment1_out},
+                  {moment2_out},
+                  {moment2_max_out},
+                  {beta1_pow_out},
+                  {beta2_pow_out},
+                  {master_param_out});
+}
+
+}  // namespace
+
+template <typename T>
+void AdamDenseKernel(const phi::Context& dev_ctx,
+                     const phi::DenseTensor& param,
+                     const phi::DenseTensor& grad,
+                     const phi::DenseTensor& learning_rate,
+                     const phi::DenseTensor& moment1,
+                     const phi::DenseTensor& moment2,
+                     const paddle::optional<phi::DenseTensor>& moment2_max,
+                     const phi::DenseTensor& beta1_pow,
+                     const phi::DenseTensor& beta2_pow,
+                     const paddle::optional<phi::DenseTensor>& master_param,
+                     const paddle::optional<phi::DenseTensor>& skip_update,
+                     const phi::Scalar& beta1,
+                     const phi::Scalar& beta2,
+                     const phi::Scalar& epsilon,
+                     bool lazy_mode,
+                     int64_t min_row_size_to_use_multithread,
+                     bool multi_precision,
+                     bool use_global_beta_pow,
+                     bool amsgrad,
+                     phi::DenseTensor* param_out,
+                     phi::DenseTensor* moment1_out,
+                     phi::DenseTensor* moment2_out,
+                     phi::DenseTensor* moment2_max_out,
+                     phi::DenseTensor* beta1_pow_out,
+                     phi::DenseTensor* beta2_pow_out,
+                     phi::DenseTensor* master_param_out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  AdamConfig config{beta1.to<double>(),
+                    beta2.to<double>(),
+                    epsilon.to<double>(),
+                    0.0,
+                    amsgrad};
+  AdamwImpl<T>(dev_ctx,
+               param,
+               grad,
+               learning_rate,
+               moment1,
+               moment2,
+               moment2_max,
+               beta1_pow,
+               beta2_pow,
+               master_param,
+               skip_update,
+               config,
+               1.0,
+               multi_precision,
+               use_global_beta_pow,
+               param_out,
+               moment1_out,
+               moment2_out,
+               moment2_max_out,
+               beta1_pow_out,
+               beta2_pow_out,
+               master_param_out);
+}
+
+template <typename T>
+void AdamwDenseKernel(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& param,
+                      const phi::DenseTensor& grad,
+                      const phi::DenseTensor& learning_rate,
+                      const phi::DenseTensor& moment1,
+                      const phi::DenseTensor& moment2,
+                      const paddle::optional<phi::DenseTensor>& moment2_max,
+                      const phi::DenseTensor& beta1_pow,
+                      const phi::DenseTensor& beta2_pow,
+                      const paddle::optional<phi::DenseTensor>& master_param,
+                      const paddle::optional<phi::DenseTensor>& skip_update,
+                      const phi::Scalar& beta1,
+                      const phi::Scalar& beta2,
+                      const phi::Scalar& epsilon,
+                      float lr_ratio,
+                      float coeff,
+                      bool with_decay,
+                      bool lazy_mode,
+                      int64_t min_row_size_to_use_multithread,
+                      bool multi_precision,
+                      bool use_global_beta_pow,
+                      bool amsgrad,
+                      phi::DenseTensor* param_out,
+                      phi::DenseTensor* moment1_out,
+                      phi::DenseTensor* moment2_out,
+                      phi::DenseTensor* moment2_max_out,
+                      phi::DenseTensor* beta1_pow_out,
+                      phi::DenseTensor* beta2_pow_out,
+                      phi::DenseTensor* master_param_out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  AdamConfig config{beta1.to<double>(),
+                    beta2.to<double>(),
+                    epsilon.to<double>(),
+                    with_decay ? coeff : 0.0,
+                    amsgrad};
+  AdamwImpl<T>(dev_ctx,
+               param,
+               grad,
+               learning_rate,
+               moment1,
+               moment2,
+               moment2_max,
+               beta1_pow,
+               beta2_pow,
+               master_param,
+               skip_update,
+               config,
+               lr_ratio,
+               multi_precision,
+               use_global_beta_pow,
+               param_out,
+               moment1_out,
+               moment2_out,
+               moment2_max_out,
+               beta1_pow_out,
+               beta2_pow_out,
+               master_param_out);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(adam,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::AdamDenseKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(adamw,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::AdamwDenseKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
@@ -12,69 +12,14 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "kernels/funcs/sort.h"
 #include "kernels/kernels.h"
 #include "kernels/phi_funcs.h"
 #include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
-template <typename T, typename Type>
-static void FullSort(Type input_height,
-                     Type input_width,
-                     int input_dim,
-                     const phi::DenseTensor* input,
-                     T* t_out,
-                     Type* t_indices,
-                     bool descending,
-                     bool stable) {
-  for (Type i = 0; i < input_height; ++i) {
-    std::vector<std::pair<T, Type>> col_vec;
-    col_vec.reserve(input_width);
-    auto e_input = input->data<T>();
-    if (input_dim == 1) {
-      for (Type j = 0; j < input_width; ++j) {
-        col_vec.push_back(std::pair<T, Type>(e_input[j], j));
-      }
-    } else {
-      for (Type j = 0; j < input_width; ++j) {
-        col_vec.push_back(std::pair<T, Type>(e_input[i * input_width + j], j));
-      }
-    }
-    if (stable) {
-      std::stable_sort(
-          col_vec.begin(),
-          col_vec.end(),
-          [&](const std::pair<T, Type>& l, const std::pair<T, Type>& r) {
-            if (descending)
-              return (std::isnan(static_cast<double>(l.first)) &&
-                      !std::isnan(static_cast<double>(r.first))) ||
-                     (l.first > r.first);
-            else
-              return (!std::isnan(static_cast<double>(l.first)) &&
-                      std::isnan(static_cast<double>(r.first))) ||
-                     (l.first < r.first);
-          });
-    } else {
-      std::sort(col_vec.begin(),
-                col_vec.end(),
-                [&](const std::pair<T, Type>& l, const std::pair<T, Type>& r) {
-                  if (descending)
-                    return (std::isnan(static_cast<double>(l.first)) &&
-                            !std::isnan(static_cast<double>(r.first))) ||
-                           (l.first > r.first);
-                  else
-                    return (!std::isnan(static_cast<double>(l.first)) &&
-                            std::isnan(static_cast<double>(r.first))) ||
-                           (l.first < r.first);
-                });
-    }
-    for (Type j = 0; j < input_width; ++j) {
-      t_out[i * input_width + j] = col_vec[j].first;
-      t_indices[i * input_width + j] = col_vec[j].second;
-    }
-  }
-}
-
 template <typename T>
 void ArgsortKernel(const phi::Context& dev_ctx,
                    const phi::DenseTensor& input,
@@ -83,6 +28,7 @@ void ArgsortKernel(const phi::Context& dev_ctx,
                    bool stable,
                    phi::DenseTensor* output,
                    phi::DenseTensor* indices) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto in_dims = input.dims();
   auto rank = in_dims.size();
   axis = (axis < 0) ? (in_dims.size() + axis) : axis;
@@ -103,20 +49,18 @@ void ArgsortKernel(const phi::Context& dev_ctx,
     return;
   }
 
-  // Do full sort
+  // Do full sort, SortRows is always stable so `stable` needs no other path.
   if (axis == -1 || axis + 1 == in_dims.size()) {
     const int64_t input_height =
         phi::product(phi::slice_ddim(in_dims, 0, in_dims.size() - 1));
     const int64_t input_width = in_dims[in_dims.size() - 1];
     int64_t* ids_data = dev_ctx.template Alloc<int64_t>(indices);
-    FullSort<T, int64_t>(input_height,
-                         input_width,
-                         in_dims.size(),
-                         &input,
-                         out_data,
-                         ids_data,
-                         descending,
-                         stable);
+    SortRows(input.data<T>(),
+             input_height,
+             input_width,
+             descending,
+             out_data,
+             ids_data);
   } else {
     // If not full sort do transpose
     std::vector<int> trans;
@@ -151,14 +95,12 @@ void ArgsortKernel(const phi::Context& dev_ctx,
     tmp_indices.Resize(trans_dims);
     auto* t_ind = dev_ctx.template Alloc<int64_t>(&tmp_indices);
 
-    FullSort<T, int64_t>(input_height,
-                         input_width,
-                         in_dims.size(),
-                         &trans_inp,
-                         t_out,
-                         t_ind,
-                         descending,
-                         stable);
+    SortRows(trans_inp.data<T>(),
+             input_height,
+             input_width,
+             descending,
+             t_out,
+             t_ind);
 
     dev_ctx.template Alloc<int64_t>(indices);
     TransposeKernel<int64_t>(dev_ctx, tmp_indices, trans, indices);
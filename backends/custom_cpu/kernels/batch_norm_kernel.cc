@@ -0,0 +1,390 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <cmath>
+#include <vector>
+
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// x viewed as [outer, channels, inner]. NHWC, and 2-D inputs, keep the
+// channels innermost with inner = 1.
+struct ChannelView {
+  int64_t outer;
+  int64_t channels;
+  int64_t inner;
+};
+
+ChannelView MakeChannelView(const phi::DenseTensor& x,
+                            const std::string& data_layout) {
+  auto dims = x.dims();
+  PD_CHECK(dims.size() >= 2,
+           "batch_norm expects an input of at least 2 dims, but received "
+           "%ld.",
+           static_cast<int64_t>(dims.size()));
+  ChannelView v;
+  if (data_layout == "NHWC" || dims.size() == 2) {
+    v.channels = dims.back();
+    v.inner = 1;
+  } else {
+    v.channels = dims[1];
+    v.inner = 1;
+    for (size_t i = 2; i < dims.size(); ++i) {
+      v.inner *= dims[i];
+    }
+  }
+  v.outer = v.channels == 0 ? 0 : x.numel() / (v.channels * v.inner);
+  return v;
+}
+
+// Calls fn(c_begin, c_end) for runs of channels over the intra-op thread
+// pool, every channel reading its outer * inner elements.
+template <typename F>
+void ForEachChannels(const ChannelView& v, const F& fn) {
+  custom_cpu::ParallelFor(
+      0, v.channels, custom_cpu::GrainSize(v.outer * v.inner), fn);
+}
+
+// Per channel sums over [c_begin, c_end) of f(c, i), where i indexes the
+// elements of channel c.
+template <typename F>
+void ChannelSums(const ChannelView& v,
+                 int64_t c_begin,
+                 int64_t c_end,
+                 const F& f,
+                 double* sums) {
+  std::fill(sums, sums + c_end - c_begin, 0.0);
+  for (int64_t o = 0; o < v.outer; ++o) {
+    for (auto c = c_begin; c < c_end; ++c) {
+      int64_t base = (o * v.channels + c) * v.inner;
+      double sum = 0;
+      for (int64_t i = 0; i < v.inner; ++i) {
+        sum += f(c, base + i);
+      }
+      sums[c - c_begin] += sum;
+    }
+  }
+}
+
+// out = x * a[c] + b[c] for every element of channel c.
+template <typename T>
+void ChannelAffine(const ChannelView& v,
+                   const T* x,
+                   const std::vector<T>& a,
+                   const std::vector<T>& b,
+                   T* out) {
+  custom_cpu::ParallelFor(0,
+                          v.outer,
+                          custom_cpu::GrainSize(v.channels * v.inner),
+                          [&](int64_t o_begin, int64_t o_end) {
+                            for (auto o = o_begin; o < o_end; ++o) {
+                              for (int64_t c = 0; c < v.channels; ++c) {
+                                int64_t base = (o * v.channels + c) * v.inner;
+                                for (int64_t i = 0; i < v.inner; ++i) {
+                                  out[base + i] = x[base + i] * a[c] + b[c];
+                                }
+                              }
+                            }
+                          });
+}
+
+// Normalises x by its batch statistics, updating the running ones, or by
+// the running statistics when `global_stats` is set. saved_mean and
+// saved_variance, which may be null, receive the mean and inverse standard
+// deviation used.
+template <typename T>
+void BatchNormCompute(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& x,
+                      const phi::DenseTensor& mean,
+                      const phi::DenseTensor& variance,
+                      const T* scale,
+                      const T* bias,
+                      bool global_stats,
+                      float momentum,
+                      float epsilon,
+                      const std::string& data_layout,
+                      phi::DenseTensor* y,
+                      phi::DenseTensor* mean_out,
+                      phi::DenseTensor* variance_out,
+                      phi::DenseTensor* saved_mean,
+                      phi::DenseTensor* saved_variance) {
+  auto v = MakeChannelView(x, data_layout);
+  const T* src = x.data<T>();
+  const T* running_mean = mean.data<T>();
+  const T* running_var = variance.data<T>();
+  T* mean_out_data = dev_ctx.template Alloc<T>(mean_out);
+  T* var_out_data = dev_ctx.template Alloc<T>(variance_out);
+  T* saved_mean_data =
+      saved_mean ? dev_ctx.template Alloc<T>(saved_mean) : nullptr;
+  T* saved_var_data =
+      saved_variance ? dev_ctx.template Alloc<T>(saved_variance) : nullptr;
+  T* dst = dev_ctx.template Alloc<T>(y);
+  const double count = static_cast<double>(v.outer * v.inner);
+
+  std::vector<T> a(v.channels), b(v.channels);
+  ForEachChannels(v, [&](int64_t c_begin, int64_t c_end) {
+    std::vector<double> batch_mean(c_end - c_begin);
+    std::vector<double> batch_var(c_end - c_begin);
+    if (!global_stats) {
+      ChannelSums(
+          v,
+          c_begin,
+          c_end,
+          [&](int64_t, int64_t i) { return static_cast<double>(src[i]); },
+          batch_mean.data());
+      for (auto& m : batch_mean) {
+        m /= count;
+      }
+      ChannelSums(
+          v,
+          c_begin,
+          c_end,
+          [&](int64_t c, int64_t i) {
+            double d = src[i] - batch_mean[c - c_begin];
+            return d * d;
+          },
+          batch_var.data());
+      for (auto& var : batch_var) {
+        var /= count;
+      }
+    }
+    for (auto c = c_begin; c < c_end; ++c) {
+      double mu = running_mean[c];
+      double var = running_var[c];
+      if (!global_stats) {
+        mu = batch_mean[c - c_begin];
+        var = batch_var[c - c_begin];
+        mean_out_data[c] =
+            static_cast<T>(running_mean[c] * momentum + mu * (1.0 - momentum));
+        var_out_data[c] =
+            static_cast<T>(running_var[c] * momentum + var * (1.0 - momentum));
+      } else {
+        mean_out_data[c] = running_mean[c];
+        var_out_data[c] = running_var[c];
+      }
+      double inv_std = 1.0 / std::sqrt(var + epsilon);
+      if (saved_mean_data) {
+        saved_mean_data[c] = static_cast<T>(mu);
+      }
+      if (saved_var_data) {
+        saved_var_data[c] = static_cast<T>(inv_std);
+      }
+      double gamma = scale ? static_cast<double>(scale[c]) : 1.0;
+      double beta = bias ? static_cast<double>(bias[c]) : 0.0;
+      a[c] = static_cast<T>(gamma * inv_std);
+      b[c] = static_cast<T>(beta - mu * gamma * inv_std);
+    }
+  });
+  ChannelAffine(v, src, a, b, dst);
+}
+
+}  // namespace
+
+template <typename T>
+void BatchNormKernel(const phi::Context& dev_ctx,
+                     const phi::DenseTensor& x,
+                     const phi::DenseTensor& mean,
+                     const phi::DenseTensor& variance,
+                     const paddle::optional<phi::DenseTensor>& scale,
+                     const paddle::optional<phi::DenseTensor>& bias,
+                     bool is_test,
+                     float momentum,
+                     float epsilon,
+                     const std::string& data_layout,
+                     bool use_global_stats,
+                     bool trainable_statistics,
+                     phi::DenseTensor* y,
+                     phi::DenseTensor* mean_out,
+                     phi::DenseTensor* variance_out,
+                     phi::DenseTensor* saved_mean,
+                     phi::DenseTensor* saved_variance,
+                     phi::DenseTensor* reserve_space) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const bool global_stats =
+      (is_test && !trainable_statistics) || use_global_stats;
+  BatchNormCompute<T>(dev_ctx,
+                      x,
+                      mean,
+                      variance,
+                      scale ? scale->data<T>() : nullptr,
+                      bias ? bias->data<T>() : nullptr,
+                      global_stats,
+                      momentum,
+                      epsilon,
+                      data_layout,
+                      y,
+                      mean_out,
+                      variance_out,
+                      saved_mean,
+                      saved_variance);
+}
+
+template <typename T>
+void BatchNormInferKernel(const phi::Context& dev_ctx,
+                          const phi::DenseTensor& x,
+                          const phi::DenseTensor& mean,
+                          const phi::DenseTensor& variance,
+                          const phi::DenseTensor& scale,
+                          const phi::DenseTensor& bias,
+                          float momentum,
+                          float epsilon,
+                          const std::string& data_layout,
+                          phi::DenseTensor* y,
+                          phi::DenseTensor* mean_out,
+                          phi::DenseTensor* variance_out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  BatchNormCompute<T>(dev_ctx,
+                      x,
+                      mean,
+                      variance,
+                      scale.data<T>(),
+                      bias.data<T>(),
+                      true,
+                      momentum,
+                      epsilon,
+                      data_layout,
+                      y,
+                      mean_out,
+                      variance_out,
+                      nullptr,
+                      nullptr);
+}
+
+template <typename T>
+void BatchNormGradKernel(
+    const phi::Context& dev_ctx,
+    const phi::DenseTensor& x,
+    const paddle::optional<phi::DenseTensor>& scale,
+    const paddle::optional<phi::DenseTensor>& bias,
+    const paddle::optional<phi::DenseTensor>& mean,
+    const paddle::optional<phi::DenseTensor>& variance,
+    const phi::DenseTensor& saved_mean,
+    const phi::DenseTensor& saved_variance,
+    const paddle::optional<phi::DenseTensor>& reserve_space,
+    const phi::DenseTensor& y_grad,
+    float momentum,
+    float epsilon,
+    const std::string& data_layout,
+    bool is_test,
+    bool use_global_stats,
+    bool trainable_statistics,
+    phi::DenseTensor* x_grad,
+    phi::DenseTensor* scale_grad,
+    phi::DenseTensor* bias_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto v = MakeChannelView(x, data_layout);
+  const bool global_stats = is_test || use_global_stats;
+  PD_CHECK(!global_stats || (mean && variance),
+           "batch_norm_grad with global statistics needs mean and variance.");
+  const T* src = x.data<T>();
+  const T* dy = y_grad.data<T>();
+  const T* gamma = scale ? scale->data<T>() : nullptr;
+  const T* stat_mean = global_stats ? mean->data<T>() : saved_mean.data<T>();
+  const T* stat_var =
+      global_stats ? variance->data<T>() : saved_variance.data<T>();
+  T* scale_grad_data =
+      scale_grad ? dev_ctx.template Alloc<T>(scale_grad) : nullptr;
+  T* bias_grad_data =
+      bias_grad ? dev_ctx.template Alloc<T>(bias_grad) : nullptr;
+  const double count = static_cast<double>(v.outer * v.inner);
+
+  // x_grad = y_grad * k1[c] + x * k2[c] + k3[c].
+  std::vector<T> k1(v.channels), k2(v.channels), k3(v.channels);
+  ForEachChannels(v, [&](int64_t c_begin, int64_t c_end) {
+    const int64_t n = c_end - c_begin;
+    std::vector<double> inv_std(n), dbias(n), dot(n);
+    for (auto c = c_begin; c < c_end; ++c) {
+      // saved_variance holds the inverse standard deviation already.
+      inv_std[c - c_begin] =
+          global_stats ? 1.0 / std::sqrt(stat_var[c] + epsilon) : stat_var[c];
+    }
+    ChannelSums(
+        v,
+        c_begin,
+        c_end,
+        [&](int64_t, int64_t i) { return static_cast<double>(dy[i]); },
+        dbias.data());
+    ChannelSums(
+        v,
+        c_begin,
+        c_end,
+        [&](int64_t c, int64_t i) {
+          return static_cast<double>(dy[i]) * (src[i] - stat_mean[c]);
+        },
+        dot.data());
+    for (auto c = c_begin; c < c_end; ++c) {
+      int64_t j = c - c_begin;
+      double dscale = dot[j] * inv_std[j];
+      if (scale_grad_data) {
+        scale_grad_data[c] = static_cast<T>(dscale);
+      }
+      if (bias_grad_data) {
+        bias_grad_data[c] = static_cast<T>(dbias[j]);
+      }
+      double g = gamma ? static_cast<double>(gamma[c]) : 1.0;
+      double a = g * inv_std[j];
+      double b = global_stats ? 0.0 : -a * inv_std[j] * dscale / count;
+      k1[c] = static_cast<T>(a);
+      k2[c] = static_cast<T>(b);
+      k3[c] = static_cast<T>(
+          global_stats ? 0.0 : -a * dbias[j] / count - stat_mean[c] * b);
+    }
+  });
+  if (!x_grad) {
+    return;
+  }
+  T* dx = dev_ctx.template Alloc<T>(x_grad);
+  custom_cpu::ParallelFor(0,
+                          v.outer,
+                          custom_cpu::GrainSize(v.channels * v.inner),
+                          [&](int64_t o_begin, int64_t o_end) {
+                            for (auto o = o_begin; o < o_end; ++o) {
+                              for (int64_t c = 0; c < v.channels; ++c) {
+                                int64_t base = (o * v.channels + c) * v.inner;
+                                for (int64_t i = 0; i < v.inner; ++i) {
+                                  dx[base + i] = dy[base + i] * k1[c] +
+                                                 src[base + i] * k2[c] + k3[c];
+                                }
+                              }
+                            }
+                          });
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(batch_norm,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::BatchNormKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(batch_norm_infer,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::BatchNormInferKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(batch_norm_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::BatchNormGradKernel,
+                    float,
+                    double) {}
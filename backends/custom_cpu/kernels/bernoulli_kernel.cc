@@ -0,0 +1,47 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/random.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+template <typename T>
+void BernoulliKernel(const phi::Context& dev_ctx,
+                     const phi::DenseTensor& x,
+                     phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  constexpr int kWords = RandomWords<T>();
+  auto numel = x.numel();
+  auto x_data = x.data<T>();
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  auto key = PhiloxKey(dev_ctx, 0);
+  ForEachRandomChunk(
+      key, numel, kWords, [&](int64_t b, int64_t e, const uint32_t* bits) {
+        for (auto i = b; i < e; ++i) {
+          T u = UniformFromBits<T>(bits + (i - b) * kWords);
+          out_data[i] = static_cast<T>(u < x_data[i]);
+        }
+      });
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(bernoulli,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::BernoulliKernel,
+                    float,
+                    double) {}
@@ -0,0 +1,168 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <cstring>
+#include <string>
+
+#include "kernels/funcs/attention.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Allocates `out`, which the op declares in place of `x`, and copies x
+// into it unless both already share their memory.
+template <typename T>
+T* InplaceOutput(const phi::Context& dev_ctx,
+                 const phi::DenseTensor& x,
+                 phi::DenseTensor* out) {
+  T* data = dev_ctx.template Alloc<T>(out);
+  if (data != x.data<T>()) {
+    std::memcpy(data, x.data<T>(), x.numel() * sizeof(T));
+  }
+  return data;
+}
+
+}  // namespace
+
+// Neither int32 qkv dequantized by qkv_out_scale nor a quantized KV cache
+// is supported, compute_dtype only names the type of such a qkv, and
+// rope_theta is unused since rope_emb carries the tables.
+template <typename T>
+void BlockMultiheadAttentionKernel(
+    const phi::Context& dev_ctx,
+    const phi::DenseTensor& qkv,
+    const phi::DenseTensor& key_cache,
+    const phi::DenseTensor& value_cache,
+    const phi::DenseTensor& seq_lens_encoder,
+    const phi::DenseTensor& seq_lens_decoder,
+    const phi::DenseTensor& seq_lens_this_time,
+    const phi::DenseTensor& padding_offsets,
+    const phi::DenseTensor& cum_offsets,
+    const phi::DenseTensor& cu_seqlens_q,
+    const phi::DenseTensor& cu_seqlens_k,
+    const phi::DenseTensor& block_tables,
+    const paddle::optional<phi::DenseTensor>& pre_key_cache,
+    const paddle::optional<phi::DenseTensor>& pre_value_cache,
+    const paddle::optional<phi::DenseTensor>& rope_emb,
+    const paddle::optional<phi::DenseTensor>& mask,
+    const paddle::optional<phi::DenseTensor>& tgt_mask,
+    const paddle::optional<phi::DenseTensor>& cache_k_quant_scales,
+    const paddle::optional<phi::DenseTensor>& cache_v_quant_scales,
+    const paddle::optional<phi::DenseTensor>& cache_k_dequant_scales,
+    const paddle::optional<phi::DenseTensor>& cache_v_dequant_scales,
+    const paddle::optional<phi::DenseTensor>& qkv_out_scale,
+    const paddle::optional<phi::DenseTensor>& qkv_bias,
+    const paddle::optional<phi::DenseTensor>& out_shift,
+    const paddle::optional<phi::DenseTensor>& out_smooth,
+    const paddle::optional<phi::DenseTensor>& max_enc_len_this_time,
+    const paddle::optional<phi::DenseTensor>& max_dec_len_this_time,
+    int max_seq_len,
+    int block_size,
+    bool use_neox_style,
+    bool dynamic_cachekv_quant,
+    int quant_round_type,
+    float quant_max_bound,
+    float quant_min_bound,
+    float out_scale,
+    const std::string& compute_dtype,
+    float rope_theta,
+    phi::DenseTensor* fmha_out,
+    phi::DenseTensor* qkv_out,
+    phi::DenseTensor* key_cache_out,
+    phi::DenseTensor* value_cache_out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  PD_CHECK(!cache_k_quant_scales && !cache_v_quant_scales &&
+               !cache_k_dequant_scales && !cache_v_dequant_scales &&
+               !dynamic_cachekv_quant,
+           "block_multihead_attention on custom_cpu does not support a "
+           "quantized KV cache.");
+  auto cache_dims = key_cache.dims();
+  PD_CHECK(cache_dims.size() == 4,
+           "key_cache of block_multihead_attention must be [blocks, "
+           "kv_heads, block_size, head_dim], but has %ld dims.",
+           static_cast<int64_t>(cache_dims.size()));
+  PD_CHECK(cache_dims[2] == block_size,
+           "block_size is %d but key_cache holds blocks of %ld.",
+           block_size,
+           cache_dims[2]);
+
+  BlockAttentionArgs<T> args;
+  args.batch = seq_lens_this_time.dims()[0];
+  args.tokens = qkv.dims()[0];
+  args.kv_heads = cache_dims[1];
+  args.block_size = cache_dims[2];
+  args.head_dim = cache_dims[3];
+  args.q_heads = qkv.dims()[1] / args.head_dim - 2 * args.kv_heads;
+  args.blocks_per_seq = block_tables.dims()[1];
+  args.seq_lens_encoder = seq_lens_encoder.data<int32_t>();
+  args.seq_lens_decoder = seq_lens_decoder.data<int32_t>();
+  args.seq_lens_this_time = seq_lens_this_time.data<int32_t>();
+  args.cu_seqlens_q = cu_seqlens_q.data<int32_t>();
+  args.block_tables = block_tables.data<int32_t>();
+  args.qkv_bias = qkv_bias ? qkv_bias->data<T>() : nullptr;
+  if (rope_emb) {
+    PD_CHECK(rope_emb->dtype() == phi::DataType::FLOAT32,
+             "rope_emb of block_multihead_attention must be float32.");
+    auto dims = rope_emb->dims();
+    args.rope_emb = rope_emb->data<float>();
+    args.rope_batch = dims[1];
+    args.rope_seq_len = dims[2];
+    args.rope_dim = dims.back();
+    args.neox_style = use_neox_style;
+  }
+  if (pre_key_cache) {
+    args.pre_key_cache = pre_key_cache->data<T>();
+    args.pre_value_cache = pre_value_cache->data<T>();
+    args.pre_cache_len = pre_key_cache->dims()[2];
+  }
+  if (mask) {
+    args.mask = mask->data<T>();
+    args.mask_rows = mask->dims()[2];
+    args.mask_cols = mask->dims()[3];
+  }
+  if (tgt_mask) {
+    args.tgt_mask = tgt_mask->data<T>();
+    args.tgt_mask_cols = tgt_mask->dims().back();
+  }
+  args.qkv = InplaceOutput<T>(dev_ctx, qkv, qkv_out);
+  args.key_cache = InplaceOutput<T>(dev_ctx, key_cache, key_cache_out);
+  args.value_cache = InplaceOutput<T>(dev_ctx, value_cache, value_cache_out);
+  args.out_shift = out_shift ? out_shift->data<T>() : nullptr;
+  args.out_smooth = out_smooth ? out_smooth->data<T>() : nullptr;
+  if (out_scale > 0) {
+    args.quant_out = dev_ctx.template Alloc<int8_t>(fmha_out);
+    args.out_scale = out_scale;
+    args.quant_round_type = quant_round_type;
+    args.quant_max_bound = quant_max_bound;
+    args.quant_min_bound = quant_min_bound;
+  } else {
+    args.out = dev_ctx.template Alloc<T>(fmha_out);
+  }
+  BlockMultiheadAttention(args);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(block_multihead_attention,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::BlockMultiheadAttentionKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->OutputAt(0).SetDataType(phi::DataType::UNDEFINED);
+}
@@ -12,8 +12,14 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include <algorithm>
+#include <cstring>
+#include <numeric>
+
 #include "paddle/phi/capi/all.h"
 #include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
 
 namespace custom_kernel {
 
@@ -22,6 +28,7 @@ void ConcatKernel(const phi::Context& dev_ctx,
                   const std::vector<const phi::DenseTensor*>& x,
                   const phi::Scalar& axis_scalar,
                   phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   int64_t axis = axis_scalar.to<int64_t>();
   if (axis < 0) {
     axis = axis + x[0]->dims().size();
@@ -37,21 +44,64 @@ void ConcatKernel(const phi::Context& dev_ctx,
     }
   }
   out->Resize(out_dims);
-  dev_ctx.template Alloc<T>(out);
+  T* out_data = dev_ctx.template Alloc<T>(out);
 
-  auto M = std::accumulate(
-      out_dims.cbegin(), out_dims.cbegin() + axis, 1, std::multiplies<int>());
-  auto N = std::accumulate(
-      out_dims.cbegin() + axis + 1, out_dims.cend(), 1, std::multiplies<int>());
-  auto out_offset = 0;
-  for (auto i = 0; i < M; ++i) {
-    for (auto j = 0; j < x.size(); ++j) {
-      memcpy(out->data<T>() + out_offset,
-             x[j]->data<T>() + i * N * x[j]->dims()[axis],
-             (N * x[j]->dims()[axis]) * sizeof(T));
-      out_offset += N * x[j]->dims()[axis];
+  // Each of the M outer rows of out is the rows of the inputs end to end,
+  // input j contributing widths[j] elements at column begins[j].
+  int64_t M = std::accumulate(out_dims.cbegin(),
+                              out_dims.cbegin() + axis,
+                              int64_t(1),
+                              std::multiplies<int64_t>());
+  int64_t N = std::accumulate(out_dims.cbegin() + axis + 1,
+                              out_dims.cend(),
+                              int64_t(1),
+                              std::multiplies<int64_t>());
+  std::vector<const T*> inputs;
+  std::vector<int64_t> widths;
+  std::vector<int64_t> begins;
+  int64_t out_width = 0;
+  for (auto input : x) {
+    int64_t width = N * input->dims()[axis];
+    if (width > 0) {
+      inputs.push_back(input->data<T>());
+      widths.push_back(width);
+      begins.push_back(out_width);
+      out_width += width;
     }
   }
+  if (M == 0 || out_width == 0) {
+    return;
+  }
+
+  if (M == 1) {
+    // Appends along the outermost dim, as to a cache, copy one flat range
+    // split over the pool regardless of where the inputs start and end.
+    custom_cpu::ParallelFor(
+        0, out_width, custom_cpu::kDefaultGrainSize, [&](int64_t b, int64_t e) {
+          auto j = std::upper_bound(begins.begin(), begins.end(), b) -
+                   begins.begin() - 1;
+          for (; b < e; ++j) {
+            int64_t end = std::min(e, begins[j] + widths[j]);
+            std::memcpy(out_data + b,
+                        inputs[j] + (b - begins[j]),
+                        (end - b) * sizeof(T));
+            b = end;
+          }
+        });
+    return;
+  }
+
+  custom_cpu::ParallelFor(
+      0, M, custom_cpu::GrainSize(out_width), [&](int64_t b, int64_t e) {
+        for (auto i = b; i < e; ++i) {
+          T* out_row = out_data + i * out_width;
+          for (size_t j = 0; j < inputs.size(); ++j) {
+            std::memcpy(out_row + begins[j],
+                        inputs[j] + i * widths[j],
+                        widths[j] * sizeof(T));
+          }
+        }
+      });
 }
 
 }  // namespace custom_kernel
@@ -0,0 +1,334 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/conv.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Shape of a convolution given its input, filter and output, or output
+// gradient, tensors.
+Conv2dShape MakeConv2dShape(const phi::DenseTensor& input,
+                            const phi::DenseTensor& filter,
+                            const phi::DenseTensor& out,
+                            const std::vector<int>& strides,
+                            const std::vector<int>& paddings,
+                            const std::string& padding_algorithm,
+                            const std::vector<int>& dilations,
+                            int groups,
+                            const std::string& data_format) {
+  auto in_dims = input.dims();
+  auto filter_dims = filter.dims();
+  auto out_dims = out.dims();
+  PD_CHECK(in_dims.size() == 4 && filter_dims.size() == 4,
+           "conv2d expects 4-D input and filter, but received %ld-D and "
+           "%ld-D.",
+           static_cast<int64_t>(in_dims.size()),
+           static_cast<int64_t>(filter_dims.size()));
+  Conv2dShape s;
+  s.channels_last = data_format == "NHWC";
+  s.batch = in_dims[0];
+  s.in_channels = s.channels_last ? in_dims[3] : in_dims[1];
+  s.in_h = s.channels_last ? in_dims[1] : in_dims[2];
+  s.in_w = s.channels_last ? in_dims[2] : in_dims[3];
+  s.out_channels = filter_dims[0];
+  s.out_h = s.channels_last ? out_dims[1] : out_dims[2];
+  s.out_w = s.channels_last ? out_dims[2] : out_dims[3];
+  s.kernel_h = filter_dims[2];
+  s.kernel_w = filter_dims[3];
+  s.stride_h = strides[0];
+  s.stride_w = strides[1];
+  s.groups = groups;
+  PD_CHECK(groups > 0 && s.in_channels == filter_dims[1] * groups &&
+               s.out_channels % groups == 0,
+           "conv2d input channels (%ld) must be the filter channels (%ld) "
+           "times groups (%d), and output channels (%ld) a multiple of it.",
+           s.in_channels,
+           filter_dims[1],
+           groups,
+           s.out_channels);
+
+  std::vector<int64_t> pads(paddings.begin(), paddings.end());
+  std::vector<int64_t> dils(dilations.begin(), dilations.end());
+  ResolvePadding(padding_algorithm,
+                 s.in_h,
+                 s.in_w,
+                 s.kernel_h,
+                 s.kernel_w,
+                 s.stride_h,
+                 s.stride_w,
+                 &pads,
+                 &dils);
+  s.pad_top = pads[0];
+  s.pad_left = pads[2];
+  s.dilation_h = dils[0];
+  s.dilation_w = dils[1];
+  return s;
+}
+
+ConvActivation ParseActivation(const std::string& activation) {
+  if (activation.empty() || activation == "identity") {
+    return ConvActivation::kIdentity;
+  } else if (activation == "relu") {
+    return ConvActivation::kRelu;
+  } else if (activation == "relu6") {
+    return ConvActivation::kRelu6;
+  } else if (activation == "leaky_relu") {
+    return ConvActivation::kLeakyRelu;
+  } else if (activation == "sigmoid") {
+    return ConvActivation::kSigmoid;
+  } else if (activation == "swish") {
+    return ConvActivation::kSwish;
+  }
+  PD_CHECK(false, "Unsupported conv activation %s.", activation.c_str());
+  return ConvActivation::kIdentity;
+}
+
+// Copies channels [begin, begin + out.channels) of x into out.
+template <typename T>
+void CopyChannels(const phi::Context& dev_ctx,
+                  const phi::DenseTensor& x,
+                  bool channels_last,
+                  int64_t begin,
+                  phi::DenseTensor* out) {
+  auto dims = x.dims();
+  const int64_t channels = channels_last ? dims[3] : dims[1];
+  const int64_t pixels = dims[1] * dims[2] * dims[3] / channels;
+  const int64_t count = out->numel() / (dims[0] * pixels);
+  const T* src = x.data<T>();
+  T* dst = dev_ctx.template Alloc<T>(out);
+  if (channels_last) {
+    for (int64_t i = 0; i < dims[0] * pixels; ++i) {
+      std::copy(src + i * channels + begin,
+                src + i * channels + begin + count,
+                dst + i * count);
+    }
+  } else {
+    for (int64_t n = 0; n < dims[0]; ++n) {
+      std::copy(src + (n * channels + begin) * pixels,
+                src + (n * channels + begin + count) * pixels,
+                dst + n * count * pixels);
+    }
+  }
+}
+
+}  // namespace
+
+template <typename T>
+void Conv2dKernel(const phi::Context& dev_ctx,
+                  const phi::DenseTensor& input,
+                  const phi::DenseTensor& filter,
+                  const std::vector<int>& strides,
+                  const std::vector<int>& paddings,
+                  const std::string& padding_algorithm,
+                  const std::vector<int>& dilations,
+                  int groups,
+                  const std::string& data_format,
+                  phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto shape = MakeConv2dShape(input,
+                               filter,
+                               *out,
+                               strides,
+                               paddings,
+                               padding_algorithm,
+                               dilations,
+                               groups,
+                               data_format);
+  Conv2dForward(shape,
+                input.data<T>(),
+                filter.data<T>(),
+                ConvEpilogue<T>(),
+                dev_ctx.template Alloc<T>(out));
+}
+
+template <typename T>
+void Conv2dGradKernel(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& input,
+                      const phi::DenseTensor& filter,
+                      const phi::DenseTensor& out_grad,
+                      const std::vector<int>& strides,
+                      const std::vector<int>& paddings,
+                      const std::string& padding_algorithm,
+                      const std::vector<int>& dilations,
+                      int groups,
+                      const std::string& data_format,
+                      phi::DenseTensor* input_grad,
+                      phi::DenseTensor* filter_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto shape = MakeConv2dShape(input,
+                               filter,
+                               out_grad,
+                               strides,
+                               paddings,
+                               padding_algorithm,
+                               dilations,
+                               groups,
+                               data_format);
+  if (input_grad) {
+    Conv2dBackwardData(shape,
+                       filter.data<T>(),
+                       out_grad.data<T>(),
+                       dev_ctx.template Alloc<T>(input_grad));
+  }
+  if (filter_grad) {
+    Conv2dBackwardFilter(shape,
+                         input.data<T>(),
+                         out_grad.data<T>(),
+                         dev_ctx.template Alloc<T>(filter_grad));
+  }
+}
+
+// depthwise_conv2d takes groups before dilations.
+template <typename T>
+void DepthwiseConv2dKernel(const phi::Context& dev_ctx,
+                           const phi::DenseTensor& input,
+                           const phi::DenseTensor& filter,
+                           const std::vector<int>& strides,
+                           const std::vector<int>& paddings,
+                           const std::string& padding_algorithm,
+                           int groups,
+                           const std::vector<int>& dilations,
+                           const std::string& data_format,
+                           phi::DenseTensor* out) {
+  Conv2dKernel<T>(dev_ctx,
+                  input,
+                  filter,
+                  strides,
+                  paddings,
+                  padding_algorithm,
+                  dilations,
+                  groups,
+                  data_format,
+                  out);
+}
+
+template <typename T>
+void DepthwiseConv2dGradKernel(const phi::Context& dev_ctx,
+                               const phi::DenseTensor& input,
+                               const phi::DenseTensor& filter,
+                               const phi::DenseTensor& out_grad,
+                               const std::vector<int>& strides,
+                               const std::vector<int>& paddings,
+                               const std::string& padding_algorithm,
+                               int groups,
+                               const std::vector<int>& dilations,
+                               const std::string& data_format,
+                               phi::DenseTensor* input_grad,
+                               phi::DenseTensor* filter_grad) {
+  Conv2dGradKernel<T>(dev_ctx,
+                      input,
+                      filter,
+                      out_grad,
+                      strides,
+                      paddings,
+                      padding_algorithm,
+                      dilations,
+                      groups,
+                      data_format,
+                      input_grad,
+                      filter_grad);
+}
+
+// Inference fusion of conv2d, bias, residual add and activation, the
+// output optionally split along the channels into `outputs`.
+template <typename T>
+void FusedConv2dAddActKernel(
+    const phi::Context& dev_ctx,
+    const phi::DenseTensor& input,
+    const phi::DenseTensor& filter,
+    const paddle::optional<phi::DenseTensor>& bias,
+    const paddle::optional<phi::DenseTensor>& residual_data,
+    const std::vector<int>& strides,
+    const std::vector<int>& paddings,
+    const std::string& padding_algorithm,
+    const std::vector<int>& dilations,
+    int groups,
+    const std::string& data_format,
+    const std::string& activation,
+    const std::vector<int>& split_channels,
+    bool exhaustive_search,
+    int workspace_size_MB,
+    float fuse_alpha,
+    phi::DenseTensor* output,
+    std::vector<phi::DenseTensor*> outputs) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto shape = MakeConv2dShape(input,
+                               filter,
+                               *output,
+                               strides,
+                               paddings,
+                               padding_algorithm,
+                               dilations,
+                               groups,
+                               data_format);
+  ConvEpilogue<T> epilogue;
+  epilogue.bias = bias ? bias->data<T>() : nullptr;
+  epilogue.residual = residual_data ? residual_data->data<T>() : nullptr;
+  epilogue.activation = ParseActivation(activation);
+  epilogue.alpha = fuse_alpha;
+  Conv2dForward(shape,
+                input.data<T>(),
+                filter.data<T>(),
+                epilogue,
+                dev_ctx.template Alloc<T>(output));
+
+  int64_t begin = 0;
+  for (size_t i = 0; i < split_channels.size() && i < outputs.size(); ++i) {
+    if (outputs[i]) {
+      CopyChannels<T>(dev_ctx, *output, shape.channels_last, begin, outputs[i]);
+    }
+    begin += split_channels[i];
+  }
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(conv2d,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::Conv2dKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(conv2d_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::Conv2dGradKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(depthwise_conv2d,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::DepthwiseConv2dKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(depthwise_conv2d_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::DepthwiseConv2dGradKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(fused_conv2d_add_act,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::FusedConv2dAddActKernel,
+                    float,
+                    double) {}
@@ -13,8 +13,11 @@
 // limitations under the License.
 
 #include "kernels.h"  //NOLINT
+#include "kernels/funcs/softmax.h"
 #include "paddle/phi/capi/all.h"
 #include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
 
 namespace custom_kernel {
 
@@ -28,44 +31,52 @@ void CrossEntropy(const T* prob,
                   int axis_dim,
                   T* out) {
   auto num_remain = num_classes / axis_dim;
+  auto grain_size = custom_cpu::GrainSize(num_classes);
   if (soft_label) {
-    for (auto i = 0; i < batch_size; ++i) {
-      for (auto k = 0; k < num_remain; ++k) {
-        out[i * num_remain + k] = 0;
-        for (auto j = 0; j < axis_dim; ++j) {
-          auto idx = i * num_classes + j * num_remain + k;
-          out[i * num_remain + k] -=
-              label[idx] * phi::TolerableValue<T>(std::log(prob[idx]));
-        }
-      }
-    }
+    custom_cpu::ParallelFor(
+        0, batch_size, grain_size, [&](int64_t b, int64_t e) {
+          for (auto i = b; i < e; ++i) {
+            for (auto k = 0; k < num_remain; ++k) {
+              out[i * num_remain + k] = 0;
+              for (auto j = 0; j < axis_dim; ++j) {
+                auto idx = i * num_classes + j * num_remain + k;
+                out[i * num_remain + k] -=
+                    label[idx] * phi::TolerableValue<T>(std::log(prob[idx]));
+              }
+            }
+          }
+        });
   } else {
-    for (int i = 0; i < batch_size; ++i) {
-      for (int j = 0; j < num_remain; j++) {
-        int lbl = static_cast<int>(label[i * num_remain + j]);
-        if (lbl != ignore_index) {
-          PD_CHECK(lbl >= 0,
-                   "label value should >= 0 when label "
-                   "value(%f) not equal to ignore_index(%f)",
-                   lbl,
-                   ignore_index);
-          PD_CHECK(lbl < axis_dim,
-                   "label value should less than the shape of axis dimension "
-                   "when label value(%f) not equal to ignore_index(%f), But "
-                   "received label value as %ld and shape of axis dimension "
-                   "is %d",
-                   lbl,
-                   ignore_index,
-                   lbl,
-                   axis_dim);
-        }
-        int index = i * num_classes + lbl * num_remain + j;
-        int loss_idx = i * num_remain + j;
-        out[loss_idx] = lbl == ignore_index
-                            ? 0
-                            : -phi::TolerableValue<T>(std::log(prob[index]));
-      }
-    }
+    custom_cpu::ParallelFor(
+        0, batch_size, grain_size, [&](int64_t b, int64_t e) {
+          for (auto i = b; i < e; ++i) {
+            for (int j = 0; j < num_remain; j++) {
+              int lbl = static_cast<int>(label[i * num_remain + j]);
+              if (lbl != ignore_index) {
+                PD_CHECK(lbl >= 0,
+                         "label value should >= 0 when label "
+                         "value(%f) not equal to ignore_index(%f)",
+                         lbl,
+                         ignore_index);
+                PD_CHECK(lbl < axis_dim,
+                         "label value should less than the shape of axis "
+                         "dimension when label value(%f) not equal to "
+                         "ignore_index(%f), But received label value as %ld "
+                         "and shape of axis dimension is %d",
+                         lbl,
+                         ignore_index,
+                         lbl,
+                         axis_dim);
+              }
+              int index = i * num_classes + lbl * num_remain + j;
+              int loss_idx = i * num_remain + j;
+              out[loss_idx] =
+                  lbl == ignore_index
+                      ? 0
+                      : -phi::TolerableValue<T>(std::log(prob[index]));
+            }
+          }
+        });
   }
 }
 
@@ -155,6 +166,65 @@ void CrossEntropyKernel(const phi::Context& dev_ctx,
   }
 }
 
+template <typename T>
+T ValueClip(const T& x) {
+  const T kThreshold = static_cast<T>(-64.);
+  return x < kThreshold ? kThreshold : x;
+}
+
+// Softmax and cross entropy of [n, axis_dim] logits in one sweep per row: the
+// online max and sum give the softmax and the loss without taking the log of
+// every probability.
+template <typename T, typename U>
+void SoftmaxCrossEntropy(const T* logits,
+                         const U* label,
+                         bool soft_label,
+                         int64_t n,
+                         int64_t axis_dim,
+                         int ignore_index,
+                         T* softmax,
+                         T* loss) {
+  auto grain_size = custom_cpu::GrainSize(3 * axis_dim);
+  custom_cpu::ParallelFor(0, n, grain_size, [&](int64_t b, int64_t e) {
+    for (auto i = b; i < e; ++i) {
+      const T* x = logits + i * axis_dim;
+      T max, sum;
+      SoftmaxRowStats(x, axis_dim, &max, &sum);
+      SoftmaxRow(x, axis_dim, max, sum, false, softmax + i * axis_dim);
+      T log_sum = std::log(sum);
+      if (soft_label) {
+        const U* y = label + i * axis_dim;
+        T out = 0;
+        for (int64_t j = 0; j < axis_dim; ++j) {
+          out -= static_cast<T>(y[j]) * (ValueClip(x[j] - max) - log_sum);
+        }
+        loss[i] = out;
+        continue;
+      }
+      int lbl = static_cast<int>(label[i]);
+      if (lbl == ignore_index) {
+        loss[i] = 0;
+        continue;
+      }
+      PD_CHECK(lbl >= 0,
+               "label value should >= 0 when label "
+               "value(%f) not equal to ignore_index(%f)",
+               lbl,
+               ignore_index);
+      PD_CHECK(lbl < axis_dim,
+               "label value should less than the shape of axis "
+               "dimension when label value(%f) not equal to "
+               "ignore_index(%f), But received label value as %ld "
+               "and shape of axis dimension is %d",
+               lbl,
+               ignore_index,
+               lbl,
+               axis_dim);
+      loss[i] = log_sum - ValueClip(x[lbl] - max);
+    }
+  });
+}
+
 template <typename T>
 void CrossEntropyWithSoftmaxKernel(const phi::Context& dev_ctx,
                                    const phi::DenseTensor& logits,
@@ -166,6 +236,7 @@ void CrossEntropyWithSoftmaxKernel(const phi::Context& dev_ctx,
                                    int axis,
                                    phi::DenseTensor* softmax,
                                    phi::DenseTensor* loss) {
+  CUSTOM_CPU_TRACE_KERNEL();
   // do not with softmax op, and input is softmax
   if (!use_softmax) {
     auto softmax_data = dev_ctx.template Alloc<T>(softmax);
@@ -175,9 +246,80 @@ void CrossEntropyWithSoftmaxKernel(const phi::Context& dev_ctx,
     return;
   }
 
-  custom_kernel::SoftmaxKernel<T>(dev_ctx, logits, axis, softmax);
-  CrossEntropyKernel<T>(
-      dev_ctx, *softmax, label, soft_label, ignore_index, axis, loss);
+  const int rank = logits.dims().size();
+  const int axis_v = phi::funcs::CanonicalAxis(axis, rank);
+  const int64_t axis_dim = rank == 0 ? 1 : logits.dims()[axis_v];
+  const int64_t d = phi::funcs::SizeFromAxis(axis_v, logits.dims());
+  if (rank == 0 || logits.numel() == 0 || d != axis_dim) {
+    // The class axis is not innermost, normalise first and then take the
+    // cross entropy of the probabilities.
+    custom_kernel::SoftmaxKernel<T>(dev_ctx, logits, axis, softmax);
+    CrossEntropyKernel<T>(
+        dev_ctx, *softmax, label, soft_label, ignore_index, axis, loss);
+    return;
+  }
+
+  const int64_t n = phi::funcs::SizeToAxis(axis_v, logits.dims());
+  auto softmax_data = dev_ctx.template Alloc<T>(softmax);
+  auto loss_data = dev_ctx.template Alloc<T>(loss);
+  auto logits_data = logits.data<T>();
+  if (soft_label) {
+    SoftmaxCrossEntropy(logits_data,
+                        label.data<T>(),
+                        soft_label,
+                        n,
+                        axis_dim,
+                        ignore_index,
+                        softmax_data,
+                        loss_data);
+  } else if (label.dtype() == phi::DataType::INT32) {
+    SoftmaxCrossEntropy(logits_data,
+                        label.data<int32_t>(),
+                        soft_label,
+                        n,
+                        axis_dim,
+                        ignore_index,
+                        softmax_data,
+                        loss_data);
+  } else if (label.dtype() == phi::DataType::INT64) {
+    SoftmaxCrossEntropy(logits_data,
+                        label.data<int64_t>(),
+                        soft_label,
+                        n,
+                        axis_dim,
+                        ignore_index,
+                        softmax_data,
+                        loss_data);
+  } else if (label.dtype() == phi::DataType::INT16) {
+    SoftmaxCrossEntropy(logits_data,
+                        label.data<int16_t>(),
+                        soft_label,
+                        n,
+                        axis_dim,
+                        ignore_index,
+                        softmax_data,
+                        loss_data);
+  } else if (label.dtype() == phi::DataType::INT8) {
+    SoftmaxCrossEntropy(logits_data,
+                        label.data<int8_t>(),
+                        soft_label,
+                        n,
+                        axis_dim,
+                        ignore_index,
+                        softmax_data,
+                        loss_data);
+  } else if (label.dtype() == phi::DataType::UINT8) {
+    SoftmaxCrossEntropy(logits_data,
+                        label.data<uint8_t>(),
+                        soft_label,
+                        n,
+                        axis_dim,
+                        ignore_index,
+                        softmax_data,
+                        loss_data);
+  } else {
+    PD_CHECK(false, "The dtype of label must be int.");
+  }
 }
 
 template <typename T, typename LabelT>
@@ -198,10 +340,6 @@ void CrossEntropyWithSoftmaxGradCPUKernel(const phi::Context& dev_ctx,
   auto logits_grad_data = logits_grad->data<T>();
   auto softmax_data = softmax.data<T>();
 
-  if (logit_grad != &softmax || !use_softmax) {
-    memcpy(logits_grad_data, softmax_data, softmax.numel() * sizeof(T));
-  }
-
   const int rank = logit_grad->dims().size();
   const int axis_v = phi::funcs::CanonicalAxis(axis, rank);
   int axis_dim = logit_grad->dims()[axis_v];
@@ -218,116 +356,93 @@ void CrossEntropyWithSoftmaxGradCPUKernel(const phi::Context& dev_ctx,
 
   const int d = phi::funcs::SizeFromAxis(axis_v, logit_grad->dims());
   int remain = d / axis_dim;
+  auto grain_size = custom_cpu::GrainSize(d);
 
   auto out_grad_data = out_grad->data<T>();
   auto label_data = label.data<LabelT>();
   auto logit_grad_data = logit_grad->data<T>();
   if (!use_softmax) {
+    memcpy(logits_grad_data, softmax_data, softmax.numel() * sizeof(T));
     // use_softmax step1
     if (soft_label) {
-      for (auto i = 0; i < n; ++i) {
-        for (auto j = 0; j < axis_dim; ++j) {
-          for (auto k = 0; k < remain; ++k) {
-            auto index = i * d + j * remain + k;
-            auto l_index = i * remain + k;
-            logit_grad_data[index] = -label_data[index] /
-                                     logit_grad_data[index] *
-                                     out_grad_data[l_index];
+      custom_cpu::ParallelFor(0, n, grain_size, [&](int64_t b, int64_t e) {
+        for (auto i = b; i < e; ++i) {
+          for (auto j = 0; j < axis_dim; ++j) {
+            for (auto k = 0; k < remain; ++k) {
+              auto index = i * d + j * remain + k;
+              auto l_index = i * remain + k;
+              logit_grad_data[index] = -label_data[index] /
+                                       logit_grad_data[index] *
+                                       out_grad_data[l_index];
+            }
           }
         }
-      }
+      });
     } else {
       // use_softmax step2
       const int remain = d / axis_dim;
-      for (int i = 0; i < n; ++i) {         // for each sample_1_dim
-        for (int j = 0; j < remain; j++) {  // for each sample_other_dims
-          int idx = i * remain + j;  // this sample's label_idx. for 1d case,
-                                     // remain=1 and j=0, so, idx = i
-          auto lbl = static_cast<int64_t>(label_data[idx]);
-          if (lbl == ignore_index) {
-            for (int k = 0; k < axis_dim; ++k) {  // for each class id's label
-              logit_grad_data[i * d + k * remain + j] = 0;
-            }
-          } else {
-            // only for this sample's label_idx, the label is 1, others is 0,
-            // so, only compute this label_idx's class
-            logit_grad_data[i * d + lbl * remain + j] =
-                (-1 / logit_grad_data[i * d + lbl * remain + j]) *
-                out_grad_data[idx];
-            for (int k = 0; k < axis_dim; ++k) {  // for each class id's label
-              if (k !=
-                  label_data[idx]) {  // label_data[idx]: this sample's label
+      custom_cpu::ParallelFor(0, n, grain_size, [&](int64_t b, int64_t e) {
+        for (auto i = b; i < e; ++i) {        // for each sample_1_dim
+          for (int j = 0; j < remain; j++) {  // for each sample_other_dims
+            int idx = i * remain + j;  // this sample's label_idx. for 1d case,
+                                       // remain=1 and j=0, so, idx = i
+            auto lbl = static_cast<int64_t>(label_data[idx]);
+            if (lbl == ignore_index) {
+              for (int k = 0; k < axis_dim; ++k) {  // for each class id's label
                 logit_grad_data[i * d + k * remain + j] = 0;
               }
+            } else {
+              // only for this sample's label_idx, the label is 1, others is 0,
+              // so, only compute this label_idx's class
+              logit_grad_data[i * d + lbl * remain + j] =
+                  (-1 / logit_grad_data[i * d + lbl * remain + j]) *
+                  out_grad_data[idx];
+              for (int k = 0; k < axis_dim; ++k) {  // for each class id's label
+                if (k !=
+                    label_data[idx]) {  // label_data[idx]: this sample's label
+                  logit_grad_data[i * d + k * remain + j] = 0;
+                }
+              }
             }
           }
         }
-      }
+      });
     }
     return;
   }
-  // for use_softmax=False, continue
+  // for use_softmax=True, continue
 
-  if (soft_label) {
-    // when soft_label = True, ignore_index is not supported
-    for (auto i = 0; i < n; ++i) {
-      for (auto j = 0; j < axis_dim; ++j) {
-        for (auto k = 0; k < remain; ++k) {
-          auto index = i * d + j * remain + k;
-          auto l_index = i * remain + k;
-          logit_grad_data[index] = out_grad_data[l_index] *
-                                   (logit_grad_data[index] - label_data[index]);
+  // dx = dy * (P - Y) in a single pass, where P is the softmax and Y the soft
+  // labels or the one-hot of the hard label. Ignored labels get no gradient.
+  custom_cpu::ParallelFor(0, n, grain_size, [&](int64_t b, int64_t e) {
+    for (auto i = b; i < e; ++i) {
+      const T* p = softmax_data + i * d;
+      const T* dy = out_grad_data + i * remain;
+      T* dx = logit_grad_data + i * d;
+      if (soft_label) {
+        const LabelT* y = label_data + i * d;
+        for (auto j = 0; j < axis_dim; ++j) {
+          for (auto k = 0; k < remain; ++k) {
+            auto index = j * remain + k;
+            dx[index] = dy[k] * (p[index] - static_cast<T>(y[index]));
+          }
         }
+        continue;
       }
-    }
-
-    // for each sample, i is sample id
-    // 1) compute dy/dx by p_j - y_j or P-Y, where j is class id,
-    // P=logit_grad_mat[i] is all class's probs, Y=lbl_mat[i] is
-    // all class's label
-    // 2) compute dy * dy/dx by   Chain rule, dy=out_grad_mat[i]
-    // for high dims, e.g. (n,c) or (n,d1,...,dm, c), compute grad by matrix
-    // operation
-
-  } else {
-    for (auto i = 0; i < n; ++i) {
+      const LabelT* lbl = label_data + i * remain;
       for (auto j = 0; j < axis_dim; ++j) {
         for (auto k = 0; k < remain; ++k) {
-          auto index = i * d + j * remain + k;
-          auto l_index = i * remain + k;
-
-          logit_grad_data[index] =
-              out_grad_data[l_index] * logit_grad_data[index];
-        }
-      }
-    }
-    for (int i = 0; i < n; ++i) {         // for each sample_1_dim
-      for (int j = 0; j < remain; j++) {  // for each sample_other_dims
-        int idx = i * remain + j;  // this sample's label_idx. for 1d case,
-                                   // remain=1 and j=0, so, idx = i
-        auto lbl = static_cast<int64_t>(label_data[idx]);
-        if (lbl == ignore_index) {
-          for (int k = 0; k < axis_dim; ++k) {  // for each class id's label
-            logit_grad_data[i * d + k * remain + j] = 0;
+          auto index = j * remain + k;
+          auto l = static_cast<int64_t>(lbl[k]);
+          if (l == ignore_index) {
+            dx[index] = 0;
+          } else {
+            dx[index] = dy[k] * (l == j ? p[index] - 1 : p[index]);
           }
-        } else {
-          // only for this sample's label_idx, the label is 1, others is 0,
-          // so, only compute this label_idx's class
-          // for 1d case, remain=1 and j=0, so, [i * d + label_data[idx] *
-          // remain + j] = [i * d + label_data[idx]]
-          // let idx_x = i * d + label_data[idx] * remain + j,
-          //   logit_grad_data[idx_x] = logit_grad_data[idx_x] -
-          //   out_grad_data[idx]
-          // note: logit_grad_mat = logit_grad_mat * out_grad_mat
-          // so: logit_grad_data[idx_x] =  (logit_grad_data[idx_x] - 1) *
-          // out_grad_data[idx]
-          // means:           dy/dp * dy=   ( p - y ) * dy
-
-          logit_grad_data[i * d + lbl * remain + j] -= out_grad_data[idx];
         }
       }
     }
-  }
+  });
 }
 
 template <typename T>
@@ -341,6 +456,7 @@ void CrossEntropyWithSoftmaxGradKernel(const phi::Context& dev_ctx,
                                        int ignore_index,
                                        int axis,
                                        phi::DenseTensor* logits_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
   if (soft_label) {
     CrossEntropyWithSoftmaxGradCPUKernel<T, T>(dev_ctx,
                                                label,
@@ -0,0 +1,128 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/random.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Applies out[i] = a[i] * scale over the intra-op thread pool, with
+// optional per-element mask.
+template <typename T>
+void ScaleByMask(
+    const T* a, const uint8_t* mask, T scale, int64_t numel, T* out) {
+  custom_cpu::ParallelFor(
+      0, numel, custom_cpu::kDefaultGrainSize, [&](int64_t b, int64_t e) {
+        if (mask == nullptr) {
+          for (auto i = b; i < e; ++i) {
+            out[i] = a[i] * scale;
+          }
+          return;
+        }
+        for (auto i = b; i < e; ++i) {
+          out[i] = mask[i] ? a[i] * scale : static_cast<T>(0);
+        }
+      });
+}
+
+}  // namespace
+
+template <typename T>
+void DropoutRawKernel(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& x,
+                      const paddle::optional<phi::DenseTensor>& seed_tensor,
+                      const phi::Scalar& p,
+                      bool is_test,
+                      const std::string& mode,
+                      int seed,
+                      bool fix_seed,
+                      phi::DenseTensor* out,
+                      phi::DenseTensor* mask) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const float prob = p.to<float>();
+  const bool upscale = mode == "upscale_in_train";
+  auto numel = x.numel();
+  auto x_data = x.data<T>();
+  T* out_data = dev_ctx.template Alloc<T>(out);
+
+  if (is_test) {
+    T scale = static_cast<T>(upscale ? 1.0f : 1.0f - prob);
+    ScaleByMask<T>(x_data, nullptr, scale, numel, out_data);
+    return;
+  }
+
+  uint8_t* mask_data = dev_ctx.template Alloc<uint8_t>(mask);
+  if (seed_tensor) {
+    seed = *seed_tensor->data<int>();
+  } else if (!fix_seed) {
+    seed = 0;
+  }
+  // Every element is dropped when p is 1, its scale is never used.
+  T scale =
+      static_cast<T>(upscale && prob < 1.0f ? 1.0f / (1.0f - prob) : 1.0f);
+  auto key = PhiloxKey(dev_ctx, seed);
+  ForEachRandomChunk(
+      key, numel, 1, [&](int64_t b, int64_t e, const uint32_t* bits) {
+        for (auto i = b; i < e; ++i) {
+          bool keep = UniformFromBits<float>(bits + (i - b)) >= prob;
+          mask_data[i] = keep;
+          out_data[i] = keep ? x_data[i] * scale : static_cast<T>(0);
+        }
+      });
+}
+
+template <typename T>
+void DropoutGradRawKernel(const phi::Context& dev_ctx,
+                          const phi::DenseTensor& mask,
+                          const phi::DenseTensor& out_grad,
+                          const phi::Scalar& p,
+                          bool is_test,
+                          const std::string& mode,
+                          phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const float prob = p.to<float>();
+  const bool upscale = mode == "upscale_in_train";
+  auto numel = out_grad.numel();
+  auto dy = out_grad.data<T>();
+  T* dx = dev_ctx.template Alloc<T>(x_grad);
+
+  if (is_test) {
+    T scale = static_cast<T>(upscale ? 1.0f : 1.0f - prob);
+    ScaleByMask<T>(dy, nullptr, scale, numel, dx);
+    return;
+  }
+  T scale =
+      static_cast<T>(upscale && prob < 1.0f ? 1.0f / (1.0f - prob) : 1.0f);
+  ScaleByMask<T>(dy, mask.data<uint8_t>(), scale, numel, dx);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(dropout,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::DropoutRawKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(dropout_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::DropoutGradRawKernel,
+                    float,
+                    double) {}
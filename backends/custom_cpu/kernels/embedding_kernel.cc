@@ -0,0 +1,88 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/gather.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+// Rows of weight [rows, width] picked by the ids of x, rows with id
+// padding_idx being zeros. A negative padding_idx pads nothing.
+template <typename T>
+void EmbeddingKernel(const phi::Context& dev_ctx,
+                     const phi::DenseTensor& x,
+                     const phi::DenseTensor& weight,
+                     int64_t padding_idx,
+                     phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const int64_t rows = weight.dims()[0];
+  const int64_t width = weight.numel() / rows;
+  auto ids = NormalizeIndex(x, rows, false, "embedding");
+  GatherRows(weight.data<T>(),
+             1,
+             rows,
+             width * sizeof(T),
+             ids.data(),
+             ids.size(),
+             dev_ctx.template Alloc<T>(out),
+             padding_idx);
+}
+
+// The dense gradient of the table. Paddle 3.3.1's C API passes no
+// SelectedRows, so embedding_sparse_grad (sparse=True) is not registered
+// here: only the rows the ids touch are written after the zero fill.
+template <typename T>
+void EmbeddingGradKernel(const phi::Context& dev_ctx,
+                         const phi::DenseTensor& x,
+                         const phi::DenseTensor& weight,
+                         const phi::DenseTensor& out_grad,
+                         int64_t padding_idx,
+                         phi::DenseTensor* weight_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const int64_t rows = weight.dims()[0];
+  const int64_t width = weight.numel() / rows;
+  auto ids = NormalizeIndex(x, rows, false, "embedding_grad");
+  T* grad = dev_ctx.template Alloc<T>(weight_grad);
+  ParallelZero(grad, weight.numel() * sizeof(T));
+  ScatterRows(out_grad.data<T>(),
+              1,
+              ids.size(),
+              width,
+              ids.data(),
+              rows,
+              ScatterMode::kSum,
+              grad,
+              padding_idx);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(embedding,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::EmbeddingKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(embedding_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::EmbeddingGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
@@ -0,0 +1,513 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/attention.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <limits>
+#include <type_traits>
+#include <vector>
+
+#include "kernels/funcs/cpu_features.h"
+#include "kernels/funcs/gemm.h"
+#include "kernels/funcs/softmax.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Query rows, tokens times the heads sharing a key head, per prefill tile.
+constexpr int64_t kTileRows = 64;
+
+// Tiles of fewer rows, decode steps mostly, multiply each key and value row
+// by the query rows directly: a GEMM would copy every cache block into
+// its packed layout and double the memory traffic.
+constexpr int64_t kMinGemmRows = 16;
+
+float DotScalar(const float* x, const float* y, int64_t n) {
+  float s = 0;
+  for (int64_t j = 0; j < n; ++j) {
+    s += x[j] * y[j];
+  }
+  return s;
+}
+
+// y += a * x
+void AxpyScalar(float a, const float* x, float* y, int64_t n) {
+  for (int64_t j = 0; j < n; ++j) {
+    y[j] += a * x[j];
+  }
+}
+
+// out[i] = x . y[i * stride] for four rows of y.
+void Dot4Scalar(
+    const float* x, const float* y, int64_t stride, int64_t n, float* out) {
+  for (int i = 0; i < 4; ++i) {
+    out[i] = DotScalar(x, y + i * stride, n);
+  }
+}
+
+// y += sum of a[i] * x[i * stride] over four rows of x.
+void Axpy4Scalar(
+    const float* a, const float* x, int64_t stride, float* y, int64_t n) {
+  for (int64_t j = 0; j < n; ++j) {
+    y[j] += a[0] * x[j] + a[1] * x[stride + j] + a[2] * x[2 * stride + j] +
+            a[3] * x[3 * stride + j];
+  }
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+CUSTOM_CPU_TARGET_AVX2 float DotAvx2(const float* x,
+                                     const float* y,
+                                     int64_t n) {
+  __m256 s0 = _mm256_setzero_ps();
+  __m256 s1 = _mm256_setzero_ps();
+  int64_t j = 0;
+  for (; j + 16 <= n; j += 16) {
+    s0 = _mm256_fmadd_ps(_mm256_loadu_ps(x + j), _mm256_loadu_ps(y + j), s0);
+    s1 = _mm256_fmadd_ps(
+        _mm256_loadu_ps(x + j + 8), _mm256_loadu_ps(y + j + 8), s1);
+  }
+  for (; j + 8 <= n; j += 8) {
+    s0 = _mm256_fmadd_ps(_mm256_loadu_ps(x + j), _mm256_loadu_ps(y + j), s0);
+  }
+  __m256 v = _mm256_add_ps(s0, s1);
+  __m128 s = _mm_add_ps(_mm256_castps256_ps128(v), _mm256_extractf128_ps(v, 1));
+  s = _mm_add_ps(s, _mm_movehl_ps(s, s));
+  s = _mm_add_ss(s, _mm_movehdup_ps(s));
+  float r = _mm_cvtss_f32(s);
+  for (; j < n; ++j) {
+    r += x[j] * y[j];
+  }
+  return r;
+}
+
+CUSTOM_CPU_TARGET_AVX2 void AxpyAvx2(float a,
+                                     const float* x,
+                                     float* y,
+                                     int64_t n) {
+  const __m256 va = _mm256_set1_ps(a);
+  int64_t j = 0;
+  for (; j + 8 <= n; j += 8) {
+    _mm256_storeu_ps(
+        y + j,
+        _mm256_fmadd_ps(va, _mm256_loadu_ps(x + j), _mm256_loadu_ps(y + j)));
+  }
+  for (; j < n; ++j) {
+    y[j] += a * x[j];
+  }
+}
+
+// The four dot products are reduced together, which keeps the latency of
+// the horizontal sums off every single key.
+CUSTOM_CPU_TARGET_AVX2 void Dot4Avx2(
+    const float* x, const float* y, int64_t stride, int64_t n, float* out) {
+  __m256 s0 = _mm256_setzero_ps();
+  __m256 s1 = _mm256_setzero_ps();
+  __m256 s2 = _mm256_setzero_ps();
+  __m256 s3 = _mm256_setzero_ps();
+  int64_t j = 0;
+  for (; j + 8 <= n; j += 8) {
+    __m256 vx = _mm256_loadu_ps(x + j);
+    s0 = _mm256_fmadd_ps(vx, _mm256_loadu_ps(y + j), s0);
+    s1 = _mm256_fmadd_ps(vx, _mm256_loadu_ps(y + stride + j), s1);
+    s2 = _mm256_fmadd_ps(vx, _mm256_loadu_ps(y + 2 * stride + j), s2);
+    s3 = _mm256_fmadd_ps(vx, _mm256_loadu_ps(y + 3 * stride + j), s3);
+  }
+  __m256 h = _mm256_hadd_ps(_mm256_hadd_ps(s0, s1), _mm256_hadd_ps(s2, s3));
+  __m128 r = _mm_add_ps(_mm256_castps256_ps128(h), _mm256_extractf128_ps(h, 1));
+  _mm_storeu_ps(out, r);
+  for (; j < n; ++j) {
+    for (int i = 0; i < 4; ++i) {
+      out[i] += x[j] * y[i * stride + j];
+    }
+  }
+}
+
+CUSTOM_CPU_TARGET_AVX2 void Axpy4Avx2(
+    const float* a, const float* x, int64_t stride, float* y, int64_t n) {
+  const __m256 a0 = _mm256_set1_ps(a[0]);
+  const __m256 a1 = _mm256_set1_ps(a[1]);
+  const __m256 a2 = _mm256_set1_ps(a[2]);
+  const __m256 a3 = _mm256_set1_ps(a[3]);
+  int64_t j = 0;
+  for (; j + 8 <= n; j += 8) {
+    __m256 vy = _mm256_loadu_ps(y + j);
+    vy = _mm256_fmadd_ps(a0, _mm256_loadu_ps(x + j), vy);
+    vy = _mm256_fmadd_ps(a1, _mm256_loadu_ps(x + stride + j), vy);
+    vy = _mm256_fmadd_ps(a2, _mm256_loadu_ps(x + 2 * stride + j), vy);
+    vy = _mm256_fmadd_ps(a3, _mm256_loadu_ps(x + 3 * stride + j), vy);
+    _mm256_storeu_ps(y + j, vy);
+  }
+  for (; j < n; ++j) {
+    y[j] += a[0] * x[j] + a[1] * x[stride + j] + a[2] * x[2 * stride + j] +
+            a[3] * x[3 * stride + j];
+  }
+}
+#endif
+
+float Dot(const float* x, const float* y, int64_t n) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    return DotAvx2(x, y, n);
+  }
+#endif
+  return DotScalar(x, y, n);
+}
+
+void Dot4(
+    const float* x, const float* y, int64_t stride, int64_t n, float* out) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    Dot4Avx2(x, y, stride, n, out);
+    return;
+  }
+#endif
+  Dot4Scalar(x, y, stride, n, out);
+}
+
+void Axpy4(
+    const float* a, const float* x, int64_t stride, float* y, int64_t n) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    Axpy4Avx2(a, x, stride, y, n);
+    return;
+  }
+#endif
+  Axpy4Scalar(a, x, stride, y, n);
+}
+
+void Axpy(float a, const float* x, float* y, int64_t n) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    AxpyAvx2(a, x, y, n);
+    return;
+  }
+#endif
+  AxpyScalar(a, x, y, n);
+}
+
+// n rows of head_dim keys or values as float, converted into `buffer`
+// unless T is float already.
+template <typename T>
+const float* FloatRows(const T* src, int64_t n, int64_t dim, float* buffer) {
+  if (std::is_same<T, float>::value) {
+    return reinterpret_cast<const float*>(src);
+  }
+  for (int64_t i = 0; i < n * dim; ++i) {
+    buffer[i] = static_cast<float>(src[i]);
+  }
+  return buffer;
+}
+
+template <typename T>
+void RotateHead(const BlockAttentionArgs<T>& a,
+                int64_t b,
+                int64_t pos,
+                T* head) {
+  const int64_t half = a.head_dim / 2;
+  const int64_t rope_b = a.rope_batch == 1 ? 0 : b;
+  const float* cos = a.rope_emb + (rope_b * a.rope_seq_len + pos) * a.rope_dim;
+  const float* sin = cos + a.rope_batch * a.rope_seq_len * a.rope_dim;
+  for (int64_t i = 0; i < half; ++i) {
+    const int64_t i0 = a.neox_style ? i : 2 * i;
+    const int64_t i1 = a.neox_style ? i + half : 2 * i + 1;
+    const float x0 = static_cast<float>(head[i0]);
+    const float x1 = static_cast<float>(head[i1]);
+    head[i0] = static_cast<T>(x0 * cos[i] - x1 * sin[i]);
+    head[i1] = static_cast<T>(x1 * cos[i] + x0 * sin[i]);
+  }
+}
+
+// Position of the first token of sequence b this step.
+template <typename T>
+int64_t StartPosition(const BlockAttentionArgs<T>& a, int64_t b) {
+  return a.seq_lens_encoder[b] > 0 ? 0 : a.seq_lens_decoder[b];
+}
+
+// Adds the bias, rotates the queries and keys and stores the keys and
+// values of every token in its cache block.
+template <typename T>
+void PrepareTokens(const BlockAttentionArgs<T>& a) {
+  const int64_t D = a.head_dim;
+  const int64_t width = (a.q_heads + 2 * a.kv_heads) * D;
+  custom_cpu::ParallelFor(0, a.batch, 1, [&](int64_t b_begin, int64_t b_end) {
+    for (auto b = b_begin; b < b_end; ++b) {
+      const int64_t len = a.seq_lens_this_time[b];
+      const int64_t start = StartPosition(a, b);
+      for (int64_t i = 0; i < len; ++i) {
+        const int64_t pos = start + i;
+        T* row = a.qkv + (a.cu_seqlens_q[b] + i) * width;
+        if (a.qkv_bias) {
+          for (int64_t j = 0; j < width; ++j) {
+            row[j] = static_cast<T>(static_cast<float>(row[j]) +
+                                    static_cast<float>(a.qkv_bias[j]));
+          }
+        }
+        if (a.rope_emb) {
+          PD_CHECK(pos < a.rope_seq_len,
+                   "Position %ld is past the %ld of rope_emb.",
+                   pos,
+                   a.rope_seq_len);
+          for (int64_t h = 0; h < a.q_heads + a.kv_heads; ++h) {
+            RotateHead(a, b, pos, row + h * D);
+          }
+        }
+        PD_CHECK(pos / a.block_size < a.blocks_per_seq,
+                 "Position %ld is past the %ld blocks of a block table.",
+                 pos,
+                 a.blocks_per_seq);
+        const int64_t block =
+            a.block_tables[b * a.blocks_per_seq + pos / a.block_size];
+        PD_CHECK(
+            block >= 0, "No cache block is allocated for position %ld.", pos);
+        for (int64_t h = 0; h < a.kv_heads; ++h) {
+          const int64_t offset =
+              ((block * a.kv_heads + h) * a.block_size + pos % a.block_size) *
+              D;
+          std::memcpy(
+              a.key_cache + offset, row + (a.q_heads + h) * D, D * sizeof(T));
+          std::memcpy(a.value_cache + offset,
+                      row + (a.q_heads + a.kv_heads + h) * D,
+                      D * sizeof(T));
+        }
+      }
+    }
+  });
+}
+
+// Query rows of one sequence that share a key head: tokens [begin, end) of
+// this step, times the `group` heads of kv_head.
+struct AttentionTile {
+  int64_t batch;
+  int64_t kv_head;
+  int64_t begin;
+  int64_t end;
+};
+
+// Running softmax state of the rows of a tile.
+struct OnlineSoftmax {
+  std::vector<float> max;
+  std::vector<float> sum;
+  std::vector<float> acc;  // [rows, head_dim]
+};
+
+template <typename T>
+void AttendTile(const BlockAttentionArgs<T>& a,
+                const AttentionTile& tile,
+                std::vector<float>* buffer) {
+  const int64_t D = a.head_dim;
+  const int64_t group = a.q_heads / a.kv_heads;
+  const int64_t rows = (tile.end - tile.begin) * group;
+  const int64_t width = (a.q_heads + 2 * a.kv_heads) * D;
+  const int64_t b = tile.batch;
+  const bool prefill = a.seq_lens_encoder[b] > 0;
+  const int64_t start = StartPosition(a, b);
+  const int64_t total = start + a.seq_lens_this_time[b];
+  const T* mask = prefill ? a.mask : a.tgt_mask;
+  const bool causal = !prefill || mask == nullptr;
+  const int64_t mask_cols = prefill ? a.mask_cols : a.tgt_mask_cols;
+  const int64_t chunk = std::max(a.block_size, int64_t(1));
+
+  buffer->resize(rows * D + 2 * chunk * D + rows * chunk + rows);
+  float* q = buffer->data();
+  float* k_buffer = q + rows * D;
+  float* v_buffer = k_buffer + chunk * D;
+  float* s = v_buffer + chunk * D;  // [rows, chunk] scores
+  float* rescale = s + rows * chunk;
+  const float scale = 1.0f / std::sqrt(static_cast<float>(D));
+  for (int64_t r = 0; r < rows; ++r) {
+    const int64_t i = tile.begin + r / group;
+    const int64_t h = tile.kv_head * group + r % group;
+    const T* src = a.qkv + (a.cu_seqlens_q[b] + i) * width + h * D;
+    for (int64_t d = 0; d < D; ++d) {
+      q[r * D + d] = static_cast<float>(src[d]) * scale;
+    }
+  }
+  OnlineSoftmax state;
+  state.max.assign(rows, -std::numeric_limits<float>::infinity());
+  state.sum.assign(rows, 0.0f);
+  state.acc.assign(rows * D, 0.0f);
+
+  // Folds `n` keys and values, the first one at mask column `col`, into
+  // the rows: scores, softmax weights rescaled to the new row maxima, and
+  // their products with the values. Causal rows only see the keys up to
+  // their own position.
+  auto fold = [&](const T* keys, const T* values, int64_t n, int64_t col) {
+    const float* k = FloatRows(keys, n, D, k_buffer);
+    const float* v = FloatRows(values, n, D, v_buffer);
+    const bool gemm = rows >= kMinGemmRows;
+    if (gemm) {
+      Gemm(false, true, rows, n, D, 1.0, q, D, k, D, 0.0, s, n);
+    }
+    for (int64_t r = 0; r < rows; ++r) {
+      const int64_t i = tile.begin + r / group;
+      float* sr = s + r * n;
+      int64_t visible = n;
+      if (causal) {
+        visible = std::max<int64_t>(
+            std::min(n, a.pre_cache_len + start + i + 1 - col), 0);
+      }
+      if (!gemm) {
+        int64_t j = 0;
+        for (; j + 4 <= visible; j += 4) {
+          Dot4(q + r * D, k + j * D, D, D, sr + j);
+        }
+        for (; j < visible; ++j) {
+          sr[j] = Dot(q + r * D, k + j * D, D);
+        }
+      }
+      if (mask) {
+        const int64_t row = prefill ? std::min(i, a.mask_rows - 1) : 0;
+        const T* mask_row =
+            mask + (b * (prefill ? a.mask_rows : 1) + row) * mask_cols;
+        for (int64_t j = 0; j < std::min(visible, mask_cols - col); ++j) {
+          sr[j] += static_cast<float>(mask_row[col + j]);
+        }
+      }
+      float row_max = -std::numeric_limits<float>::infinity();
+      for (int64_t j = 0; j < visible; ++j) {
+        row_max = std::max(row_max, sr[j]);
+      }
+      rescale[r] = 1.0f;
+      if (row_max == -std::numeric_limits<float>::infinity()) {
+        std::fill(sr, sr + n, 0.0f);
+        continue;
+      }
+      const float new_max = std::max(state.max[r], row_max);
+      rescale[r] = std::exp(state.max[r] - new_max);
+      for (int64_t j = 0; j < visible; ++j) {
+        sr[j] -= new_max;
+      }
+      Exp(sr, sr, visible);
+      std::fill(sr + visible, sr + n, 0.0f);
+      float sum = 0;
+      for (int64_t j = 0; j < visible; ++j) {
+        sum += sr[j];
+      }
+      state.sum[r] = state.sum[r] * rescale[r] + sum;
+      state.max[r] = new_max;
+    }
+    for (int64_t r = 0; r < rows; ++r) {
+      float* acc = state.acc.data() + r * D;
+      if (rescale[r] != 1.0f) {
+        for (int64_t d = 0; d < D; ++d) {
+          acc[d] *= rescale[r];
+        }
+      }
+      if (!gemm) {
+        const float* p = s + r * n;
+        int64_t j = 0;
+        for (; j + 4 <= n; j += 4) {
+          Axpy4(p + j, v + j * D, D, acc, D);
+        }
+        for (; j < n; ++j) {
+          Axpy(p[j], v + j * D, acc, D);
+        }
+      }
+    }
+    if (gemm) {
+      Gemm(false, false, rows, D, n, 1.0, s, n, v, D, 1.0, state.acc.data(), D);
+    }
+  };
+
+  const int64_t h = tile.kv_head;
+  for (int64_t p = 0; p < a.pre_cache_len; p += chunk) {
+    const int64_t offset = ((b * a.kv_heads + h) * a.pre_cache_len + p) * D;
+    fold(a.pre_key_cache + offset,
+         a.pre_value_cache + offset,
+         std::min(chunk, a.pre_cache_len - p),
+         p);
+  }
+  // Only the keys some row of the tile can see are read.
+  const int64_t last = causal ? start + tile.end : total;
+  for (int64_t p = 0; p < last; p += a.block_size) {
+    const int64_t block =
+        a.block_tables[b * a.blocks_per_seq + p / a.block_size];
+    const int64_t offset = (block * a.kv_heads + h) * a.block_size * D;
+    fold(a.key_cache + offset,
+         a.value_cache + offset,
+         std::min(a.block_size, last - p),
+         a.pre_cache_len + p);
+  }
+
+  for (int64_t r = 0; r < rows; ++r) {
+    const int64_t i = tile.begin + r / group;
+    const int64_t head = tile.kv_head * group + r % group;
+    const int64_t offset = ((a.cu_seqlens_q[b] + i) * a.q_heads + head) * D;
+    const float inv_sum = state.sum[r] > 0 ? 1.0f / state.sum[r] : 0.0f;
+    const float* acc = state.acc.data() + r * D;
+    for (int64_t d = 0; d < D; ++d) {
+      const int64_t c = head * D + d;
+      float y = acc[d] * inv_sum;
+      if (a.out_shift) {
+        y += static_cast<float>(a.out_shift[c]);
+      }
+      if (a.out_smooth) {
+        y *= static_cast<float>(a.out_smooth[c]);
+      }
+      if (a.quant_out) {
+        float q = a.quant_max_bound * a.out_scale * y;
+        q = a.quant_round_type == 0 ? std::rint(q) : std::round(q);
+        a.quant_out[offset + d] = static_cast<int8_t>(
+            std::min(std::max(q, a.quant_min_bound), a.quant_max_bound));
+      } else {
+        a.out[offset + d] = static_cast<T>(y);
+      }
+    }
+  }
+}
+
+}  // namespace
+
+template <typename T>
+void BlockMultiheadAttention(const BlockAttentionArgs<T>& a) {
+  PD_CHECK(a.kv_heads > 0 && a.q_heads % a.kv_heads == 0,
+           "block_multihead_attention needs the %ld query heads to be a "
+           "multiple of the %ld key heads.",
+           a.q_heads,
+           a.kv_heads);
+  PrepareTokens(a);
+
+  const int64_t group = a.q_heads / a.kv_heads;
+  const int64_t tile_tokens = std::max<int64_t>(kTileRows / group, 1);
+  std::vector<AttentionTile> tiles;
+  for (int64_t b = 0; b < a.batch; ++b) {
+    const int64_t len = a.seq_lens_this_time[b];
+    for (int64_t h = 0; h < a.kv_heads; ++h) {
+      for (int64_t i = 0; i < len; i += tile_tokens) {
+        tiles.push_back({b, h, i, std::min(len, i + tile_tokens)});
+      }
+    }
+  }
+  custom_cpu::ParallelFor(
+      0, tiles.size(), 1, [&](int64_t t_begin, int64_t t_end) {
+        std::vector<float> buffer;
+        for (auto t = t_begin; t < t_end; ++t) {
+          AttendTile(a, tiles[t], &buffer);
+        }
+      });
+}
+
+template void BlockMultiheadAttention<float>(const BlockAttentionArgs<float>&);
+template void BlockMultiheadAttention<phi::dtype::float16>(
+    const BlockAttentionArgs<phi::dtype::float16>&);
+template void BlockMultiheadAttention<phi::dtype::bfloat16>(
+    const BlockAttentionArgs<phi::dtype::bfloat16>&);
+
+}  // namespace custom_kernel
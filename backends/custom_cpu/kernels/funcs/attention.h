@@ -0,0 +1,103 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+
+namespace custom_kernel {
+
+// Multi-head attention of a batch of sequences over a paged KV cache, as
+// phi's block_multihead_attention. The tokens of sequence b this step are
+// rows [cu_seqlens_q[b], cu_seqlens_q[b + 1]) of qkv, each holding q_heads
+// query heads followed by kv_heads key and kv_heads value heads of
+// head_dim elements. Query head h reads key and value head
+// h / (q_heads / kv_heads).
+//
+// A sequence with seq_lens_encoder[b] > 0 is in its prefill: its tokens take
+// the positions 0, 1, ... and attend causally to each other, or through
+// `mask` [batch, 1, mask_rows, mask_cols] when given. Otherwise its tokens
+// follow the seq_lens_decoder[b] ones already cached and attend to all of
+// them, plus `tgt_mask` [batch, 1, 1, tgt_mask_cols] when given. Key j of a
+// sequence at position p lives in row p % block_size of cache block
+// block_tables[b][p / block_size], laid out as [kv_heads, block_size,
+// head_dim]. pre_key_cache and pre_value_cache [batch, kv_heads,
+// pre_cache_len, head_dim] are prepended to every sequence and occupy the
+// first pre_cache_len mask columns.
+template <typename T>
+struct BlockAttentionArgs {
+  int64_t batch;
+  int64_t tokens;
+  int64_t q_heads;
+  int64_t kv_heads;
+  int64_t head_dim;
+  int64_t block_size;
+  int64_t blocks_per_seq;
+  const int32_t* seq_lens_encoder = nullptr;    // [batch]
+  const int32_t* seq_lens_decoder = nullptr;    // [batch]
+  const int32_t* seq_lens_this_time = nullptr;  // [batch]
+  const int32_t* cu_seqlens_q = nullptr;        // [batch + 1]
+  const int32_t* block_tables = nullptr;        // [batch, blocks_per_seq]
+
+  // Updated in place: the bias is added and the rotary embedding applied to
+  // the query and key heads.
+  T* qkv = nullptr;
+  const T* qkv_bias = nullptr;  // [(q_heads + 2 * kv_heads) * head_dim]
+
+  // cos and sin tables [2, rope_batch, rope_seq_len, 1, rope_dim], indexed
+  // by the token position and pair. Pairs are (2i, 2i + 1), or (i, i +
+  // head_dim / 2) in the NeoX style.
+  const float* rope_emb = nullptr;
+  int64_t rope_batch = 1;
+  int64_t rope_seq_len = 0;
+  int64_t rope_dim = 0;
+  bool neox_style = false;
+
+  const T* pre_key_cache = nullptr;
+  const T* pre_value_cache = nullptr;
+  int64_t pre_cache_len = 0;
+  const T* mask = nullptr;
+  int64_t mask_rows = 0;
+  int64_t mask_cols = 0;
+  const T* tgt_mask = nullptr;
+  int64_t tgt_mask_cols = 0;
+
+  T* key_cache = nullptr;    // [blocks, kv_heads, block_size, head_dim]
+  T* value_cache = nullptr;  // [blocks, kv_heads, block_size, head_dim]
+
+  // out [tokens, q_heads * head_dim] is (attention + out_shift) *
+  // out_smooth, or that rounded to int8 into quant_out as
+  // round(quant_max_bound * out_scale * y), clipped to the bounds.
+  const T* out_shift = nullptr;
+  const T* out_smooth = nullptr;
+  T* out = nullptr;
+  int8_t* quant_out = nullptr;
+  float out_scale = -1;
+  int quant_round_type = 1;
+  float quant_max_bound = 127;
+  float quant_min_bound = -127;
+};
+
+// The new keys and values are first written to the cache through the block
+// tables. Attention then runs over tiles of query rows, all the heads of a
+// tile sharing one key and value head, so that each cache block is read once
+// per tile: a tile of many tokens for a prefill, or the few heads of one
+// token for a decode step, which makes every block a batched GEMV. Blocks are
+// folded in with an online softmax, keeping a running max, sum and output
+// per row instead of the full score matrix. Tiles are spread over the
+// intra-op thread pool. Computed in float for float, float16 and bfloat16.
+template <typename T>
+void BlockMultiheadAttention(const BlockAttentionArgs<T>& args);
+
+}  // namespace custom_kernel
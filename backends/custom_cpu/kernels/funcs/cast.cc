@@ -0,0 +1,301 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/cast.h"
+
+#include <cmath>
+#include <cstring>
+#include <limits>
+#include <type_traits>
+
+#include "kernels/funcs/cpu_features.h"
+#include "runtime/half.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+using float16 = phi::dtype::float16;
+using bfloat16 = phi::dtype::bfloat16;
+
+using CastFn = void (*)(const void* in, void* out, int64_t n);
+
+using custom_cpu::Bfloat16BitsToFloat;
+using custom_cpu::FloatToBfloat16Bits;
+using custom_cpu::FloatToHalfBits;
+using custom_cpu::HalfBitsToFloat;
+
+// Loads widen 16-bit floats to float, every other type is used as is.
+template <typename T>
+T Load(T value) {
+  return value;
+}
+
+float Load(float16 value) { return HalfBitsToFloat(value.x); }
+
+float Load(bfloat16 value) { return Bfloat16BitsToFloat(value.x); }
+
+template <typename Out, typename In>
+Out ToNumber(In value, std::false_type /* float to integer */) {
+  return static_cast<Out>(value);
+}
+
+template <typename Out, typename In>
+Out ToNumber(In value, std::true_type /* float to integer */) {
+  if (std::isnan(value)) {
+    return 0;
+  }
+  if (value <= static_cast<In>(std::numeric_limits<Out>::min())) {
+    return std::numeric_limits<Out>::min();
+  }
+  if (value >= static_cast<In>(std::numeric_limits<Out>::max())) {
+    return std::numeric_limits<Out>::max();
+  }
+  return static_cast<Out>(value);
+}
+
+template <typename Out>
+struct Store {
+  template <typename In>
+  static Out Apply(In value) {
+    using FloatToInteger =
+        std::integral_constant<bool,
+                               std::is_floating_point<In>::value &&
+                                   std::is_integral<Out>::value>;
+    return ToNumber<Out>(value, FloatToInteger());
+  }
+};
+
+template <>
+struct Store<bool> {
+  template <typename In>
+  static bool Apply(In value) {
+    return value != static_cast<In>(0);
+  }
+};
+
+template <>
+struct Store<float16> {
+  template <typename In>
+  static float16 Apply(In value) {
+    float16 out;
+    out.x = FloatToHalfBits(static_cast<float>(value));
+    return out;
+  }
+};
+
+template <>
+struct Store<bfloat16> {
+  template <typename In>
+  static bfloat16 Apply(In value) {
+    bfloat16 out;
+    out.x = FloatToBfloat16Bits(static_cast<float>(value));
+    return out;
+  }
+};
+
+template <typename In, typename Out>
+void Convert(const void* in, void* out, int64_t n) {
+  auto x = static_cast<const In*>(in);
+  auto y = static_cast<Out*>(out);
+  for (int64_t i = 0; i < n; ++i) {
+    y[i] = Store<Out>::Apply(Load(x[i]));
+  }
+}
+
+template <typename T>
+void Copy(const void* in, void* out, int64_t n) {
+  std::memcpy(out, in, n * sizeof(T));
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+CUSTOM_CPU_TARGET_F16C void FloatToHalfF16c(const void* in,
+                                            void* out,
+                                            int64_t n) {
+  auto x = static_cast<const float*>(in);
+  auto y = static_cast<float16*>(out);
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m128i half =
+        _mm256_cvtps_ph(_mm256_loadu_ps(x + i), _MM_FROUND_TO_NEAREST_INT);
+    _mm_storeu_si128(reinterpret_cast<__m128i*>(y + i), half);
+  }
+  for (; i < n; ++i) {
+    y[i].x = FloatToHalfBits(x[i]);
+  }
+}
+
+CUSTOM_CPU_TARGET_F16C void HalfToFloatF16c(const void* in,
+                                            void* out,
+                                            int64_t n) {
+  auto x = static_cast<const float16*>(in);
+  auto y = static_cast<float*>(out);
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m128i half = _mm_loadu_si128(reinterpret_cast<const __m128i*>(x + i));
+    _mm256_storeu_ps(y + i, _mm256_cvtph_ps(half));
+  }
+  for (; i < n; ++i) {
+    y[i] = HalfBitsToFloat(x[i].x);
+  }
+}
+
+CUSTOM_CPU_TARGET_AVX2 void FloatToBfloat16Avx2(const void* in,
+                                                void* out,
+                                                int64_t n) {
+  auto x = static_cast<const float*>(in);
+  auto y = static_cast<bfloat16*>(out);
+  const __m256i one = _mm256_set1_epi32(1);
+  const __m256i round = _mm256_set1_epi32(0x7fff);
+  const __m256i quiet = _mm256_set1_epi32(0x40);
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m256 v = _mm256_loadu_ps(x + i);
+    __m256i bits = _mm256_castps_si256(v);
+    __m256i lsb = _mm256_and_si256(_mm256_srli_epi32(bits, 16), one);
+    __m256i rounded = _mm256_add_epi32(bits, _mm256_add_epi32(round, lsb));
+    rounded = _mm256_srli_epi32(rounded, 16);
+    __m256i nan = _mm256_or_si256(_mm256_srli_epi32(bits, 16), quiet);
+    __m256 is_nan = _mm256_cmp_ps(v, v, _CMP_UNORD_Q);
+    rounded = _mm256_castps_si256(_mm256_blendv_ps(
+        _mm256_castsi256_ps(rounded), _mm256_castsi256_ps(nan), is_nan));
+    // Pack the low halves of both 128-bit lanes and gather them in order.
+    __m256i packed = _mm256_packus_epi32(rounded, rounded);
+    packed = _mm256_permute4x64_epi64(packed, 0x08);
+    _mm_storeu_si128(reinterpret_cast<__m128i*>(y + i),
+                     _mm256_castsi256_si128(packed));
+  }
+  for (; i < n; ++i) {
+    y[i].x = FloatToBfloat16Bits(x[i]);
+  }
+}
+
+CUSTOM_CPU_TARGET_AVX2 void Bfloat16ToFloatAvx2(const void* in,
+                                                void* out,
+                                                int64_t n) {
+  auto x = static_cast<const bfloat16*>(in);
+  auto y = static_cast<float*>(out);
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m128i half = _mm_loadu_si128(reinterpret_cast<const __m128i*>(x + i));
+    __m256i bits = _mm256_slli_epi32(_mm256_cvtepu16_epi32(half), 16);
+    _mm256_storeu_ps(y + i, _mm256_castsi256_ps(bits));
+  }
+  for (; i < n; ++i) {
+    y[i] = Bfloat16BitsToFloat(x[i].x);
+  }
+}
+#endif
+
+constexpr int kNumTypes = 10;
+
+// Position of a dtype in the table, -1 when it has no converters.
+int TypeIndex(phi::DataType dtype) {
+  switch (dtype) {
+    case phi::DataType::BOOL:
+      return 0;
+    case phi::DataType::UINT8:
+      return 1;
+    case phi::DataType::INT8:
+      return 2;
+    case phi::DataType::INT16:
+      return 3;
+    case phi::DataType::INT32:
+      return 4;
+    case phi::DataType::INT64:
+      return 5;
+    case phi::DataType::FLOAT16:
+      return 6;
+    case phi::DataType::BFLOAT16:
+      return 7;
+    case phi::DataType::FLOAT32:
+      return 8;
+    case phi::DataType::FLOAT64:
+      return 9;
+    default:
+      return -1;
+  }
+}
+
+struct CastTable {
+  CastFn fn[kNumTypes][kNumTypes];
+  size_t size[kNumTypes];
+
+  CastTable() {
+    FillRow<bool>(0);
+    FillRow<uint8_t>(1);
+    FillRow<int8_t>(2);
+    FillRow<int16_t>(3);
+    FillRow<int32_t>(4);
+    FillRow<int64_t>(5);
+    FillRow<float16>(6);
+    FillRow<bfloat16>(7);
+    FillRow<float>(8);
+    FillRow<double>(9);
+#if defined(CUSTOM_CPU_AVX2)
+    if (HasF16c()) {
+      fn[8][6] = FloatToHalfF16c;
+      fn[6][8] = HalfToFloatF16c;
+    }
+    if (HasAvx2Fma()) {
+      fn[8][7] = FloatToBfloat16Avx2;
+      fn[7][8] = Bfloat16ToFloatAvx2;
+    }
+#endif
+  }
+
+  template <typename In>
+  void FillRow(int i) {
+    size[i] = sizeof(In);
+    fn[i][0] = Convert<In, bool>;
+    fn[i][1] = Convert<In, uint8_t>;
+    fn[i][2] = Convert<In, int8_t>;
+    fn[i][3] = Convert<In, int16_t>;
+    fn[i][4] = Convert<In, int32_t>;
+    fn[i][5] = Convert<In, int64_t>;
+    fn[i][6] = Convert<In, float16>;
+    fn[i][7] = Convert<In, bfloat16>;
+    fn[i][8] = Convert<In, float>;
+    fn[i][9] = Convert<In, double>;
+    fn[i][i] = Copy<In>;
+  }
+};
+
+}  // namespace
+
+void CastData(const void* in,
+              phi::DataType in_dtype,
+              void* out,
+              phi::DataType out_dtype,
+              int64_t numel) {
+  static const CastTable table;
+  int i = TypeIndex(in_dtype);
+  int o = TypeIndex(out_dtype);
+  PD_CHECK(i >= 0 && o >= 0,
+           "cast does not support converting data type %d to %d.",
+           in_dtype,
+           out_dtype);
+  CastFn fn = table.fn[i][o];
+  size_t in_size = table.size[i];
+  size_t out_size = table.size[o];
+  auto x = static_cast<const char*>(in);
+  auto y = static_cast<char*>(out);
+  custom_cpu::ParallelFor(
+      0, numel, custom_cpu::kDefaultGrainSize, [&](int64_t b, int64_t e) {
+        fn(x + b * in_size, y + b * out_size, e - b);
+      });
+}
+
+}  // namespace custom_kernel
@@ -0,0 +1,38 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+
+#include "paddle/phi/capi/all.h"
+
+namespace custom_kernel {
+
+// Converts `numel` elements of `in_dtype` at `in` to `out_dtype` at `out`.
+//
+// Every (in, out) pair of bool, uint8, int8, int16, int32, int64, float16,
+// bfloat16, float32 and float64 has a direct converter: only conversions to
+// float16 and bfloat16 pass through float, and those round to nearest even.
+// Floating point to integer conversions saturate with NaN going to 0 and
+// integer narrowing wraps as in C++. float32 <-> float16 and bfloat16
+// run vectorised when the CPU supports it. The buffer is converted in
+// chunks spread over the intra-op thread pool.
+void CastData(const void* in,
+              phi::DataType in_dtype,
+              void* out,
+              phi::DataType out_dtype,
+              int64_t numel);
+
+}  // namespace custom_kernel
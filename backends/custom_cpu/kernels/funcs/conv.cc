@@ -0,0 +1,862 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/conv.h"
+
+#include <cmath>
+
+#include "kernels/funcs/gemm.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Winograd trades 2.25x fewer multiplies for transforms that only pay off
+// once the GEMMs over the channels are large enough.
+constexpr int64_t kWinogradMinChannels = 16;
+
+// Padded image split by stride phase. Plane (ph, pw) holds the pixels of
+// the padded image whose row is ph and column pw modulo the strides, at
+// row / stride_h and column / stride_w, channels innermost. Output pixel
+// (oh, ow) reads tap (kh, kw), at offsets a = kh * dilation_h and
+// b = kw * dilation_w, from plane (a % stride_h, b % stride_w) at row
+// oh + a / stride_h and column ow + b / stride_w. Numbering the output
+// pixels oh * plane_w + ow, the output "grid", every tap thus reads one
+// matrix whose rows are `channels` apart. Grid columns from out_w to
+// plane_w read finite padding and are dropped, a spare row keeps them
+// inside the plane.
+struct PhaseLayout {
+  int64_t channels;
+  int64_t plane_h;
+  int64_t plane_w;
+  int64_t plane_size;  // plane_h * plane_w * channels
+  int64_t image_size;  // of all stride_h * stride_w planes
+};
+
+PhaseLayout MakePhaseLayout(const Conv2dShape& s,
+                            int64_t channels,
+                            int64_t min_plane_h = 0,
+                            int64_t min_plane_w = 0) {
+  int64_t padded_h = std::max(
+      s.pad_top + s.in_h,
+      (s.out_h - 1) * s.stride_h + (s.kernel_h - 1) * s.dilation_h + 1);
+  int64_t padded_w = std::max(
+      s.pad_left + s.in_w,
+      (s.out_w - 1) * s.stride_w + (s.kernel_w - 1) * s.dilation_w + 1);
+  PhaseLayout l;
+  l.channels = channels;
+  l.plane_h =
+      std::max((padded_h + s.stride_h - 1) / s.stride_h + 1, min_plane_h);
+  l.plane_w = std::max((padded_w + s.stride_w - 1) / s.stride_w, min_plane_w);
+  l.plane_size = l.plane_h * l.plane_w * channels;
+  l.image_size = s.stride_h * s.stride_w * l.plane_size;
+  return l;
+}
+
+// Offset in a phase split image of pixel (row, col) of the padded image,
+// which is RowOffset(row) + ColOffset(col).
+int64_t RowOffset(const Conv2dShape& s, const PhaseLayout& l, int64_t row) {
+  return (row % s.stride_h) * s.stride_w * l.plane_size +
+         row / s.stride_h * l.plane_w * l.channels;
+}
+
+int64_t ColOffset(const Conv2dShape& s, const PhaseLayout& l, int64_t col) {
+  return (col % s.stride_w) * l.plane_size + col / s.stride_w * l.channels;
+}
+
+// Offset of tap (kh, kw) of grid pixel 0.
+int64_t TapOffset(const Conv2dShape& s,
+                  const PhaseLayout& l,
+                  int64_t kh,
+                  int64_t kw) {
+  return RowOffset(s, l, kh * s.dilation_h) +
+         ColOffset(s, l, kw * s.dilation_w);
+}
+
+// ColOffset of every input column.
+std::vector<int64_t> InputColOffsets(const Conv2dShape& s,
+                                     const PhaseLayout& l) {
+  std::vector<int64_t> offsets(s.in_w);
+  for (int64_t w = 0; w < s.in_w; ++w) {
+    offsets[w] = ColOffset(s, l, w + s.pad_left);
+  }
+  return offsets;
+}
+
+// Copies x into the zero filled phase split image buffer `image`.
+template <typename T>
+void PackImage(const Conv2dShape& s,
+               const PhaseLayout& l,
+               const T* x,
+               T* image) {
+  const int64_t channels = l.channels;
+  auto st = MakeImageStrides(s.channels_last, channels, s.in_h, s.in_w);
+  auto cols = InputColOffsets(s, l);
+  custom_cpu::ParallelFor(
+      0,
+      s.batch * s.in_h,
+      custom_cpu::GrainSize(s.in_w * channels),
+      [&](int64_t b, int64_t e) {
+        for (auto r = b; r < e; ++r) {
+          int64_t n = r / s.in_h, h = r % s.in_h;
+          const T* src = x + n * st.n + h * st.h;
+          T* dst = image + n * l.image_size + RowOffset(s, l, h + s.pad_top);
+          if (s.channels_last) {
+            for (int64_t w = 0; w < s.in_w; ++w) {
+              std::copy(
+                  src + w * channels, src + (w + 1) * channels, dst + cols[w]);
+            }
+          } else {
+            for (int64_t c = 0; c < channels; ++c) {
+              for (int64_t w = 0; w < s.in_w; ++w) {
+                dst[cols[w] + c] = src[c * st.c + w];
+              }
+            }
+          }
+        }
+      });
+}
+
+// Inverse of PackImage, dropping the padding.
+template <typename T>
+void UnpackImage(const Conv2dShape& s,
+                 const PhaseLayout& l,
+                 const T* image,
+                 T* x) {
+  const int64_t channels = l.channels;
+  auto st = MakeImageStrides(s.channels_last, channels, s.in_h, s.in_w);
+  auto cols = InputColOffsets(s, l);
+  custom_cpu::ParallelFor(0,
+                          s.batch * s.in_h,
+                          custom_cpu::GrainSize(s.in_w * channels),
+                          [&](int64_t b, int64_t e) {
+                            for (auto r = b; r < e; ++r) {
+                              int64_t n = r / s.in_h, h = r % s.in_h;
+                              const T* src = image + n * l.image_size +
+                                             RowOffset(s, l, h + s.pad_top);
+                              T* dst = x + n * st.n + h * st.h;
+                              if (s.channels_last) {
+                                for (int64_t w = 0; w < s.in_w; ++w) {
+                                  std::copy(src + cols[w],
+                                            src + cols[w] + channels,
+                                            dst + w * channels);
+                                }
+                              } else {
+                                for (int64_t c = 0; c < channels; ++c) {
+                                  for (int64_t w = 0; w < s.in_w; ++w) {
+                                    dst[c * st.c + w] = src[cols[w] + c];
+                                  }
+                                }
+                              }
+                            }
+                          });
+}
+
+// Copies the output gradient into the zero filled grid `grid`,
+// [batch, out_h * plane_w, out_channels].
+template <typename T>
+void PackGrid(const Conv2dShape& s,
+              const PhaseLayout& l,
+              const T* out_grad,
+              T* grid) {
+  const int64_t channels = s.out_channels;
+  auto st = MakeImageStrides(s.channels_last, channels, s.out_h, s.out_w);
+  custom_cpu::ParallelFor(0,
+                          s.batch * s.out_h,
+                          custom_cpu::GrainSize(s.out_w * channels),
+                          [&](int64_t b, int64_t e) {
+                            for (auto r = b; r < e; ++r) {
+                              int64_t n = r / s.out_h, h = r % s.out_h;
+                              const T* src = out_grad + n * st.n + h * st.h;
+                              T* dst = grid + r * l.plane_w * channels;
+                              if (s.channels_last) {
+                                std::copy(src, src + s.out_w * channels, dst);
+                              } else {
+                                for (int64_t c = 0; c < channels; ++c) {
+                                  for (int64_t w = 0; w < s.out_w; ++w) {
+                                    dst[w * channels + c] = src[c * st.c + w];
+                                  }
+                                }
+                              }
+                            }
+                          });
+}
+
+// Filter [out_channels, in_channels / groups, kh, kw] as one
+// [in_channels / groups, out_channels / groups] matrix per group and tap.
+template <typename T>
+void PackFilter(const Conv2dShape& s, const T* filter, T* packed) {
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  const int64_t in_group = s.in_channels / s.groups;
+  const int64_t out_group = s.out_channels / s.groups;
+  for (int64_t g = 0; g < s.groups; ++g) {
+    for (int64_t o = 0; o < out_group; ++o) {
+      for (int64_t i = 0; i < in_group; ++i) {
+        const T* src = filter + ((g * out_group + o) * in_group + i) * taps;
+        for (int64_t t = 0; t < taps; ++t) {
+          packed[((g * taps + t) * in_group + i) * out_group + o] = src[t];
+        }
+      }
+    }
+  }
+}
+
+template <typename T>
+void UnpackFilter(const Conv2dShape& s, const T* packed, T* filter) {
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  const int64_t in_group = s.in_channels / s.groups;
+  const int64_t out_group = s.out_channels / s.groups;
+  for (int64_t g = 0; g < s.groups; ++g) {
+    for (int64_t o = 0; o < out_group; ++o) {
+      for (int64_t i = 0; i < in_group; ++i) {
+        T* dst = filter + ((g * out_group + o) * in_group + i) * taps;
+        for (int64_t t = 0; t < taps; ++t) {
+          dst[t] = packed[((g * taps + t) * in_group + i) * out_group + o];
+        }
+      }
+    }
+  }
+}
+
+template <typename T>
+T Activate(T v, ConvActivation activation, T alpha) {
+  switch (activation) {
+    case ConvActivation::kIdentity:
+      return v;
+    case ConvActivation::kRelu:
+      return v > 0 ? v : 0;
+    case ConvActivation::kRelu6:
+      return std::min<T>(std::max<T>(v, 0), 6);
+    case ConvActivation::kLeakyRelu:
+      return v > 0 ? v : alpha * v;
+    case ConvActivation::kSigmoid:
+      return 1 / (1 + std::exp(-v));
+    case ConvActivation::kSwish:
+      return v / (1 + std::exp(-v));
+  }
+  return v;
+}
+
+template <typename T>
+bool IsPlainEpilogue(const ConvEpilogue<T>& e) {
+  return e.bias == nullptr && e.residual == nullptr &&
+         e.activation == ConvActivation::kIdentity;
+}
+
+// Writes output row (n, oh) from `row`, out_w pixels of out_channels
+// values, through the epilogue.
+template <typename T>
+void StoreOutputRow(const Conv2dShape& s,
+                    const ConvEpilogue<T>& epilogue,
+                    int64_t n,
+                    int64_t oh,
+                    const T* row,
+                    T* out) {
+  const int64_t channels = s.out_channels;
+  auto st = MakeImageStrides(s.channels_last, channels, s.out_h, s.out_w);
+  const int64_t offset = n * st.n + oh * st.h;
+  const T* residual = epilogue.residual ? epilogue.residual + offset : nullptr;
+  const T alpha = static_cast<T>(epilogue.alpha);
+  T* dst = out + offset;
+  auto store = [&](int64_t c, int64_t w) {
+    int64_t i = w * st.w + c * st.c;
+    T v = row[w * channels + c] + (residual ? residual[i] : 0);
+    if (epilogue.bias) {
+      v += epilogue.bias[c];
+    }
+    dst[i] = Activate(v, epilogue.activation, alpha);
+  };
+  if (s.channels_last) {
+    for (int64_t w = 0; w < s.out_w; ++w) {
+      for (int64_t c = 0; c < channels; ++c) {
+        store(c, w);
+      }
+    }
+  } else {
+    for (int64_t c = 0; c < channels; ++c) {
+      for (int64_t w = 0; w < s.out_w; ++w) {
+        store(c, w);
+      }
+    }
+  }
+}
+
+template <typename T>
+void GemmConvForward(const Conv2dShape& s,
+                     const T* x,
+                     const T* filter,
+                     const ConvEpilogue<T>& epilogue,
+                     T* out) {
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  const int64_t in_group = s.in_channels / s.groups;
+  const int64_t out_group = s.out_channels / s.groups;
+  const bool pointwise = s.channels_last && taps == 1 && s.stride_h == 1 &&
+                         s.stride_w == 1 && s.pad_top == 0 && s.pad_left == 0 &&
+                         s.out_h == s.in_h && s.out_w == s.in_w;
+
+  // A 1x1 NHWC convolution reads x in place.
+  PhaseLayout l;
+  std::vector<T> image;
+  const T* image_data = x;
+  if (pointwise) {
+    l = {s.in_channels, s.in_h, s.in_w, 0, s.in_h * s.in_w * s.in_channels};
+  } else {
+    l = MakePhaseLayout(s, s.in_channels);
+    image.resize(s.batch * l.image_size);
+    PackImage(s, l, x, image.data());
+    image_data = image.data();
+  }
+  std::vector<T> packed_filter(taps * in_group * s.out_channels);
+  PackFilter(s, filter, packed_filter.data());
+
+  const int64_t grid_rows = s.out_h * l.plane_w;
+  const bool direct =
+      s.channels_last && l.plane_w == s.out_w && IsPlainEpilogue(epilogue);
+  std::vector<T> grid;
+  T* grid_data = out;
+  if (!direct) {
+    grid.resize(s.batch * grid_rows * s.out_channels);
+    grid_data = grid.data();
+  }
+
+  // Taps of one output accumulate into it, batches and groups run apart.
+  std::vector<int64_t> a_offsets, b_offsets, c_offsets;
+  for (int64_t n = 0; n < s.batch; ++n) {
+    for (int64_t g = 0; g < s.groups; ++g) {
+      for (int64_t kh = 0; kh < s.kernel_h; ++kh) {
+        for (int64_t kw = 0; kw < s.kernel_w; ++kw) {
+          a_offsets.push_back(n * l.image_size + TapOffset(s, l, kh, kw) +
+                              g * in_group);
+          b_offsets.push_back((g * taps + kh * s.kernel_w + kw) * in_group *
+                              out_group);
+          c_offsets.push_back(n * grid_rows * s.out_channels + g * out_group);
+        }
+      }
+    }
+  }
+  BatchedGemm(false,
+              false,
+              grid_rows,
+              out_group,
+              in_group,
+              1.0,
+              image_data,
+              s.in_channels,
+              a_offsets,
+              packed_filter.data(),
+              out_group,
+              b_offsets,
+              0.0,
+              grid_data,
+              s.out_channels,
+              c_offsets);
+  if (direct) {
+    return;
+  }
+  custom_cpu::ParallelFor(0,
+                          s.batch * s.out_h,
+                          custom_cpu::GrainSize(s.out_w * s.out_channels),
+                          [&](int64_t b, int64_t e) {
+                            for (auto r = b; r < e; ++r) {
+                              StoreOutputRow(
+                                  s,
+                                  epilogue,
+                                  r / s.out_h,
+                                  r % s.out_h,
+                                  grid_data + r * l.plane_w * s.out_channels,
+                                  out);
+                            }
+                          });
+}
+
+bool UseWinograd(const Conv2dShape& s) {
+  return s.kernel_h == 3 && s.kernel_w == 3 && s.stride_h == 1 &&
+         s.stride_w == 1 && s.dilation_h == 1 && s.dilation_w == 1 &&
+         s.groups == 1 && s.in_channels >= kWinogradMinChannels &&
+         s.out_channels >= kWinogradMinChannels;
+}
+
+// Winograd F(2x2, 3x3): every 4x4 input tile d and 3x3 filter g give the
+// 2x2 output tile A^T [(G g G^T) .* (B^T d B)] A. The elementwise product
+// summed over the input channels is 16 GEMMs of
+// [tiles, in_channels] x [in_channels, out_channels].
+template <typename T>
+void WinogradConvForward(const Conv2dShape& s,
+                         const T* x,
+                         const T* filter,
+                         const ConvEpilogue<T>& epilogue,
+                         T* out) {
+  const int64_t in_c = s.in_channels;
+  const int64_t out_c = s.out_channels;
+  const int64_t tiles_h = (s.out_h + 1) / 2;
+  const int64_t tiles_w = (s.out_w + 1) / 2;
+  const int64_t tiles = s.batch * tiles_h * tiles_w;
+  PhaseLayout l = MakePhaseLayout(s, in_c, 2 * tiles_h + 2, 2 * tiles_w + 2);
+  std::vector<T> image(s.batch * l.image_size);
+  PackImage(s, l, x, image.data());
+
+  // U = G g G^T as 16 [in_c, out_c] matrices.
+  std::vector<T> u(16 * in_c * out_c);
+  custom_cpu::ParallelFor(
+      0, out_c * in_c, custom_cpu::GrainSize(64), [&](int64_t b, int64_t e) {
+        for (auto idx = b; idx < e; ++idx) {
+          int64_t o = idx / in_c, c = idx % in_c;
+          const T* g = filter + idx * 9;
+          T gg[4][3];
+          for (int j = 0; j < 3; ++j) {
+            gg[0][j] = g[j];
+            gg[1][j] = (g[j] + g[3 + j] + g[6 + j]) / 2;
+            gg[2][j] = (g[j] - g[3 + j] + g[6 + j]) / 2;
+            gg[3][j] = g[6 + j];
+          }
+          for (int i = 0; i < 4; ++i) {
+            T row[4] = {gg[i][0],
+                        (gg[i][0] + gg[i][1] + gg[i][2]) / 2,
+                        (gg[i][0] - gg[i][1] + gg[i][2]) / 2,
+                        gg[i][2]};
+            for (int j = 0; j < 4; ++j) {
+              u[((i * 4 + j) * in_c + c) * out_c + o] = row[j];
+            }
+          }
+        }
+      });
+
+  // V = B^T d B as 16 [tiles, in_c] matrices.
+  std::vector<T> v(16 * tiles * in_c);
+  const int64_t v_stride = tiles * in_c;
+  custom_cpu::ParallelFor(
+      0, tiles, custom_cpu::GrainSize(32 * in_c), [&](int64_t b, int64_t e) {
+        for (auto t = b; t < e; ++t) {
+          int64_t n = t / (tiles_h * tiles_w);
+          int64_t th = t / tiles_w % tiles_h, tw = t % tiles_w;
+          const T* base = image.data() + n * l.image_size +
+                          (2 * th * l.plane_w + 2 * tw) * in_c;
+          T* dst = v.data() + t * in_c;
+          for (int64_t c = 0; c < in_c; ++c) {
+            T d[4][4], m[4][4];
+            for (int i = 0; i < 4; ++i) {
+              for (int j = 0; j < 4; ++j) {
+                d[i][j] = base[(i * l.plane_w + j) * in_c + c];
+              }
+            }
+            for (int j = 0; j < 4; ++j) {
+              m[0][j] = d[0][j] - d[2][j];
+              m[1][j] = d[1][j] + d[2][j];
+              m[2][j] = d[2][j] - d[1][j];
+              m[3][j] = d[1][j] - d[3][j];
+            }
+            for (int i = 0; i < 4; ++i) {
+              T* row = dst + i * 4 * v_stride + c;
+              row[0] = m[i][0] - m[i][2];
+              row[v_stride] = m[i][1] + m[i][2];
+              row[2 * v_stride] = m[i][2] - m[i][1];
+              row[3 * v_stride] = m[i][1] - m[i][3];
+            }
+          }
+        }
+      });
+
+  std::vector<T> product(16 * tiles * out_c);
+  std::vector<int64_t> a_offsets, b_offsets, c_offsets;
+  for (int64_t k = 0; k < 16; ++k) {
+    a_offsets.push_back(k * tiles * in_c);
+    b_offsets.push_back(k * in_c * out_c);
+    c_offsets.push_back(k * tiles * out_c);
+  }
+  BatchedGemm(false,
+              false,
+              tiles,
+              out_c,
+              in_c,
+              1.0,
+              v.data(),
+              in_c,
+              a_offsets,
+              u.data(),
+              out_c,
+              b_offsets,
+              0.0,
+              product.data(),
+              out_c,
+              c_offsets);
+
+  // Y = A^T M A, two output rows per row of tiles.
+  const int64_t p_stride = tiles * out_c;
+  custom_cpu::ParallelFor(
+      0,
+      s.batch * tiles_h,
+      custom_cpu::GrainSize(4 * s.out_w * out_c),
+      [&](int64_t b, int64_t e) {
+        std::vector<T> rows(2 * 2 * tiles_w * out_c);
+        T* row0 = rows.data();
+        T* row1 = rows.data() + 2 * tiles_w * out_c;
+        for (auto r = b; r < e; ++r) {
+          int64_t n = r / tiles_h, th = r % tiles_h;
+          for (int64_t tw = 0; tw < tiles_w; ++tw) {
+            const T* src = product.data() + (r * tiles_w + tw) * out_c;
+            for (int64_t o = 0; o < out_c; ++o) {
+              T m[4][4];
+              for (int k = 0; k < 16; ++k) {
+                m[k / 4][k % 4] = src[k * p_stride + o];
+              }
+              T t0[4], t1[4];
+              for (int j = 0; j < 4; ++j) {
+                t0[j] = m[0][j] + m[1][j] + m[2][j];
+                t1[j] = m[1][j] - m[2][j] - m[3][j];
+              }
+              int64_t col = 2 * tw * out_c + o;
+              row0[col] = t0[0] + t0[1] + t0[2];
+              row0[col + out_c] = t0[1] - t0[2] - t0[3];
+              row1[col] = t1[0] + t1[1] + t1[2];
+              row1[col + out_c] = t1[1] - t1[2] - t1[3];
+            }
+          }
+          StoreOutputRow(s, epilogue, n, 2 * th, row0, out);
+          if (2 * th + 1 < s.out_h) {
+            StoreOutputRow(s, epilogue, n, 2 * th + 1, row1, out);
+          }
+        }
+      });
+}
+
+bool IsDepthwise(const Conv2dShape& s) {
+  return s.groups > 1 && s.groups == s.in_channels;
+}
+
+// Depthwise filter [out_channels, 1, kh, kw] as [taps, out_channels]. Output
+// channel o reads input channel o / multiplier.
+template <typename T>
+std::vector<T> PackDepthwiseFilter(const Conv2dShape& s, const T* filter) {
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  std::vector<T> packed(taps * s.out_channels);
+  for (int64_t o = 0; o < s.out_channels; ++o) {
+    for (int64_t t = 0; t < taps; ++t) {
+      packed[t * s.out_channels + o] = filter[o * taps + t];
+    }
+  }
+  return packed;
+}
+
+template <typename T>
+void DepthwiseConvForward(const Conv2dShape& s,
+                          const T* x,
+                          const T* filter,
+                          const ConvEpilogue<T>& epilogue,
+                          T* out) {
+  const int64_t in_c = s.in_channels;
+  const int64_t out_c = s.out_channels;
+  const int64_t multiplier = out_c / in_c;
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  PhaseLayout l = MakePhaseLayout(s, in_c);
+  std::vector<T> image(s.batch * l.image_size);
+  PackImage(s, l, x, image.data());
+  auto packed = PackDepthwiseFilter(s, filter);
+
+  custom_cpu::ParallelFor(
+      0,
+      s.batch * s.out_h,
+      custom_cpu::GrainSize(s.out_w * out_c * taps),
+      [&](int64_t b, int64_t e) {
+        std::vector<T> row(s.out_w * out_c);
+        for (auto r = b; r < e; ++r) {
+          int64_t n = r / s.out_h, oh = r % s.out_h;
+          std::fill(row.begin(), row.end(), static_cast<T>(0));
+          for (int64_t kh = 0; kh < s.kernel_h; ++kh) {
+            for (int64_t kw = 0; kw < s.kernel_w; ++kw) {
+              const T* src = image.data() + n * l.image_size +
+                             TapOffset(s, l, kh, kw) + oh * l.plane_w * in_c;
+              const T* w = packed.data() + (kh * s.kernel_w + kw) * out_c;
+              for (int64_t ow = 0; ow < s.out_w; ++ow) {
+                const T* pixel = src + ow * in_c;
+                T* acc = row.data() + ow * out_c;
+                if (multiplier == 1) {
+                  for (int64_t c = 0; c < in_c; ++c) {
+                    acc[c] += pixel[c] * w[c];
+                  }
+                } else {
+                  for (int64_t o = 0; o < out_c; ++o) {
+                    acc[o] += pixel[o / multiplier] * w[o];
+                  }
+                }
+              }
+            }
+          }
+          StoreOutputRow(s, epilogue, n, oh, row.data(), out);
+        }
+      });
+}
+
+template <typename T>
+void DepthwiseConvBackwardData(const Conv2dShape& s,
+                               const T* filter,
+                               const T* out_grad,
+                               T* x_grad) {
+  const int64_t in_c = s.in_channels;
+  const int64_t out_c = s.out_channels;
+  const int64_t multiplier = out_c / in_c;
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  PhaseLayout l = MakePhaseLayout(s, in_c);
+  std::vector<T> grid(s.batch * s.out_h * l.plane_w * out_c);
+  PackGrid(s, l, out_grad, grid.data());
+  auto packed = PackDepthwiseFilter(s, filter);
+
+  std::vector<T> image(s.batch * l.image_size);
+  ForEachImageChannels(
+      s.batch,
+      in_c,
+      s.out_h * s.out_w * taps * multiplier,
+      [&](int64_t n, int64_t c_begin, int64_t c_end) {
+        for (int64_t oh = 0; oh < s.out_h; ++oh) {
+          const T* dy = grid.data() + (n * s.out_h + oh) * l.plane_w * out_c;
+          for (int64_t kh = 0; kh < s.kernel_h; ++kh) {
+            for (int64_t kw = 0; kw < s.kernel_w; ++kw) {
+              T* dst = image.data() + n * l.image_size +
+                       TapOffset(s, l, kh, kw) + oh * l.plane_w * in_c;
+              const T* w = packed.data() + (kh * s.kernel_w + kw) * out_c;
+              for (int64_t ow = 0; ow < s.out_w; ++ow) {
+                const T* g = dy + ow * out_c;
+                T* pixel = dst + ow * in_c;
+                for (int64_t c = c_begin; c < c_end; ++c) {
+                  T sum = 0;
+                  for (int64_t m = 0; m < multiplier; ++m) {
+                    sum += g[c * multiplier + m] * w[c * multiplier + m];
+                  }
+                  pixel[c] += sum;
+                }
+              }
+            }
+          }
+        }
+      });
+  UnpackImage(s, l, image.data(), x_grad);
+}
+
+template <typename T>
+void DepthwiseConvBackwardFilter(const Conv2dShape& s,
+                                 const T* x,
+                                 const T* out_grad,
+                                 T* filter_grad) {
+  const int64_t in_c = s.in_channels;
+  const int64_t out_c = s.out_channels;
+  const int64_t multiplier = out_c / in_c;
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  PhaseLayout l = MakePhaseLayout(s, in_c);
+  std::vector<T> image(s.batch * l.image_size);
+  PackImage(s, l, x, image.data());
+  std::vector<T> grid(s.batch * s.out_h * l.plane_w * out_c);
+  PackGrid(s, l, out_grad, grid.data());
+
+  custom_cpu::ParallelFor(
+      0,
+      out_c,
+      custom_cpu::GrainSize(s.batch * s.out_h * s.out_w * taps),
+      [&](int64_t o_begin, int64_t o_end) {
+        std::vector<T> acc(o_end - o_begin);
+        for (int64_t t = 0; t < taps; ++t) {
+          std::fill(acc.begin(), acc.end(), static_cast<T>(0));
+          int64_t tap_offset = TapOffset(s, l, t / s.kernel_w, t % s.kernel_w);
+          for (int64_t n = 0; n < s.batch; ++n) {
+            for (int64_t oh = 0; oh < s.out_h; ++oh) {
+              const T* src = image.data() + n * l.image_size + tap_offset +
+                             oh * l.plane_w * in_c;
+              const T* dy =
+                  grid.data() + (n * s.out_h + oh) * l.plane_w * out_c;
+              for (int64_t ow = 0; ow < s.out_w; ++ow) {
+                const T* pixel = src + ow * in_c;
+                const T* g = dy + ow * out_c;
+                for (auto o = o_begin; o < o_end; ++o) {
+                  acc[o - o_begin] += pixel[o / multiplier] * g[o];
+                }
+              }
+            }
+          }
+          for (auto o = o_begin; o < o_end; ++o) {
+            filter_grad[o * taps + t] = acc[o - o_begin];
+          }
+        }
+      });
+}
+
+}  // namespace
+
+void ResolvePadding(const std::string& padding_algorithm,
+                    int64_t in_h,
+                    int64_t in_w,
+                    int64_t kernel_h,
+                    int64_t kernel_w,
+                    int64_t stride_h,
+                    int64_t stride_w,
+                    std::vector<int64_t>* paddings,
+                    std::vector<int64_t>* dilations) {
+  auto& p = *paddings;
+  if (p.size() == 2) {
+    p = {p[0], p[0], p[1], p[1]};
+  }
+  if (padding_algorithm == "SAME") {
+    const int64_t in[2] = {in_h, in_w};
+    const int64_t kernel[2] = {kernel_h, kernel_w};
+    const int64_t stride[2] = {stride_h, stride_w};
+    for (int i = 0; i < 2; ++i) {
+      int64_t out = (in[i] + stride[i] - 1) / stride[i];
+      int64_t pad =
+          std::max<int64_t>((out - 1) * stride[i] + kernel[i] - in[i], 0);
+      p[2 * i] = pad / 2;
+      p[2 * i + 1] = pad - pad / 2;
+    }
+    if (dilations) {
+      std::fill(dilations->begin(), dilations->end(), 1);
+    }
+  } else if (padding_algorithm == "VALID") {
+    std::fill(p.begin(), p.end(), 0);
+  }
+}
+
+template <typename T>
+void Conv2dForward(const Conv2dShape& shape,
+                   const T* x,
+                   const T* filter,
+                   const ConvEpilogue<T>& epilogue,
+                   T* out) {
+  if (IsDepthwise(shape)) {
+    DepthwiseConvForward(shape, x, filter, epilogue, out);
+  } else if (UseWinograd(shape)) {
+    WinogradConvForward(shape, x, filter, epilogue, out);
+  } else {
+    GemmConvForward(shape, x, filter, epilogue, out);
+  }
+}
+
+template <typename T>
+void Conv2dBackwardData(const Conv2dShape& s,
+                        const T* filter,
+                        const T* out_grad,
+                        T* x_grad) {
+  if (IsDepthwise(s)) {
+    DepthwiseConvBackwardData(s, filter, out_grad, x_grad);
+    return;
+  }
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  const int64_t in_group = s.in_channels / s.groups;
+  const int64_t out_group = s.out_channels / s.groups;
+  PhaseLayout l = MakePhaseLayout(s, s.in_channels);
+  const int64_t grid_rows = s.out_h * l.plane_w;
+  std::vector<T> grid(s.batch * grid_rows * s.out_channels);
+  PackGrid(s, l, out_grad, grid.data());
+  std::vector<T> packed_filter(taps * in_group * s.out_channels);
+  PackFilter(s, filter, packed_filter.data());
+
+  // Every tap scatters the whole grid into the image, so the taps of an
+  // image run in turn and only images run in parallel.
+  std::vector<T> image(s.batch * l.image_size);
+  auto run_image = [&](int64_t n) {
+    for (int64_t g = 0; g < s.groups; ++g) {
+      for (int64_t t = 0; t < taps; ++t) {
+        Gemm(false,
+             true,
+             grid_rows,
+             in_group,
+             out_group,
+             1.0,
+             grid.data() + n * grid_rows * s.out_channels + g * out_group,
+             s.out_channels,
+             packed_filter.data() + (g * taps + t) * in_group * out_group,
+             out_group,
+             1.0,
+             image.data() + n * l.image_size +
+                 TapOffset(s, l, t / s.kernel_w, t % s.kernel_w) + g * in_group,
+             s.in_channels);
+      }
+    }
+  };
+  if (s.batch >= static_cast<int64_t>(custom_cpu::IntraOpThreads())) {
+    custom_cpu::ParallelFor(0, s.batch, 1, [&](int64_t b, int64_t e) {
+      for (auto n = b; n < e; ++n) {
+        run_image(n);
+      }
+    });
+  } else {
+    for (int64_t n = 0; n < s.batch; ++n) {
+      run_image(n);
+    }
+  }
+  UnpackImage(s, l, image.data(), x_grad);
+}
+
+template <typename T>
+void Conv2dBackwardFilter(const Conv2dShape& s,
+                          const T* x,
+                          const T* out_grad,
+                          T* filter_grad) {
+  if (IsDepthwise(s)) {
+    DepthwiseConvBackwardFilter(s, x, out_grad, filter_grad);
+    return;
+  }
+  const int64_t taps = s.kernel_h * s.kernel_w;
+  const int64_t in_group = s.in_channels / s.groups;
+  const int64_t out_group = s.out_channels / s.groups;
+  PhaseLayout l = MakePhaseLayout(s, s.in_channels);
+  std::vector<T> image(s.batch * l.image_size);
+  PackImage(s, l, x, image.data());
+  const int64_t grid_rows = s.out_h * l.plane_w;
+  std::vector<T> grid(s.batch * grid_rows * s.out_channels);
+  PackGrid(s, l, out_grad, grid.data());
+
+  // image_tap^T * grid summed over the batch for every group and tap. The
+  // dropped grid columns are zero and add nothing.
+  std::vector<T> packed_grad(taps * in_group * s.out_channels);
+  std::vector<int64_t> a_offsets, b_offsets, c_offsets;
+  for (int64_t g = 0; g < s.groups; ++g) {
+    for (int64_t t = 0; t < taps; ++t) {
+      for (int64_t n = 0; n < s.batch; ++n) {
+        a_offsets.push_back(n * l.image_size +
+                            TapOffset(s, l, t / s.kernel_w, t % s.kernel_w) +
+                            g * in_group);
+        b_offsets.push_back(n * grid_rows * s.out_channels + g * out_group);
+        c_offsets.push_back((g * taps + t) * in_group * out_group);
+      }
+    }
+  }
+  BatchedGemm(true,
+              false,
+              in_group,
+              out_group,
+              grid_rows,
+              1.0,
+              image.data(),
+              s.in_channels,
+              a_offsets,
+              grid.data(),
+              s.out_channels,
+              b_offsets,
+              0.0,
+              packed_grad.data(),
+              out_group,
+              c_offsets);
+  UnpackFilter(s, packed_grad.data(), filter_grad);
+}
+
+#define INSTANTIATE_CONV(T)                                                \
+  template void Conv2dForward<T>(                                          \
+      const Conv2dShape&, const T*, const T*, const ConvEpilogue<T>&, T*); \
+  template void Conv2dBackwardData<T>(                                     \
+      const Conv2dShape&, const T*, const T*, T*);                         \
+  template void Conv2dBackwardFilter<T>(                                   \
+      const Conv2dShape&, const T*, const T*, T*);
+
+INSTANTIATE_CONV(float)
+INSTANTIATE_CONV(double)
+
+#undef INSTANTIATE_CONV
+
+}  // namespace custom_kernel
@@ -0,0 +1,156 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <algorithm>
+#include <cstdint>
+#include <string>
+#include <vector>
+
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+// Geometry of a 2-D convolution or pooling window over a batch of images
+// stored NCHW, or NHWC when `channels_last` is set. Only the top and left
+// paddings are kept, the output size implies the others. Pooling leaves
+// out_channels equal to in_channels and groups at 1.
+struct Conv2dShape {
+  int64_t batch;
+  int64_t in_channels;
+  int64_t in_h;
+  int64_t in_w;
+  int64_t out_channels;
+  int64_t out_h;
+  int64_t out_w;
+  int64_t kernel_h;
+  int64_t kernel_w;
+  int64_t stride_h;
+  int64_t stride_w;
+  int64_t pad_top;
+  int64_t pad_left;
+  int64_t dilation_h;
+  int64_t dilation_w;
+  int64_t groups;
+  bool channels_last;
+};
+
+// Element strides of an image batch stored NCHW, or NHWC when
+// `channels_last` is set.
+struct ImageStrides {
+  int64_t n;
+  int64_t c;
+  int64_t h;
+  int64_t w;
+};
+
+inline ImageStrides MakeImageStrides(bool channels_last,
+                                     int64_t channels,
+                                     int64_t height,
+                                     int64_t width) {
+  if (channels_last) {
+    return {height * width * channels, 1, width * channels, channels};
+  }
+  return {channels * height * width, height * width, width, 1};
+}
+
+// Expands `paddings`, given as {h, w} or {top, bottom, left, right}, to the
+// latter form and applies `padding_algorithm` as phi does: "SAME" pads to
+// ceil(in / stride) outputs and resets the dilations to 1, "VALID" drops
+// the padding. `dilations` may be null for pooling.
+void ResolvePadding(const std::string& padding_algorithm,
+                    int64_t in_h,
+                    int64_t in_w,
+                    int64_t kernel_h,
+                    int64_t kernel_w,
+                    int64_t stride_h,
+                    int64_t stride_w,
+                    std::vector<int64_t>* paddings,
+                    std::vector<int64_t>* dilations);
+
+enum class ConvActivation {
+  kIdentity,
+  kRelu,
+  kRelu6,
+  kLeakyRelu,
+  kSigmoid,
+  kSwish,
+};
+
+// Fused into the store of every output element as
+// activation(conv + bias[channel] + residual).
+template <typename T>
+struct ConvEpilogue {
+  const T* bias = nullptr;      // [out_channels], or null
+  const T* residual = nullptr;  // same shape as the output, or null
+  ConvActivation activation = ConvActivation::kIdentity;
+  double alpha = 0;  // slope of kLeakyRelu
+};
+
+// Convolution of x [batch, in_channels, in_h, in_w] with filter
+// [out_channels, in_channels / groups, kernel_h, kernel_w] (the image dims
+// permuted to NHWC for channels_last, the filter never is).
+//
+// No im2col buffer is built. The input is copied once into a padded NHWC
+// image split by stride phase, in which every kernel tap of a whole output
+// image is a single strided matrix, and the taps are accumulated by GEMMs
+// straight into the output. Depthwise convolutions run a direct loop over
+// the channels instead, and 3x3 stride 1 convolutions with enough channels
+// use Winograd F(2x2, 3x3). Implemented for float and double.
+template <typename T>
+void Conv2dForward(const Conv2dShape& shape,
+                   const T* x,
+                   const T* filter,
+                   const ConvEpilogue<T>& epilogue,
+                   T* out);
+
+// Gradient of Conv2dForward, without epilogue, with respect to x.
+template <typename T>
+void Conv2dBackwardData(const Conv2dShape& shape,
+                        const T* filter,
+                        const T* out_grad,
+                        T* x_grad);
+
+// Gradient of Conv2dForward, without epilogue, with respect to the filter.
+template <typename T>
+void Conv2dBackwardFilter(const Conv2dShape& shape,
+                          const T* x,
+                          const T* out_grad,
+                          T* filter_grad);
+
+// Splits the batch * channels image channels over the intra-op thread pool
+// and calls fn(n, c_begin, c_end) for runs of channels of one image, each
+// channel costing about `cost` elements. Channels are independent, so
+// results scattered through overlapping windows need no synchronisation.
+template <typename F>
+void ForEachImageChannels(int64_t batch,
+                          int64_t channels,
+                          int64_t cost,
+                          const F& fn) {
+  custom_cpu::ParallelFor(0,
+                          batch * channels,
+                          custom_cpu::GrainSize(cost),
+                          [&](int64_t b, int64_t e) {
+                            while (b < e) {
+                              int64_t n = b / channels;
+                              int64_t c = b % channels;
+                              int64_t c_end = std::min(channels, c + e - b);
+                              fn(n, c, c_end);
+                              b += c_end - c;
+                            }
+                          });
+}
+
+}  // namespace custom_kernel
@@ -0,0 +1,49 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+// Kernels are built for the baseline ISA. Functions marked
+// CUSTOM_CPU_TARGET_AVX2 use AVX2 and FMA and may only be called once
+// HasAvx2Fma() returned true, CUSTOM_CPU_TARGET_F16C ones add the half
+// precision conversions and need HasF16c() as well.
+#if defined(__x86_64__) && defined(__GNUC__)
+#include <immintrin.h>
+#define CUSTOM_CPU_AVX2
+#define CUSTOM_CPU_TARGET_AVX2 __attribute__((target("avx2,fma")))
+#define CUSTOM_CPU_TARGET_F16C __attribute__((target("avx2,fma,f16c")))
+#endif
+
+namespace custom_kernel {
+
+inline bool HasAvx2Fma() {
+#if defined(CUSTOM_CPU_AVX2)
+  static bool has =
+      __builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma");
+  return has;
+#else
+  return false;
+#endif
+}
+
+inline bool HasF16c() {
+#if defined(CUSTOM_CPU_AVX2)
+  static bool has = HasAvx2Fma() && __builtin_cpu_supports("f16c");
+  return has;
+#else
+  return false;
+#endif
+}
+
+}  // namespace custom_kernel
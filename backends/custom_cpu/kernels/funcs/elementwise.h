@@ -0,0 +1,173 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+#include <vector>
+
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+// Walks an output of shape `dims` reading x and y through element strides,
+// 0 along the dims they are broadcast over, so inputs are never expanded.
+// Dims that are contiguous for every operand are merged, leaving as few and
+// as long inner rows as possible.
+struct BroadcastIndexer {
+  std::vector<int64_t> dims;
+  std::vector<int64_t> x_strides;
+  std::vector<int64_t> y_strides;
+
+  // `axis` aligns the lower rank input to the output as in phi::BroadcastTo,
+  // -1 aligning it to the trailing dims.
+  BroadcastIndexer(int axis,
+                   const std::vector<int64_t>& x_dims,
+                   const std::vector<int64_t>& y_dims,
+                   const std::vector<int64_t>& out_dims) {
+    int ndim = out_dims.size();
+    auto x_full = InputStrides(axis, x_dims, out_dims);
+    auto y_full = InputStrides(axis, y_dims, out_dims);
+    for (int i = 0; i < ndim; ++i) {
+      if (out_dims[i] == 1) {
+        continue;
+      }
+      if (!dims.empty() && x_strides.back() == x_full[i] * out_dims[i] &&
+          y_strides.back() == y_full[i] * out_dims[i]) {
+        dims.back() *= out_dims[i];
+        x_strides.back() = x_full[i];
+        y_strides.back() = y_full[i];
+      } else {
+        dims.push_back(out_dims[i]);
+        x_strides.push_back(x_full[i]);
+        y_strides.push_back(y_full[i]);
+      }
+    }
+    if (dims.empty()) {
+      dims.push_back(1);
+      x_strides.push_back(0);
+      y_strides.push_back(0);
+    }
+  }
+
+ private:
+  static std::vector<int64_t> InputStrides(
+      int axis,
+      const std::vector<int64_t>& in_dims,
+      const std::vector<int64_t>& out_dims) {
+    int ndim = out_dims.size();
+    int in_ndim = in_dims.size();
+    int offset = in_ndim == ndim ? 0 : (axis == -1 ? ndim - in_ndim : axis);
+    std::vector<int64_t> strides(ndim, 0);
+    int64_t stride = 1;
+    for (int i = in_ndim - 1; i >= 0; --i) {
+      if (in_dims[i] != 1) {
+        strides[offset + i] = stride;
+      }
+      stride *= in_dims[i];
+    }
+    return strides;
+  }
+};
+
+// out[i] = func(x[i], y[i]) with x and y broadcast to `out_dims`. The
+// innermost row is specialised on whether each input is contiguous or
+// broadcast along it, so the loops stay simple enough to vectorise.
+template <typename T, typename OutT, typename Functor>
+void BroadcastElementwise(const T* x_data,
+                          const std::vector<int64_t>& x_dims,
+                          const T* y_data,
+                          const std::vector<int64_t>& y_dims,
+                          int axis,
+                          OutT* out_data,
+                          const std::vector<int64_t>& out_dims,
+                          Functor func) {
+  BroadcastIndexer indexer(axis, x_dims, y_dims, out_dims);
+  int ndim = indexer.dims.size();
+  int64_t inner = indexer.dims.back();
+  int64_t x_inner = indexer.x_strides.back();
+  int64_t y_inner = indexer.y_strides.back();
+  int64_t rows = 1;
+  for (int i = 0; i < ndim - 1; ++i) {
+    rows *= indexer.dims[i];
+  }
+  if (rows * inner == 0) {
+    return;
+  }
+
+  auto grain_size = custom_cpu::GrainSize(inner);
+  custom_cpu::ParallelFor(0, rows, grain_size, [&](int64_t b, int64_t e) {
+    std::vector<int64_t> index(ndim, 0);
+    int64_t rest = b;
+    for (int j = ndim - 2; j >= 0; --j) {
+      index[j] = rest % indexer.dims[j];
+      rest /= indexer.dims[j];
+    }
+    for (auto row = b; row < e; ++row) {
+      int64_t x_offset = 0;
+      int64_t y_offset = 0;
+      for (int j = 0; j < ndim - 1; ++j) {
+        x_offset += index[j] * indexer.x_strides[j];
+        y_offset += index[j] * indexer.y_strides[j];
+      }
+      const T* x_row = x_data + x_offset;
+      const T* y_row = y_data + y_offset;
+      OutT* out_row = out_data + row * inner;
+      if (x_inner == 1 && y_inner == 1) {
+        for (int64_t i = 0; i < inner; ++i) {
+          out_row[i] = func(x_row[i], y_row[i]);
+        }
+      } else if (x_inner == 1) {
+        const T y_value = y_row[0];
+        for (int64_t i = 0; i < inner; ++i) {
+          out_row[i] = func(x_row[i], y_value);
+        }
+      } else if (y_inner == 1) {
+        const T x_value = x_row[0];
+        for (int64_t i = 0; i < inner; ++i) {
+          out_row[i] = func(x_value, y_row[i]);
+        }
+      } else {
+        const OutT value = func(x_row[0], y_row[0]);
+        for (int64_t i = 0; i < inner; ++i) {
+          out_row[i] = value;
+        }
+      }
+      for (int j = ndim - 2; j >= 0 && ++index[j] == indexer.dims[j]; --j) {
+        index[j] = 0;
+      }
+    }
+  });
+}
+
+// Runs BroadcastElementwise on the data of `x` and `y` into `out`, already
+// allocated with the broadcast shape.
+template <typename T, typename OutT, typename Functor>
+void BroadcastElementwise(const phi::DenseTensor& x,
+                          const phi::DenseTensor& y,
+                          int axis,
+                          phi::DenseTensor* out,
+                          Functor func) {
+  BroadcastElementwise(x.data<T>(),
+                       x.dims(),
+                       y.data<T>(),
+                       y.dims(),
+                       axis,
+                       out->data<OutT>(),
+                       out->dims(),
+                       func);
+}
+
+}  // namespace custom_kernel
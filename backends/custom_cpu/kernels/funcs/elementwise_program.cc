@@ -0,0 +1,691 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/elementwise_program.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstdlib>
+#include <memory>
+#include <mutex>
+#include <sstream>
+#include <type_traits>
+#include <unordered_map>
+
+#include "kernels/funcs/mp_type_trait.h"
+#include "kernels/funcs/softmax.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Elements of a row evaluated at a time, so that the registers of a program
+// of a dozen ops take a few KB of L1.
+constexpr int64_t kBlock = 256;
+
+enum class OpCode {
+  kNeg,
+  kAbs,
+  kExp,
+  kLog,
+  kSqrt,
+  kRsqrt,
+  kReciprocal,
+  kSquare,
+  kSigmoid,
+  kTanh,
+  kRelu,
+  kSilu,
+  kGelu,
+  kGeluTanh,
+  kAdd,
+  kSub,
+  kMul,
+  kDiv,
+  kMax,
+  kMin,
+  kPow,
+};
+
+struct OpInfo {
+  const char* name;
+  OpCode code;
+  int arity;
+};
+
+constexpr OpInfo kOps[] = {
+    {"neg", OpCode::kNeg, 1},
+    {"abs", OpCode::kAbs, 1},
+    {"exp", OpCode::kExp, 1},
+    {"log", OpCode::kLog, 1},
+    {"sqrt", OpCode::kSqrt, 1},
+    {"rsqrt", OpCode::kRsqrt, 1},
+    {"reciprocal", OpCode::kReciprocal, 1},
+    {"square", OpCode::kSquare, 1},
+    {"sigmoid", OpCode::kSigmoid, 1},
+    {"tanh", OpCode::kTanh, 1},
+    {"relu", OpCode::kRelu, 1},
+    {"silu", OpCode::kSilu, 1},
+    {"gelu", OpCode::kGelu, 1},
+    {"gelu_tanh", OpCode::kGeluTanh, 1},
+    {"add", OpCode::kAdd, 2},
+    {"sub", OpCode::kSub, 2},
+    {"mul", OpCode::kMul, 2},
+    {"div", OpCode::kDiv, 2},
+    {"max", OpCode::kMax, 2},
+    {"min", OpCode::kMin, 2},
+    {"pow", OpCode::kPow, 2},
+};
+
+struct Operand {
+  enum Kind { kInput, kResult, kConstant } kind;
+  int64_t index;
+  double value;
+};
+
+struct ParsedOp {
+  OpCode code;
+  std::vector<Operand> args;
+};
+
+Operand ParseOperand(const std::string& token,
+                     size_t num_inputs,
+                     size_t num_ops) {
+  const char* s = token.c_str();
+  char* end = nullptr;
+  if (token.size() > 1 && (s[0] == 'x' || s[0] == 't')) {
+    int64_t index = std::strtoll(s + 1, &end, 10);
+    if (*end == '\0') {
+      size_t bound = s[0] == 'x' ? num_inputs : num_ops;
+      PD_CHECK(index >= 0 && static_cast<size_t>(index) < bound,
+               "Operand %s of an elementwise program refers to no %s.",
+               s,
+               s[0] == 'x' ? "input" : "earlier op");
+      return {s[0] == 'x' ? Operand::kInput : Operand::kResult, index, 0};
+    }
+  }
+  double value = std::strtod(s, &end);
+  PD_CHECK(end != s && *end == '\0',
+           "Operand %s of an elementwise program is neither xI, tJ nor a "
+           "number.",
+           s);
+  return {Operand::kConstant, -1, value};
+}
+
+std::vector<ParsedOp> ParseProgram(const std::string& program,
+                                   size_t num_inputs) {
+  std::vector<ParsedOp> ops;
+  std::stringstream statements(program);
+  std::string statement;
+  while (std::getline(statements, statement, ';')) {
+    std::stringstream tokens(statement);
+    std::string name;
+    if (!(tokens >> name)) {
+      continue;
+    }
+    const OpInfo* info = nullptr;
+    for (const auto& op : kOps) {
+      if (name == op.name) {
+        info = &op;
+      }
+    }
+    PD_CHECK(info != nullptr,
+             "Unknown op %s in an elementwise program.",
+             name.c_str());
+    ParsedOp op{info->code, {}};
+    std::string token;
+    while (tokens >> token) {
+      op.args.push_back(ParseOperand(token, num_inputs, ops.size()));
+    }
+    PD_CHECK(static_cast<int>(op.args.size()) == info->arity,
+             "Op %s of an elementwise program takes %d operands, but got %d.",
+             info->name,
+             info->arity,
+             static_cast<int>(op.args.size()));
+    ops.push_back(std::move(op));
+  }
+  PD_CHECK(!ops.empty(), "An elementwise program needs at least one op.");
+  return ops;
+}
+
+// out[i] = op(a[i], b[i]) for n elements, a scalar operand being read at
+// index 0 only. out never aliases an operand.
+template <typename CT>
+using LoopFn = void (*)(const CT* a, const CT* b, CT* out, int64_t n);
+
+template <typename CT, typename F>
+void UnaryLoop(const CT* a, const CT*, CT* out, int64_t n) {
+  F f;
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] = f(a[i]);
+  }
+}
+
+template <typename CT, typename F, bool kScalarA, bool kScalarB>
+void BinaryLoop(const CT* a, const CT* b, CT* out, int64_t n) {
+  F f;
+  if (kScalarA) {
+    const CT value = a[0];
+    for (int64_t i = 0; i < n; ++i) {
+      out[i] = f(value, b[i]);
+    }
+  } else if (kScalarB) {
+    const CT value = b[0];
+    for (int64_t i = 0; i < n; ++i) {
+      out[i] = f(a[i], value);
+    }
+  } else {
+    for (int64_t i = 0; i < n; ++i) {
+      out[i] = f(a[i], b[i]);
+    }
+  }
+}
+
+// The ops built on exp run it over the block at once, vectorised by Exp.
+template <typename CT>
+void ExpLoop(const CT* a, const CT*, CT* out, int64_t n) {
+  Exp(a, out, n);
+}
+
+template <typename CT>
+void SigmoidLoop(const CT* a, const CT*, CT* out, int64_t n) {
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] = -a[i];
+  }
+  Exp(out, out, n);
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] = CT(1) / (CT(1) + out[i]);
+  }
+}
+
+template <typename CT>
+void SiluLoop(const CT* a, const CT*, CT* out, int64_t n) {
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] = -a[i];
+  }
+  Exp(out, out, n);
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] = a[i] / (CT(1) + out[i]);
+  }
+}
+
+template <typename T>
+struct NegFunctor {
+  T operator()(T a) const { return -a; }
+};
+
+template <typename T>
+struct AbsFunctor {
+  T operator()(T a) const { return std::abs(a); }
+};
+
+template <typename T>
+struct LogFunctor {
+  T operator()(T a) const { return std::log(a); }
+};
+
+template <typename T>
+struct SqrtFunctor {
+  T operator()(T a) const { return std::sqrt(a); }
+};
+
+template <typename T>
+struct RsqrtFunctor {
+  T operator()(T a) const { return T(1) / std::sqrt(a); }
+};
+
+template <typename T>
+struct ReciprocalFunctor {
+  T operator()(T a) const { return T(1) / a; }
+};
+
+template <typename T>
+struct SquareFunctor {
+  T operator()(T a) const { return a * a; }
+};
+
+template <typename T>
+struct TanhFunctor {
+  T operator()(T a) const { return std::tanh(a); }
+};
+
+template <typename T>
+struct ReluFunctor {
+  T operator()(T a) const { return a > T(0) ? a : T(0); }
+};
+
+template <typename T>
+struct GeluFunctor {
+  T operator()(T a) const {
+    return T(0.5) * a * (T(1) + std::erf(a * T(M_SQRT1_2)));
+  }
+};
+
+template <typename T>
+struct GeluTanhFunctor {
+  T operator()(T a) const {
+    const T inner = T(M_2_SQRTPI * M_SQRT1_2) * (a + T(0.044715) * a * a * a);
+    return T(0.5) * a * (T(1) + std::tanh(inner));
+  }
+};
+
+template <typename T>
+struct AddFunctor {
+  T operator()(T a, T b) const { return a + b; }
+};
+
+template <typename T>
+struct SubFunctor {
+  T operator()(T a, T b) const { return a - b; }
+};
+
+template <typename T>
+struct MulFunctor {
+  T operator()(T a, T b) const { return a * b; }
+};
+
+template <typename T>
+struct DivFunctor {
+  T operator()(T a, T b) const { return a / b; }
+};
+
+template <typename T>
+struct MaxFunctor {
+  T operator()(T a, T b) const { return a > b ? a : b; }
+};
+
+template <typename T>
+struct MinFunctor {
+  T operator()(T a, T b) const { return a < b ? a : b; }
+};
+
+template <typename T>
+struct PowFunctor {
+  T operator()(T a, T b) const { return std::pow(a, b); }
+};
+
+// The loop of `code` specialised on which operands are scalars.
+template <typename CT>
+LoopFn<CT> SelectLoop(OpCode code, bool scalar_a, bool scalar_b) {
+#define UNARY_CASE(code, functor) \
+  case OpCode::code:              \
+    return &UnaryLoop<CT, functor<CT>>;
+#define BINARY_CASE(code, functor)                                \
+  case OpCode::code:                                              \
+    return scalar_a   ? &BinaryLoop<CT, functor<CT>, true, false> \
+           : scalar_b ? &BinaryLoop<CT, functor<CT>, false, true> \
+                      : &BinaryLoop<CT, functor<CT>, false, false>;
+  switch (code) {
+    case OpCode::kExp:
+      return &ExpLoop<CT>;
+    case OpCode::kSigmoid:
+      return &SigmoidLoop<CT>;
+    case OpCode::kSilu:
+      return &SiluLoop<CT>;
+      UNARY_CASE(kNeg, NegFunctor)
+      UNARY_CASE(kAbs, AbsFunctor)
+      UNARY_CASE(kLog, LogFunctor)
+      UNARY_CASE(kSqrt, SqrtFunctor)
+      UNARY_CASE(kRsqrt, RsqrtFunctor)
+      UNARY_CASE(kReciprocal, ReciprocalFunctor)
+      UNARY_CASE(kSquare, SquareFunctor)
+      UNARY_CASE(kTanh, TanhFunctor)
+      UNARY_CASE(kRelu, ReluFunctor)
+      UNARY_CASE(kGelu, GeluFunctor)
+      UNARY_CASE(kGeluTanh, GeluTanhFunctor)
+      BINARY_CASE(kAdd, AddFunctor)
+      BINARY_CASE(kSub, SubFunctor)
+      BINARY_CASE(kMul, MulFunctor)
+      BINARY_CASE(kDiv, DivFunctor)
+      BINARY_CASE(kMax, MaxFunctor)
+      BINARY_CASE(kMin, MinFunctor)
+      BINARY_CASE(kPow, PowFunctor)
+  }
+#undef UNARY_CASE
+#undef BINARY_CASE
+  return nullptr;
+}
+
+// Where an operand or result lives while a row is evaluated.
+struct Slot {
+  enum Kind {
+    kScalar,    // one value per row, in the scalar table at `index`
+    kInput,     // a block of input `index`
+    kRegister,  // block register `index`
+    kOutput,    // a block of the output
+  } kind;
+  int index;
+};
+
+template <typename CT>
+struct Instruction {
+  LoopFn<CT> fn;
+  int a;
+  int b;
+  int out;
+};
+
+// A program specialised on the dtype and on which inputs are scalars along
+// the rows. Ops on scalars alone run once per row, the others once per
+// block.
+template <typename CT>
+struct CompiledProgram {
+  std::vector<Slot> slots;
+  std::vector<std::pair<int, CT>> constants;
+  std::vector<Instruction<CT>> row_code;
+  std::vector<Instruction<CT>> block_code;
+  int num_registers = 0;
+  int result = 0;
+};
+
+template <typename T>
+std::shared_ptr<const CompiledProgram<typename MPTypeTrait<T>::Type>> Compile(
+    const std::string& program, const std::vector<bool>& scalar_inputs) {
+  using CT = typename MPTypeTrait<T>::Type;
+  auto ops = ParseProgram(program, scalar_inputs.size());
+  auto compiled = std::make_shared<CompiledProgram<CT>>();
+  auto& slots = compiled->slots;
+  for (size_t k = 0; k < scalar_inputs.size(); ++k) {
+    slots.push_back(scalar_inputs[k]
+                        ? Slot{Slot::kScalar, static_cast<int>(slots.size())}
+                        : Slot{Slot::kInput, static_cast<int>(k)});
+  }
+
+  // The last op reading every result, to recycle its register after it.
+  std::vector<size_t> last_use(ops.size(), 0);
+  for (size_t j = 0; j < ops.size(); ++j) {
+    for (const auto& arg : ops[j].args) {
+      if (arg.kind == Operand::kResult) {
+        last_use[arg.index] = j;
+      }
+    }
+  }
+  std::vector<int> result_slots(ops.size());
+  std::vector<int> free_registers;
+  for (size_t j = 0; j < ops.size(); ++j) {
+    std::vector<int> args;
+    for (const auto& arg : ops[j].args) {
+      if (arg.kind == Operand::kInput) {
+        args.push_back(arg.index);
+      } else if (arg.kind == Operand::kResult) {
+        args.push_back(result_slots[arg.index]);
+      } else {
+        int slot = slots.size();
+        slots.push_back({Slot::kScalar, slot});
+        compiled->constants.emplace_back(slot, static_cast<CT>(arg.value));
+        args.push_back(slot);
+      }
+    }
+    const bool scalar_a = slots[args[0]].kind == Slot::kScalar;
+    const bool scalar_b =
+        args.size() < 2 || slots[args[1]].kind == Slot::kScalar;
+    const bool scalar = scalar_a && scalar_b;
+    // The result is placed before the operands' registers are released, so
+    // that no loop writes over an operand it still reads.
+    int out = slots.size();
+    if (scalar) {
+      slots.push_back({Slot::kScalar, out});
+    } else if (j + 1 == ops.size() && std::is_same<T, CT>::value) {
+      slots.push_back({Slot::kOutput, 0});
+    } else if (!free_registers.empty()) {
+      slots.push_back({Slot::kRegister, free_registers.back()});
+      free_registers.pop_back();
+    } else {
+      slots.push_back({Slot::kRegister, compiled->num_registers++});
+    }
+    result_slots[j] = out;
+    for (const auto& arg : ops[j].args) {
+      if (arg.kind == Operand::kResult && last_use[arg.index] == j &&
+          slots[result_slots[arg.index]].kind == Slot::kRegister) {
+        free_registers.push_back(slots[result_slots[arg.index]].index);
+        // An op reading a result twice releases its register once.
+        last_use[arg.index] = ops.size();
+      }
+    }
+    Instruction<CT> instruction{
+        SelectLoop<CT>(ops[j].code, !scalar && scalar_a, !scalar && scalar_b),
+        args[0],
+        args.size() < 2 ? args[0] : args[1],
+        out};
+    (scalar ? compiled->row_code : compiled->block_code).push_back(instruction);
+  }
+  compiled->result = result_slots.back();
+  return compiled;
+}
+
+// Compiled programs by program, dtype and scalar inputs. The specialisation
+// is on the broadcast pattern rather than the shapes, so that a program over
+// varying batch sizes compiles once.
+template <typename T>
+std::shared_ptr<const CompiledProgram<typename MPTypeTrait<T>::Type>>
+CachedCompile(const std::string& program,
+              const std::vector<bool>& scalar_inputs) {
+  using Cache = std::unordered_map<
+      std::string,
+      std::shared_ptr<const CompiledProgram<typename MPTypeTrait<T>::Type>>>;
+  static std::mutex mutex;
+  static Cache cache;
+  std::string key = program + '|';
+  for (bool scalar : scalar_inputs) {
+    key += scalar ? 's' : 'v';
+  }
+  std::lock_guard<std::mutex> lock(mutex);
+  auto it = cache.find(key);
+  if (it == cache.end()) {
+    it = cache.emplace(key, Compile<T>(program, scalar_inputs)).first;
+  }
+  return it->second;
+}
+
+// The output walked as rows of its innermost merged dim, with the element
+// strides of every input, 0 along the dims it is broadcast over. Dims
+// contiguous for every input are merged, as BroadcastIndexer does for two.
+struct RowLayout {
+  std::vector<int64_t> dims;
+  std::vector<std::vector<int64_t>> strides;
+
+  RowLayout(const std::vector<std::vector<int64_t>>& input_dims,
+            const std::vector<int64_t>& out_dims)
+      : strides(input_dims.size()) {
+    const int ndim = out_dims.size();
+    std::vector<std::vector<int64_t>> full(input_dims.size());
+    for (size_t k = 0; k < input_dims.size(); ++k) {
+      const auto& in = input_dims[k];
+      const int offset = ndim - static_cast<int>(in.size());
+      full[k].assign(ndim, 0);
+      int64_t stride = 1;
+      for (int i = in.size() - 1; i >= 0; --i) {
+        if (in[i] != 1) {
+          full[k][offset + i] = stride;
+        }
+        stride *= in[i];
+      }
+    }
+    for (int i = 0; i < ndim; ++i) {
+      if (out_dims[i] == 1) {
+        continue;
+      }
+      bool merge = !dims.empty();
+      for (size_t k = 0; merge && k < full.size(); ++k) {
+        merge = strides[k].back() == full[k][i] * out_dims[i];
+      }
+      if (merge) {
+        dims.back() *= out_dims[i];
+      } else {
+        dims.push_back(out_dims[i]);
+      }
+      for (size_t k = 0; k < full.size(); ++k) {
+        if (merge) {
+          strides[k].back() = full[k][i];
+        } else {
+          strides[k].push_back(full[k][i]);
+        }
+      }
+    }
+    if (dims.empty()) {
+      dims.push_back(1);
+      for (auto& s : strides) {
+        s.push_back(0);
+      }
+    }
+  }
+};
+
+}  // namespace
+
+std::vector<int64_t> BroadcastShape(
+    const std::vector<std::vector<int64_t>>& dims) {
+  size_t ndim = 0;
+  for (const auto& d : dims) {
+    ndim = std::max(ndim, d.size());
+  }
+  std::vector<int64_t> out(ndim, 1);
+  for (const auto& d : dims) {
+    const size_t offset = ndim - d.size();
+    for (size_t i = 0; i < d.size(); ++i) {
+      int64_t& o = out[offset + i];
+      if (o == -1 || d[i] == -1) {
+        o = o == -1 ? (d[i] == 1 ? -1 : d[i]) : (o == 1 ? -1 : o);
+        continue;
+      }
+      PD_CHECK(o == 1 || d[i] == 1 || o == d[i],
+               "Dim %ld of size %ld can not be broadcast with size %ld.",
+               static_cast<int64_t>(offset + i),
+               d[i],
+               o);
+      o = o == 1 ? d[i] : o;
+    }
+  }
+  return out;
+}
+
+template <typename T>
+void RunElementwiseProgram(const std::string& program,
+                           const std::vector<const T*>& inputs,
+                           const std::vector<std::vector<int64_t>>& input_dims,
+                           T* out,
+                           const std::vector<int64_t>& out_dims) {
+  using CT = typename MPTypeTrait<T>::Type;
+  int64_t numel = 1;
+  for (auto d : out_dims) {
+    numel *= d;
+  }
+  if (numel == 0) {
+    return;
+  }
+  RowLayout layout(input_dims, out_dims);
+  const int ndim = layout.dims.size();
+  const int64_t inner = layout.dims.back();
+  std::vector<bool> scalar_inputs;
+  for (const auto& s : layout.strides) {
+    scalar_inputs.push_back(s.back() == 0);
+  }
+  auto compiled = CachedCompile<T>(program, scalar_inputs);
+  const auto& slots = compiled->slots;
+  const int64_t cost = compiled->block_code.size() + inputs.size();
+
+  custom_cpu::ParallelFor(
+      0, numel, custom_cpu::GrainSize(cost), [&](int64_t begin, int64_t end) {
+        std::vector<CT> scalars(slots.size());
+        for (const auto& c : compiled->constants) {
+          scalars[c.first] = c.second;
+        }
+        std::vector<CT> registers(compiled->num_registers * kBlock);
+        // Blocks of inputs converted to CT, when T is not.
+        std::vector<CT> converted(
+            std::is_same<T, CT>::value ? 0 : inputs.size() * kBlock);
+        std::vector<CT*> ptrs(slots.size());
+        for (size_t s = 0; s < slots.size(); ++s) {
+          if (slots[s].kind == Slot::kScalar) {
+            ptrs[s] = &scalars[slots[s].index];
+          } else if (slots[s].kind == Slot::kRegister) {
+            ptrs[s] = registers.data() + slots[s].index * kBlock;
+          }
+        }
+        std::vector<const T*> rows(inputs.size());
+        for (int64_t pos = begin; pos < end;) {
+          const int64_t row = pos / inner;
+          const int64_t col = pos % inner;
+          const int64_t count = std::min(end - pos, inner - col);
+          for (size_t k = 0; k < inputs.size(); ++k) {
+            int64_t offset = 0;
+            int64_t rest = row;
+            for (int j = ndim - 2; j >= 0; --j) {
+              offset += rest % layout.dims[j] * layout.strides[k][j];
+              rest /= layout.dims[j];
+            }
+            rows[k] = inputs[k] + offset;
+            if (scalar_inputs[k]) {
+              scalars[k] = static_cast<CT>(rows[k][0]);
+            }
+          }
+          for (const auto& op : compiled->row_code) {
+            op.fn(ptrs[op.a], ptrs[op.b], ptrs[op.out], 1);
+          }
+          T* out_row = out + pos;
+          if (slots[compiled->result].kind == Slot::kScalar) {
+            const T value = static_cast<T>(*ptrs[compiled->result]);
+            std::fill(out_row, out_row + count, value);
+            pos += count;
+            continue;
+          }
+          for (int64_t i = 0; i < count; i += kBlock) {
+            const int64_t n = std::min(kBlock, count - i);
+            for (size_t s = 0; s < slots.size(); ++s) {
+              if (slots[s].kind == Slot::kInput) {
+                const int k = slots[s].index;
+                const T* src = rows[k] + col + i;
+                if (std::is_same<T, CT>::value) {
+                  ptrs[s] = reinterpret_cast<CT*>(const_cast<T*>(src));
+                } else {
+                  ptrs[s] = converted.data() + k * kBlock;
+                  for (int64_t e = 0; e < n; ++e) {
+                    ptrs[s][e] = static_cast<CT>(src[e]);
+                  }
+                }
+              } else if (slots[s].kind == Slot::kOutput) {
+                ptrs[s] = reinterpret_cast<CT*>(out_row + i);
+              }
+            }
+            for (const auto& op : compiled->block_code) {
+              op.fn(ptrs[op.a], ptrs[op.b], ptrs[op.out], n);
+            }
+            if (slots[compiled->result].kind != Slot::kOutput) {
+              const CT* result = ptrs[compiled->result];
+              for (int64_t e = 0; e < n; ++e) {
+                out_row[i + e] = static_cast<T>(result[e]);
+              }
+            }
+          }
+          pos += count;
+        }
+      });
+}
+
+#define INSTANTIATE_RUN_ELEMENTWISE_PROGRAM(T)  \
+  template void RunElementwiseProgram<T>(       \
+      const std::string&,                       \
+      const std::vector<const T*>&,             \
+      const std::vector<std::vector<int64_t>>&, \
+      T*,                                       \
+      const std::vector<int64_t>&);
+
+INSTANTIATE_RUN_ELEMENTWISE_PROGRAM(float)
+INSTANTIATE_RUN_ELEMENTWISE_PROGRAM(double)
+INSTANTIATE_RUN_ELEMENTWISE_PROGRAM(phi::dtype::float16)
+INSTANTIATE_RUN_ELEMENTWISE_PROGRAM(phi::dtype::bfloat16)
+
+}  // namespace custom_kernel
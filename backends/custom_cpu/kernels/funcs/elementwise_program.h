@@ -0,0 +1,50 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+namespace custom_kernel {
+
+// The numpy broadcast of `dims`, the shape a program over inputs of these
+// shapes writes. A dim of -1, unknown until run time, is taken to match.
+std::vector<int64_t> BroadcastShape(
+    const std::vector<std::vector<int64_t>>& dims);
+
+// Evaluates an elementwise program over `inputs` broadcast to `out_dims`,
+// writing the result of its last op to `out`.
+//
+// A program is a list of ops separated by ';', each an op name followed by
+// its operands: xI for input I, tJ for the result of op J and a number for a
+// constant. x * sigmoid(x) is "sigmoid x0; mul x0 t0". Unary ops are neg,
+// abs, exp, log, sqrt, rsqrt, reciprocal, square, sigmoid, tanh, relu, silu,
+// gelu and gelu_tanh, binary ones add, sub, mul, div, max, min and pow.
+//
+// The whole chain runs in one pass over memory: the output is walked in
+// rows of its innermost merged dim, and every row in blocks small enough
+// for the intermediate results to stay in L1, each op being a loop over a
+// block. A program is compiled once per dtype and per set of inputs that
+// are constant along the rows, the ops on those being hoisted out of the
+// block loop, and cached. Computed in float for float16 and bfloat16.
+template <typename T>
+void RunElementwiseProgram(const std::string& program,
+                           const std::vector<const T*>& inputs,
+                           const std::vector<std::vector<int64_t>>& input_dims,
+                           T* out,
+                           const std::vector<int64_t>& out_dims);
+
+}  // namespace custom_kernel
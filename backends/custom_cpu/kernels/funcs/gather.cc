@@ -0,0 +1,243 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/gather.h"
+
+#include <algorithm>
+#include <cstring>
+
+#include "kernels/funcs/mp_type_trait.h"
+#include "kernels/funcs/sort.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Rows between the one being copied and the one being prefetched, enough
+// to cover a memory latency with the copies in between.
+constexpr int64_t kPrefetchDistance = 8;
+
+// Leading bytes of a row prefetched. The hardware prefetcher follows the
+// rest of a longer row once its copy has started.
+constexpr size_t kPrefetchBytes = 256;
+
+inline void PrefetchRow(const void* row, size_t bytes, bool write) {
+#if defined(__GNUC__)
+  const char* p = static_cast<const char*>(row);
+  const size_t end = std::min(bytes, kPrefetchBytes);
+  for (size_t b = 0; b < end; b += 64) {
+    if (write) {
+      __builtin_prefetch(p + b, 1);
+    } else {
+      __builtin_prefetch(p + b, 0);
+    }
+  }
+#endif
+}
+
+template <typename IndexT>
+std::vector<int64_t> NormalizeIndexImpl(const IndexT* index,
+                                        int64_t m,
+                                        int64_t n,
+                                        bool allow_negative,
+                                        const char* op) {
+  std::vector<int64_t> out(m);
+  for (int64_t i = 0; i < m; ++i) {
+    int64_t v = index[i];
+    if (allow_negative && v < 0) {
+      v += n;
+    }
+    PD_CHECK(v >= 0 && v < n,
+             "Index %ld of %s is out of range [%ld, %ld).",
+             static_cast<int64_t>(index[i]),
+             op,
+             allow_negative ? -n : 0,
+             n);
+    out[i] = v;
+  }
+  return out;
+}
+
+}  // namespace
+
+std::vector<int64_t> NormalizeIndex(const phi::DenseTensor& index,
+                                    int64_t n,
+                                    bool allow_negative,
+                                    const char* op) {
+  if (index.dtype() == phi::DataType::INT32) {
+    return NormalizeIndexImpl(
+        index.data<int32_t>(), index.numel(), n, allow_negative, op);
+  }
+  PD_CHECK(index.dtype() == phi::DataType::INT64,
+           "The index of %s must be int32 or int64.",
+           op);
+  return NormalizeIndexImpl(
+      index.data<int64_t>(), index.numel(), n, allow_negative, op);
+}
+
+void GatherRows(const void* src,
+                int64_t outer,
+                int64_t n,
+                size_t row_bytes,
+                const int64_t* index,
+                int64_t m,
+                void* dst,
+                int64_t zero_index) {
+  const char* s = static_cast<const char*>(src);
+  char* d = static_cast<char*>(dst);
+  auto src_row = [&](int64_t t) {
+    return s + ((t / m) * n + index[t % m]) * row_bytes;
+  };
+  custom_cpu::ParallelFor(
+      0,
+      outer * m,
+      custom_cpu::GrainSize(row_bytes / sizeof(float)),
+      [&](int64_t begin, int64_t end) {
+        for (int64_t t = begin; t < std::min(begin + kPrefetchDistance, end);
+             ++t) {
+          PrefetchRow(src_row(t), row_bytes, false);
+        }
+        for (int64_t t = begin; t < end; ++t) {
+          if (t + kPrefetchDistance < end) {
+            PrefetchRow(src_row(t + kPrefetchDistance), row_bytes, false);
+          }
+          if (index[t % m] == zero_index) {
+            std::memset(d + t * row_bytes, 0, row_bytes);
+          } else {
+            std::memcpy(d + t * row_bytes, src_row(t), row_bytes);
+          }
+        }
+      });
+}
+
+void ParallelZero(void* dst, size_t bytes) {
+  char* d = static_cast<char*>(dst);
+  custom_cpu::ParallelFor(0,
+                          static_cast<int64_t>(bytes),
+                          custom_cpu::kDefaultGrainSize * sizeof(float),
+                          [&](int64_t begin, int64_t end) {
+                            std::memset(d + begin, 0, end - begin);
+                          });
+}
+
+void ZeroRows(
+    void* dst, int64_t n, size_t row_bytes, const int64_t* index, int64_t m) {
+  std::vector<bool> marked(n, false);
+  std::vector<int64_t> rows;
+  for (int64_t i = 0; i < m; ++i) {
+    if (!marked[index[i]]) {
+      marked[index[i]] = true;
+      rows.push_back(index[i]);
+    }
+  }
+  char* d = static_cast<char*>(dst);
+  custom_cpu::ParallelFor(0,
+                          rows.size(),
+                          custom_cpu::GrainSize(row_bytes / sizeof(float)),
+                          [&](int64_t begin, int64_t end) {
+                            for (int64_t i = begin; i < end; ++i) {
+                              std::memset(
+                                  d + rows[i] * row_bytes, 0, row_bytes);
+                            }
+                          });
+}
+
+template <typename T>
+void ScatterRows(const T* src,
+                 int64_t outer,
+                 int64_t m,
+                 int64_t row,
+                 const int64_t* index,
+                 int64_t n,
+                 ScatterMode mode,
+                 T* dst,
+                 int64_t skip_index) {
+  using CT = typename MPTypeTrait<T>::Type;
+  if (outer == 0 || m == 0 || row == 0) {
+    return;
+  }
+  // The positions of src in the order of their index, and the runs of
+  // positions sharing one.
+  std::vector<int64_t> sorted(m);
+  std::vector<int64_t> order(m);
+  SortRows(index, 1, m, false, sorted.data(), order.data());
+  std::vector<int64_t> starts;
+  for (int64_t i = 0; i < m; ++i) {
+    if (i == 0 || sorted[i] != sorted[i - 1]) {
+      starts.push_back(i);
+    }
+  }
+  const int64_t runs = starts.size();
+  starts.push_back(m);
+
+  auto dst_row = [&](int64_t t) {
+    return dst + ((t / runs) * n + sorted[starts[t % runs]]) * row;
+  };
+  custom_cpu::ParallelFor(
+      0,
+      outer * runs,
+      custom_cpu::GrainSize(row * m / runs),
+      [&](int64_t begin, int64_t end) {
+        std::vector<CT> acc(mode == ScatterMode::kAssign ? 0 : row);
+        for (int64_t t = begin; t < end; ++t) {
+          if (t + kPrefetchDistance < end) {
+            PrefetchRow(dst_row(t + kPrefetchDistance), row * sizeof(T), true);
+          }
+          const int64_t o = t / runs;
+          const int64_t r = t % runs;
+          if (sorted[starts[r]] == skip_index) {
+            continue;
+          }
+          T* d = dst_row(t);
+          const T* s = src + o * m * row;
+          if (mode == ScatterMode::kAssign) {
+            std::memcpy(d, s + order[starts[r + 1] - 1] * row, row * sizeof(T));
+            continue;
+          }
+          for (int64_t j = 0; j < row; ++j) {
+            acc[j] = mode == ScatterMode::kAdd ? static_cast<CT>(d[j]) : CT(0);
+          }
+          for (int64_t i = starts[r]; i < starts[r + 1]; ++i) {
+            const T* s_row = s + order[i] * row;
+            for (int64_t j = 0; j < row; ++j) {
+              acc[j] += static_cast<CT>(s_row[j]);
+            }
+          }
+          for (int64_t j = 0; j < row; ++j) {
+            d[j] = static_cast<T>(acc[j]);
+          }
+        }
+      });
+}
+
+#define INSTANTIATE_SCATTER_ROWS(T)            \
+  template void ScatterRows<T>(const T*,       \
+                               int64_t,        \
+                               int64_t,        \
+                               int64_t,        \
+                               const int64_t*, \
+                               int64_t,        \
+                               ScatterMode,    \
+                               T*,             \
+                               int64_t);
+
+INSTANTIATE_SCATTER_ROWS(float)
+INSTANTIATE_SCATTER_ROWS(double)
+INSTANTIATE_SCATTER_ROWS(int32_t)
+INSTANTIATE_SCATTER_ROWS(int64_t)
+INSTANTIATE_SCATTER_ROWS(phi::dtype::float16)
+INSTANTIATE_SCATTER_ROWS(phi::dtype::bfloat16)
+
+}  // namespace custom_kernel
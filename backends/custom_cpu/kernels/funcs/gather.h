@@ -0,0 +1,82 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+#include "paddle/phi/capi/all.h"
+
+namespace custom_kernel {
+
+// The int32 or int64 `index` as int64, negative entries counted from n when
+// `allow_negative` is set, checking that every entry falls in [0, n).
+std::vector<int64_t> NormalizeIndex(const phi::DenseTensor& index,
+                                    int64_t n,
+                                    bool allow_negative,
+                                    const char* op);
+
+// dst[o, i] = src[o, index[i]] for src viewed as [outer, n, row] and dst as
+// [outer, m, row], rows of `row_bytes` bytes, index normalized. Rows whose
+// index is `zero_index`, as embedding's padding_idx, are zero filled.
+//
+// Rows are copied in parallel, each task prefetching the rows a few indices
+// ahead of the one it copies, since random rows of a large table miss every
+// cache level.
+void GatherRows(const void* src,
+                int64_t outer,
+                int64_t n,
+                size_t row_bytes,
+                const int64_t* index,
+                int64_t m,
+                void* dst,
+                int64_t zero_index = -1);
+
+// Zero fills `bytes` bytes of dst over the intra-op thread pool, as the
+// gradients scattered into are.
+void ParallelZero(void* dst, size_t bytes);
+
+// Zero fills the rows index[i] of dst viewed as [n, row_bytes], as the
+// gradient of what a scatter overwrote. Repeated indices are zeroed once.
+void ZeroRows(
+    void* dst, int64_t n, size_t row_bytes, const int64_t* index, int64_t m);
+
+// How ScatterRows combines the src rows sharing an index with their dst row.
+enum class ScatterMode {
+  kAssign,  // the last src row replaces dst
+  kSum,     // the sum of the src rows replaces dst
+  kAdd,     // the sum of the src rows is added to dst
+};
+
+// dst[o, index[i]] (op)= src[o, i] for src viewed as [outer, m, row] and dst
+// as [outer, n, row], index normalized. Rows whose index is `skip_index` are
+// left out.
+//
+// The index is sorted by a stable radix sort, so that every dst row is
+// written by the one task owning its run of equal indices, in the order of
+// src and without atomics. Sums are computed in MPTypeTrait<T>::Type.
+template <typename T>
+void ScatterRows(const T* src,
+                 int64_t outer,
+                 int64_t m,
+                 int64_t row,
+                 const int64_t* index,
+                 int64_t n,
+                 ScatterMode mode,
+                 T* dst,
+                 int64_t skip_index = -1);
+
+}  // namespace custom_kernel
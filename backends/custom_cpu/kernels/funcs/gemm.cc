@@ -0,0 +1,486 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/gemm.h"
+
+#include <algorithm>
+#include <numeric>
+#include <vector>
+
+#include "kernels/funcs/cpu_features.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+template <typename T>
+struct AccType {
+  using Type = T;
+};
+
+template <>
+struct AccType<phi::dtype::float16> {
+  using Type = float;
+};
+
+// Register tile of the micro-kernel, kMR rows by kNR columns of C.
+template <typename AccT>
+struct GemmTile;
+
+template <>
+struct GemmTile<float> {
+  static constexpr int kMR = 6;
+  static constexpr int kNR = 16;
+};
+
+template <>
+struct GemmTile<double> {
+  static constexpr int kMR = 6;
+  static constexpr int kNR = 8;
+};
+
+// Depth of the packed panels, kept in L1 (B) and L2 (A) by the micro-kernel.
+constexpr int64_t kBlockK = 256;
+// Columns of B packed at once, shared by all threads through L3.
+constexpr int64_t kBlockN = 2048;
+// Block of C computed by one task, multiples of every kMR and kNR.
+constexpr int64_t kTileM = 96;
+constexpr int64_t kTileN = 256;
+
+// Multiplications of two batched matrices below this many are not worth
+// spreading a single matrix over the pool.
+constexpr int64_t kSmallGemmFlops = 1 << 18;
+
+int64_t RoundUp(int64_t value, int64_t multiple) {
+  return (value + multiple - 1) / multiple * multiple;
+}
+
+template <typename AccT>
+void MicroKernelGeneric(int64_t kc, const AccT* a, const AccT* b, AccT* c) {
+  constexpr int kMR = GemmTile<AccT>::kMR;
+  constexpr int kNR = GemmTile<AccT>::kNR;
+  AccT acc[kMR][kNR] = {};
+  for (int64_t p = 0; p < kc; ++p) {
+    for (int i = 0; i < kMR; ++i) {
+      AccT a_i = a[p * kMR + i];
+      for (int j = 0; j < kNR; ++j) {
+        acc[i][j] += a_i * b[p * kNR + j];
+      }
+    }
+  }
+  for (int i = 0; i < kMR; ++i) {
+    for (int j = 0; j < kNR; ++j) {
+      c[i * kNR + j] = acc[i][j];
+    }
+  }
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+// 6 x 16 floats, twelve accumulators plus two B vectors and one broadcast A
+// value fit the sixteen ymm registers.
+CUSTOM_CPU_TARGET_AVX2 void MicroKernelAvx2(int64_t kc,
+                                            const float* a,
+                                            const float* b,
+                                            float* c) {
+  __m256 acc[6][2];
+  for (int i = 0; i < 6; ++i) {
+    acc[i][0] = _mm256_setzero_ps();
+    acc[i][1] = _mm256_setzero_ps();
+  }
+  for (int64_t p = 0; p < kc; ++p) {
+    __m256 b0 = _mm256_loadu_ps(b);
+    __m256 b1 = _mm256_loadu_ps(b + 8);
+    for (int i = 0; i < 6; ++i) {
+      __m256 a_i = _mm256_broadcast_ss(a + i);
+      acc[i][0] = _mm256_fmadd_ps(a_i, b0, acc[i][0]);
+      acc[i][1] = _mm256_fmadd_ps(a_i, b1, acc[i][1]);
+    }
+    a += 6;
+    b += 16;
+  }
+  for (int i = 0; i < 6; ++i) {
+    _mm256_storeu_ps(c + i * 16, acc[i][0]);
+    _mm256_storeu_ps(c + i * 16 + 8, acc[i][1]);
+  }
+}
+
+CUSTOM_CPU_TARGET_AVX2 void MicroKernelAvx2(int64_t kc,
+                                            const double* a,
+                                            const double* b,
+                                            double* c) {
+  __m256d acc[6][2];
+  for (int i = 0; i < 6; ++i) {
+    acc[i][0] = _mm256_setzero_pd();
+    acc[i][1] = _mm256_setzero_pd();
+  }
+  for (int64_t p = 0; p < kc; ++p) {
+    __m256d b0 = _mm256_loadu_pd(b);
+    __m256d b1 = _mm256_loadu_pd(b + 4);
+    for (int i = 0; i < 6; ++i) {
+      __m256d a_i = _mm256_broadcast_sd(a + i);
+      acc[i][0] = _mm256_fmadd_pd(a_i, b0, acc[i][0]);
+      acc[i][1] = _mm256_fmadd_pd(a_i, b1, acc[i][1]);
+    }
+    a += 6;
+    b += 8;
+  }
+  for (int i = 0; i < 6; ++i) {
+    _mm256_storeu_pd(c + i * 8, acc[i][0]);
+    _mm256_storeu_pd(c + i * 8 + 4, acc[i][1]);
+  }
+}
+#endif
+
+// Writes the kMR x kNR product of a packed A panel and a packed B panel of
+// depth kc to c.
+template <typename AccT>
+void MicroKernel(int64_t kc, const AccT* a, const AccT* b, AccT* c) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    MicroKernelAvx2(kc, a, b, c);
+    return;
+  }
+#endif
+  MicroKernelGeneric(kc, a, b, c);
+}
+
+// Packs rows [0, M) and columns [k0, k0 + kc) of op(A) into panels of kMR
+// rows, each stored column by column. The last panel is padded with zeros.
+template <typename T, typename AccT>
+void PackA(bool trans,
+           const T* A,
+           int64_t lda,
+           int64_t M,
+           int64_t k0,
+           int64_t kc,
+           AccT* packed) {
+  constexpr int kMR = GemmTile<AccT>::kMR;
+  int64_t panels = (M + kMR - 1) / kMR;
+  auto grain_size = custom_cpu::GrainSize(kMR * kc);
+  custom_cpu::ParallelFor(0, panels, grain_size, [&](int64_t b, int64_t e) {
+    for (auto panel = b; panel < e; ++panel) {
+      AccT* dst = packed + panel * kMR * kc;
+      int64_t i0 = panel * kMR;
+      int64_t rows = std::min<int64_t>(kMR, M - i0);
+      if (rows < kMR) {
+        std::fill(dst, dst + kMR * kc, static_cast<AccT>(0));
+      }
+      if (trans) {
+        for (int64_t p = 0; p < kc; ++p) {
+          const T* src = A + (k0 + p) * lda + i0;
+          for (int64_t i = 0; i < rows; ++i) {
+            dst[p * kMR + i] = static_cast<AccT>(src[i]);
+          }
+        }
+      } else {
+        for (int64_t i = 0; i < rows; ++i) {
+          const T* src = A + (i0 + i) * lda + k0;
+          for (int64_t p = 0; p < kc; ++p) {
+            dst[p * kMR + i] = static_cast<AccT>(src[p]);
+          }
+        }
+      }
+    }
+  });
+}
+
+// Packs rows [k0, k0 + kc) and columns [n0, n0 + nc) of op(B) into panels of
+// kNR columns, each stored row by row. The last panel is padded with zeros.
+template <typename T, typename AccT>
+void PackB(bool trans,
+           const T* B,
+           int64_t ldb,
+           int64_t n0,
+           int64_t nc,
+           int64_t k0,
+           int64_t kc,
+           AccT* packed) {
+  constexpr int kNR = GemmTile<AccT>::kNR;
+  int64_t panels = (nc + kNR - 1) / kNR;
+  auto grain_size = custom_cpu::GrainSize(kNR * kc);
+  custom_cpu::ParallelFor(0, panels, grain_size, [&](int64_t b, int64_t e) {
+    for (auto panel = b; panel < e; ++panel) {
+      AccT* dst = packed + panel * kNR * kc;
+      int64_t j0 = n0 + panel * kNR;
+      int64_t cols = std::min<int64_t>(kNR, n0 + nc - j0);
+      if (cols < kNR) {
+        std::fill(dst, dst + kNR * kc, static_cast<AccT>(0));
+      }
+      if (trans) {
+        for (int64_t j = 0; j < cols; ++j) {
+          const T* src = B + (j0 + j) * ldb + k0;
+          for (int64_t p = 0; p < kc; ++p) {
+            dst[p * kNR + j] = static_cast<AccT>(src[p]);
+          }
+        }
+      } else {
+        for (int64_t p = 0; p < kc; ++p) {
+          const T* src = B + (k0 + p) * ldb + j0;
+          for (int64_t j = 0; j < cols; ++j) {
+            dst[p * kNR + j] = static_cast<AccT>(src[j]);
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename T, typename AccT>
+void ScaleMatrix(int64_t M, int64_t N, AccT beta, T* C, int64_t ldc) {
+  if (beta == static_cast<AccT>(1)) {
+    return;
+  }
+  auto grain_size = custom_cpu::GrainSize(N);
+  custom_cpu::ParallelFor(0, M, grain_size, [&](int64_t b, int64_t e) {
+    for (auto i = b; i < e; ++i) {
+      T* row = C + i * ldc;
+      for (int64_t j = 0; j < N; ++j) {
+        // beta == 0 overwrites C, NaNs in it must not leak into the result.
+        row[j] = beta == static_cast<AccT>(0)
+                     ? static_cast<T>(0)
+                     : static_cast<T>(beta * static_cast<AccT>(row[j]));
+      }
+    }
+  });
+}
+
+// y[r * incy] += alpha * sum_c op(A)(r, c) * x[c * incx] for an op(A) of
+// rows x cols, A being stored cols x rows when `trans` is set.
+template <typename T, typename AccT>
+void Gemv(bool trans,
+          int64_t rows,
+          int64_t cols,
+          AccT alpha,
+          const T* A,
+          int64_t lda,
+          const T* x,
+          int64_t incx,
+          T* y,
+          int64_t incy) {
+  auto grain_size = custom_cpu::GrainSize(cols);
+  custom_cpu::ParallelFor(0, rows, grain_size, [&](int64_t b, int64_t e) {
+    std::vector<AccT> sum(e - b, static_cast<AccT>(0));
+    if (trans) {
+      // Walk A row by row, the columns of op(A) are contiguous.
+      for (int64_t c = 0; c < cols; ++c) {
+        AccT x_c = static_cast<AccT>(x[c * incx]);
+        const T* row = A + c * lda;
+        for (auto r = b; r < e; ++r) {
+          sum[r - b] += static_cast<AccT>(row[r]) * x_c;
+        }
+      }
+    } else {
+      for (auto r = b; r < e; ++r) {
+        const T* row = A + r * lda;
+        AccT acc = 0;
+        for (int64_t c = 0; c < cols; ++c) {
+          acc += static_cast<AccT>(row[c]) * static_cast<AccT>(x[c * incx]);
+        }
+        sum[r - b] = acc;
+      }
+    }
+    for (auto r = b; r < e; ++r) {
+      T* out = y + r * incy;
+      *out = static_cast<T>(static_cast<AccT>(*out) + alpha * sum[r - b]);
+    }
+  });
+}
+
+}  // namespace
+
+template <typename T>
+void Gemm(bool trans_a,
+          bool trans_b,
+          int64_t M,
+          int64_t N,
+          int64_t K,
+          double alpha,
+          const T* A,
+          int64_t lda,
+          const T* B,
+          int64_t ldb,
+          double beta,
+          T* C,
+          int64_t ldc) {
+  using AccT = typename AccType<T>::Type;
+  constexpr int kMR = GemmTile<AccT>::kMR;
+  constexpr int kNR = GemmTile<AccT>::kNR;
+  if (M <= 0 || N <= 0) {
+    return;
+  }
+  ScaleMatrix(M, N, static_cast<AccT>(beta), C, ldc);
+  if (K <= 0 || alpha == 0) {
+    return;
+  }
+  auto scale = static_cast<AccT>(alpha);
+
+  // Matrix-vector products are bound by memory, packing would only add
+  // another pass over the matrix.
+  if (M == 1) {
+    Gemv(!trans_b, N, K, scale, B, ldb, A, trans_a ? lda : 1, C, 1);
+    return;
+  }
+  if (N == 1) {
+    Gemv(trans_a, M, K, scale, A, lda, B, trans_b ? 1 : ldb, C, ldc);
+    return;
+  }
+
+  int64_t block_k = std::min(K, kBlockK);
+  std::vector<AccT> packed_a(RoundUp(M, kMR) * block_k);
+  std::vector<AccT> packed_b(std::min(RoundUp(N, kNR), kBlockN) * block_k);
+  for (int64_t k0 = 0; k0 < K; k0 += kBlockK) {
+    int64_t kc = std::min(kBlockK, K - k0);
+    PackA(trans_a, A, lda, M, k0, kc, packed_a.data());
+    for (int64_t n0 = 0; n0 < N; n0 += kBlockN) {
+      int64_t nc = std::min(kBlockN, N - n0);
+      PackB(trans_b, B, ldb, n0, nc, k0, kc, packed_b.data());
+
+      int64_t tiles_m = (M + kTileM - 1) / kTileM;
+      int64_t tiles_n = (nc + kTileN - 1) / kTileN;
+      custom_cpu::ParallelFor(
+          0, tiles_m * tiles_n, 1, [&](int64_t b, int64_t e) {
+            AccT tile[kMR * kNR];
+            for (auto t = b; t < e; ++t) {
+              int64_t m_begin = t / tiles_n * kTileM;
+              int64_t m_end = std::min(M, m_begin + kTileM);
+              int64_t n_begin = t % tiles_n * kTileN;
+              int64_t n_end = std::min(nc, n_begin + kTileN);
+              // Sweep the A tile under each B panel, which stays in L1.
+              for (auto jr = n_begin; jr < n_end; jr += kNR) {
+                const AccT* b_panel = packed_b.data() + jr / kNR * kNR * kc;
+                int64_t nr = std::min<int64_t>(kNR, n_end - jr);
+                for (auto ir = m_begin; ir < m_end; ir += kMR) {
+                  const AccT* a_panel = packed_a.data() + ir / kMR * kMR * kc;
+                  MicroKernel(kc, a_panel, b_panel, tile);
+                  int64_t mr = std::min<int64_t>(kMR, m_end - ir);
+                  for (int64_t i = 0; i < mr; ++i) {
+                    T* c = C + (ir + i) * ldc + n0 + jr;
+                    for (int64_t j = 0; j < nr; ++j) {
+                      c[j] = static_cast<T>(static_cast<AccT>(c[j]) +
+                                            scale * tile[i * kNR + j]);
+                    }
+                  }
+                }
+              }
+            }
+          });
+    }
+  }
+}
+
+template <typename T>
+void BatchedGemm(bool trans_a,
+                 bool trans_b,
+                 int64_t M,
+                 int64_t N,
+                 int64_t K,
+                 double alpha,
+                 const T* A,
+                 int64_t lda,
+                 const std::vector<int64_t>& a_offsets,
+                 const T* B,
+                 int64_t ldb,
+                 const std::vector<int64_t>& b_offsets,
+                 double beta,
+                 T* C,
+                 int64_t ldc,
+                 const std::vector<int64_t>& c_offsets) {
+  // Group the products by output, each group runs in order.
+  std::vector<size_t> order(c_offsets.size());
+  std::iota(order.begin(), order.end(), 0);
+  std::stable_sort(order.begin(), order.end(), [&](size_t a, size_t b) {
+    return c_offsets[a] < c_offsets[b];
+  });
+  std::vector<size_t> group_begin;
+  for (size_t i = 0; i < order.size(); ++i) {
+    if (i == 0 || c_offsets[order[i]] != c_offsets[order[i - 1]]) {
+      group_begin.push_back(i);
+    }
+  }
+  group_begin.push_back(order.size());
+  int64_t groups = static_cast<int64_t>(group_begin.size()) - 1;
+
+  auto run_group = [&](int64_t group) {
+    for (auto i = group_begin[group]; i < group_begin[group + 1]; ++i) {
+      auto index = order[i];
+      Gemm(trans_a,
+           trans_b,
+           M,
+           N,
+           K,
+           alpha,
+           A + a_offsets[index],
+           lda,
+           B + b_offsets[index],
+           ldb,
+           i == group_begin[group] ? beta : 1.0,
+           C + c_offsets[index],
+           ldc);
+    }
+  };
+  if (groups >= static_cast<int64_t>(custom_cpu::IntraOpThreads()) ||
+      M * N * K < kSmallGemmFlops) {
+    // One output per thread, Gemm runs inline inside the parallel region.
+    custom_cpu::ParallelFor(0, groups, 1, [&](int64_t b, int64_t e) {
+      for (auto group = b; group < e; ++group) {
+        run_group(group);
+      }
+    });
+  } else {
+    for (int64_t group = 0; group < groups; ++group) {
+      run_group(group);
+    }
+  }
+}
+
+#define INSTANTIATE_GEMM(T)                                 \
+  template void Gemm<T>(bool,                               \
+                        bool,                               \
+                        int64_t,                            \
+                        int64_t,                            \
+                        int64_t,                            \
+                        double,                             \
+                        const T*,                           \
+                        int64_t,                            \
+                        const T*,                           \
+                        int64_t,                            \
+                        double,                             \
+                        T*,                                 \
+                        int64_t);                           \
+  template void BatchedGemm<T>(bool,                        \
+                               bool,                        \
+                               int64_t,                     \
+                               int64_t,                     \
+                               int64_t,                     \
+                               double,                      \
+                               const T*,                    \
+                               int64_t,                     \
+                               const std::vector<int64_t>&, \
+                               const T*,                    \
+                               int64_t,                     \
+                               const std::vector<int64_t>&, \
+                               double,                      \
+                               T*,                          \
+                               int64_t,                     \
+                               const std::vector<int64_t>&);
+
+INSTANTIATE_GEMM(float)
+INSTANTIATE_GEMM(double)
+INSTANTIATE_GEMM(phi::dtype::float16)
+
+#undef INSTANTIATE_GEMM
+
+}  // namespace custom_kernel
@@ -0,0 +1,69 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+#include <vector>
+
+namespace custom_kernel {
+
+// C = alpha * op(A) * op(B) + beta * C, where op(A) is M x K, op(B) is K x N
+// and every matrix is row-major with the given leading dimension. op(A) is A
+// itself, or its transpose when `trans_a` is set (A is then stored K x M).
+// With beta == 0 the previous content of C is ignored.
+//
+// Operands are packed into cache-sized blocks and multiplied by a register
+// blocked micro-kernel, AVX2/FMA when the CPU supports it. Blocks of C are
+// spread over the intra-op thread pool. float16 is computed in float.
+// Implemented for float, double and phi::dtype::float16.
+template <typename T>
+void Gemm(bool trans_a,
+          bool trans_b,
+          int64_t M,
+          int64_t N,
+          int64_t K,
+          double alpha,
+          const T* A,
+          int64_t lda,
+          const T* B,
+          int64_t ldb,
+          double beta,
+          T* C,
+          int64_t ldc);
+
+// Runs Gemm for every product i, multiplying A + a_offsets[i] by
+// B + b_offsets[i] into C + c_offsets[i]. Products sharing a C offset are
+// summed into it, beta being applied once, which reduces over broadcast batch
+// dimensions. Independent outputs run in parallel when each product is too
+// small to use the whole pool.
+template <typename T>
+void BatchedGemm(bool trans_a,
+                 bool trans_b,
+                 int64_t M,
+                 int64_t N,
+                 int64_t K,
+                 double alpha,
+                 const T* A,
+                 int64_t lda,
+                 const std::vector<int64_t>& a_offsets,
+                 const T* B,
+                 int64_t ldb,
+                 const std::vector<int64_t>& b_offsets,
+                 double beta,
+                 T* C,
+                 int64_t ldc,
+                 const std::vector<int64_t>& c_offsets);
+
+}  // namespace custom_kernel
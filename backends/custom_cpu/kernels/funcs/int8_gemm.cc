@@ -0,0 +1,589 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/int8_gemm.h"
+
+#include <algorithm>
+#include <cmath>
+#include <vector>
+
+#include "kernels/funcs/cpu_features.h"
+#include "kernels/funcs/gemm.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Columns of op(B), or weight channels, per parallel task.
+constexpr int64_t kPanelCols = 64;
+
+// Fewer rows of x multiply every weight row directly: a GEMM would first
+// dequantize the weight to float and read four times the bytes.
+constexpr int64_t kMinGemmRows = 16;
+
+// Weight channels dequantized to float per Gemm, wide enough for Gemm to
+// reach its full speed.
+constexpr int64_t kGemmPanelCols = 256;
+
+// x itself when it is float, else x converted into `buf`.
+template <typename T>
+const float* AsFloat(const T* x, int64_t n, std::vector<float>* buf) {
+  buf->resize(n);
+  for (int64_t i = 0; i < n; ++i) {
+    (*buf)[i] = static_cast<float>(x[i]);
+  }
+  return buf->data();
+}
+
+const float* AsFloat(const float* x, int64_t n, std::vector<float>* buf) {
+  return x;
+}
+
+// op(X) [rows, K] widened to int16, one row after the other.
+std::vector<int16_t> WidenRows(
+    bool trans, int64_t rows, int64_t K, const int8_t* x, int64_t ldx) {
+  std::vector<int16_t> out(rows * K);
+  custom_cpu::ParallelFor(
+      0, rows, custom_cpu::GrainSize(K), [&](int64_t begin, int64_t end) {
+        for (int64_t i = begin; i < end; ++i) {
+          int16_t* row = out.data() + i * K;
+          for (int64_t k = 0; k < K; ++k) {
+            row[k] = trans ? x[k * ldx + i] : x[i * ldx + k];
+          }
+        }
+      });
+  return out;
+}
+
+// c[r][j] = a[r] . b[j] over K for R rows of a and NB rows of b.
+template <int R, int NB>
+void Int8BlockScalar(
+    const int16_t* a, const int16_t* b, int64_t K, int32_t* c, int64_t ldc) {
+  for (int r = 0; r < R; ++r) {
+    for (int j = 0; j < NB; ++j) {
+      int32_t s = 0;
+      for (int64_t k = 0; k < K; ++k) {
+        s += a[r * K + k] * b[j * K + k];
+      }
+      c[r * ldc + j] = s;
+    }
+  }
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+CUSTOM_CPU_TARGET_AVX2 inline int32_t HorizontalSum(__m256i v) {
+  __m128i s =
+      _mm_add_epi32(_mm256_castsi256_si128(v), _mm256_extracti128_si256(v, 1));
+  s = _mm_hadd_epi32(s, s);
+  s = _mm_hadd_epi32(s, s);
+  return _mm_cvtsi128_si32(s);
+}
+
+template <int R, int NB>
+CUSTOM_CPU_TARGET_AVX2 void Int8BlockAvx2(
+    const int16_t* a, const int16_t* b, int64_t K, int32_t* c, int64_t ldc) {
+  __m256i acc[R][NB];
+  for (int r = 0; r < R; ++r) {
+    for (int j = 0; j < NB; ++j) {
+      acc[r][j] = _mm256_setzero_si256();
+    }
+  }
+  int64_t k = 0;
+  for (; k + 16 <= K; k += 16) {
+    __m256i bv[NB];
+    for (int j = 0; j < NB; ++j) {
+      bv[j] =
+          _mm256_loadu_si256(reinterpret_cast<const __m256i*>(b + j * K + k));
+    }
+    for (int r = 0; r < R; ++r) {
+      __m256i av =
+          _mm256_loadu_si256(reinterpret_cast<const __m256i*>(a + r * K + k));
+      for (int j = 0; j < NB; ++j) {
+        acc[r][j] = _mm256_add_epi32(acc[r][j], _mm256_madd_epi16(av, bv[j]));
+      }
+    }
+  }
+  for (int r = 0; r < R; ++r) {
+    for (int j = 0; j < NB; ++j) {
+      int32_t s = HorizontalSum(acc[r][j]);
+      for (int64_t t = k; t < K; ++t) {
+        s += a[r * K + t] * b[j * K + t];
+      }
+      c[r * ldc + j] = s;
+    }
+  }
+}
+#endif
+
+template <int R, int NB>
+void Int8Block(
+    const int16_t* a, const int16_t* b, int64_t K, int32_t* c, int64_t ldc) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    Int8BlockAvx2<R, NB>(a, b, K, c, ldc);
+    return;
+  }
+#endif
+  Int8BlockScalar<R, NB>(a, b, K, c, ldc);
+}
+
+// The R rows of a times all nb rows of b, two at a time.
+template <int R>
+void Int8Rows(const int16_t* a,
+              const int16_t* b,
+              int64_t nb,
+              int64_t K,
+              int32_t* c,
+              int64_t ldc) {
+  int64_t j = 0;
+  for (; j + 2 <= nb; j += 2) {
+    Int8Block<R, 2>(a, b + j * K, K, c + j, ldc);
+  }
+  if (j < nb) {
+    Int8Block<R, 1>(a, b + j * K, K, c + j, ldc);
+  }
+}
+
+// out[r] = sum over groups g of s[g] * (x[r] . w) within the group, for R
+// rows of x of stride K.
+template <int R>
+void WeightDotScalar(const float* x,
+                     int64_t K,
+                     const int8_t* w,
+                     const float* s,
+                     int64_t group_size,
+                     float* out) {
+  for (int r = 0; r < R; ++r) {
+    out[r] = 0;
+  }
+  for (int64_t g = 0; g * group_size < K; ++g) {
+    const int64_t end = std::min(K, (g + 1) * group_size);
+    for (int r = 0; r < R; ++r) {
+      float sum = 0;
+      for (int64_t k = g * group_size; k < end; ++k) {
+        sum += x[r * K + k] * w[k];
+      }
+      out[r] += s[g] * sum;
+    }
+  }
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+CUSTOM_CPU_TARGET_AVX2 inline float HorizontalSum(__m256 v) {
+  __m128 s = _mm_add_ps(_mm256_castps256_ps128(v), _mm256_extractf128_ps(v, 1));
+  s = _mm_hadd_ps(s, s);
+  s = _mm_hadd_ps(s, s);
+  return _mm_cvtss_f32(s);
+}
+
+// The weight is dequantized in registers, eight at a time, and multiplied
+// into every row.
+template <int R>
+CUSTOM_CPU_TARGET_AVX2 void WeightDotAvx2(const float* x,
+                                          int64_t K,
+                                          const int8_t* w,
+                                          const float* s,
+                                          int64_t group_size,
+                                          float* out) {
+  __m256 acc[R];
+  float tail[R];
+  for (int r = 0; r < R; ++r) {
+    acc[r] = _mm256_setzero_ps();
+    tail[r] = 0;
+  }
+  for (int64_t g = 0; g * group_size < K; ++g) {
+    const int64_t end = std::min(K, (g + 1) * group_size);
+    const __m256 scale = _mm256_set1_ps(s[g]);
+    int64_t k = g * group_size;
+    for (; k + 8 <= end; k += 8) {
+      __m256i wi = _mm256_cvtepi8_epi32(
+          _mm_loadl_epi64(reinterpret_cast<const __m128i*>(w + k)));
+      __m256 wf = _mm256_mul_ps(_mm256_cvtepi32_ps(wi), scale);
+      for (int r = 0; r < R; ++r) {
+        acc[r] = _mm256_fmadd_ps(_mm256_loadu_ps(x + r * K + k), wf, acc[r]);
+      }
+    }
+    for (; k < end; ++k) {
+      for (int r = 0; r < R; ++r) {
+        tail[r] += s[g] * x[r * K + k] * w[k];
+      }
+    }
+  }
+  for (int r = 0; r < R; ++r) {
+    out[r] = HorizontalSum(acc[r]) + tail[r];
+  }
+}
+#endif
+
+template <int R>
+void WeightDot(const float* x,
+               int64_t K,
+               const int8_t* w,
+               const float* s,
+               int64_t group_size,
+               float* out) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    WeightDotAvx2<R>(x, K, w, s, group_size, out);
+    return;
+  }
+#endif
+  WeightDotScalar<R>(x, K, w, s, group_size, out);
+}
+
+// y [M, N] of row stride N, for the channels [n_begin, n_end).
+void WeightOnlyRows(int64_t M,
+                    int64_t N,
+                    int64_t K,
+                    const float* x,
+                    const int8_t* weight,
+                    const float* scale,
+                    int64_t group_size,
+                    int64_t n_begin,
+                    int64_t n_end,
+                    float* y) {
+  const int64_t groups = (K + group_size - 1) / group_size;
+  float out[4];
+  for (int64_t n = n_begin; n < n_end; ++n) {
+    const int8_t* w = weight + n * K;
+    const float* s = scale + n * groups;
+    int64_t i = 0;
+    for (; i + 4 <= M; i += 4) {
+      WeightDot<4>(x + i * K, K, w, s, group_size, out);
+      for (int r = 0; r < 4; ++r) {
+        y[(i + r) * N + n] = out[r];
+      }
+    }
+    switch (M - i) {
+      case 3:
+        WeightDot<3>(x + i * K, K, w, s, group_size, out);
+        break;
+      case 2:
+        WeightDot<2>(x + i * K, K, w, s, group_size, out);
+        break;
+      case 1:
+        WeightDot<1>(x + i * K, K, w, s, group_size, out);
+        break;
+    }
+    for (int64_t r = 0; i + r < M; ++r) {
+      y[(i + r) * N + n] = out[r];
+    }
+  }
+}
+
+template <typename T>
+void StoreOutput(int64_t M, int64_t N, const float* acc, const T* bias, T* y) {
+  custom_cpu::ParallelFor(
+      0, M, custom_cpu::GrainSize(N), [&](int64_t begin, int64_t end) {
+        for (int64_t i = begin; i < end; ++i) {
+          for (int64_t n = 0; n < N; ++n) {
+            float v = acc[i * N + n];
+            if (bias) {
+              v += static_cast<float>(bias[n]);
+            }
+            y[i * N + n] = static_cast<T>(v);
+          }
+        }
+      });
+}
+
+}  // namespace
+
+void Int8Gemm(bool trans_a,
+              bool trans_b,
+              int64_t M,
+              int64_t N,
+              int64_t K,
+              const int8_t* A,
+              int64_t lda,
+              const int8_t* B,
+              int64_t ldb,
+              int32_t* C,
+              int64_t ldc) {
+  if (M == 0 || N == 0) {
+    return;
+  }
+  const std::vector<int16_t> a = WidenRows(trans_a, M, K, A, lda);
+  const int64_t panels = (N + kPanelCols - 1) / kPanelCols;
+  custom_cpu::ParallelFor(
+      0,
+      panels,
+      custom_cpu::GrainSize(M * K * kPanelCols),
+      [&](int64_t begin, int64_t end) {
+        std::vector<int16_t> panel(kPanelCols * K);
+        for (int64_t p = begin; p < end; ++p) {
+          const int64_t n0 = p * kPanelCols;
+          const int64_t nb = std::min(kPanelCols, N - n0);
+          for (int64_t j = 0; j < nb; ++j) {
+            for (int64_t k = 0; k < K; ++k) {
+              panel[j * K + k] =
+                  trans_b ? B[(n0 + j) * ldb + k] : B[k * ldb + n0 + j];
+            }
+          }
+          int64_t i = 0;
+          for (; i + 4 <= M; i += 4) {
+            Int8Rows<4>(
+                a.data() + i * K, panel.data(), nb, K, C + i * ldc + n0, ldc);
+          }
+          const int16_t* rest = a.data() + i * K;
+          int32_t* c = C + i * ldc + n0;
+          switch (M - i) {
+            case 3:
+              Int8Rows<3>(rest, panel.data(), nb, K, c, ldc);
+              break;
+            case 2:
+              Int8Rows<2>(rest, panel.data(), nb, K, c, ldc);
+              break;
+            case 1:
+              Int8Rows<1>(rest, panel.data(), nb, K, c, ldc);
+              break;
+          }
+        }
+      });
+}
+
+template <typename T>
+void WeightOnlyGemm(int64_t M,
+                    int64_t N,
+                    int64_t K,
+                    const T* x,
+                    const int8_t* weight,
+                    const T* scale,
+                    int64_t group_size,
+                    const T* bias,
+                    T* y) {
+  if (group_size <= 0) {
+    group_size = K;
+  }
+  PD_CHECK(K % group_size == 0,
+           "K %ld of a weight-only matmul is not a multiple of its group "
+           "size %ld.",
+           K,
+           group_size);
+  const int64_t groups = K / group_size;
+  // The scales of every channel, group after group.
+  std::vector<float> channel_scale(N * groups);
+  for (int64_t g = 0; g < groups; ++g) {
+    for (int64_t n = 0; n < N; ++n) {
+      channel_scale[n * groups + g] = static_cast<float>(scale[g * N + n]);
+    }
+  }
+  std::vector<float> x_buf;
+  const float* xf = AsFloat(x, M * K, &x_buf);
+  std::vector<float> acc(M * N);
+
+  if (M < kMinGemmRows) {
+    custom_cpu::ParallelFor(
+        0, N, custom_cpu::GrainSize(M * K), [&](int64_t begin, int64_t end) {
+          WeightOnlyRows(M,
+                         N,
+                         K,
+                         xf,
+                         weight,
+                         channel_scale.data(),
+                         group_size,
+                         begin,
+                         end,
+                         acc.data());
+        });
+  } else {
+    const int64_t panels = (N + kGemmPanelCols - 1) / kGemmPanelCols;
+    custom_cpu::ParallelFor(0, panels, 1, [&](int64_t begin, int64_t end) {
+      std::vector<float> panel(kGemmPanelCols * K);
+      for (int64_t p = begin; p < end; ++p) {
+        const int64_t n0 = p * kGemmPanelCols;
+        const int64_t nb = std::min(kGemmPanelCols, N - n0);
+        for (int64_t j = 0; j < nb; ++j) {
+          const int8_t* w = weight + (n0 + j) * K;
+          const float* s = channel_scale.data() + (n0 + j) * groups;
+          for (int64_t k = 0; k < K; ++k) {
+            panel[j * K + k] = w[k];
+          }
+          for (int64_t g = 0; g < groups; ++g) {
+            float* row = panel.data() + j * K + g * group_size;
+            for (int64_t k = 0; k < group_size; ++k) {
+              row[k] *= s[g];
+            }
+          }
+        }
+        Gemm<float>(false,
+                    true,
+                    M,
+                    nb,
+                    K,
+                    1.0,
+                    xf,
+                    K,
+                    panel.data(),
+                    K,
+                    0.0,
+                    acc.data() + n0,
+                    N);
+      }
+    });
+  }
+  StoreOutput(M, N, acc.data(), bias, y);
+}
+
+template <typename T>
+void LlmInt8Gemm(int64_t M,
+                 int64_t N,
+                 int64_t K,
+                 const T* x,
+                 const int8_t* weight,
+                 const float* scale,
+                 float threshold,
+                 const T* bias,
+                 T* y) {
+  std::vector<float> x_buf;
+  const float* xf = AsFloat(x, M * K, &x_buf);
+  std::vector<float> col_max(K, 0.0f);
+  for (int64_t i = 0; i < M; ++i) {
+    for (int64_t k = 0; k < K; ++k) {
+      col_max[k] = std::max(col_max[k], std::abs(xf[i * K + k]));
+    }
+  }
+  std::vector<int64_t> outliers;
+  for (int64_t k = 0; k < K; ++k) {
+    if (col_max[k] > threshold) {
+      outliers.push_back(k);
+    }
+  }
+
+  std::vector<int8_t> xq(M * K);
+  std::vector<float> row_scale(M);
+  custom_cpu::ParallelFor(
+      0, M, custom_cpu::GrainSize(K), [&](int64_t begin, int64_t end) {
+        for (int64_t i = begin; i < end; ++i) {
+          const float* row = xf + i * K;
+          float amax = 0;
+          for (int64_t k = 0; k < K; ++k) {
+            if (col_max[k] <= threshold) {
+              amax = std::max(amax, std::abs(row[k]));
+            }
+          }
+          row_scale[i] = amax / 127.0f;
+          const float inv = amax > 0 ? 127.0f / amax : 0.0f;
+          for (int64_t k = 0; k < K; ++k) {
+            xq[i * K + k] = col_max[k] <= threshold
+                                ? static_cast<int8_t>(std::round(row[k] * inv))
+                                : 0;
+          }
+        }
+      });
+
+  std::vector<int32_t> acc(M * N);
+  Int8Gemm(false, true, M, N, K, xq.data(), K, weight, K, acc.data(), N);
+  custom_cpu::ParallelFor(
+      0, M, custom_cpu::GrainSize(N), [&](int64_t begin, int64_t end) {
+        for (int64_t i = begin; i < end; ++i) {
+          for (int64_t n = 0; n < N; ++n) {
+            const int8_t* w = weight + n * K;
+            float outlier = 0;
+            for (int64_t k : outliers) {
+              outlier += xf[i * K + k] * w[k];
+            }
+            float v = (acc[i * N + n] * row_scale[i] + outlier) * scale[n];
+            if (bias) {
+              v += static_cast<float>(bias[n]);
+            }
+            y[i * N + n] = static_cast<T>(v);
+          }
+        }
+      });
+}
+
+template <typename T>
+void QuantizeInt8(int64_t rows,
+                  int64_t cols,
+                  const T* x,
+                  const T* shift,
+                  const T* smooth,
+                  float scale,
+                  int round_type,
+                  float max_bound,
+                  float min_bound,
+                  int8_t* out) {
+  custom_cpu::ParallelFor(
+      0, rows, custom_cpu::GrainSize(cols), [&](int64_t begin, int64_t end) {
+        for (int64_t i = begin; i < end; ++i) {
+          for (int64_t j = 0; j < cols; ++j) {
+            float v = static_cast<float>(x[i * cols + j]);
+            if (shift) {
+              v += static_cast<float>(shift[j]);
+            }
+            if (smooth) {
+              v *= static_cast<float>(smooth[j]);
+            }
+            float q = max_bound * scale * v;
+            q = round_type == 0 ? std::rint(q) : std::round(q);
+            out[i * cols + j] = static_cast<int8_t>(
+                std::min(std::max(q, min_bound), max_bound));
+          }
+        }
+      });
+}
+
+template <typename T>
+void DequantizeInt32(
+    int64_t rows, int64_t cols, const int32_t* x, const float* scale, T* out) {
+  custom_cpu::ParallelFor(
+      0, rows, custom_cpu::GrainSize(cols), [&](int64_t begin, int64_t end) {
+        for (int64_t i = begin; i < end; ++i) {
+          for (int64_t j = 0; j < cols; ++j) {
+            out[i * cols + j] = static_cast<T>(x[i * cols + j] * scale[j]);
+          }
+        }
+      });
+}
+
+#define INSTANTIATE_INT8_GEMM(T)                 \
+  template void WeightOnlyGemm<T>(int64_t,       \
+                                  int64_t,       \
+                                  int64_t,       \
+                                  const T*,      \
+                                  const int8_t*, \
+                                  const T*,      \
+                                  int64_t,       \
+                                  const T*,      \
+                                  T*);           \
+  template void LlmInt8Gemm<T>(int64_t,          \
+                               int64_t,          \
+                               int64_t,          \
+                               const T*,         \
+                               const int8_t*,    \
+                               const float*,     \
+                               float,            \
+                               const T*,         \
+                               T*);              \
+  template void QuantizeInt8<T>(int64_t,         \
+                                int64_t,         \
+                                const T*,        \
+                                const T*,        \
+                                const T*,        \
+                                float,           \
+                                int,             \
+                                float,           \
+                                float,           \
+                                int8_t*);        \
+  template void DequantizeInt32<T>(              \
+      int64_t, int64_t, const int32_t*, const float*, T*);
+
+INSTANTIATE_INT8_GEMM(float)
+INSTANTIATE_INT8_GEMM(phi::dtype::float16)
+INSTANTIATE_INT8_GEMM(phi::dtype::bfloat16)
+
+}  // namespace custom_kernel
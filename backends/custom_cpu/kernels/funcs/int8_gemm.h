@@ -0,0 +1,99 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+
+namespace custom_kernel {
+
+// C = op(A) * op(B) of int8 matrices accumulated in int32, where op(A) is
+// M x K, op(B) is K x N and every matrix is row-major with the given leading
+// dimension, as Gemm. C is overwritten.
+//
+// Rows of op(A) and panels of columns of op(B) are widened to int16 and
+// laid out along K, and every 4 x 2 block of C is a pairwise int16 multiply
+// add, AVX2 when the CPU supports it. Panels are spread over the intra-op
+// thread pool.
+void Int8Gemm(bool trans_a,
+              bool trans_b,
+              int64_t M,
+              int64_t N,
+              int64_t K,
+              const int8_t* A,
+              int64_t lda,
+              const int8_t* B,
+              int64_t ldb,
+              int32_t* C,
+              int64_t ldc);
+
+// y [M, N] = x [M, K] * W' + bias, where the int8 weight W [N, K] holds one
+// output channel per row and is dequantized by `scale`: the channel scale
+// [N] when group_size is -1, else [K / group_size, N], one per group of
+// group_size consecutive k. bias [N] may be null.
+//
+// Few rows, as in a decode step, read every weight once: a block of it is
+// widened and scaled in registers and multiplied into four rows of x at a
+// time, so that the weight traffic is a quarter of a float matmul. More rows
+// dequantize panels of W to float and multiply them with Gemm. Computed in
+// float for float, float16 and bfloat16.
+template <typename T>
+void WeightOnlyGemm(int64_t M,
+                    int64_t N,
+                    int64_t K,
+                    const T* x,
+                    const int8_t* weight,
+                    const T* scale,
+                    int64_t group_size,
+                    const T* bias,
+                    T* y);
+
+// The LLM.int8() product y [M, N] = x [M, K] * W' + bias of the weight
+// [N, K] quantized with the channel scale [N]. Columns of x holding a value
+// beyond `threshold` are outliers multiplied by the dequantized weight in
+// float. Every row of the other columns is quantized to int8 by its own
+// absolute max and multiplied by the weight through Int8Gemm.
+template <typename T>
+void LlmInt8Gemm(int64_t M,
+                 int64_t N,
+                 int64_t K,
+                 const T* x,
+                 const int8_t* weight,
+                 const float* scale,
+                 float threshold,
+                 const T* bias,
+                 T* y);
+
+// Quantizes rows [rows, cols] of x to int8 as phi's QuantHelperFunc does:
+// round(max_bound * scale * (x + shift) * smooth), to nearest even for
+// round_type 0 and half away from zero otherwise, clipped to [min_bound,
+// max_bound]. shift and smooth [cols] may be null.
+template <typename T>
+void QuantizeInt8(int64_t rows,
+                  int64_t cols,
+                  const T* x,
+                  const T* shift,
+                  const T* smooth,
+                  float scale,
+                  int round_type,
+                  float max_bound,
+                  float min_bound,
+                  int8_t* out);
+
+// out = x * scale of int32 rows [rows, cols], with one scale per column.
+template <typename T>
+void DequantizeInt32(
+    int64_t rows, int64_t cols, const int32_t* x, const float* scale, T* out);
+
+}  // namespace custom_kernel
@@ -0,0 +1,38 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include "paddle/phi/capi/all.h"
+
+namespace custom_kernel {
+
+// Type that values of type T are accumulated and computed in: float for
+// float16 and bfloat16, T itself otherwise.
+template <typename T>
+struct MPTypeTrait {
+  using Type = T;
+};
+
+template <>
+struct MPTypeTrait<phi::dtype::float16> {
+  using Type = float;
+};
+
+template <>
+struct MPTypeTrait<phi::dtype::bfloat16> {
+  using Type = float;
+};
+
+}  // namespace custom_kernel
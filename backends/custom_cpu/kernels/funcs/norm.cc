@@ -0,0 +1,366 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/norm.h"
+
+#include <algorithm>
+#include <cmath>
+#include <type_traits>
+#include <vector>
+
+#include "kernels/funcs/cpu_features.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Sums over a row, with four partial sums so the adds pipeline.
+template <typename CT>
+CT Sum(const CT* x, int64_t n) {
+  CT s[4] = {0, 0, 0, 0};
+  int64_t j = 0;
+  for (; j + 4 <= n; j += 4) {
+    for (int k = 0; k < 4; ++k) {
+      s[k] += x[j + k];
+    }
+  }
+  for (; j < n; ++j) {
+    s[0] += x[j];
+  }
+  return (s[0] + s[1]) + (s[2] + s[3]);
+}
+
+// Sum of (x - center)^2.
+template <typename CT>
+CT SquareSum(const CT* x, int64_t n, CT center) {
+  CT s[4] = {0, 0, 0, 0};
+  int64_t j = 0;
+  for (; j + 4 <= n; j += 4) {
+    for (int k = 0; k < 4; ++k) {
+      CT d = x[j + k] - center;
+      s[k] += d * d;
+    }
+  }
+  for (; j < n; ++j) {
+    CT d = x[j] - center;
+    s[0] += d * d;
+  }
+  return (s[0] + s[1]) + (s[2] + s[3]);
+}
+
+template <typename CT>
+CT Dot(const CT* x, const CT* y, int64_t n) {
+  CT s[4] = {0, 0, 0, 0};
+  int64_t j = 0;
+  for (; j + 4 <= n; j += 4) {
+    for (int k = 0; k < 4; ++k) {
+      s[k] += x[j + k] * y[j + k];
+    }
+  }
+  for (; j < n; ++j) {
+    s[0] += x[j] * y[j];
+  }
+  return (s[0] + s[1]) + (s[2] + s[3]);
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+CUSTOM_CPU_TARGET_AVX2 float HorizontalSum(__m256 v) {
+  __m128 s = _mm_add_ps(_mm256_castps256_ps128(v), _mm256_extractf128_ps(v, 1));
+  s = _mm_add_ps(s, _mm_movehl_ps(s, s));
+  s = _mm_add_ss(s, _mm_movehdup_ps(s));
+  return _mm_cvtss_f32(s);
+}
+
+CUSTOM_CPU_TARGET_AVX2 float SumAvx2(const float* x, int64_t n) {
+  __m256 s0 = _mm256_setzero_ps();
+  __m256 s1 = _mm256_setzero_ps();
+  int64_t j = 0;
+  for (; j + 16 <= n; j += 16) {
+    s0 = _mm256_add_ps(s0, _mm256_loadu_ps(x + j));
+    s1 = _mm256_add_ps(s1, _mm256_loadu_ps(x + j + 8));
+  }
+  float s = HorizontalSum(_mm256_add_ps(s0, s1));
+  for (; j < n; ++j) {
+    s += x[j];
+  }
+  return s;
+}
+
+CUSTOM_CPU_TARGET_AVX2 float SquareSumAvx2(const float* x,
+                                           int64_t n,
+                                           float center) {
+  const __m256 c = _mm256_set1_ps(center);
+  __m256 s0 = _mm256_setzero_ps();
+  __m256 s1 = _mm256_setzero_ps();
+  int64_t j = 0;
+  for (; j + 16 <= n; j += 16) {
+    __m256 d0 = _mm256_sub_ps(_mm256_loadu_ps(x + j), c);
+    __m256 d1 = _mm256_sub_ps(_mm256_loadu_ps(x + j + 8), c);
+    s0 = _mm256_fmadd_ps(d0, d0, s0);
+    s1 = _mm256_fmadd_ps(d1, d1, s1);
+  }
+  float s = HorizontalSum(_mm256_add_ps(s0, s1));
+  for (; j < n; ++j) {
+    float d = x[j] - center;
+    s += d * d;
+  }
+  return s;
+}
+
+CUSTOM_CPU_TARGET_AVX2 float DotAvx2(const float* x,
+                                     const float* y,
+                                     int64_t n) {
+  __m256 s0 = _mm256_setzero_ps();
+  __m256 s1 = _mm256_setzero_ps();
+  int64_t j = 0;
+  for (; j + 16 <= n; j += 16) {
+    s0 = _mm256_fmadd_ps(_mm256_loadu_ps(x + j), _mm256_loadu_ps(y + j), s0);
+    s1 = _mm256_fmadd_ps(
+        _mm256_loadu_ps(x + j + 8), _mm256_loadu_ps(y + j + 8), s1);
+  }
+  float s = HorizontalSum(_mm256_add_ps(s0, s1));
+  for (; j < n; ++j) {
+    s += x[j] * y[j];
+  }
+  return s;
+}
+
+template <>
+float Sum(const float* x, int64_t n) {
+  if (HasAvx2Fma()) {
+    return SumAvx2(x, n);
+  }
+  float s = 0;
+  for (int64_t j = 0; j < n; ++j) {
+    s += x[j];
+  }
+  return s;
+}
+
+template <>
+float SquareSum(const float* x, int64_t n, float center) {
+  if (HasAvx2Fma()) {
+    return SquareSumAvx2(x, n, center);
+  }
+  float s = 0;
+  for (int64_t j = 0; j < n; ++j) {
+    s += (x[j] - center) * (x[j] - center);
+  }
+  return s;
+}
+
+template <>
+float Dot(const float* x, const float* y, int64_t n) {
+  if (HasAvx2Fma()) {
+    return DotAvx2(x, y, n);
+  }
+  float s = 0;
+  for (int64_t j = 0; j < n; ++j) {
+    s += x[j] * y[j];
+  }
+  return s;
+}
+#endif
+
+template <typename CT>
+int8_t Quantize(CT y, const NormQuant& quant) {
+  float q = quant.max_bound * quant.scale * static_cast<float>(y);
+  q = quant.round_type == 0 ? std::rint(q) : std::round(q);
+  return static_cast<int8_t>(
+      std::min(std::max(q, quant.min_bound), quant.max_bound));
+}
+
+// A [cols] parameter in CT, `fill` where it is absent.
+template <typename T, typename CT = typename MPTypeTrait<T>::Type>
+std::vector<CT> ColumnParam(const T* param, int64_t cols, CT fill) {
+  std::vector<CT> out(cols, fill);
+  if (param) {
+    for (int64_t j = 0; j < cols; ++j) {
+      out[j] = static_cast<CT>(param[j]);
+    }
+  }
+  return out;
+}
+
+template <typename T, typename CT = typename MPTypeTrait<T>::Type>
+std::vector<CT> ColumnParam(const NormParam<T>& param, int64_t cols, CT fill) {
+  if (param.wide) {
+    return std::vector<CT>(param.wide, param.wide + cols);
+  }
+  return ColumnParam(param.data, cols, fill);
+}
+
+template <typename T, typename CT = typename MPTypeTrait<T>::Type>
+void StoreColumn(const NormParamGrad<T>& grad, int64_t j, CT value) {
+  if (grad.wide) {
+    grad.wide[j] = value;
+  } else if (grad.data) {
+    grad.data[j] = static_cast<T>(value);
+  }
+}
+
+// Rows of `cols` elements per chunk of the pool.
+int64_t RowGrain(int64_t cols) { return custom_cpu::GrainSize(4 * cols); }
+
+}  // namespace
+
+template <typename T>
+void NormForward(const NormForwardArgs<T>& a) {
+  using CT = typename MPTypeTrait<T>::Type;
+  const int64_t cols = a.cols;
+  if (a.rows == 0 || cols == 0) {
+    return;
+  }
+  const auto gamma = ColumnParam(a.scale, cols, CT(1));
+  const auto beta = ColumnParam(a.shift, cols, CT(0));
+  const auto bias = ColumnParam(a.bias, cols, CT(0));
+  const CT alpha = static_cast<CT>(a.residual_alpha);
+  // A float or double x without fusion is reduced in place.
+  const bool staged = !std::is_same<T, CT>::value || a.bias != nullptr ||
+                      a.residual != nullptr || a.residual_out != nullptr;
+
+  custom_cpu::ParallelFor(0, a.rows, RowGrain(cols), [&](int64_t b, int64_t e) {
+    std::vector<CT> buffer(staged ? cols : 0);
+    std::vector<CT> y(cols);
+    for (auto r = b; r < e; ++r) {
+      const T* x = a.x + r * cols;
+      const CT* h = reinterpret_cast<const CT*>(x);
+      if (staged) {
+        CT* s = buffer.data();
+        for (int64_t j = 0; j < cols; ++j) {
+          s[j] = static_cast<CT>(x[j]) + bias[j];
+        }
+        if (a.residual) {
+          const T* res = a.residual + r * cols;
+          for (int64_t j = 0; j < cols; ++j) {
+            s[j] += alpha * static_cast<CT>(res[j]);
+          }
+        }
+        if (a.residual_out) {
+          T* res_out = a.residual_out + r * cols;
+          for (int64_t j = 0; j < cols; ++j) {
+            res_out[j] = static_cast<T>(s[j]);
+          }
+        }
+        h = s;
+      }
+
+      CT mean = a.rms ? CT(0) : Sum(h, cols) / static_cast<CT>(cols);
+      CT variance = SquareSum(h, cols, mean) / static_cast<CT>(cols);
+      CT inv_std = CT(1) / std::sqrt(variance + static_cast<CT>(a.epsilon));
+      if (a.mean) {
+        a.mean[r] = mean;
+      }
+      if (a.variance) {
+        a.variance[r] = variance;
+      }
+      if (a.inv_std) {
+        a.inv_std[r] = inv_std;
+      }
+
+      for (int64_t j = 0; j < cols; ++j) {
+        y[j] = (h[j] - mean) * inv_std * gamma[j] + beta[j];
+      }
+      if (a.quant_out) {
+        int8_t* out = a.quant_out + r * cols;
+        for (int64_t j = 0; j < cols; ++j) {
+          out[j] = Quantize(y[j], a.quant);
+        }
+      } else if (a.out) {
+        T* out = a.out + r * cols;
+        for (int64_t j = 0; j < cols; ++j) {
+          out[j] = static_cast<T>(y[j]);
+        }
+      }
+    }
+  });
+}
+
+template <typename T>
+void NormBackward(const NormBackwardArgs<T>& a) {
+  using CT = typename MPTypeTrait<T>::Type;
+  const int64_t cols = a.cols;
+  if (a.rows == 0 || cols == 0) {
+    return;
+  }
+  const auto gamma = ColumnParam(a.scale, cols, CT(1));
+  const bool rms = a.mean == nullptr;
+  const bool column_sums =
+      static_cast<bool>(a.scale_grad) || static_cast<bool>(a.shift_grad);
+
+  // Column sums of out_grad * x_hat and out_grad, per chunk of rows.
+  auto partial = [&](int64_t b, int64_t e, const std::vector<CT>&) {
+    std::vector<CT> sums(column_sums ? 2 * cols : 0, CT(0));
+    std::vector<CT> x_hat(cols);
+    std::vector<CT> g(cols);
+    for (auto r = b; r < e; ++r) {
+      const T* x = a.x + r * cols;
+      const T* dy = a.out_grad + r * cols;
+      const CT mean = rms ? CT(0) : a.mean[r];
+      const CT inv_std = a.inv_std[r];
+      for (int64_t j = 0; j < cols; ++j) {
+        x_hat[j] = (static_cast<CT>(x[j]) - mean) * inv_std;
+        g[j] = static_cast<CT>(dy[j]);
+      }
+      if (column_sums) {
+        for (int64_t j = 0; j < cols; ++j) {
+          sums[j] += g[j] * x_hat[j];
+          sums[cols + j] += g[j];
+        }
+      }
+      if (a.x_grad == nullptr) {
+        continue;
+      }
+      for (int64_t j = 0; j < cols; ++j) {
+        g[j] *= gamma[j];
+      }
+      const CT inv_cols = CT(1) / static_cast<CT>(cols);
+      const CT g_mean = rms ? CT(0) : Sum(g.data(), cols) * inv_cols;
+      const CT gx_mean = Dot(g.data(), x_hat.data(), cols) * inv_cols;
+      T* dx = a.x_grad + r * cols;
+      for (int64_t j = 0; j < cols; ++j) {
+        dx[j] = static_cast<T>(inv_std * (g[j] - g_mean - x_hat[j] * gx_mean));
+      }
+    }
+    return sums;
+  };
+  auto sums = custom_cpu::ParallelReduce(
+      int64_t(0),
+      a.rows,
+      RowGrain(cols),
+      std::vector<CT>(column_sums ? 2 * cols : 0, CT(0)),
+      partial,
+      [](std::vector<CT> total, const std::vector<CT>& part) {
+        for (size_t j = 0; j < part.size(); ++j) {
+          total[j] += part[j];
+        }
+        return total;
+      });
+  for (int64_t j = 0; column_sums && j < cols; ++j) {
+    StoreColumn(a.scale_grad, j, sums[j]);
+    StoreColumn(a.shift_grad, j, sums[cols + j]);
+  }
+}
+
+#define INSTANTIATE_NORM(T)                                \
+  template void NormForward<T>(const NormForwardArgs<T>&); \
+  template void NormBackward<T>(const NormBackwardArgs<T>&);
+
+INSTANTIATE_NORM(float)
+INSTANTIATE_NORM(double)
+INSTANTIATE_NORM(phi::dtype::float16)
+INSTANTIATE_NORM(phi::dtype::bfloat16)
+
+}  // namespace custom_kernel
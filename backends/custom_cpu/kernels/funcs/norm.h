@@ -0,0 +1,197 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+#include <type_traits>
+#include <vector>
+
+#include "kernels/funcs/mp_type_trait.h"
+
+namespace custom_kernel {
+
+// Rounding of a normalised value to int8 as phi's QuantHelperFunc does:
+// round(max_bound * scale * y), to nearest even for round_type 0 and half
+// away from zero otherwise, clipped to [min_bound, max_bound].
+struct NormQuant {
+  float scale;
+  int round_type;
+  float max_bound;
+  float min_bound;
+};
+
+// A [cols] parameter of a norm or its gradient, in the data type of x or,
+// as AMP O2 keeps norm weights in float32 for float16 and bfloat16 models,
+// in MPTypeTrait<T>::Type. At most one of the two pointers is set.
+template <typename T, typename P = const T>
+struct NormParam {
+  using CT = typename std::conditional<std::is_const<P>::value,
+                                       const typename MPTypeTrait<T>::Type,
+                                       typename MPTypeTrait<T>::Type>::type;
+
+  P* data = nullptr;
+  CT* wide = nullptr;
+
+  explicit operator bool() const { return data != nullptr || wide != nullptr; }
+};
+
+template <typename T>
+using NormParamGrad = NormParam<T, T>;
+
+// One row-wise layer norm, or RMS norm when `rms` is set, of x viewed as
+// [rows, cols]. Statistics are computed in MPTypeTrait<T>::Type, called CT
+// below. Every pointer but x may be null:
+//
+//   h = x + bias + residual_alpha * residual
+//   out = (h - mean) * inv_std * scale + shift
+//
+// where inv_std is 1 / sqrt(variance + epsilon), and for RMS norm the mean
+// is taken as 0 and variance is the mean square. h goes to residual_out,
+// and out to `out`, or to `quant_out` rounded by `quant`.
+template <typename T>
+struct NormForwardArgs {
+  using CT = typename MPTypeTrait<T>::Type;
+
+  int64_t rows;
+  int64_t cols;
+  bool rms = false;
+  double epsilon = 0;
+  const T* x = nullptr;
+  const T* bias = nullptr;      // [cols]
+  const T* residual = nullptr;  // [rows, cols]
+  double residual_alpha = 1;
+  NormParam<T> scale;
+  NormParam<T> shift;
+  T* residual_out = nullptr;
+  T* out = nullptr;
+  int8_t* quant_out = nullptr;
+  NormQuant quant{};
+  CT* mean = nullptr;      // [rows], layer norm only
+  CT* variance = nullptr;  // [rows]
+  CT* inv_std = nullptr;   // [rows]
+};
+
+// Gradients of a row-wise layer norm, or RMS norm when `mean` is null,
+// without the bias and residual fusion:
+//
+//   x_grad = inv_std * (g - mean(g) - x_hat * mean(g * x_hat))
+//
+// with x_hat the normalised x and g = out_grad * scale, and mean(g) dropped
+// for RMS norm. scale_grad and shift_grad are the column sums of
+// out_grad * x_hat and out_grad. Any of the three outputs may be null.
+template <typename T>
+struct NormBackwardArgs {
+  using CT = typename MPTypeTrait<T>::Type;
+
+  int64_t rows;
+  int64_t cols;
+  const T* x = nullptr;
+  NormParam<T> scale;           // absent for 1
+  const CT* mean = nullptr;     // [rows]
+  const CT* inv_std = nullptr;  // [rows]
+  const T* out_grad = nullptr;
+  T* x_grad = nullptr;
+  NormParamGrad<T> scale_grad;  // in the data type of scale
+  NormParamGrad<T> shift_grad;
+};
+
+// Each row is read once: it is staged in a per-thread CT buffer, reduced
+// there and written out, with the sums vectorised for float when the CPU
+// has AVX2. Rows are spread over the intra-op thread pool, and the column
+// sums of the backward pass are accumulated per chunk of rows and combined
+// at the end. Implemented for float, double, float16 and bfloat16.
+template <typename T>
+void NormForward(const NormForwardArgs<T>& args);
+
+template <typename T>
+void NormBackward(const NormBackwardArgs<T>& args);
+
+// Sets rows and cols of a tensor of `dims` normalised over the dims from
+// `begin_norm_axis` on.
+inline void NormMatrix(const std::vector<int64_t>& dims,
+                       int begin_norm_axis,
+                       int64_t* rows,
+                       int64_t* cols) {
+  const int rank = static_cast<int>(dims.size());
+  PD_CHECK(begin_norm_axis >= 0 && begin_norm_axis <= rank,
+           "begin_norm_axis must be in [0, %d], but received %d.",
+           rank,
+           begin_norm_axis);
+  *rows = 1;
+  *cols = 1;
+  for (int i = 0; i < rank; ++i) {
+    (i < begin_norm_axis ? *rows : *cols) *= dims[i];
+  }
+}
+
+// Whether the [cols] parameter `t` of a norm of x is in
+// MPTypeTrait<T>::Type rather than in the data type of x. Only the meta of
+// `t` is read, the grad kernels do not get the buffer of every parameter.
+template <typename T>
+bool NormParamIsWide(const phi::DenseTensor& t,
+                     const phi::DenseTensor& x,
+                     const char* name) {
+  using CT = typename MPTypeTrait<T>::Type;
+  if (t.dtype() == x.dtype()) {
+    return false;
+  }
+  constexpr bool kWidens = !std::is_same<T, CT>::value;
+  PD_CHECK(kWidens && t.dtype() == phi::DataType::FLOAT32,
+           "%s of a norm must have the data type of x, or float32 for a "
+           "float16 or bfloat16 x.",
+           name);
+  return true;
+}
+
+// The [cols] parameter `t` of a norm of x, which may be null.
+template <typename T>
+NormParam<T> NormParamData(const phi::DenseTensor* t,
+                           const phi::DenseTensor& x,
+                           const char* name) {
+  using CT = typename MPTypeTrait<T>::Type;
+  NormParam<T> param;
+  if (t == nullptr) {
+    return param;
+  }
+  if (NormParamIsWide<T>(*t, x, name)) {
+    param.wide = t->data<CT>();
+  } else {
+    param.data = t->data<T>();
+  }
+  return param;
+}
+
+// Allocates `grad`, the gradient of the parameter `t`, in the data type of
+// `t` when both are present.
+template <typename T>
+NormParamGrad<T> NormParamGradData(const phi::Context& dev_ctx,
+                                   const phi::DenseTensor* t,
+                                   const phi::DenseTensor& x,
+                                   const char* name,
+                                   phi::DenseTensor* grad) {
+  using CT = typename MPTypeTrait<T>::Type;
+  NormParamGrad<T> out;
+  if (t == nullptr || grad == nullptr) {
+    return out;
+  }
+  if (NormParamIsWide<T>(*t, x, name)) {
+    out.wide = dev_ctx.template Alloc<CT>(grad);
+  } else {
+    out.data = dev_ctx.template Alloc<T>(grad);
+  }
+  return out;
+}
+
+}  // namespace custom_kernel
@@ -0,0 +1,304 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/optimizer.h"
+
+#include <algorithm>
+#include <cmath>
+#include <type_traits>
+
+#include "kernels/funcs/cast.h"
+#include "kernels/funcs/cpu_features.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Elements updated per unit of thread pool grain: every element reads and
+// writes several streams and takes a square root or two.
+constexpr int64_t kOptimizerCost = 8;
+
+template <typename MT>
+using ComputeType = typename std::
+    conditional<std::is_same<MT, double>::value, double, float>::type;
+
+// Calls fn(tensor, begin, end) for the ranges of every tensor covered by a
+// chunk of the concatenated elements of all tensors.
+template <typename Tensors, typename Fn>
+void ForEachTensorRange(const std::vector<Tensors>& tensors, const Fn& fn) {
+  std::vector<int64_t> offsets(tensors.size() + 1, 0);
+  for (size_t t = 0; t < tensors.size(); ++t) {
+    offsets[t + 1] = offsets[t] + tensors[t].numel;
+  }
+  auto grain_size = custom_cpu::GrainSize(kOptimizerCost);
+  custom_cpu::ParallelFor(
+      0, offsets.back(), grain_size, [&](int64_t b, int64_t e) {
+        size_t t = std::upper_bound(offsets.begin(), offsets.end(), b) -
+                   offsets.begin() - 1;
+        while (b < e) {
+          int64_t end = std::min(e, offsets[t + 1]);
+          if (end > b) {
+            fn(tensors[t], b - offsets[t], end - offsets[t]);
+          }
+          b = end;
+          ++t;
+        }
+      });
+}
+
+// Parameters are read from and written to their master weights when they
+// have them.
+template <typename CT, typename T, typename MT>
+CT LoadParam(const T* param, const MT* master_param, int64_t i) {
+  return master_param != nullptr ? static_cast<CT>(master_param[i])
+                                 : static_cast<CT>(param[i]);
+}
+
+template <typename T, typename MT, typename CT>
+void StoreParam(T* param_out, MT* master_param_out, int64_t i, CT p) {
+  if (master_param_out != nullptr) {
+    master_param_out[i] = static_cast<MT>(p);
+  }
+  param_out[i] = static_cast<T>(p);
+}
+
+// Per tensor constants of an Adam step, with the bias corrections folded
+// into the learning rate and epsilon.
+template <typename CT>
+struct AdamCoeffs {
+  AdamCoeffs(const AdamConfig& config,
+             double lr,
+             double beta1_pow,
+             double beta2_pow) {
+    double bias2 = std::sqrt(1 - beta2_pow);
+    beta1 = static_cast<CT>(config.beta1);
+    beta2 = static_cast<CT>(config.beta2);
+    step = static_cast<CT>(lr * bias2 / (1 - beta1_pow));
+    epsilon = static_cast<CT>(config.epsilon * bias2);
+    decay = static_cast<CT>(1 - lr * config.weight_decay);
+  }
+
+  CT beta1;
+  CT beta2;
+  CT step;
+  CT epsilon;
+  CT decay;
+};
+
+template <typename T, typename MT, typename CT>
+void AdamRange(const AdamTensors<T, MT>& t,
+               const AdamCoeffs<CT>& c,
+               bool amsgrad,
+               int64_t b,
+               int64_t e) {
+  const CT one = 1;
+  for (auto i = b; i < e; ++i) {
+    CT g = static_cast<CT>(t.grad[i]);
+    CT p = LoadParam<CT>(t.param, t.master_param, i) * c.decay;
+    CT m1 = c.beta1 * static_cast<CT>(t.moment1[i]) + (one - c.beta1) * g;
+    CT m2 = c.beta2 * static_cast<CT>(t.moment2[i]) + (one - c.beta2) * g * g;
+    CT denom = m2;
+    if (amsgrad) {
+      denom = std::max(static_cast<CT>(t.moment2_max[i]), m2);
+      t.moment2_max_out[i] = static_cast<MT>(denom);
+    }
+    p -= c.step * (m1 / (std::sqrt(denom) + c.epsilon));
+    t.moment1_out[i] = static_cast<MT>(m1);
+    t.moment2_out[i] = static_cast<MT>(m2);
+    StoreParam(t.param_out, t.master_param_out, i, p);
+  }
+}
+
+template <typename CT>
+struct MomentumCoeffs {
+  MomentumCoeffs(const MomentumConfig& config, double lr, double l2_decay)
+      : mu(static_cast<CT>(config.mu)),
+        rescale(static_cast<CT>(config.rescale_grad)),
+        lr(static_cast<CT>(lr)),
+        l2_decay(static_cast<CT>(l2_decay)) {}
+
+  CT mu;
+  CT rescale;
+  CT lr;
+  CT l2_decay;
+};
+
+template <typename T, typename MT, typename CT>
+void MomentumRange(const MomentumTensors<T, MT>& t,
+                   const MomentumCoeffs<CT>& c,
+                   bool use_nesterov,
+                   int64_t b,
+                   int64_t e) {
+  for (auto i = b; i < e; ++i) {
+    CT p = LoadParam<CT>(t.param, t.master_param, i);
+    CT g = static_cast<CT>(t.grad[i]) * c.rescale + c.l2_decay * p;
+    CT v = c.mu * static_cast<CT>(t.velocity[i]) + g;
+    p -= use_nesterov ? (g + v * c.mu) * c.lr : c.lr * v;
+    t.velocity_out[i] = static_cast<MT>(v);
+    StoreParam(t.param_out, t.master_param_out, i, p);
+  }
+}
+
+// Vectorised bodies, returning the first element left for the scalar loop.
+template <typename T, typename MT, typename CT>
+int64_t AdamRangeFast(const AdamTensors<T, MT>&,
+                      const AdamCoeffs<CT>&,
+                      bool,
+                      int64_t b,
+                      int64_t) {
+  return b;
+}
+
+template <typename T, typename MT, typename CT>
+int64_t MomentumRangeFast(const MomentumTensors<T, MT>&,
+                          const MomentumCoeffs<CT>&,
+                          bool,
+                          int64_t b,
+                          int64_t) {
+  return b;
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+CUSTOM_CPU_TARGET_AVX2 int64_t AdamRangeAvx2(const AdamTensors<float, float>& t,
+                                             const AdamCoeffs<float>& c,
+                                             bool amsgrad,
+                                             int64_t b,
+                                             int64_t e) {
+  const __m256 beta1 = _mm256_set1_ps(c.beta1);
+  const __m256 beta2 = _mm256_set1_ps(c.beta2);
+  const __m256 rest1 = _mm256_set1_ps(1.0f - c.beta1);
+  const __m256 rest2 = _mm256_set1_ps(1.0f - c.beta2);
+  const __m256 step = _mm256_set1_ps(c.step);
+  const __m256 epsilon = _mm256_set1_ps(c.epsilon);
+  const __m256 decay = _mm256_set1_ps(c.decay);
+  for (; b + 8 <= e; b += 8) {
+    __m256 g = _mm256_loadu_ps(t.grad + b);
+    __m256 p = _mm256_mul_ps(_mm256_loadu_ps(t.param + b), decay);
+    __m256 m1 = _mm256_fmadd_ps(
+        beta1, _mm256_loadu_ps(t.moment1 + b), _mm256_mul_ps(rest1, g));
+    __m256 m2 = _mm256_fmadd_ps(beta2,
+                                _mm256_loadu_ps(t.moment2 + b),
+                                _mm256_mul_ps(rest2, _mm256_mul_ps(g, g)));
+    __m256 denom = m2;
+    if (amsgrad) {
+      denom = _mm256_max_ps(_mm256_loadu_ps(t.moment2_max + b), m2);
+      _mm256_storeu_ps(t.moment2_max_out + b, denom);
+    }
+    __m256 update =
+        _mm256_div_ps(m1, _mm256_add_ps(_mm256_sqrt_ps(denom), epsilon));
+    p = _mm256_fnmadd_ps(step, update, p);
+    _mm256_storeu_ps(t.moment1_out + b, m1);
+    _mm256_storeu_ps(t.moment2_out + b, m2);
+    _mm256_storeu_ps(t.param_out + b, p);
+  }
+  return b;
+}
+
+CUSTOM_CPU_TARGET_AVX2 int64_t
+MomentumRangeAvx2(const MomentumTensors<float, float>& t,
+                  const MomentumCoeffs<float>& c,
+                  bool use_nesterov,
+                  int64_t b,
+                  int64_t e) {
+  const __m256 mu = _mm256_set1_ps(c.mu);
+  const __m256 rescale = _mm256_set1_ps(c.rescale);
+  const __m256 lr = _mm256_set1_ps(c.lr);
+  const __m256 l2_decay = _mm256_set1_ps(c.l2_decay);
+  for (; b + 8 <= e; b += 8) {
+    __m256 p = _mm256_loadu_ps(t.param + b);
+    __m256 g = _mm256_fmadd_ps(
+        _mm256_loadu_ps(t.grad + b), rescale, _mm256_mul_ps(l2_decay, p));
+    __m256 v = _mm256_fmadd_ps(mu, _mm256_loadu_ps(t.velocity + b), g);
+    __m256 update = use_nesterov ? _mm256_fmadd_ps(v, mu, g) : v;
+    p = _mm256_fnmadd_ps(lr, update, p);
+    _mm256_storeu_ps(t.velocity_out + b, v);
+    _mm256_storeu_ps(t.param_out + b, p);
+  }
+  return b;
+}
+
+int64_t AdamRangeFast(const AdamTensors<float, float>& t,
+                      const AdamCoeffs<float>& c,
+                      bool amsgrad,
+                      int64_t b,
+                      int64_t e) {
+  bool fast = HasAvx2Fma() && t.master_param == nullptr;
+  return fast ? AdamRangeAvx2(t, c, amsgrad, b, e) : b;
+}
+
+int64_t MomentumRangeFast(const MomentumTensors<float, float>& t,
+                          const MomentumCoeffs<float>& c,
+                          bool use_nesterov,
+                          int64_t b,
+                          int64_t e) {
+  bool fast = HasAvx2Fma() && t.master_param == nullptr;
+  return fast ? MomentumRangeAvx2(t, c, use_nesterov, b, e) : b;
+}
+#endif
+
+}  // namespace
+
+double ScalarTensorValue(const phi::DenseTensor& x) {
+  double value;
+  CastData(x.data<uint8_t>(), x.dtype(), &value, phi::DataType::FLOAT64, 1);
+  return value;
+}
+
+void SetScalarTensor(const phi::Context& dev_ctx,
+                     double value,
+                     phi::DataType dtype,
+                     phi::DenseTensor* out) {
+  void* out_data = dev_ctx.Alloc(out, dtype);
+  CastData(&value, phi::DataType::FLOAT64, out_data, dtype, 1);
+}
+
+template <typename T, typename MT>
+void AdamUpdate(const AdamConfig& config,
+                const std::vector<AdamTensors<T, MT>>& tensors) {
+  using CT = ComputeType<MT>;
+  ForEachTensorRange(
+      tensors, [&](const AdamTensors<T, MT>& t, int64_t b, int64_t e) {
+        AdamCoeffs<CT> coeffs(config, t.lr, t.beta1_pow, t.beta2_pow);
+        b = AdamRangeFast(t, coeffs, config.amsgrad, b, e);
+        AdamRange(t, coeffs, config.amsgrad, b, e);
+      });
+}
+
+template <typename T, typename MT>
+void MomentumUpdate(const MomentumConfig& config,
+                    const std::vector<MomentumTensors<T, MT>>& tensors) {
+  using CT = ComputeType<MT>;
+  ForEachTensorRange(
+      tensors, [&](const MomentumTensors<T, MT>& t, int64_t b, int64_t e) {
+        MomentumCoeffs<CT> coeffs(config, t.lr, t.l2_decay);
+        b = MomentumRangeFast(t, coeffs, config.use_nesterov, b, e);
+        MomentumRange(t, coeffs, config.use_nesterov, b, e);
+      });
+}
+
+#define INSTANTIATE_OPTIMIZER(T, MT)                                       \
+  template void AdamUpdate<T, MT>(const AdamConfig&,                       \
+                                  const std::vector<AdamTensors<T, MT>>&); \
+  template void MomentumUpdate<T, MT>(                                     \
+      const MomentumConfig&, const std::vector<MomentumTensors<T, MT>>&);
+
+INSTANTIATE_OPTIMIZER(float, float)
+INSTANTIATE_OPTIMIZER(double, double)
+INSTANTIATE_OPTIMIZER(phi::dtype::float16, phi::dtype::float16)
+INSTANTIATE_OPTIMIZER(phi::dtype::float16, float)
+INSTANTIATE_OPTIMIZER(phi::dtype::bfloat16, phi::dtype::bfloat16)
+INSTANTIATE_OPTIMIZER(phi::dtype::bfloat16, float)
+
+}  // namespace custom_kernel
@@ -0,0 +1,103 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+#include <vector>
+
+#include "kernels/funcs/mp_type_trait.h"
+#include "paddle/phi/capi/all.h"
+
+namespace custom_kernel {
+
+// Value of a one element floating point tensor such as a learning rate or
+// a beta power.
+double ScalarTensorValue(const phi::DenseTensor& x);
+
+// Stores `value` in the one element tensor `out` of type `dtype`.
+void SetScalarTensor(const phi::Context& dev_ctx,
+                     double value,
+                     phi::DataType dtype,
+                     phi::DenseTensor* out);
+
+// Optimizer state is held in MT: float for float16 and bfloat16 parameters
+// with fp32 accumulators, the parameter type T otherwise. Parameters trained
+// with master weights read and update `master_param`, and write `param_out`
+// as their rounding to T. Without them both master pointers are null.
+// Outputs may alias the matching inputs.
+
+// One tensor of an Adam or AdamW step.
+template <typename T, typename MT>
+struct AdamTensors {
+  int64_t numel;
+  const T* grad;
+  const T* param;
+  const MT* master_param;
+  const MT* moment1;
+  const MT* moment2;
+  const MT* moment2_max;  // amsgrad only
+  T* param_out;
+  MT* master_param_out;
+  MT* moment1_out;
+  MT* moment2_out;
+  MT* moment2_max_out;  // amsgrad only
+  double lr;
+  double beta1_pow;
+  double beta2_pow;
+};
+
+struct AdamConfig {
+  double beta1;
+  double beta2;
+  double epsilon;
+  double weight_decay;  // decoupled AdamW decay, 0 for Adam
+  bool amsgrad;
+};
+
+// One tensor of a momentum step.
+template <typename T, typename MT>
+struct MomentumTensors {
+  int64_t numel;
+  const T* grad;
+  const T* param;
+  const MT* master_param;
+  const MT* velocity;
+  T* param_out;
+  MT* master_param_out;
+  MT* velocity_out;
+  double lr;
+  double l2_decay;  // "l2_decay" regularization coefficient, 0 for none
+};
+
+struct MomentumConfig {
+  double mu;
+  double rescale_grad;
+  bool use_nesterov;
+};
+
+// Apply one step to all `tensors` in a single pass. The elements of every
+// tensor are laid end to end and split into chunks over the intra-op
+// thread pool, so many small parameters update as one large one. Updates
+// are computed in float, or double for double parameters, and the float
+// case runs eight lanes at a time with AVX2 when the CPU supports it.
+template <typename T, typename MT>
+void AdamUpdate(const AdamConfig& config,
+                const std::vector<AdamTensors<T, MT>>& tensors);
+
+template <typename T, typename MT>
+void MomentumUpdate(const MomentumConfig& config,
+                    const std::vector<MomentumTensors<T, MT>>& tensors);
+
+}  // namespace custom_kernel
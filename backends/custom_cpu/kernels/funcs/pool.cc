@@ -0,0 +1,244 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/pool.h"
+
+#include <algorithm>
+#include <limits>
+#include <vector>
+
+namespace custom_kernel {
+
+namespace {
+
+// Input range [begin[o], end[o]) pooled into output o along one dim, and
+// the length of the window clipped to the padded input, which averages
+// that include the padding divide by.
+struct PoolWindows {
+  std::vector<int64_t> begin;
+  std::vector<int64_t> end;
+  std::vector<int64_t> padded;
+};
+
+PoolWindows MakePoolWindows(int64_t in,
+                            int64_t out,
+                            int64_t kernel,
+                            int64_t stride,
+                            int64_t pad,
+                            bool adaptive) {
+  PoolWindows windows;
+  windows.begin.resize(out);
+  windows.end.resize(out);
+  windows.padded.resize(out);
+  for (int64_t o = 0; o < out; ++o) {
+    if (adaptive) {
+      windows.begin[o] = o * in / out;
+      windows.end[o] = ((o + 1) * in + out - 1) / out;
+      windows.padded[o] = windows.end[o] - windows.begin[o];
+    } else {
+      int64_t begin = o * stride - pad;
+      windows.begin[o] = std::max<int64_t>(begin, 0);
+      windows.end[o] = std::min(begin + kernel, in);
+      windows.padded[o] = std::min(begin + kernel, in + pad) - begin;
+    }
+  }
+  return windows;
+}
+
+// Geometry shared by the forward and backward passes.
+struct PoolPlan {
+  PoolWindows rows;
+  PoolWindows cols;
+  ImageStrides in;
+  ImageStrides out;
+
+  PoolPlan(const Conv2dShape& s, bool adaptive)
+      : rows(MakePoolWindows(
+            s.in_h, s.out_h, s.kernel_h, s.stride_h, s.pad_top, adaptive)),
+        cols(MakePoolWindows(
+            s.in_w, s.out_w, s.kernel_w, s.stride_w, s.pad_left, adaptive)),
+        in(MakeImageStrides(s.channels_last, s.in_channels, s.in_h, s.in_w)),
+        out(MakeImageStrides(
+            s.channels_last, s.in_channels, s.out_h, s.out_w)) {}
+
+  // Divisor of the average of window (oh, ow).
+  int64_t AvgDivisor(int64_t oh, int64_t ow, bool exclusive) const {
+    if (exclusive) {
+      return (rows.end[oh] - rows.begin[oh]) * (cols.end[ow] - cols.begin[ow]);
+    }
+    return rows.padded[oh] * cols.padded[ow];
+  }
+};
+
+}  // namespace
+
+template <typename T>
+void Pool2dForward(const Conv2dShape& s,
+                   PoolType type,
+                   bool exclusive,
+                   bool adaptive,
+                   const T* x,
+                   T* out) {
+  const PoolPlan plan(s, adaptive);
+  const bool use_max = type == PoolType::kMax;
+  const T init = use_max ? std::numeric_limits<T>::lowest() : 0;
+  auto divisor = [&](int64_t oh, int64_t ow) {
+    return static_cast<T>(plan.AvgDivisor(oh, ow, exclusive || adaptive));
+  };
+  ForEachImageChannels(
+      s.batch,
+      s.in_channels,
+      s.out_h * s.out_w * s.kernel_h * s.kernel_w,
+      [&](int64_t n, int64_t c_begin, int64_t c_end) {
+        const T* src = x + n * plan.in.n;
+        T* dst = out + n * plan.out.n;
+        if (s.channels_last) {
+          std::vector<T> acc(c_end - c_begin);
+          for (int64_t oh = 0; oh < s.out_h; ++oh) {
+            for (int64_t ow = 0; ow < s.out_w; ++ow) {
+              std::fill(acc.begin(), acc.end(), init);
+              for (auto h = plan.rows.begin[oh]; h < plan.rows.end[oh]; ++h) {
+                for (auto w = plan.cols.begin[ow]; w < plan.cols.end[ow]; ++w) {
+                  const T* pixel =
+                      src + h * plan.in.h + w * plan.in.w + c_begin;
+                  for (int64_t c = 0; c < c_end - c_begin; ++c) {
+                    acc[c] = use_max ? std::max(acc[c], pixel[c])
+                                     : acc[c] + pixel[c];
+                  }
+                }
+              }
+              T* o = dst + oh * plan.out.h + ow * plan.out.w + c_begin;
+              const T d = use_max ? static_cast<T>(1) : divisor(oh, ow);
+              for (int64_t c = 0; c < c_end - c_begin; ++c) {
+                o[c] = acc[c] / d;
+              }
+            }
+          }
+          return;
+        }
+        for (auto c = c_begin; c < c_end; ++c) {
+          const T* plane = src + c * plan.in.c;
+          for (int64_t oh = 0; oh < s.out_h; ++oh) {
+            for (int64_t ow = 0; ow < s.out_w; ++ow) {
+              T acc = init;
+              for (auto h = plan.rows.begin[oh]; h < plan.rows.end[oh]; ++h) {
+                const T* row = plane + h * s.in_w;
+                for (auto w = plan.cols.begin[ow]; w < plan.cols.end[ow]; ++w) {
+                  acc = use_max ? std::max(acc, row[w]) : acc + row[w];
+                }
+              }
+              dst[c * plan.out.c + oh * s.out_w + ow] =
+                  use_max ? acc : acc / divisor(oh, ow);
+            }
+          }
+        }
+      });
+}
+
+template <typename T>
+void Pool2dBackward(const Conv2dShape& s,
+                    PoolType type,
+                    bool exclusive,
+                    bool adaptive,
+                    const T* x,
+                    const T* out,
+                    const T* out_grad,
+                    T* x_grad) {
+  const PoolPlan plan(s, adaptive);
+  const bool use_max = type == PoolType::kMax;
+  auto scale = [&](int64_t oh, int64_t ow) {
+    return static_cast<T>(1) /
+           static_cast<T>(plan.AvgDivisor(oh, ow, exclusive || adaptive));
+  };
+  // Adds g to the gradient of the first element of window (oh, ow) of one
+  // image channel equal to y.
+  auto route_max =
+      [&](const T* image, T* grad, int64_t oh, int64_t ow, T y, T g) {
+        for (auto h = plan.rows.begin[oh]; h < plan.rows.end[oh]; ++h) {
+          for (auto w = plan.cols.begin[ow]; w < plan.cols.end[ow]; ++w) {
+            int64_t i = h * plan.in.h + w * plan.in.w;
+            if (image[i] == y) {
+              grad[i] += g;
+              return;
+            }
+          }
+        }
+      };
+  ForEachImageChannels(
+      s.batch,
+      s.in_channels,
+      s.out_h * s.out_w * s.kernel_h * s.kernel_w,
+      [&](int64_t n, int64_t c_begin, int64_t c_end) {
+        const T* image = x + n * plan.in.n;
+        const T* y = out + n * plan.out.n;
+        const T* dy = out_grad + n * plan.out.n;
+        T* dx = x_grad + n * plan.in.n;
+        if (s.channels_last) {
+          for (int64_t i = 0; i < s.in_h * s.in_w; ++i) {
+            std::fill(dx + i * s.in_channels + c_begin,
+                      dx + i * s.in_channels + c_end,
+                      static_cast<T>(0));
+          }
+        } else {
+          std::fill(dx + c_begin * plan.in.c,
+                    dx + c_end * plan.in.c,
+                    static_cast<T>(0));
+        }
+        for (int64_t oh = 0; oh < s.out_h; ++oh) {
+          for (int64_t ow = 0; ow < s.out_w; ++ow) {
+            int64_t o = oh * plan.out.h + ow * plan.out.w;
+            if (use_max) {
+              for (auto c = c_begin; c < c_end; ++c) {
+                int64_t oc = o + c * plan.out.c;
+                route_max(image + c * plan.in.c,
+                          dx + c * plan.in.c,
+                          oh,
+                          ow,
+                          y[oc],
+                          dy[oc]);
+              }
+              continue;
+            }
+            const T k = scale(oh, ow);
+            for (auto h = plan.rows.begin[oh]; h < plan.rows.end[oh]; ++h) {
+              for (auto w = plan.cols.begin[ow]; w < plan.cols.end[ow]; ++w) {
+                int64_t i = h * plan.in.h + w * plan.in.w;
+                for (auto c = c_begin; c < c_end; ++c) {
+                  dx[i + c * plan.in.c] += dy[o + c * plan.out.c] * k;
+                }
+              }
+            }
+          }
+        }
+      });
+}
+
+#define INSTANTIATE_POOL(T)                                    \
+  template void Pool2dForward<T>(                              \
+      const Conv2dShape&, PoolType, bool, bool, const T*, T*); \
+  template void Pool2dBackward<T>(const Conv2dShape&,          \
+                                  PoolType,                    \
+                                  bool,                        \
+                                  bool,                        \
+                                  const T*,                    \
+                                  const T*,                    \
+                                  const T*,                    \
+                                  T*);
+
+INSTANTIATE_POOL(float)
+INSTANTIATE_POOL(double)
+
+#undef INSTANTIATE_POOL
+
+}  // namespace custom_kernel
@@ -0,0 +1,55 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+
+#include "kernels/funcs/conv.h"
+
+namespace custom_kernel {
+
+enum class PoolType {
+  kMax,
+  kAvg,
+};
+
+// 2-D max or average pooling of x into out over the windows of `shape`,
+// which has no dilation and one group. Adaptive pooling splits the input
+// evenly into the output size instead, as phi does. Average pooling
+// divides by the window clipped to the image when `exclusive` or
+// `adaptive` is set, to the padded image otherwise. Work is split over
+// runs of image channels as for depthwise convolution, NHWC images
+// vectorising over the channels. Implemented for float and double.
+template <typename T>
+void Pool2dForward(const Conv2dShape& shape,
+                   PoolType type,
+                   bool exclusive,
+                   bool adaptive,
+                   const T* x,
+                   T* out);
+
+// Gradient of Pool2dForward. Max pooling routes every output gradient to
+// the first element of its window equal to the output, as phi does.
+template <typename T>
+void Pool2dBackward(const Conv2dShape& shape,
+                    PoolType type,
+                    bool exclusive,
+                    bool adaptive,
+                    const T* x,
+                    const T* out,
+                    const T* out_grad,
+                    T* x_grad);
+
+}  // namespace custom_kernel
@@ -0,0 +1,137 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/random.h"
+
+#include <cmath>
+
+namespace custom_kernel {
+
+namespace {
+
+constexpr uint32_t kPhiloxM0 = 0xD2511F53;
+constexpr uint32_t kPhiloxM1 = 0xCD9E8D57;
+constexpr uint32_t kPhiloxW0 = 0x9E3779B9;
+constexpr uint32_t kPhiloxW1 = 0xBB67AE85;
+constexpr int kPhiloxRounds = 10;
+
+// Blocks computed together. The rounds are written lane by lane over
+// separate counter words so the compiler vectorises the 32x32->64 bit
+// multiplies across blocks.
+constexpr int kPhiloxBatch = 16;
+
+// Philox4x32-10 of the counters first_block, first_block + 1, ... with
+// `key`, written as four values per block.
+void PhiloxBlocks(uint64_t key,
+                  uint64_t first_block,
+                  int blocks,
+                  uint32_t* out) {
+  uint32_t c0[kPhiloxBatch], c1[kPhiloxBatch];
+  uint32_t c2[kPhiloxBatch], c3[kPhiloxBatch];
+  for (int j = 0; j < kPhiloxBatch; ++j) {
+    uint64_t counter = first_block + j;
+    c0[j] = static_cast<uint32_t>(counter);
+    c1[j] = static_cast<uint32_t>(counter >> 32);
+    c2[j] = 0;
+    c3[j] = 0;
+  }
+  uint32_t k0 = static_cast<uint32_t>(key);
+  uint32_t k1 = static_cast<uint32_t>(key >> 32);
+  for (int r = 0; r < kPhiloxRounds; ++r) {
+    for (int j = 0; j < kPhiloxBatch; ++j) {
+      uint64_t p0 = static_cast<uint64_t>(kPhiloxM0) * c0[j];
+      uint64_t p1 = static_cast<uint64_t>(kPhiloxM1) * c2[j];
+      c0[j] = static_cast<uint32_t>(p1 >> 32) ^ c1[j] ^ k0;
+      c1[j] = static_cast<uint32_t>(p1);
+      c2[j] = static_cast<uint32_t>(p0 >> 32) ^ c3[j] ^ k1;
+      c3[j] = static_cast<uint32_t>(p0);
+    }
+    k0 += kPhiloxW0;
+    k1 += kPhiloxW1;
+  }
+  for (int j = 0; j < blocks; ++j) {
+    out[4 * j] = c0[j];
+    out[4 * j + 1] = c1[j];
+    out[4 * j + 2] = c2[j];
+    out[4 * j + 3] = c3[j];
+  }
+}
+
+}  // namespace
+
+uint64_t PhiloxKey(const phi::Context& dev_ctx, int seed) {
+  return seed != 0 ? static_cast<uint32_t>(seed) : dev_ctx.random();
+}
+
+void PhiloxFill(uint64_t key, int64_t first, int64_t n, uint32_t* out) {
+  uint32_t batch[4 * kPhiloxBatch];
+  int64_t i = 0;
+  while (i < n) {
+    int64_t pos = first + i;
+    int lane = pos % 4;
+    uint64_t block = pos / 4;
+    if (lane == 0 && n - i >= 4 * kPhiloxBatch) {
+      PhiloxBlocks(key, block, kPhiloxBatch, out + i);
+      i += 4 * kPhiloxBatch;
+      continue;
+    }
+    // Unaligned head or short tail.
+    PhiloxBlocks(key, block, kPhiloxBatch, batch);
+    int64_t len = std::min<int64_t>(4 * kPhiloxBatch - lane, n - i);
+    std::copy(batch + lane, batch + lane + len, out + i);
+    i += len;
+  }
+}
+
+template <typename T>
+void UniformRandom(uint64_t key, T min, T max, int64_t numel, T* out) {
+  constexpr int kWords = RandomWords<T>();
+  const T range = max - min;
+  ForEachRandomChunk(
+      key, numel, kWords, [&](int64_t b, int64_t e, const uint32_t* bits) {
+        for (auto i = b; i < e; ++i) {
+          out[i] = min + range * UniformFromBits<T>(bits + (i - b) * kWords);
+        }
+      });
+}
+
+template <typename T>
+void GaussianRandom(uint64_t key, T mean, T std, int64_t numel, T* out) {
+  constexpr int kWords = RandomWords<T>();
+  constexpr T kTwoPi = static_cast<T>(2 * M_PI);
+  ForEachRandomChunk(
+      key, numel, kWords, [&](int64_t b, int64_t e, const uint32_t* bits) {
+        for (auto i = b; i < e; i += 2) {
+          const uint32_t* pair = bits + (i - b) * kWords;
+          // 1 - u lies in (0, 1], so the log stays finite.
+          T u1 = static_cast<T>(1) - UniformFromBits<T>(pair);
+          T u2 = UniformFromBits<T>(pair + kWords);
+          T radius = std * std::sqrt(static_cast<T>(-2) * std::log(u1));
+          T theta = kTwoPi * u2;
+          out[i] = mean + radius * std::cos(theta);
+          if (i + 1 < e) {
+            out[i + 1] = mean + radius * std::sin(theta);
+          }
+        }
+      });
+}
+
+#define INSTANTIATE_RANDOM(T)                                  \
+  template void UniformRandom<T>(uint64_t, T, T, int64_t, T*); \
+  template void GaussianRandom<T>(uint64_t, T, T, int64_t, T*);
+
+INSTANTIATE_RANDOM(float)
+INSTANTIATE_RANDOM(double)
+
+}  // namespace custom_kernel
@@ -0,0 +1,89 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <algorithm>
+#include <cstdint>
+#include <vector>
+
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+// Random numbers come from Philox4x32-10, a counter-based generator: value
+// i of a stream is a pure function of (key, i). Any range of the stream can
+// be produced independently, so a kernel splits its output over threads and
+// still writes the same numbers for any thread count.
+
+// The key of a kernel's stream. A nonzero seed always gives the same stream,
+// seed 0 draws a fresh key from the device generator so successive calls
+// differ and follow paddle.seed.
+uint64_t PhiloxKey(const phi::Context& dev_ctx, int seed);
+
+// Writes values [first, first + n) of the stream of `key` to `out`.
+void PhiloxFill(uint64_t key, int64_t first, int64_t n, uint32_t* out);
+
+// 32-bit values drawn per element of T.
+template <typename T>
+constexpr int RandomWords() {
+  return sizeof(T) > sizeof(uint32_t) ? 2 : 1;
+}
+
+// Uniform in [0, 1) from the first RandomWords<T>() values of `bits`, with
+// the full mantissa of T.
+template <typename T>
+inline T UniformFromBits(const uint32_t* bits) {
+  return static_cast<T>(bits[0] >> 8) * (1.0f / (1 << 24));
+}
+
+template <>
+inline double UniformFromBits<double>(const uint32_t* bits) {
+  uint64_t x = (static_cast<uint64_t>(bits[0]) << 32) | bits[1];
+  return static_cast<double>(x >> 11) * (1.0 / (1ULL << 53));
+}
+
+constexpr int64_t kRandomChunk = 4096;
+
+// Calls fn(begin, end, bits) for consecutive chunks [begin, end) of
+// [0, numel) over the intra-op thread pool. `bits` holds the values
+// numbered from begin * words of the stream, `words` per element, and is
+// padded to an even number of elements so values can be used in pairs.
+template <typename Fn>
+void ForEachRandomChunk(uint64_t key, int64_t numel, int words, const Fn& fn) {
+  const int64_t chunks = (numel + kRandomChunk - 1) / kRandomChunk;
+  auto grain_size = custom_cpu::GrainSize(kRandomChunk);
+  custom_cpu::ParallelFor(0, chunks, grain_size, [&](int64_t b, int64_t e) {
+    std::vector<uint32_t> bits(kRandomChunk * words);
+    for (auto c = b; c < e; ++c) {
+      int64_t begin = c * kRandomChunk;
+      int64_t end = std::min(begin + kRandomChunk, numel);
+      int64_t padded = (end - begin + 1) / 2 * 2;
+      PhiloxFill(key, begin * words, padded * words, bits.data());
+      fn(begin, end, bits.data());
+    }
+  });
+}
+
+// Fills `out` with `numel` samples of U[min, max).
+template <typename T>
+void UniformRandom(uint64_t key, T min, T max, int64_t numel, T* out);
+
+// Fills `out` with `numel` samples of N(mean, std^2), drawn in pairs by the
+// Box-Muller transform.
+template <typename T>
+void GaussianRandom(uint64_t key, T mean, T std, int64_t numel, T* out);
+
+}  // namespace custom_kernel
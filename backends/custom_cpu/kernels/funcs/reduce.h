@@ -0,0 +1,420 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <algorithm>
+#include <cstdint>
+#include <limits>
+#include <vector>
+
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+// Reduction ops for ReduceDims. kCompensated ops are sums, whose partial
+// results are combined with Kahan summation.
+template <typename T>
+struct SumOp {
+  static constexpr bool kCompensated = true;
+  T Identity() const { return static_cast<T>(0); }
+  T operator()(T a, T b) const { return a + b; }
+  T Finalize(T acc) const { return acc; }
+};
+
+template <typename T>
+struct MeanOp : public SumOp<T> {
+  explicit MeanOp(int64_t count) : count(count) {}
+  T Finalize(T acc) const { return acc / static_cast<T>(count); }
+
+  int64_t count;
+};
+
+template <typename T>
+struct MinOp {
+  static constexpr bool kCompensated = false;
+  T Identity() const { return std::numeric_limits<T>::max(); }
+  T operator()(T a, T b) const { return std::min(a, b); }
+  T Finalize(T acc) const { return acc; }
+};
+
+template <typename T>
+struct MaxOp {
+  static constexpr bool kCompensated = false;
+  T Identity() const { return std::numeric_limits<T>::lowest(); }
+  T operator()(T a, T b) const { return std::max(a, b); }
+  T Finalize(T acc) const { return acc; }
+};
+
+namespace detail {
+
+// Contiguous rows up to this length are reduced directly, longer ones are
+// halved first so the rounding error of a sum grows with log(n).
+constexpr int64_t kPairwiseBlock = 128;
+// Independent accumulators of the direct loop, wide enough to vectorise.
+constexpr int kLanes = 8;
+// Output columns reduced together when the innermost dim is kept.
+constexpr int64_t kColumnBlock = 256;
+
+// Kept and reduced dims of a contiguous x, size 1 dims dropped and
+// neighbours of the same kind merged, with their strides in x.
+struct ReduceLayout {
+  std::vector<int64_t> kept_dims;
+  std::vector<int64_t> kept_strides;
+  std::vector<int64_t> reduced_dims;
+  std::vector<int64_t> reduced_strides;
+  // Whether the innermost dim of x is reduced, making every reduced row
+  // contiguous. Otherwise the innermost dim is kept and contiguous in both
+  // x and out.
+  bool inner_reduced;
+
+  ReduceLayout(const std::vector<int64_t>& x_dims,
+               const std::vector<int64_t>& reduce_dims) {
+    int rank = x_dims.size();
+    std::vector<bool> reduced(rank, false);
+    for (auto d : reduce_dims) {
+      reduced[d] = true;
+    }
+    int64_t stride = 1;
+    int last_kind = -1;
+    // Walk from the innermost dim, merging runs of the same kind.
+    for (int i = rank - 1; i >= 0; --i) {
+      int64_t dim_stride = stride;
+      stride *= x_dims[i];
+      if (x_dims[i] == 1) {
+        continue;
+      }
+      auto& dims = reduced[i] ? reduced_dims : kept_dims;
+      auto& strides = reduced[i] ? reduced_strides : kept_strides;
+      if (last_kind == static_cast<int>(reduced[i])) {
+        dims.back() *= x_dims[i];
+      } else {
+        dims.push_back(x_dims[i]);
+        strides.push_back(dim_stride);
+      }
+      if (last_kind == -1) {
+        inner_reduced = reduced[i];
+      }
+      last_kind = reduced[i];
+    }
+    if (last_kind == -1) {
+      inner_reduced = false;
+    }
+    std::reverse(kept_dims.begin(), kept_dims.end());
+    std::reverse(kept_strides.begin(), kept_strides.end());
+    std::reverse(reduced_dims.begin(), reduced_dims.end());
+    std::reverse(reduced_strides.begin(), reduced_strides.end());
+    if (kept_dims.empty() && !inner_reduced) {
+      kept_dims.push_back(1);
+      kept_strides.push_back(1);
+    }
+  }
+
+  // Offset in x of element `index` of the given dims, in row-major order.
+  static int64_t Offset(const std::vector<int64_t>& dims,
+                        const std::vector<int64_t>& strides,
+                        int64_t index,
+                        int ndim) {
+    int64_t offset = 0;
+    for (int j = ndim - 1; j >= 0; --j) {
+      offset += index % dims[j] * strides[j];
+      index /= dims[j];
+    }
+    return offset;
+  }
+};
+
+// Odometer over the first `ndim` of `dims`, tracking the offset in x.
+class StridedIndex {
+ public:
+  StridedIndex(const std::vector<int64_t>& dims,
+               const std::vector<int64_t>& strides,
+               int ndim,
+               int64_t start)
+      : dims_(dims), strides_(strides), index_(ndim, 0), offset_(0) {
+    for (int j = ndim - 1; j >= 0; --j) {
+      index_[j] = start % dims[j];
+      start /= dims[j];
+      offset_ += index_[j] * strides[j];
+    }
+  }
+
+  int64_t offset() const { return offset_; }
+
+  void Next() {
+    for (int j = static_cast<int>(index_.size()) - 1; j >= 0; --j) {
+      offset_ += strides_[j];
+      if (++index_[j] < dims_[j]) {
+        return;
+      }
+      offset_ -= dims_[j] * strides_[j];
+      index_[j] = 0;
+    }
+  }
+
+ private:
+  const std::vector<int64_t>& dims_;
+  const std::vector<int64_t>& strides_;
+  std::vector<int64_t> index_;
+  int64_t offset_;
+};
+
+template <typename T, typename Op>
+inline void Accumulate(const Op& op, T value, T* acc, T* comp) {
+  if (Op::kCompensated) {
+    T y = value - *comp;
+    T t = *acc + y;
+    *comp = (t - *acc) - y;
+    *acc = t;
+  } else {
+    *acc = op(*acc, value);
+  }
+}
+
+// Reduces n contiguous elements pairwise.
+template <typename T, typename Op>
+T ReduceRow(const T* x, int64_t n, const Op& op) {
+  if (n > kPairwiseBlock) {
+    int64_t half = n / 2 / kLanes * kLanes;
+    return op(ReduceRow(x, half, op), ReduceRow(x + half, n - half, op));
+  }
+  T lanes[kLanes];
+  std::fill(lanes, lanes + kLanes, op.Identity());
+  int64_t i = 0;
+  for (; i + kLanes <= n; i += kLanes) {
+    for (int l = 0; l < kLanes; ++l) {
+      lanes[l] = op(lanes[l], x[i + l]);
+    }
+  }
+  for (; i < n; ++i) {
+    lanes[0] = op(lanes[0], x[i]);
+  }
+  for (int width = kLanes / 2; width > 0; width /= 2) {
+    for (int l = 0; l < width; ++l) {
+      lanes[l] = op(lanes[l], lanes[l + width]);
+    }
+  }
+  return lanes[0];
+}
+
+// Reduces elements [b, e) of the reduced index space of the output at
+// `offset` when the innermost dim is reduced.
+template <typename T, typename Op>
+T ReduceRows(const T* x,
+             const ReduceLayout& layout,
+             int64_t offset,
+             int64_t b,
+             int64_t e,
+             const Op& op) {
+  int64_t row = layout.reduced_dims.back();
+  int outer_ndim = layout.reduced_dims.size() - 1;
+  StridedIndex outer(
+      layout.reduced_dims, layout.reduced_strides, outer_ndim, b / row);
+  T acc = op.Identity();
+  T comp = static_cast<T>(0);
+  int64_t col = b % row;
+  for (auto r = b; r < e;) {
+    int64_t n = std::min(row - col, e - r);
+    Accumulate(
+        op, ReduceRow(x + offset + outer.offset() + col, n, op), &acc, &comp);
+    r += n;
+    col = 0;
+    outer.Next();
+  }
+  return acc;
+}
+
+// Accumulates rows [b, e) of the reduced index space into the columns
+// [0, cols) of acc, x pointing at the first column, when the innermost dim
+// is kept.
+template <typename T, typename Op>
+void ReduceColumns(const T* x,
+                   const ReduceLayout& layout,
+                   int64_t cols,
+                   int64_t b,
+                   int64_t e,
+                   const Op& op,
+                   T* acc,
+                   T* comp) {
+  StridedIndex reduced(layout.reduced_dims,
+                       layout.reduced_strides,
+                       layout.reduced_dims.size(),
+                       b);
+  for (auto r = b; r < e; ++r) {
+    const T* row = x + reduced.offset();
+    if (Op::kCompensated) {
+      for (int64_t c = 0; c < cols; ++c) {
+        T y = row[c] - comp[c];
+        T t = acc[c] + y;
+        comp[c] = (t - acc[c]) - y;
+        acc[c] = t;
+      }
+    } else {
+      for (int64_t c = 0; c < cols; ++c) {
+        acc[c] = op(acc[c], row[c]);
+      }
+    }
+    reduced.Next();
+  }
+}
+
+}  // namespace detail
+
+// Reduces the contiguous `x` of shape `x_dims` over `reduce_dims` with `op`,
+// writing the kept dims in order to `out`.
+//
+// Dims are merged into alternating kept and reduced groups. When the
+// innermost group is reduced, every output reduces contiguous rows pairwise.
+// When it is kept, blocks of output columns accumulate whole rows at once.
+// Outputs are spread over the intra-op pool, or the reduced elements when
+// there are too few outputs to keep it busy.
+template <typename T, typename Op>
+void ReduceDims(const T* x,
+                const std::vector<int64_t>& x_dims,
+                const std::vector<int64_t>& reduce_dims,
+                const Op& op,
+                T* out) {
+  detail::ReduceLayout layout(x_dims, reduce_dims);
+  int64_t out_numel = 1;
+  for (auto d : layout.kept_dims) {
+    out_numel *= d;
+  }
+  int64_t reduce_numel = 1;
+  for (auto d : layout.reduced_dims) {
+    reduce_numel *= d;
+  }
+  if (out_numel == 0) {
+    return;
+  }
+  if (reduce_numel == 0) {
+    std::fill(out, out + out_numel, op.Finalize(op.Identity()));
+    return;
+  }
+  // Which of the two loops runs must not depend on the number of threads,
+  // they sum in different orders.
+  constexpr int64_t kParallelOutputs = custom_cpu::kMaxReduceChunks;
+  int kept_ndim = layout.kept_dims.size();
+
+  if (layout.inner_reduced) {
+    if (out_numel >= kParallelOutputs ||
+        reduce_numel < custom_cpu::kDefaultGrainSize) {
+      auto grain_size = custom_cpu::GrainSize(reduce_numel);
+      custom_cpu::ParallelFor(
+          0, out_numel, grain_size, [&](int64_t b, int64_t e) {
+            detail::StridedIndex kept(
+                layout.kept_dims, layout.kept_strides, kept_ndim, b);
+            for (auto o = b; o < e; ++o) {
+              out[o] = op.Finalize(detail::ReduceRows(
+                  x, layout, kept.offset(), 0, reduce_numel, op));
+              kept.Next();
+            }
+          });
+      return;
+    }
+    for (int64_t o = 0; o < out_numel; ++o) {
+      auto offset = detail::ReduceLayout::Offset(
+          layout.kept_dims, layout.kept_strides, o, kept_ndim);
+      auto acc = custom_cpu::ParallelReduce(
+          0,
+          reduce_numel,
+          custom_cpu::kDefaultGrainSize,
+          op.Identity(),
+          [&](int64_t b, int64_t e, T) {
+            return detail::ReduceRows(x, layout, offset, b, e, op);
+          },
+          op);
+      out[o] = op.Finalize(acc);
+    }
+    return;
+  }
+
+  int64_t cols = layout.kept_dims.back();
+  int64_t blocks = (cols + detail::kColumnBlock - 1) / detail::kColumnBlock;
+  int64_t tasks = out_numel / cols * blocks;
+  // Task t reduces a block of up to kColumnBlock columns of one output row.
+  auto task_offsets = [&](int64_t task,
+                          int64_t* x_offset,
+                          int64_t* out_offset,
+                          int64_t* width) {
+    int64_t outer = task / blocks;
+    int64_t c0 = task % blocks * detail::kColumnBlock;
+    *x_offset =
+        c0 + detail::ReduceLayout::Offset(
+                 layout.kept_dims, layout.kept_strides, outer, kept_ndim - 1);
+    *out_offset = outer * cols + c0;
+    *width = std::min(detail::kColumnBlock, cols - c0);
+  };
+
+  if (tasks >= kParallelOutputs ||
+      reduce_numel * cols < custom_cpu::kDefaultGrainSize) {
+    auto grain_size = custom_cpu::GrainSize(
+        reduce_numel * std::min(cols, detail::kColumnBlock));
+    custom_cpu::ParallelFor(0, tasks, grain_size, [&](int64_t b, int64_t e) {
+      std::vector<T> acc(detail::kColumnBlock);
+      std::vector<T> comp(detail::kColumnBlock);
+      for (auto task = b; task < e; ++task) {
+        int64_t x_offset, out_offset, width;
+        task_offsets(task, &x_offset, &out_offset, &width);
+        std::fill(acc.begin(), acc.begin() + width, op.Identity());
+        std::fill(comp.begin(), comp.begin() + width, static_cast<T>(0));
+        detail::ReduceColumns(x + x_offset,
+                              layout,
+                              width,
+                              0,
+                              reduce_numel,
+                              op,
+                              acc.data(),
+                              comp.data());
+        for (int64_t c = 0; c < width; ++c) {
+          out[out_offset + c] = op.Finalize(acc[c]);
+        }
+      }
+    });
+    return;
+  }
+
+  // Few and narrow outputs, e.g. a column sum: split the rows instead.
+  for (int64_t task = 0; task < tasks; ++task) {
+    int64_t x_offset, out_offset, width;
+    task_offsets(task, &x_offset, &out_offset, &width);
+    auto acc = custom_cpu::ParallelReduce(
+        0,
+        reduce_numel,
+        custom_cpu::GrainSize(width),
+        std::vector<T>(width, op.Identity()),
+        [&](int64_t b, int64_t e, std::vector<T> partial) {
+          std::vector<T> comp(width, static_cast<T>(0));
+          detail::ReduceColumns(x + x_offset,
+                                layout,
+                                width,
+                                b,
+                                e,
+                                op,
+                                partial.data(),
+                                comp.data());
+          return partial;
+        },
+        [&](std::vector<T> a, const std::vector<T>& b) {
+          for (int64_t c = 0; c < width; ++c) {
+            a[c] = op(a[c], b[c]);
+          }
+          return a;
+        });
+    for (int64_t c = 0; c < width; ++c) {
+      out[out_offset + c] = op.Finalize(acc[c]);
+    }
+  }
+}
+
+}  // namespace custom_kernel
@@ -0,0 +1,320 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/softmax.h"
+
+#include <algorithm>
+#include <cmath>
+#include <limits>
+
+#include "kernels/funcs/cpu_features.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Elements a row is processed by at once, sized for stack scratch buffers.
+constexpr int64_t kBlock = 256;
+
+template <typename T>
+T ValueClip(const T& x) {
+  const T kThreshold = static_cast<T>(-64.);
+  return x < kThreshold ? kThreshold : x;
+}
+
+#if defined(CUSTOM_CPU_AVX2)
+// Cephes style expf: exp(x) = 2^n * exp(r) with |r| <= ln(2) / 2 and exp(r)
+// from a degree 5 polynomial, within 2 ulp over the clamped range.
+CUSTOM_CPU_TARGET_AVX2 void ExpAvx2(const float* x, float* y, int64_t n) {
+  const __m256 max_x = _mm256_set1_ps(88.3762626647949f);
+  const __m256 min_x = _mm256_set1_ps(-87.3365478515625f);
+  const __m256 log2e = _mm256_set1_ps(1.44269504088896341f);
+  const __m256 ln2_hi = _mm256_set1_ps(0.693359375f);
+  const __m256 ln2_lo = _mm256_set1_ps(-2.12194440e-4f);
+  const __m256 p0 = _mm256_set1_ps(1.9875691500E-4f);
+  const __m256 p1 = _mm256_set1_ps(1.3981999507E-3f);
+  const __m256 p2 = _mm256_set1_ps(8.3334519073E-3f);
+  const __m256 p3 = _mm256_set1_ps(4.1665795894E-2f);
+  const __m256 p4 = _mm256_set1_ps(1.6666665459E-1f);
+  const __m256 p5 = _mm256_set1_ps(5.0000001201E-1f);
+  const __m256 one = _mm256_set1_ps(1.f);
+  const __m256 zero = _mm256_setzero_ps();
+  int64_t i = 0;
+  for (; i + 8 <= n; i += 8) {
+    __m256 v = _mm256_loadu_ps(x + i);
+    // exp underflows to 0 below min_x, NaN stays NaN through the compares.
+    __m256 underflow = _mm256_cmp_ps(v, min_x, _CMP_LT_OQ);
+    v = _mm256_min_ps(v, max_x);
+    v = _mm256_max_ps(v, min_x);
+    __m256 fx = _mm256_round_ps(_mm256_mul_ps(v, log2e),
+                                _MM_FROUND_TO_NEAREST_INT | _MM_FROUND_NO_EXC);
+    __m256 r = _mm256_fnmadd_ps(fx, ln2_hi, v);
+    r = _mm256_fnmadd_ps(fx, ln2_lo, r);
+    __m256 p = _mm256_fmadd_ps(p0, r, p1);
+    p = _mm256_fmadd_ps(p, r, p2);
+    p = _mm256_fmadd_ps(p, r, p3);
+    p = _mm256_fmadd_ps(p, r, p4);
+    p = _mm256_fmadd_ps(p, r, p5);
+    __m256 r2 = _mm256_mul_ps(r, r);
+    p = _mm256_fmadd_ps(p, r2, _mm256_add_ps(r, one));
+    __m256i e =
+        _mm256_add_epi32(_mm256_cvtps_epi32(fx), _mm256_set1_epi32(127));
+    __m256 pow2n = _mm256_castsi256_ps(_mm256_slli_epi32(e, 23));
+    p = _mm256_mul_ps(p, pow2n);
+    _mm256_storeu_ps(y + i, _mm256_blendv_ps(p, zero, underflow));
+  }
+  for (; i < n; ++i) {
+    y[i] = std::exp(x[i]);
+  }
+}
+#endif
+
+}  // namespace
+
+template <typename T>
+void Exp(const T* x, T* y, int64_t n) {
+  for (int64_t i = 0; i < n; ++i) {
+    y[i] = std::exp(x[i]);
+  }
+}
+
+template <>
+void Exp<float>(const float* x, float* y, int64_t n) {
+#if defined(CUSTOM_CPU_AVX2)
+  if (HasAvx2Fma()) {
+    ExpAvx2(x, y, n);
+    return;
+  }
+#endif
+  for (int64_t i = 0; i < n; ++i) {
+    y[i] = std::exp(x[i]);
+  }
+}
+
+template <typename T>
+void SoftmaxRowStats(const T* x, int64_t n, T* max, T* sum) {
+  T running_max = -std::numeric_limits<T>::infinity();
+  T running_sum = 0;
+  T buffer[kBlock];
+  for (int64_t b = 0; b < n; b += kBlock) {
+    int64_t len = std::min(kBlock, n - b);
+    T block_max = running_max;
+    for (int64_t i = 0; i < len; ++i) {
+      block_max = std::max(block_max, x[b + i]);
+    }
+    if (block_max > running_max) {
+      if (running_sum != 0) {
+        running_sum *= std::exp(running_max - block_max);
+      }
+      running_max = block_max;
+    }
+    for (int64_t i = 0; i < len; ++i) {
+      buffer[i] = x[b + i] - running_max;
+    }
+    Exp(buffer, buffer, len);
+    // Summing each block on its own keeps the rounding error of long rows
+    // close to that of a pairwise sum.
+    T block_sum = 0;
+    for (int64_t i = 0; i < len; ++i) {
+      block_sum += buffer[i];
+    }
+    running_sum += block_sum;
+  }
+  *max = running_max;
+  *sum = running_sum;
+}
+
+template <typename T>
+void SoftmaxRow(const T* x, int64_t n, T max, T sum, bool log, T* out) {
+  if (log) {
+    T shift = max + std::log(sum);
+    for (int64_t i = 0; i < n; ++i) {
+      out[i] = x[i] - shift;
+    }
+    return;
+  }
+  T scale = static_cast<T>(1) / sum;
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] = ValueClip(x[i] - max);
+  }
+  Exp(out, out, n);
+  for (int64_t i = 0; i < n; ++i) {
+    out[i] *= scale;
+  }
+}
+
+template <typename T>
+void SoftmaxForward(
+    const T* x, int64_t n, int64_t axis_dim, int64_t remain, bool log, T* out) {
+  if (remain == 1) {
+    auto grain_size = custom_cpu::GrainSize(2 * axis_dim);
+    custom_cpu::ParallelFor(0, n, grain_size, [&](int64_t b, int64_t e) {
+      for (auto i = b; i < e; ++i) {
+        T max, sum;
+        const T* x_row = x + i * axis_dim;
+        SoftmaxRowStats(x_row, axis_dim, &max, &sum);
+        SoftmaxRow(x_row, axis_dim, max, sum, log, out + i * axis_dim);
+      }
+    });
+    return;
+  }
+
+  // The axis is strided: normalise blocks of up to kBlock columns together,
+  // each pass over the axis reading contiguous rows of the block.
+  int64_t blocks = (remain + kBlock - 1) / kBlock;
+  auto grain_size = custom_cpu::GrainSize(3 * axis_dim * kBlock);
+  custom_cpu::ParallelFor(0, n * blocks, grain_size, [&](int64_t b, int64_t e) {
+    T max[kBlock];
+    T sum[kBlock];
+    T buffer[kBlock];
+    for (auto task = b; task < e; ++task) {
+      int64_t i = task / blocks;
+      int64_t k0 = task % blocks * kBlock;
+      int64_t width = std::min(kBlock, remain - k0);
+      const T* x_block = x + i * axis_dim * remain + k0;
+      T* out_block = out + i * axis_dim * remain + k0;
+      std::fill(max, max + width, -std::numeric_limits<T>::infinity());
+      std::fill(sum, sum + width, static_cast<T>(0));
+      for (int64_t j = 0; j < axis_dim; ++j) {
+        for (int64_t k = 0; k < width; ++k) {
+          max[k] = std::max(max[k], x_block[j * remain + k]);
+        }
+      }
+      for (int64_t j = 0; j < axis_dim; ++j) {
+        for (int64_t k = 0; k < width; ++k) {
+          buffer[k] = x_block[j * remain + k] - max[k];
+        }
+        Exp(buffer, buffer, width);
+        for (int64_t k = 0; k < width; ++k) {
+          sum[k] += buffer[k];
+        }
+      }
+      for (int64_t j = 0; j < axis_dim; ++j) {
+        const T* x_row = x_block + j * remain;
+        T* out_row = out_block + j * remain;
+        if (log) {
+          for (int64_t k = 0; k < width; ++k) {
+            out_row[k] = x_row[k] - max[k] - std::log(sum[k]);
+          }
+        } else {
+          for (int64_t k = 0; k < width; ++k) {
+            out_row[k] = ValueClip(x_row[k] - max[k]);
+          }
+          Exp(out_row, out_row, width);
+          for (int64_t k = 0; k < width; ++k) {
+            out_row[k] /= sum[k];
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename T>
+void SoftmaxBackward(const T* out,
+                     const T* out_grad,
+                     int64_t n,
+                     int64_t axis_dim,
+                     int64_t remain,
+                     bool log,
+                     T* x_grad) {
+  // softmax:     dx = (dy - sum(dy * y)) * y
+  // log_softmax: dx = dy - exp(y) * sum(dy)
+  if (remain == 1) {
+    auto grain_size = custom_cpu::GrainSize(3 * axis_dim);
+    custom_cpu::ParallelFor(0, n, grain_size, [&](int64_t b, int64_t e) {
+      T buffer[kBlock];
+      for (auto i = b; i < e; ++i) {
+        const T* y = out + i * axis_dim;
+        const T* dy = out_grad + i * axis_dim;
+        T* dx = x_grad + i * axis_dim;
+        T dot = 0;
+        for (int64_t j0 = 0; j0 < axis_dim; j0 += kBlock) {
+          int64_t j1 = std::min(j0 + kBlock, axis_dim);
+          T block_dot = 0;
+          for (auto j = j0; j < j1; ++j) {
+            block_dot += log ? dy[j] : dy[j] * y[j];
+          }
+          dot += block_dot;
+        }
+        for (int64_t j0 = 0; j0 < axis_dim; j0 += kBlock) {
+          int64_t len = std::min(kBlock, axis_dim - j0);
+          if (log) {
+            Exp(y + j0, buffer, len);
+            for (int64_t j = 0; j < len; ++j) {
+              dx[j0 + j] = dy[j0 + j] - buffer[j] * dot;
+            }
+          } else {
+            for (int64_t j = j0; j < j0 + len; ++j) {
+              dx[j] = (dy[j] - dot) * y[j];
+            }
+          }
+        }
+      }
+    });
+    return;
+  }
+
+  int64_t blocks = (remain + kBlock - 1) / kBlock;
+  auto grain_size =
+      custom_cpu::GrainSize(3 * axis_dim * std::min(remain, kBlock));
+  custom_cpu::ParallelFor(0, n * blocks, grain_size, [&](int64_t b, int64_t e) {
+    T dot[kBlock];
+    T buffer[kBlock];
+    for (auto task = b; task < e; ++task) {
+      int64_t i = task / blocks;
+      int64_t k0 = task % blocks * kBlock;
+      int64_t width = std::min(kBlock, remain - k0);
+      int64_t offset = i * axis_dim * remain + k0;
+      std::fill(dot, dot + width, static_cast<T>(0));
+      for (int64_t j = 0; j < axis_dim; ++j) {
+        const T* y = out + offset + j * remain;
+        const T* dy = out_grad + offset + j * remain;
+        for (int64_t k = 0; k < width; ++k) {
+          dot[k] += log ? dy[k] : dy[k] * y[k];
+        }
+      }
+      for (int64_t j = 0; j < axis_dim; ++j) {
+        const T* y = out + offset + j * remain;
+        const T* dy = out_grad + offset + j * remain;
+        T* dx = x_grad + offset + j * remain;
+        if (log) {
+          Exp(y, buffer, width);
+          for (int64_t k = 0; k < width; ++k) {
+            dx[k] = dy[k] - buffer[k] * dot[k];
+          }
+        } else {
+          for (int64_t k = 0; k < width; ++k) {
+            dx[k] = (dy[k] - dot[k]) * y[k];
+          }
+        }
+      }
+    }
+  });
+}
+
+#define INSTANTIATE_SOFTMAX(T)                                    \
+  template void SoftmaxRowStats<T>(const T*, int64_t, T*, T*);    \
+  template void SoftmaxRow<T>(const T*, int64_t, T, T, bool, T*); \
+  template void SoftmaxForward<T>(                                \
+      const T*, int64_t, int64_t, int64_t, bool, T*);             \
+  template void SoftmaxBackward<T>(                               \
+      const T*, const T*, int64_t, int64_t, int64_t, bool, T*);
+
+template void Exp<double>(const double*, double*, int64_t);
+INSTANTIATE_SOFTMAX(float)
+INSTANTIATE_SOFTMAX(double)
+
+}  // namespace custom_kernel
@@ -0,0 +1,53 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+
+namespace custom_kernel {
+
+// y[i] = exp(x[i]) for n elements, vectorised with AVX2 for float when the
+// CPU supports it. x and y may alias.
+template <typename T>
+void Exp(const T* x, T* y, int64_t n);
+
+// Max and sum of exp(x - max) of n contiguous elements, computed in a single
+// pass over x by rescaling the running sum whenever the max grows.
+template <typename T>
+void SoftmaxRowStats(const T* x, int64_t n, T* max, T* sum);
+
+// Softmax, or log-softmax when `log` is set, of n contiguous elements given
+// their SoftmaxRowStats. x and out may alias.
+template <typename T>
+void SoftmaxRow(const T* x, int64_t n, T max, T sum, bool log, T* out);
+
+// Softmax, or log-softmax, of x viewed as [n, axis_dim, remain] along the
+// middle dim. Rows are spread over the intra-op thread pool. Exponents are
+// clipped at -64 as in phi.
+template <typename T>
+void SoftmaxForward(
+    const T* x, int64_t n, int64_t axis_dim, int64_t remain, bool log, T* out);
+
+// Gradient of SoftmaxForward given its output and the output gradient.
+template <typename T>
+void SoftmaxBackward(const T* out,
+                     const T* out_grad,
+                     int64_t n,
+                     int64_t axis_dim,
+                     int64_t remain,
+                     bool log,
+                     T* x_grad);
+
+}  // namespace custom_kernel
@@ -0,0 +1,252 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/sort.h"
+
+#include <algorithm>
+#include <cmath>
+#include <cstring>
+#include <type_traits>
+#include <utility>
+#include <vector>
+
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+constexpr int kRadixBits = 8;
+constexpr int kRadixBuckets = 1 << kRadixBits;
+
+// Rows shorter than this are sorted by comparison, the radix histograms
+// would cost more than the sort itself.
+constexpr int64_t kRadixMinWidth = 256;
+
+// Top-k keeps a heap while k is at most this fraction of the row.
+constexpr int64_t kHeapRatio = 16;
+
+// Unsigned keys ordered like the values they encode, NaN above everything.
+template <typename T, bool kFloat = std::is_floating_point<T>::value>
+struct RadixTraits;
+
+template <typename T>
+struct RadixTraits<T, true> {
+  using Key = typename std::
+      conditional<sizeof(T) == sizeof(uint32_t), uint32_t, uint64_t>::type;
+
+  static Key Encode(T value) {
+    constexpr Key kSign = Key(1) << (sizeof(Key) * 8 - 1);
+    if (std::isnan(value)) {
+      return ~Key(0);
+    }
+    if (value == 0) {
+      value = 0;  // -0.0 sorts as 0.0
+    }
+    Key bits;
+    std::memcpy(&bits, &value, sizeof(bits));
+    return (bits & kSign) ? ~bits : bits | kSign;
+  }
+};
+
+template <typename T>
+struct RadixTraits<T, false> {
+  using Key = typename std::make_unsigned<T>::type;
+
+  static Key Encode(T value) {
+    constexpr Key kSign = Key(1) << (sizeof(Key) * 8 - 1);
+    return static_cast<Key>(value) ^ kSign;
+  }
+};
+
+// LSD radix sort of keys carrying indices. The sorted indices end up in
+// either `indices` or `indices_tmp`, the one holding them is returned.
+template <typename Key>
+int64_t* RadixSort(Key* keys,
+                   int64_t* indices,
+                   int64_t n,
+                   Key* keys_tmp,
+                   int64_t* indices_tmp) {
+  constexpr int kPasses = sizeof(Key) * 8 / kRadixBits;
+  int64_t hist[kPasses][kRadixBuckets] = {};
+  for (int64_t i = 0; i < n; ++i) {
+    Key key = keys[i];
+    for (int p = 0; p < kPasses; ++p) {
+      ++hist[p][(key >> (p * kRadixBits)) & (kRadixBuckets - 1)];
+    }
+  }
+  for (int p = 0; p < kPasses; ++p) {
+    int shift = p * kRadixBits;
+    if (hist[p][(keys[0] >> shift) & (kRadixBuckets - 1)] == n) {
+      continue;  // every key has the same digit
+    }
+    int64_t offsets[kRadixBuckets];
+    int64_t offset = 0;
+    for (int b = 0; b < kRadixBuckets; ++b) {
+      offsets[b] = offset;
+      offset += hist[p][b];
+    }
+    for (int64_t i = 0; i < n; ++i) {
+      auto pos = offsets[(keys[i] >> shift) & (kRadixBuckets - 1)]++;
+      keys_tmp[pos] = keys[i];
+      indices_tmp[pos] = indices[i];
+    }
+    std::swap(keys, keys_tmp);
+    std::swap(indices, indices_tmp);
+  }
+  return indices;
+}
+
+// Selection order of top-k: a ranks before b. Keys are already flipped for
+// the smallest elements, so larger keys always rank first.
+template <typename Key>
+bool RanksBefore(const std::pair<Key, int64_t>& a,
+                 const std::pair<Key, int64_t>& b) {
+  return a.first > b.first || (a.first == b.first && a.second < b.second);
+}
+
+template <typename T>
+void TopKRow(
+    const T* x,
+    int64_t n,
+    int64_t k,
+    bool largest,
+    bool sorted,
+    std::vector<std::pair<typename RadixTraits<T>::Key, int64_t>>* candidates,
+    T* out,
+    int64_t* indices) {
+  using Key = typename RadixTraits<T>::Key;
+  using Candidate = std::pair<Key, int64_t>;
+  auto key_of = [&](int64_t j) {
+    Key key = RadixTraits<T>::Encode(x[j]);
+    return largest ? key : ~key;
+  };
+  auto& c = *candidates;
+  c.clear();
+  if (k * kHeapRatio <= n) {
+    // The heap top is the worst of the k best seen so far, most elements of
+    // a long row are rejected by a single compare against it.
+    for (int64_t j = 0; j < k; ++j) {
+      c.emplace_back(key_of(j), j);
+    }
+    std::make_heap(c.begin(), c.end(), RanksBefore<Key>);
+    for (int64_t j = k; j < n; ++j) {
+      Candidate candidate(key_of(j), j);
+      if (RanksBefore(candidate, c.front())) {
+        std::pop_heap(c.begin(), c.end(), RanksBefore<Key>);
+        c.back() = candidate;
+        std::push_heap(c.begin(), c.end(), RanksBefore<Key>);
+      }
+    }
+    if (sorted) {
+      std::sort_heap(c.begin(), c.end(), RanksBefore<Key>);
+    }
+  } else {
+    for (int64_t j = 0; j < n; ++j) {
+      c.emplace_back(key_of(j), j);
+    }
+    std::nth_element(c.begin(), c.begin() + k - 1, c.end(), RanksBefore<Key>);
+    if (sorted) {
+      std::sort(c.begin(), c.begin() + k - 1, RanksBefore<Key>);
+    }
+  }
+  for (int64_t j = 0; j < k; ++j) {
+    indices[j] = c[j].second;
+    out[j] = x[c[j].second];
+  }
+}
+
+}  // namespace
+
+template <typename T>
+void SortRows(const T* x,
+              int64_t rows,
+              int64_t width,
+              bool descending,
+              T* out,
+              int64_t* indices) {
+  using Key = typename RadixTraits<T>::Key;
+  auto grain_size = custom_cpu::GrainSize(sizeof(T) * width);
+  custom_cpu::ParallelFor(0, rows, grain_size, [&](int64_t b, int64_t e) {
+    std::vector<Key> keys(2 * width);
+    std::vector<int64_t> order(2 * width);
+    for (auto i = b; i < e; ++i) {
+      const T* x_row = x + i * width;
+      Key* row_keys = keys.data();
+      int64_t* row_order = order.data();
+      for (int64_t j = 0; j < width; ++j) {
+        Key key = RadixTraits<T>::Encode(x_row[j]);
+        row_keys[j] = descending ? ~key : key;
+        row_order[j] = j;
+      }
+      if (width < kRadixMinWidth) {
+        std::stable_sort(
+            row_order, row_order + width, [&](int64_t l, int64_t r) {
+              return row_keys[l] < row_keys[r];
+            });
+      } else {
+        row_order = RadixSort(
+            row_keys, row_order, width, row_keys + width, row_order + width);
+      }
+      T* out_row = out + i * width;
+      int64_t* indices_row = indices + i * width;
+      for (int64_t j = 0; j < width; ++j) {
+        indices_row[j] = row_order[j];
+        out_row[j] = x_row[row_order[j]];
+      }
+    }
+  });
+}
+
+template <typename T>
+void TopKRows(const T* x,
+              int64_t rows,
+              int64_t width,
+              int64_t k,
+              bool largest,
+              bool sorted,
+              T* out,
+              int64_t* indices) {
+  using Key = typename RadixTraits<T>::Key;
+  if (k == 0) {
+    return;
+  }
+  auto grain_size = custom_cpu::GrainSize(width);
+  custom_cpu::ParallelFor(0, rows, grain_size, [&](int64_t b, int64_t e) {
+    std::vector<std::pair<Key, int64_t>> candidates;
+    candidates.reserve(k * kHeapRatio <= width ? k : width);
+    for (auto i = b; i < e; ++i) {
+      TopKRow(x + i * width,
+              width,
+              k,
+              largest,
+              sorted,
+              &candidates,
+              out + i * k,
+              indices + i * k);
+    }
+  });
+}
+
+#define INSTANTIATE_SORT(T)                                                  \
+  template void SortRows<T>(const T*, int64_t, int64_t, bool, T*, int64_t*); \
+  template void TopKRows<T>(                                                 \
+      const T*, int64_t, int64_t, int64_t, bool, bool, T*, int64_t*);
+
+INSTANTIATE_SORT(float)
+INSTANTIATE_SORT(double)
+INSTANTIATE_SORT(int32_t)
+INSTANTIATE_SORT(int64_t)
+
+}  // namespace custom_kernel
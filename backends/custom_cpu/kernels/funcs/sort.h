@@ -0,0 +1,53 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+
+namespace custom_kernel {
+
+// Stable sort of `rows` contiguous rows of `width` elements, writing the
+// sorted values to `out` and their positions in the row to `indices`. NaNs
+// order after every number, so they come last ascending and first
+// descending, and -0.0 equals 0.0.
+//
+// Values are mapped to unsigned keys with the same order and sorted by an
+// LSD radix sort on 8-bit digits, skipping digits all keys share. Short rows
+// use a comparison sort on the same keys. Rows are spread over the intra-op
+// thread pool. Implemented for float, double, int32_t and int64_t.
+template <typename T>
+void SortRows(const T* x,
+              int64_t rows,
+              int64_t width,
+              bool descending,
+              T* out,
+              int64_t* indices);
+
+// The k largest, or smallest, elements of every row of `width` elements,
+// with the same NaN ordering as SortRows and ties broken by position. Small
+// k keeps a k element heap while scanning the row, larger k selects with
+// nth_element. Outputs are best first when `sorted` is set and in no
+// particular order otherwise.
+template <typename T>
+void TopKRows(const T* x,
+              int64_t rows,
+              int64_t width,
+              int64_t k,
+              bool largest,
+              bool sorted,
+              T* out,
+              int64_t* indices);
+
+}  // namespace custom_kernel
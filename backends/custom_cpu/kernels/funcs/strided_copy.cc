@@ -0,0 +1,264 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/strided_copy.h"
+
+#include <algorithm>
+#include <cstring>
+#include <numeric>
+
+#include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Side of the square tiles a transpose is copied by, 32 x 32 elements of up
+// to 8 bytes keep both the source and destination tile in L1.
+constexpr int64_t kTile = 32;
+
+struct Element16 {
+  uint64_t data[2];
+};
+
+// One dim of the copy with its strides on both sides.
+struct CopyDim {
+  int64_t size;
+  int64_t src_stride;
+  int64_t dst_stride;
+};
+
+// Drops size 1 dims, orders the rest by decreasing dst stride and merges
+// neighbours that are contiguous on both sides. The result is never empty.
+std::vector<CopyDim> CoalesceDims(const std::vector<int64_t>& dims,
+                                  const std::vector<int64_t>& src_strides,
+                                  const std::vector<int64_t>& dst_strides) {
+  std::vector<CopyDim> sorted;
+  for (size_t i = 0; i < dims.size(); ++i) {
+    if (dims[i] != 1) {
+      sorted.push_back({dims[i], src_strides[i], dst_strides[i]});
+    }
+  }
+  std::stable_sort(
+      sorted.begin(), sorted.end(), [](const CopyDim& a, const CopyDim& b) {
+        return a.dst_stride > b.dst_stride;
+      });
+
+  std::vector<CopyDim> merged;
+  for (auto& dim : sorted) {
+    if (!merged.empty() &&
+        merged.back().src_stride == dim.src_stride * dim.size &&
+        merged.back().dst_stride == dim.dst_stride * dim.size) {
+      merged.back().size *= dim.size;
+      merged.back().src_stride = dim.src_stride;
+      merged.back().dst_stride = dim.dst_stride;
+    } else {
+      merged.push_back(dim);
+    }
+  }
+  if (merged.empty()) {
+    merged.push_back({1, 1, 1});
+  }
+  return merged;
+}
+
+// Calls fn(outer, src_offset, dst_offset) for every index in [b, e) of the
+// first `ndim` dims, walking them with an odometer instead of div/mod.
+template <typename Fn>
+void ForEachOuter(const std::vector<CopyDim>& dims,
+                  int ndim,
+                  int64_t b,
+                  int64_t e,
+                  const Fn& fn) {
+  std::vector<int64_t> index(ndim, 0);
+  int64_t rest = b;
+  int64_t src_offset = 0;
+  int64_t dst_offset = 0;
+  for (int j = ndim - 1; j >= 0; --j) {
+    index[j] = rest % dims[j].size;
+    rest /= dims[j].size;
+    src_offset += index[j] * dims[j].src_stride;
+    dst_offset += index[j] * dims[j].dst_stride;
+  }
+  for (auto outer = b; outer < e; ++outer) {
+    fn(outer, src_offset, dst_offset);
+    for (int j = ndim - 1; j >= 0; --j) {
+      src_offset += dims[j].src_stride;
+      dst_offset += dims[j].dst_stride;
+      if (++index[j] < dims[j].size) {
+        break;
+      }
+      src_offset -= dims[j].size * dims[j].src_stride;
+      dst_offset -= dims[j].size * dims[j].dst_stride;
+      index[j] = 0;
+    }
+  }
+}
+
+int64_t OuterNumel(const std::vector<CopyDim>& dims, int ndim) {
+  int64_t numel = 1;
+  for (int j = 0; j < ndim; ++j) {
+    numel *= dims[j].size;
+  }
+  return numel;
+}
+
+template <typename E>
+void StridedCopyImpl(const E* src, E* dst, std::vector<CopyDim> dims) {
+  int ndim = dims.size();
+  const CopyDim inner = dims.back();
+
+  if (inner.src_stride == 1 && inner.dst_stride == 1) {
+    // Rows contiguous on both sides.
+    int64_t rows = OuterNumel(dims, ndim - 1);
+    if (rows == 1) {
+      auto grain_size = custom_cpu::kDefaultGrainSize;
+      custom_cpu::ParallelFor(
+          0, inner.size, grain_size, [&](int64_t b, int64_t e) {
+            std::memcpy(dst + b, src + b, (e - b) * sizeof(E));
+          });
+      return;
+    }
+    auto grain_size = custom_cpu::GrainSize(inner.size);
+    custom_cpu::ParallelFor(0, rows, grain_size, [&](int64_t b, int64_t e) {
+      ForEachOuter(dims,
+                   ndim - 1,
+                   b,
+                   e,
+                   [&](int64_t, int64_t src_offset, int64_t dst_offset) {
+                     std::memcpy(dst + dst_offset,
+                                 src + src_offset,
+                                 inner.size * sizeof(E));
+                   });
+    });
+    return;
+  }
+
+  auto src_contiguous =
+      std::find_if(dims.begin(), dims.end() - 1, [](const CopyDim& dim) {
+        return dim.src_stride == 1;
+      });
+  if (inner.dst_stride == 1 && src_contiguous != dims.end() - 1) {
+    // A transpose: move the dim contiguous in src next to the inner one and
+    // copy the pair by square tiles, reading and writing whole cache lines.
+    CopyDim rows = *src_contiguous;
+    dims.erase(src_contiguous);
+    dims.insert(dims.end() - 1, rows);
+    int outer_ndim = ndim - 2;
+    int64_t row_tiles = (rows.size + kTile - 1) / kTile;
+    int64_t col_tiles = (inner.size + kTile - 1) / kTile;
+    int64_t tiles = row_tiles * col_tiles;
+    int64_t outer = OuterNumel(dims, outer_ndim);
+    auto grain_size = custom_cpu::GrainSize(kTile * kTile);
+    custom_cpu::ParallelFor(
+        0, outer * tiles, grain_size, [&](int64_t b, int64_t e) {
+          int64_t outer_begin = b / tiles;
+          int64_t outer_end = (e + tiles - 1) / tiles;
+          ForEachOuter(
+              dims,
+              outer_ndim,
+              outer_begin,
+              outer_end,
+              [&](int64_t o, int64_t src_offset, int64_t dst_offset) {
+                int64_t tile_begin = std::max(b - o * tiles, int64_t(0));
+                int64_t tile_end = std::min(e - o * tiles, tiles);
+                for (auto tile = tile_begin; tile < tile_end; ++tile) {
+                  int64_t i0 = tile / col_tiles * kTile;
+                  int64_t j0 = tile % col_tiles * kTile;
+                  int64_t i1 = std::min(i0 + kTile, rows.size);
+                  int64_t j1 = std::min(j0 + kTile, inner.size);
+                  for (auto i = i0; i < i1; ++i) {
+                    const E* src_row = src + src_offset + i;
+                    E* dst_row = dst + dst_offset + i * rows.dst_stride;
+                    for (auto j = j0; j < j1; ++j) {
+                      dst_row[j] = src_row[j * inner.src_stride];
+                    }
+                  }
+                }
+              });
+        });
+    return;
+  }
+
+  // Generic rows with strides on both sides.
+  int64_t rows = OuterNumel(dims, ndim - 1);
+  auto grain_size = custom_cpu::GrainSize(inner.size);
+  custom_cpu::ParallelFor(0, rows, grain_size, [&](int64_t b, int64_t e) {
+    ForEachOuter(dims,
+                 ndim - 1,
+                 b,
+                 e,
+                 [&](int64_t, int64_t src_offset, int64_t dst_offset) {
+                   const E* src_row = src + src_offset;
+                   E* dst_row = dst + dst_offset;
+                   for (int64_t j = 0; j < inner.size; ++j) {
+                     dst_row[j * inner.dst_stride] =
+                         src_row[j * inner.src_stride];
+                   }
+                 });
+  });
+}
+
+}  // namespace
+
+void StridedCopy(const void* src,
+                 const std::vector<int64_t>& src_strides,
+                 void* dst,
+                 const std::vector<int64_t>& dst_strides,
+                 const std::vector<int64_t>& dims,
+                 size_t element_size) {
+  PD_CHECK(
+      src_strides.size() == dims.size() && dst_strides.size() == dims.size(),
+      "StridedCopy expects %d strides, received %d and %d.",
+      dims.size(),
+      src_strides.size(),
+      dst_strides.size());
+  if (std::find(dims.begin(), dims.end(), 0) != dims.end()) {
+    return;
+  }
+  auto merged = CoalesceDims(dims, src_strides, dst_strides);
+  switch (element_size) {
+    case 1:
+      StridedCopyImpl(
+          static_cast<const uint8_t*>(src), static_cast<uint8_t*>(dst), merged);
+      break;
+    case 2:
+      StridedCopyImpl(static_cast<const uint16_t*>(src),
+                      static_cast<uint16_t*>(dst),
+                      merged);
+      break;
+    case 4:
+      StridedCopyImpl(static_cast<const uint32_t*>(src),
+                      static_cast<uint32_t*>(dst),
+                      merged);
+      break;
+    case 8:
+      StridedCopyImpl(static_cast<const uint64_t*>(src),
+                      static_cast<uint64_t*>(dst),
+                      merged);
+      break;
+    case 16:
+      StridedCopyImpl(static_cast<const Element16*>(src),
+                      static_cast<Element16*>(dst),
+                      merged);
+      break;
+    default:
+      PD_CHECK(false,
+               "StridedCopy does not support %d byte elements.",
+               element_size);
+  }
+}
+
+}  // namespace custom_kernel
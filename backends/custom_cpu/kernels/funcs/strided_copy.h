@@ -0,0 +1,52 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+namespace custom_kernel {
+
+// Copies a tensor of shape `dims` read from `src` through `src_strides` to
+// `dst` written through `dst_strides`, strides counted in elements of
+// `element_size` bytes (1, 2, 4, 8 or 16).
+//
+// Dims are reordered to walk dst in memory order and merged where both sides
+// are contiguous. Contiguous runs are copied with memcpy and a dim that is
+// contiguous in src only, as in a transpose, is copied by cache-blocked
+// tiles. The outer dims are spread over the intra-op thread pool.
+void StridedCopy(const void* src,
+                 const std::vector<int64_t>& src_strides,
+                 void* dst,
+                 const std::vector<int64_t>& dst_strides,
+                 const std::vector<int64_t>& dims,
+                 size_t element_size);
+
+template <typename T>
+void StridedCopy(const T* src,
+                 const std::vector<int64_t>& src_strides,
+                 T* dst,
+                 const std::vector<int64_t>& dst_strides,
+                 const std::vector<int64_t>& dims) {
+  StridedCopy(static_cast<const void*>(src),
+              src_strides,
+              static_cast<void*>(dst),
+              dst_strides,
+              dims,
+              sizeof(T));
+}
+
+}  // namespace custom_kernel
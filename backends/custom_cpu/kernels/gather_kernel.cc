@@ -0,0 +1,313 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/gather.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+int64_t DimsProduct(const std::vector<int64_t>& dims,
+                    int64_t begin,
+                    int64_t end) {
+  int64_t size = 1;
+  for (int64_t i = begin; i < end; ++i) {
+    size *= dims[i];
+  }
+  return size;
+}
+
+// x viewed as [outer, n, inner] around `axis`.
+struct AxisView {
+  int64_t outer;
+  int64_t n;
+  int64_t inner;
+};
+
+AxisView ViewAroundAxis(const phi::DenseTensor& x,
+                        int64_t axis,
+                        const char* op) {
+  auto dims = x.dims();
+  int64_t rank = dims.size();
+  if (rank == 0) {
+    PD_CHECK(axis == 0 || axis == -1,
+             "The axis of %s must be 0 for a 0-D tensor, but received %ld.",
+             op,
+             axis);
+    return {1, 1, 1};
+  }
+  PD_CHECK(axis >= -rank && axis < rank,
+           "The axis of %s must be in [%ld, %ld), but received %ld.",
+           op,
+           -rank,
+           rank,
+           axis);
+  axis = axis < 0 ? axis + rank : axis;
+  return {DimsProduct(dims, 0, axis),
+          dims[axis],
+          DimsProduct(dims, axis + 1, rank)};
+}
+
+template <typename T>
+void GatherAxis(const phi::Context& dev_ctx,
+                const phi::DenseTensor& x,
+                const phi::DenseTensor& index,
+                int64_t axis,
+                const char* op,
+                phi::DenseTensor* out) {
+  auto view = ViewAroundAxis(x, axis, op);
+  auto rows = NormalizeIndex(index, view.n, true, op);
+  GatherRows(x.data<T>(),
+             view.outer,
+             view.n,
+             view.inner * sizeof(T),
+             rows.data(),
+             rows.size(),
+             dev_ctx.template Alloc<T>(out));
+}
+
+template <typename T>
+void GatherAxisGrad(const phi::Context& dev_ctx,
+                    const phi::DenseTensor& x,
+                    const phi::DenseTensor& index,
+                    const phi::DenseTensor& out_grad,
+                    int64_t axis,
+                    const char* op,
+                    phi::DenseTensor* x_grad) {
+  auto view = ViewAroundAxis(x, axis, op);
+  auto rows = NormalizeIndex(index, view.n, true, op);
+  T* grad = dev_ctx.template Alloc<T>(x_grad);
+  ParallelZero(grad, x.numel() * sizeof(T));
+  ScatterRows(out_grad.data<T>(),
+              view.outer,
+              rows.size(),
+              view.inner,
+              rows.data(),
+              view.n,
+              ScatterMode::kSum,
+              grad);
+}
+
+template <typename IndexT>
+void LinearizeNdIndex(const IndexT* index,
+                      const std::vector<int64_t>& x_dims,
+                      int64_t k,
+                      std::vector<int64_t>* rows) {
+  for (size_t i = 0; i < rows->size(); ++i) {
+    int64_t row = 0;
+    for (int64_t j = 0; j < k; ++j) {
+      int64_t v = index[i * k + j];
+      PD_CHECK(v >= -x_dims[j] && v < x_dims[j],
+               "Index %ld of gather_nd is out of range [%ld, %ld) along "
+               "dim %ld.",
+               v,
+               -x_dims[j],
+               x_dims[j],
+               j);
+      row = row * x_dims[j] + (v < 0 ? v + x_dims[j] : v);
+    }
+    (*rows)[i] = row;
+  }
+}
+
+// The rows of x, viewed as [n, slice] over its leading index.dims()[-1]
+// dims, that the coordinates in the last dim of index point at.
+std::vector<int64_t> GatherNdRows(const phi::DenseTensor& x,
+                                  const phi::DenseTensor& index,
+                                  int64_t* n,
+                                  int64_t* slice) {
+  auto x_dims = x.dims();
+  auto index_dims = index.dims();
+  const int64_t rank = x_dims.size();
+  PD_CHECK(!index_dims.empty(), "The index of gather_nd must not be 0-D.");
+  const int64_t k = index_dims.back();
+  PD_CHECK(k <= rank,
+           "The last dim of the index of gather_nd (%ld) must not exceed the "
+           "rank of x (%ld).",
+           k,
+           rank);
+  *n = DimsProduct(x_dims, 0, k);
+  *slice = DimsProduct(x_dims, k, rank);
+  std::vector<int64_t> rows(DimsProduct(index_dims, 0, index_dims.size() - 1));
+  if (index.dtype() == phi::DataType::INT32) {
+    LinearizeNdIndex(index.data<int32_t>(), x_dims, k, &rows);
+  } else {
+    PD_CHECK(index.dtype() == phi::DataType::INT64,
+             "The index of gather_nd must be int32 or int64.");
+    LinearizeNdIndex(index.data<int64_t>(), x_dims, k, &rows);
+  }
+  return rows;
+}
+
+}  // namespace
+
+template <typename T>
+void GatherKernel(const phi::Context& dev_ctx,
+                  const phi::DenseTensor& x,
+                  const phi::DenseTensor& index,
+                  const phi::Scalar& axis,
+                  phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  GatherAxis<T>(dev_ctx, x, index, axis.to<int64_t>(), "gather", out);
+}
+
+template <typename T>
+void GatherGradKernel(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& x,
+                      const phi::DenseTensor& index,
+                      const phi::DenseTensor& out_grad,
+                      const phi::Scalar& axis,
+                      phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  GatherAxisGrad<T>(
+      dev_ctx, x, index, out_grad, axis.to<int64_t>(), "gather_grad", x_grad);
+}
+
+template <typename T>
+void IndexSelectKernel(const phi::Context& dev_ctx,
+                       const phi::DenseTensor& x,
+                       const phi::DenseTensor& index,
+                       int dim,
+                       phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  GatherAxis<T>(dev_ctx, x, index, dim, "index_select", out);
+}
+
+template <typename T>
+void IndexSelectGradKernel(const phi::Context& dev_ctx,
+                           const phi::DenseTensor& x,
+                           const phi::DenseTensor& index,
+                           const phi::DenseTensor& out_grad,
+                           int dim,
+                           phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  GatherAxisGrad<T>(
+      dev_ctx, x, index, out_grad, dim, "index_select_grad", x_grad);
+}
+
+template <typename T>
+void GatherNdKernel(const phi::Context& dev_ctx,
+                    const phi::DenseTensor& x,
+                    const phi::DenseTensor& index,
+                    phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  if (out->numel() == 0) {
+    return;
+  }
+  int64_t n, slice;
+  auto rows = GatherNdRows(x, index, &n, &slice);
+  GatherRows(
+      x.data<T>(), 1, n, slice * sizeof(T), rows.data(), rows.size(), out_data);
+}
+
+template <typename T>
+void GatherNdGradKernel(const phi::Context& dev_ctx,
+                        const phi::DenseTensor& x,
+                        const phi::DenseTensor& index,
+                        const phi::DenseTensor& out_grad,
+                        phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  T* grad = dev_ctx.template Alloc<T>(x_grad);
+  ParallelZero(grad, x.numel() * sizeof(T));
+  if (out_grad.numel() == 0) {
+    return;
+  }
+  int64_t n, slice;
+  auto rows = GatherNdRows(x, index, &n, &slice);
+  ScatterRows(out_grad.data<T>(),
+              1,
+              rows.size(),
+              slice,
+              rows.data(),
+              n,
+              ScatterMode::kSum,
+              grad);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(gather,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::GatherKernel,
+                    float,
+                    double,
+                    int32_t,
+                    int64_t,
+                    int16_t,
+                    int8_t,
+                    uint8_t,
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(gather_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::GatherGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(index_select,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::IndexSelectKernel,
+                    float,
+                    double,
+                    int32_t,
+                    int64_t,
+                    int16_t,
+                    int8_t,
+                    uint8_t,
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(index_select_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::IndexSelectGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(gather_nd,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::GatherNdKernel,
+                    float,
+                    double,
+                    int32_t,
+                    int64_t,
+                    int16_t,
+                    int8_t,
+                    uint8_t,
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(gather_nd_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::GatherNdGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
@@ -0,0 +1,284 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/cast.h"
+#include "kernels/funcs/gather.h"
+#include "kernels/funcs/mp_type_trait.h"
+#include "kernels/funcs/reduce.h"
+#include "paddle/phi/capi/all.h"
+#include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// One index tensor along one dim of x, as int64 values and their shape.
+struct DimIndex {
+  std::vector<int64_t> values;
+  std::vector<int64_t> dims;
+};
+
+template <typename IndexT>
+DimIndex ToDimIndex(const phi::DenseTensor& index) {
+  const IndexT* data = index.data<IndexT>();
+  return {std::vector<int64_t>(data, data + index.numel()), index.dims()};
+}
+
+// The indexed rows of x, viewed as [n, slice] over its leading dims, and
+// in `value_dims` the shape of the values they take: the broadcast shape of
+// the index tensors followed by the dims of a slice. A bool mask stands for
+// the coordinates of its true elements over as many dims as it has.
+std::vector<int64_t> IndexPutRows(
+    const phi::DenseTensor& x,
+    const std::vector<const phi::DenseTensor*>& indices,
+    std::vector<int64_t>* value_dims,
+    int64_t* n,
+    int64_t* slice) {
+  auto x_dims = x.dims();
+  std::vector<DimIndex> dim_indices;
+  for (auto index : indices) {
+    if (index->dtype() == phi::DataType::INT64) {
+      dim_indices.push_back(ToDimIndex<int64_t>(*index));
+    } else if (index->dtype() == phi::DataType::INT32) {
+      dim_indices.push_back(ToDimIndex<int32_t>(*index));
+    } else {
+      PD_CHECK(index->dtype() == phi::DataType::BOOL,
+               "The indices of index_put must be int32, int64 or bool.");
+      auto mask_dims = index->dims();
+      const int64_t rank = mask_dims.size();
+      const int64_t first = dim_indices.size();
+      PD_CHECK(first + rank <= static_cast<int64_t>(x_dims.size()),
+               "The bool index of index_put covers more dims than x has.");
+      for (int64_t j = 0; j < rank; ++j) {
+        PD_CHECK(mask_dims[j] == x_dims[first + j],
+                 "The bool index of index_put has dim %ld of %ld, but x has "
+                 "%ld.",
+                 j,
+                 mask_dims[j],
+                 x_dims[first + j]);
+      }
+      std::vector<DimIndex> coords(rank);
+      const bool* mask = index->data<bool>();
+      for (int64_t i = 0; i < index->numel(); ++i) {
+        if (!mask[i]) {
+          continue;
+        }
+        for (int64_t j = rank - 1, rest = i; j >= 0; --j) {
+          coords[j].values.push_back(rest % mask_dims[j]);
+          rest /= mask_dims[j];
+        }
+      }
+      for (auto& c : coords) {
+        c.dims = {static_cast<int64_t>(c.values.size())};
+        dim_indices.push_back(std::move(c));
+      }
+    }
+  }
+  const int64_t q = dim_indices.size();
+  PD_CHECK(q <= static_cast<int64_t>(x_dims.size()),
+           "index_put got %ld indices for a %ld-D x.",
+           q,
+           static_cast<int64_t>(x_dims.size()));
+
+  // The index tensors broadcast against each other as numpy does.
+  std::vector<int64_t> index_dims;
+  for (auto& d : dim_indices) {
+    if (d.dims.size() > index_dims.size()) {
+      index_dims.insert(
+          index_dims.begin(), d.dims.size() - index_dims.size(), 1);
+    }
+    const int64_t offset = index_dims.size() - d.dims.size();
+    for (size_t j = 0; j < d.dims.size(); ++j) {
+      int64_t& b = index_dims[offset + j];
+      PD_CHECK(b == 1 || d.dims[j] == 1 || b == d.dims[j],
+               "The indices of index_put can not be broadcast together.");
+      b = b == 1 ? d.dims[j] : b;
+    }
+  }
+  const int64_t rank = index_dims.size();
+  int64_t m = 1;
+  for (auto d : index_dims) {
+    m *= d;
+  }
+  *n = 1;
+  *slice = 1;
+  for (int64_t j = 0; j < static_cast<int64_t>(x_dims.size()); ++j) {
+    (j < q ? *n : *slice) *= x_dims[j];
+  }
+
+  // The strides of every index tensor over the broadcast dims, 0 where it
+  // is broadcast.
+  std::vector<std::vector<int64_t>> strides(q, std::vector<int64_t>(rank, 0));
+  for (int64_t k = 0; k < q; ++k) {
+    const auto& dims = dim_indices[k].dims;
+    int64_t stride = 1;
+    for (int64_t j = dims.size() - 1; j >= 0; --j) {
+      if (dims[j] != 1) {
+        strides[k][rank - dims.size() + j] = stride;
+      }
+      stride *= dims[j];
+    }
+  }
+  std::vector<int64_t> rows(m);
+  std::vector<int64_t> pos(rank, 0);
+  for (int64_t i = 0; i < m; ++i) {
+    int64_t row = 0;
+    for (int64_t k = 0; k < q; ++k) {
+      int64_t offset = 0;
+      for (int64_t j = 0; j < rank; ++j) {
+        offset += pos[j] * strides[k][j];
+      }
+      int64_t v = dim_indices[k].values[offset];
+      PD_CHECK(v >= -x_dims[k] && v < x_dims[k],
+               "Index %ld of index_put is out of range [%ld, %ld) along "
+               "dim %ld.",
+               v,
+               -x_dims[k],
+               x_dims[k],
+               k);
+      row = row * x_dims[k] + (v < 0 ? v + x_dims[k] : v);
+    }
+    rows[i] = row;
+    for (int64_t j = rank - 1; j >= 0 && ++pos[j] == index_dims[j]; --j) {
+      pos[j] = 0;
+    }
+  }
+  *value_dims = index_dims;
+  value_dims->insert(value_dims->end(), x_dims.begin() + q, x_dims.end());
+  return rows;
+}
+
+}  // namespace
+
+// out is x with the rows picked by indices set to value, or incremented by
+// it with accumulate. value broadcasts to the shape of the picked rows.
+template <typename T>
+void IndexPutKernel(const phi::Context& dev_ctx,
+                    const phi::DenseTensor& x,
+                    const std::vector<const phi::DenseTensor*>& indices,
+                    const phi::DenseTensor& value,
+                    bool accumulate,
+                    phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const T* x_data = x.data<T>();
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  if (out_data != x_data) {
+    CastData(x_data, x.dtype(), out_data, x.dtype(), x.numel());
+  }
+  std::vector<int64_t> value_dims;
+  int64_t n, slice;
+  auto rows = IndexPutRows(x, indices, &value_dims, &n, &slice);
+  if (rows.empty() || slice == 0) {
+    return;
+  }
+  phi::DenseTensor values;
+  phi::BroadcastTo<T>(dev_ctx, value, value_dims, -1, &values);
+  ScatterRows(values.data<T>(),
+              1,
+              rows.size(),
+              slice,
+              rows.data(),
+              n,
+              accumulate ? ScatterMode::kAdd : ScatterMode::kAssign,
+              out_data);
+}
+
+template <typename T>
+void IndexPutGradKernel(const phi::Context& dev_ctx,
+                        const phi::DenseTensor& x,
+                        const std::vector<const phi::DenseTensor*>& indices,
+                        const phi::DenseTensor& value,
+                        const phi::DenseTensor& out_grad,
+                        bool accumulate,
+                        phi::DenseTensor* x_grad,
+                        phi::DenseTensor* value_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  std::vector<int64_t> value_dims;
+  int64_t n, slice;
+  auto rows = IndexPutRows(x, indices, &value_dims, &n, &slice);
+  if (x_grad) {
+    T* x_grad_data = dev_ctx.template Alloc<T>(x_grad);
+    CastData(out_grad.data<T>(),
+             out_grad.dtype(),
+             x_grad_data,
+             out_grad.dtype(),
+             out_grad.numel());
+    if (!accumulate) {
+      ZeroRows(x_grad_data, n, slice * sizeof(T), rows.data(), rows.size());
+    }
+  }
+  if (!value_grad) {
+    return;
+  }
+  T* value_grad_data = dev_ctx.template Alloc<T>(value_grad);
+  const int64_t numel = rows.size() * slice;
+  if (numel == value.numel()) {
+    GatherRows(out_grad.data<T>(),
+               1,
+               n,
+               slice * sizeof(T),
+               rows.data(),
+               rows.size(),
+               value_grad_data);
+    return;
+  }
+  // value was broadcast, its gradient sums the gathered rows over the dims
+  // it was broadcast along.
+  using CT = typename MPTypeTrait<T>::Type;
+  std::vector<T> gathered(numel);
+  GatherRows(out_grad.data<T>(),
+             1,
+             n,
+             slice * sizeof(T),
+             rows.data(),
+             rows.size(),
+             gathered.data());
+  std::vector<CT> wide(gathered.begin(), gathered.end());
+  auto dims = value.dims();
+  const int64_t lead = value_dims.size() - dims.size();
+  std::vector<int64_t> reduce_dims;
+  for (int64_t j = 0; j < static_cast<int64_t>(value_dims.size()); ++j) {
+    if (j < lead || (dims[j - lead] == 1 && value_dims[j] != 1)) {
+      reduce_dims.push_back(j);
+    }
+  }
+  std::vector<CT> sums(value.numel());
+  ReduceDims(wide.data(), value_dims, reduce_dims, SumOp<CT>(), sums.data());
+  for (int64_t i = 0; i < value.numel(); ++i) {
+    value_grad_data[i] = static_cast<T>(sums[i]);
+  }
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(index_put,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::IndexPutKernel,
+                    float,
+                    double,
+                    int32_t,
+                    int64_t,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(index_put_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::IndexPutGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
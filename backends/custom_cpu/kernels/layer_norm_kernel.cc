@@ -0,0 +1,191 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <cmath>
+#include <vector>
+
+#include "kernels/funcs/norm.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+template <typename T>
+const T* OptionalData(const paddle::optional<phi::DenseTensor>& t,
+                      const phi::DenseTensor& x,
+                      const char* name) {
+  if (!t) {
+    return nullptr;
+  }
+  PD_CHECK(t->dtype() == x.dtype(),
+           "%s of a norm must have the data type of x.",
+           name);
+  return t->data<T>();
+}
+
+}  // namespace
+
+template <typename T>
+void LayerNormKernel(const phi::Context& dev_ctx,
+                     const phi::DenseTensor& x,
+                     const paddle::optional<phi::DenseTensor>& scale,
+                     const paddle::optional<phi::DenseTensor>& bias,
+                     float epsilon,
+                     int begin_norm_axis,
+                     phi::DenseTensor* out,
+                     phi::DenseTensor* mean,
+                     phi::DenseTensor* variance) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  NormForwardArgs<T> args;
+  NormMatrix(x.dims(), begin_norm_axis, &args.rows, &args.cols);
+  args.epsilon = epsilon;
+  args.x = x.data<T>();
+  args.scale = NormParamData<T>(scale.get_ptr(), x, "scale");
+  args.shift = NormParamData<T>(bias.get_ptr(), x, "bias");
+  args.out = dev_ctx.template Alloc<T>(out);
+  args.mean = mean ? dev_ctx.template Alloc<CT>(mean) : nullptr;
+  args.variance = variance ? dev_ctx.template Alloc<CT>(variance) : nullptr;
+  NormForward(args);
+}
+
+template <typename T>
+void LayerNormGradKernel(const phi::Context& dev_ctx,
+                         const phi::DenseTensor& x,
+                         const paddle::optional<phi::DenseTensor>& scale,
+                         const paddle::optional<phi::DenseTensor>& bias,
+                         const phi::DenseTensor& mean,
+                         const phi::DenseTensor& variance,
+                         const phi::DenseTensor& out_grad,
+                         float epsilon,
+                         int begin_norm_axis,
+                         phi::DenseTensor* x_grad,
+                         phi::DenseTensor* scale_grad,
+                         phi::DenseTensor* bias_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  NormBackwardArgs<T> args;
+  NormMatrix(x.dims(), begin_norm_axis, &args.rows, &args.cols);
+  const CT* var = variance.data<CT>();
+  std::vector<CT> inv_std(args.rows);
+  for (int64_t r = 0; r < args.rows; ++r) {
+    inv_std[r] = CT(1) / std::sqrt(var[r] + static_cast<CT>(epsilon));
+  }
+  args.x = x.data<T>();
+  args.scale = NormParamData<T>(scale.get_ptr(), x, "scale");
+  args.mean = mean.data<CT>();
+  args.inv_std = inv_std.data();
+  args.out_grad = out_grad.data<T>();
+  args.x_grad = x_grad ? dev_ctx.template Alloc<T>(x_grad) : nullptr;
+  args.scale_grad =
+      NormParamGradData<T>(dev_ctx, scale.get_ptr(), x, "scale", scale_grad);
+  args.shift_grad =
+      NormParamGradData<T>(dev_ctx, bias.get_ptr(), x, "bias", bias_grad);
+  NormBackward(args);
+}
+
+// x + bias + residual_alpha * residual goes to residual_out and its layer
+// norm to out, rounded to int8 when quant_scale is positive. As in phi,
+// `variance` receives the inverse standard deviation. There is no
+// backward op.
+template <typename T>
+void FusedBiasResidualLayerNormKernel(
+    const phi::Context& dev_ctx,
+    const phi::DenseTensor& x,
+    const paddle::optional<phi::DenseTensor>& bias,
+    const paddle::optional<phi::DenseTensor>& residual,
+    const paddle::optional<phi::DenseTensor>& norm_weight,
+    const paddle::optional<phi::DenseTensor>& norm_bias,
+    float epsilon,
+    float residual_alpha,
+    int begin_norm_axis,
+    float quant_scale,
+    int quant_round_type,
+    float quant_max_bound,
+    float quant_min_bound,
+    phi::DenseTensor* out,
+    phi::DenseTensor* residual_out,
+    phi::DenseTensor* mean,
+    phi::DenseTensor* variance) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  NormForwardArgs<T> args;
+  NormMatrix(x.dims(), begin_norm_axis, &args.rows, &args.cols);
+  args.epsilon = epsilon;
+  args.x = x.data<T>();
+  args.bias = OptionalData<T>(bias, x, "bias");
+  args.residual = OptionalData<T>(residual, x, "residual");
+  args.residual_alpha = residual_alpha;
+  args.scale = NormParamData<T>(norm_weight.get_ptr(), x, "norm_weight");
+  args.shift = NormParamData<T>(norm_bias.get_ptr(), x, "norm_bias");
+  if (quant_scale > 0) {
+    args.quant_out = dev_ctx.template Alloc<int8_t>(out);
+    args.quant = {
+        quant_scale, quant_round_type, quant_max_bound, quant_min_bound};
+  } else {
+    args.out = dev_ctx.template Alloc<T>(out);
+  }
+  if (residual_out) {
+    args.residual_out = dev_ctx.template Alloc<T>(residual_out);
+  }
+  args.mean = mean ? dev_ctx.template Alloc<CT>(mean) : nullptr;
+  args.inv_std = variance ? dev_ctx.template Alloc<CT>(variance) : nullptr;
+  NormForward(args);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(layer_norm,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::LayerNormKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  if (kernel_key.dtype() == phi::DataType::FLOAT16 ||
+      kernel_key.dtype() == phi::DataType::BFLOAT16) {
+    kernel->OutputAt(1).SetDataType(phi::DataType::FLOAT32);
+    kernel->OutputAt(2).SetDataType(phi::DataType::FLOAT32);
+  }
+}
+
+PD_BUILD_PHI_KERNEL(layer_norm_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::LayerNormGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  if (kernel_key.dtype() == phi::DataType::FLOAT16 ||
+      kernel_key.dtype() == phi::DataType::BFLOAT16) {
+    kernel->InputAt(3).SetDataType(phi::DataType::FLOAT32);
+    kernel->InputAt(4).SetDataType(phi::DataType::FLOAT32);
+  }
+}
+
+PD_BUILD_PHI_KERNEL(fused_bias_residual_layernorm,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::FusedBiasResidualLayerNormKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->OutputAt(0).SetDataType(phi::DataType::UNDEFINED);
+  kernel->OutputAt(2).SetDataType(phi::DataType::FLOAT32);
+  kernel->OutputAt(3).SetDataType(phi::DataType::FLOAT32);
+}
@@ -0,0 +1,91 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/softmax.h"
+#include "kernels/phi_funcs.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+template <typename T>
+void LogSoftmaxKernel(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& x,
+                      int axis,
+                      phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const int rank = x.dims().size();
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  if (out->numel() == 0) {
+    return;
+  }
+
+  if (rank == 0) {
+    out_data[0] = static_cast<T>(0);
+    return;
+  }
+
+  const int calc_axis = phi::funcs::CanonicalAxis(axis, rank);
+  const int64_t axis_dim = x.dims()[calc_axis];
+  const int64_t n = phi::funcs::SizeToAxis(calc_axis, x.dims());
+  const int64_t d = phi::funcs::SizeFromAxis(calc_axis, x.dims());
+  SoftmaxForward(x.data<T>(), n, axis_dim, d / axis_dim, true, out_data);
+}
+
+template <typename T>
+void LogSoftmaxGradKernel(const phi::Context& dev_ctx,
+                          const phi::DenseTensor& out,
+                          const phi::DenseTensor& out_grad,
+                          int axis,
+                          phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const int rank = x_grad->dims().size();
+  T* x_grad_data = dev_ctx.template Alloc<T>(x_grad);
+  if (x_grad->numel() == 0) {
+    return;
+  }
+
+  if (rank == 0) {
+    x_grad_data[0] = static_cast<T>(0);
+    return;
+  }
+
+  const int calc_axis = phi::funcs::CanonicalAxis(axis, rank);
+  const int64_t axis_dim = x_grad->dims()[calc_axis];
+  const int64_t n = phi::funcs::SizeToAxis(calc_axis, x_grad->dims());
+  const int64_t d = phi::funcs::SizeFromAxis(calc_axis, x_grad->dims());
+  SoftmaxBackward(out.data<T>(),
+                  out_grad.data<T>(),
+                  n,
+                  axis_dim,
+                  d / axis_dim,
+                  true,
+                  x_grad_data);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(log_softmax,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::LogSoftmaxKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(log_softmax_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::LogSoftmaxGradKernel,
+                    float,
+                    double) {}
@@ -12,85 +12,111 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "kernels/funcs/gemm.h"
+#include "kernels/funcs/int8_gemm.h"
 #include "kernels/phi_funcs.h"
 #include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
-template <typename T>
-void GEMM(bool trans_x,
-          bool trans_y,
-          size_t M,
-          size_t K,
-          size_t N,
-          const T* x,
-          const T* y,
-          T* out,
-          bool trans_out = false) {
-  memset(out, 0, M * N * sizeof(T));
-  for (size_t m = 0; m < M; ++m) {
-    for (size_t n = 0; n < N; ++n) {
-      auto* out_data = trans_out ? &out[n * M + m] : &out[m * N + n];
-      for (size_t k = 0; k < K; ++k) {
-        auto x_dat = trans_x ? x[k * M + m] : x[m * K + k];
-        auto y_dat = trans_y ? y[n * K + k] : y[k * N + n];
-        *out_data += x_dat * y_dat;
-      }
-    }
+// Shapes of a matmul after 1-D operands are promoted to matrices, x to
+// 1 x K and y to K x 1, and the batch dimensions of both are broadcast.
+struct MatmulDims {
+  int64_t M;
+  int64_t K;
+  int64_t N;
+  std::vector<int64_t> out_dims;
+  // Offset of the x, y and out matrix of every broadcast batch.
+  std::vector<int64_t> x_offsets;
+  std::vector<int64_t> y_offsets;
+  std::vector<int64_t> out_offsets;
+};
+
+MatmulDims GetMatmulDims(const std::vector<int64_t>& x_dims,
+                         const std::vector<int64_t>& y_dims,
+                         bool transpose_x,
+                         bool transpose_y) {
+  int x_ndim = x_dims.size();
+  int y_ndim = y_dims.size();
+  PD_CHECK(x_ndim > 0 && y_ndim > 0,
+           "Input(X) and Input(Y) of matmul must not be 0-D.");
+
+  MatmulDims dims;
+  int64_t x_k;
+  if (x_ndim == 1) {
+    dims.M = 1;
+    x_k = x_dims[0];
+  } else {
+    dims.M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
+    x_k = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
   }
-}
+  if (y_ndim == 1) {
+    dims.K = y_dims[0];
+    dims.N = 1;
+  } else {
+    dims.K = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
+    dims.N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
+  }
+  PD_CHECK(x_k == dims.K,
+           "Input(X) and Input(Y) of matmul have mismatched inner dims, "
+           "received %d and %d.",
+           x_k,
+           dims.K);
 
-template <typename T>
-void BatchedGEMM(bool trans_x,
-                 bool trans_y,
-                 size_t M,
-                 size_t K,
-                 size_t N,
-                 const T* x,
-                 const T* y,
-                 T* out,
-                 size_t batch_size,
-                 bool x_is_larger,
-                 bool trans_out = false,
-                 bool bs_flag = false,
-                 bool reduce_bs = false,
-                 float alpha = 1.0) {
-  memset(out, 0, sizeof(T) * (reduce_bs ? M * N : batch_size * M * N));
-  if (x_is_larger) {
-    for (size_t bs = 0; bs < batch_size; ++bs) {
-      for (size_t m = 0; m < M; ++m) {
-        for (size_t n = 0; n < N; ++n) {
-          auto out_bs = reduce_bs ? 0 : bs * M * N;
-          auto* out_data =
-              trans_out ? &out[out_bs + n * M + m] : &out[out_bs + m * N + n];
-          for (size_t k = 0; k < K; ++k) {
-            auto x_dat =
-                trans_x ? x[bs * M * K + k * M + m] : x[bs * M * K + m * K + k];
-            auto y_bs = bs_flag ? bs * N * K : 0;
-            auto y_dat = trans_y ? y[y_bs + n * K + k] : y[y_bs + k * N + n];
-            *out_data += static_cast<T>(alpha) * (x_dat * y_dat);
-          }
-        }
-      }
+  // Broadcast the batch dims, aligned to the right.
+  std::vector<int64_t> x_batch(x_dims.begin(),
+                               x_dims.end() - std::min(x_ndim, 2));
+  std::vector<int64_t> y_batch(y_dims.begin(),
+                               y_dims.end() - std::min(y_ndim, 2));
+  int batch_ndim = std::max(x_batch.size(), y_batch.size());
+  x_batch.insert(x_batch.begin(), batch_ndim - x_batch.size(), 1);
+  y_batch.insert(y_batch.begin(), batch_ndim - y_batch.size(), 1);
+  std::vector<int64_t> batch(batch_ndim);
+  for (int i = 0; i < batch_ndim; ++i) {
+    PD_CHECK(x_batch[i] == y_batch[i] || x_batch[i] == 1 || y_batch[i] == 1,
+             "Input(X) and Input(Y) of matmul can not broadcast dim %d, "
+             "received %d and %d.",
+             i,
+             x_batch[i],
+             y_batch[i]);
+    batch[i] = std::max(x_batch[i], y_batch[i]);
+  }
+
+  dims.out_dims = batch;
+  if (x_ndim > 1) {
+    dims.out_dims.push_back(dims.M);
+  }
+  if (y_ndim > 1) {
+    dims.out_dims.push_back(dims.N);
+  }
+  if (dims.out_dims.empty()) {
+    // The product of two vectors is a tensor of shape [1].
+    dims.out_dims.push_back(1);
+  }
+
+  int64_t batch_size = phi::product(batch);
+  dims.x_offsets.resize(batch_size);
+  dims.y_offsets.resize(batch_size);
+  dims.out_offsets.resize(batch_size);
+  std::vector<int64_t> index(batch_ndim, 0);
+  for (int64_t i = 0; i < batch_size; ++i) {
+    int64_t x_batch_index = 0;
+    int64_t y_batch_index = 0;
+    for (int j = 0; j < batch_ndim; ++j) {
+      x_batch_index =
+          x_batch_index * x_batch[j] + (x_batch[j] == 1 ? 0 : index[j]);
+      y_batch_index =
+          y_batch_index * y_batch[j] + (y_batch[j] == 1 ? 0 : index[j]);
     }
-  } else {
-    for (size_t bs = 0; bs < batch_size; ++bs) {
-      for (size_t m = 0; m < M; ++m) {
-        for (size_t n = 0; n < N; ++n) {
-          auto out_bs = reduce_bs ? 0 : bs * M * N;
-          auto* out_data =
-              trans_out ? &out[out_bs + n * M + m] : &out[out_bs + m * N + n];
-          for (size_t k = 0; k < K; ++k) {
-            auto y_dat =
-                trans_y ? y[bs * K * N + n * K + k] : y[bs * K * N + k * N + n];
-            auto x_bs = bs_flag ? bs * M * K : 0;
-            auto x_dat = trans_x ? x[x_bs + k * M + m] : x[x_bs + m * K + k];
-            *out_data += static_cast<T>(alpha) * (x_dat * y_dat);
-          }
-        }
-      }
+    dims.x_offsets[i] = x_batch_index * dims.M * dims.K;
+    dims.y_offsets[i] = y_batch_index * dims.K * dims.N;
+    dims.out_offsets[i] = i * dims.M * dims.N;
+    for (int j = batch_ndim - 1; j >= 0 && ++index[j] == batch[j]; --j) {
+      index[j] = 0;
     }
   }
+  return dims;
 }
 
 template <typename T>
@@ -100,197 +126,62 @@ void MatmulKernel(const phi::Context& dev_ctx,
                   bool transpose_x,
                   bool transpose_y,
                   phi::DenseTensor* out) {
-  auto x_dims = x.dims();
-  auto y_dims = y.dims();
-  auto x_data = x.data<T>();
-  auto y_data = y.data<T>();
-  auto x_ndim = x_dims.size();
-  auto y_ndim = y_dims.size();
+  CUSTOM_CPU_TRACE_KERNEL();
+  // A 1-D operand is never transposed.
+  transpose_x = transpose_x && x.dims().size() > 1;
+  transpose_y = transpose_y && y.dims().size() > 1;
+  auto dims = GetMatmulDims(x.dims(), y.dims(), transpose_x, transpose_y);
+  auto M = dims.M;
+  auto K = dims.K;
+  auto N = dims.N;
 
-  if (x_ndim == 1 && y_ndim == 1) {
-    auto M = x.numel();
-    auto N = y.numel();
-    PD_CHECK(M == N, "M must be equal to N.");
-    out->Resize({1});
-    auto out_data = dev_ctx.template Alloc<T>(out);
-    GEMM(false, false, 1, M, 1, x.data<T>(), y.data<T>(), out_data);
-    return;
-  } else if (x_ndim == 1) {
-    auto M = 1;
-    auto K = x.numel();
-    auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-    if (transpose_y) {
-      PD_CHECK(K == y_dims[y_ndim - 1],
-               "Input(Y) has error dim."
-               "Y'dims[%d] must be equal to %d"
-               "But received Y'dims[%d] is %d",
-               y_ndim - 1,
-               K,
-               y_ndim - 1,
-               y_dims[y_ndim - 1]);
-    } else {
-      PD_CHECK(K == y_dims[y_ndim - 2],
-               "Input(Y) has error dim."
-               "Y'dims[%d] must be equal to %d"
-               "But received Y'dims[%d] is %d",
-               y_ndim - 2,
-               K,
-               y_ndim - 2,
-               y_dims[y_ndim - 2]);
-    }
-    std::vector<int64_t> out_dims(y_ndim - 1);
-    if (transpose_y) {
-      std::copy_n(y_dims.cbegin(), y_ndim - 1, out_dims.begin());
-    } else {
-      std::copy_n(y_dims.cbegin(), y_ndim - 2, out_dims.begin());
-      out_dims.back() = y_dims.back();
-    }
-    out->Resize(out_dims);
-    auto out_data = dev_ctx.template Alloc<T>(out);
-    if (y_ndim == 2) {
-      GEMM(false, transpose_y, M, K, N, x_data, y_data, out_data);
-    } else {
-      BatchedGEMM(false,
-                  transpose_y,
-                  M,
-                  K,
-                  N,
-                  x_data,
-                  y_data,
-                  out_data,
-                  y_dims[0],
-                  false);
-    }
-    return;
-  } else if (y_ndim == 1) {
-    auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-    auto K = y.numel();
-    auto N = 1;
-    if (!transpose_x) {
-      PD_CHECK(K == x_dims[x_ndim - 1],
-               "Input(Y) has error dim."
-               "Y'dims[%d] must be equal to %d"
-               "But received Y'dims[%d] is %d",
-               x_ndim - 1,
-               K,
-               x_ndim - 1,
-               x_dims[x_ndim - 1]);
-    } else {
-      PD_CHECK(K == x_dims[x_ndim - 2],
-               "Input(Y) has error dim."
-               "Y'dims[%d] must be equal to %d"
-               "But received Y'dims[%d] is %d",
-               x_ndim - 2,
-               K,
-               x_ndim - 2,
-               x_dims[x_ndim - 2]);
-    }
-    std::vector<int64_t> out_dims(x_ndim - 1);
-    if (!transpose_x) {
-      std::copy_n(x_dims.cbegin(), x_ndim - 1, out_dims.begin());
-    } else {
-      std::copy_n(x_dims.cbegin(), x_ndim - 2, out_dims.begin());
-      out_dims.back() = x_dims.back();
-    }
-    out->Resize(out_dims);
-    auto out_data = dev_ctx.template Alloc<T>(out);
-    if (x_ndim == 2) {
-      GEMM(transpose_x, false, M, K, N, x_data, y_data, out_data);
-    } else {
-      BatchedGEMM(transpose_x,
-                  false,
-                  M,
-                  K,
-                  N,
-                  x_data,
-                  y_data,
-                  out_data,
-                  x_dims[0],
-                  true);
-    }
-    return;
-  }
+  out->Resize(dims.out_dims);
+  auto out_data = dev_ctx.template Alloc<T>(out);
+  BatchedGemm(transpose_x,
+              transpose_y,
+              M,
+              N,
+              K,
+              1.0,
+              x.data<T>(),
+              transpose_x ? M : K,
+              dims.x_offsets,
+              y.data<T>(),
+              transpose_y ? K : N,
+              dims.y_offsets,
+              0.0,
+              out_data,
+              N,
+              dims.out_offsets);
+}
 
-  if (x_ndim == 2 && y_ndim == 2) {
-    auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-    auto K = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-    auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-    std::vector<int64_t> out_dims({M, N});
-    out->Resize(out_dims);
-    auto out_data = dev_ctx.template Alloc<T>(out);
-    GEMM(transpose_x, transpose_y, M, K, N, x_data, y_data, out_data);
-  } else if (x_ndim == 3) {
-    auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-    auto K = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-    auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-    if (transpose_y) {
-      PD_CHECK(y_dims[y_ndim - 1] == K,
-               "Input(Y) has error dim."
-               "Y'dims[%d] must be equal to %d"
-               "But received Y'dims[%d] is %d",
-               y_ndim - 1,
-               K,
-               y_ndim - 1,
-               y_dims[y_ndim - 1]);
-    } else {
-      PD_CHECK(y_dims[y_ndim - 2] == K,
-               "Input(Y) has error dim."
-               "Y'dims[%d] must be equal to %d"
-               "But received Y'dims[%d] is %d",
-               y_ndim - 2,
-               K,
-               y_ndim - 2,
-               y_dims[y_ndim - 2]);
-    }
-    std::vector<int64_t> out_dims({x_dims[0], M, N});
-    out->Resize(out_dims);
-    auto out_data = dev_ctx.template Alloc<T>(out);
-    BatchedGEMM(transpose_x,
-                transpose_y,
-                M,
-                K,
-                N,
-                x_data,
-                y_data,
-                out_data,
-                x_dims[0],
-                true);
-  } else if (y_ndim == 3) {
-    auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-    auto K = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
-    auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-    if (!transpose_x) {
-      PD_CHECK(x_dims[x_ndim - 1] == K,
-               "Input(X) has error dim."
-               "X'dims[%d] must be equal to %d"
-               "But received X'dims[%d] is %d",
-               x_ndim - 1,
-               K,
-               x_ndim - 1,
-               x_dims[x_ndim - 1]);
-    } else {
-      PD_CHECK(x_dims[x_ndim - 2] == K,
-               "Input(X) has error dim."
-               "X'dims[%d] must be equal to %d"
-               "But received X'dims[%d] is %d",
-               x_ndim - 2,
-               K,
-               x_ndim - 2,
-               x_dims[y_ndim - 2]);
-    }
-    std::vector<int64_t> out_dims({y_dims[0], M, N});
-    out->Resize(out_dims);
-    auto out_data = dev_ctx.template Alloc<T>(out);
-    BatchedGEMM(transpose_x,
-                transpose_y,
-                M,
-                K,
-                N,
-                x_data,
-                y_data,
-                out_data,
-                y_dims[0],
-                false);
+// int8 operands are multiplied exactly into an int32 out, as phi's GPU
+// matmul does for the int8 GEMMs of quantized inference.
+template <>
+void MatmulKernel<int8_t>(const phi::Context& dev_ctx,
+                          const phi::DenseTensor& x,
+                          const phi::DenseTensor& y,
+                          bool transpose_x,
+                          bool transpose_y,
+                          phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  transpose_x = transpose_x && x.dims().size() > 1;
+  transpose_y = transpose_y && y.dims().size() > 1;
+  auto dims = GetMatmulDims(x.dims(), y.dims(), transpose_x, transpose_y);
+  out->Resize(dims.out_dims);
+  auto out_data = dev_ctx.template Alloc<int32_t>(out);
+  for (size_t i = 0; i < dims.out_offsets.size(); ++i) {
+    Int8Gemm(transpose_x,
+             transpose_y,
+             dims.M,
+             dims.N,
+             dims.K,
+             x.data<int8_t>() + dims.x_offsets[i],
+             transpose_x ? dims.M : dims.K,
+             y.data<int8_t>() + dims.y_offsets[i],
+             transpose_y ? dims.K : dims.N,
+             out_data + dims.out_offsets[i],
+             dims.N);
   }
 }
 
@@ -303,237 +194,100 @@ void MatmulGradKernel(const phi::Context& dev_ctx,
                       bool transpose_y,
                       phi::DenseTensor* dx,
                       phi::DenseTensor* dy) {
-  auto x_dims = x.dims();
-  auto y_dims = y.dims();
-  auto dout_dims = out_grad.dims();
-
-  int x_ndim = x_dims.size();
-  int y_ndim = y_dims.size();
-  int ndim = dout_dims.size();
-
+  CUSTOM_CPU_TRACE_KERNEL();
+  transpose_x = transpose_x && x.dims().size() > 1;
+  transpose_y = transpose_y && y.dims().size() > 1;
+  auto dims = GetMatmulDims(x.dims(), y.dims(), transpose_x, transpose_y);
+  auto M = dims.M;
+  auto K = dims.K;
+  auto N = dims.N;
   auto x_data = x.data<T>();
   auto y_data = y.data<T>();
   auto out_grad_data = out_grad.data<T>();
-  auto dx_data = static_cast<T*>(nullptr);
-  auto dy_data = static_cast<T*>(nullptr);
-
-  if (dx) dx_data = dev_ctx.template Alloc<T>(dx);
-  if (dy) dy_data = dev_ctx.template Alloc<T>(dy);
-
-  if (x_ndim == 1 && y_ndim == 1) {
-    if (out_grad.numel() == 1) {
-      auto M = 1;
-      auto K = 1;
-      auto N = x.numel();
-      if (dx) {
-        GEMM(false, false, M, K, N, out_grad_data, y_data, dx_data);
-      }
-      if (dy) {
-        GEMM(false, false, M, K, N, out_grad_data, x_data, dy_data);
-      }
-      return;
-    }
-  } else if (x_ndim == 1) {
-    // dx = dout' * y
-    // dy = x * dout'
-    if (dx) {
-      auto M = 1;
-      auto K = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      auto N = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
-      if (y_ndim == 2) {
-        GEMM(false, !transpose_y, M, K, N, out_grad_data, y_data, dx_data);
-      } else {
-        BatchedGEMM(false,
-                    !transpose_y,
-                    M,
-                    K,
-                    N,
-                    out_grad_data,
-                    y_data,
-                    dx_data,
-                    y_dims[0],
-                    false,
-                    false,
-                    true,
-                    true);
-      }
-    }
-    if (dy) {
-      auto M = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
-      auto K = 1;
-      auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      if (y_ndim == 2) {
-        GEMM(
-            false, false, M, K, N, x_data, out_grad_data, dy_data, transpose_y);
-      } else {
-        BatchedGEMM(false,
-                    false,
-                    M,
-                    K,
-                    N,
-                    x_data,
-                    out_grad_data,
-                    dy_data,
-                    y_dims[0],
-                    false,
-                    transpose_y);
-      }
-    }
-    return;
-  } else if (y_ndim == 1) {
-    // dx = dout * y'
-    if (dx) {
-      auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto K = 1;
-      auto N = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-      if (x_ndim == 2) {
-        GEMM(
-            false, false, M, K, N, out_grad_data, y_data, dx_data, transpose_x);
-      } else {
-        BatchedGEMM(false,
-                    false,
-                    M,
-                    K,
-                    N,
-                    out_grad_data,
-                    y_data,
-                    dx_data,
-                    x_dims[0],
-                    true,
-                    transpose_x);
-      }
-    }
-    // dy = x' * dout
-    if (dy) {
-      auto M = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-      auto K = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto N = 1;
-      if (x_ndim == 2) {
-        GEMM(!transpose_x, false, M, K, N, x_data, out_grad_data, dy_data);
-      } else {
-        BatchedGEMM(!transpose_x,
-                    false,
-                    M,
-                    K,
-                    N,
-                    x_data,
-                    out_grad_data,
-                    dy_data,
-                    x_dims[0],
-                    true,
-                    false,
-                    true,
-                    true);
-      }
-    }
-
-    return;
-  }
+  auto ldx = transpose_x ? M : K;
+  auto ldy = transpose_y ? K : N;
 
-  if (x_ndim == 2 && y_ndim == 2) {
-    // dx = dout * y'
-    if (dx) {
-      auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto K = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      auto N = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-      GEMM(false,
-           !transpose_y,
-           M,
-           K,
-           N,
-           out_grad_data,
-           y_data,
-           dx_data,
-           transpose_x);
-    }
-    // dy = x' * dout
-    if (dy) {
-      auto M = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
-      auto K = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      GEMM(!transpose_x,
-           false,
-           M,
-           K,
-           N,
-           x_data,
-           out_grad_data,
-           dy_data,
-           transpose_y);
-    }
-    return;
-  } else if (x_ndim == 2) {
-    // dx = dout * y'
-    if (dx) {
-      auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto K = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      auto N = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-      BatchedGEMM(false,
+  // The products of every batch x or y was broadcast over are summed into
+  // its gradient by BatchedGemm, as they share the same offset.
+  if (dx) {
+    auto dx_data = dev_ctx.template Alloc<T>(dx);
+    if (transpose_x) {
+      // dx = y * dout'
+      BatchedGemm(transpose_y,
+                  true,
+                  K,
+                  M,
+                  N,
+                  1.0,
+                  y_data,
+                  ldy,
+                  dims.y_offsets,
+                  out_grad_data,
+                  N,
+                  dims.out_offsets,
+                  0.0,
+                  dx_data,
+                  M,
+                  dims.x_offsets);
+    } else {
+      // dx = dout * y'
+      BatchedGemm(false,
                   !transpose_y,
                   M,
                   K,
                   N,
+                  1.0,
                   out_grad_data,
+                  N,
+                  dims.out_offsets,
                   y_data,
+                  ldy,
+                  dims.y_offsets,
+                  0.0,
                   dx_data,
-                  y_dims[0],
-                  false,
-                  transpose_x,
-                  true,
-                  true);
+                  K,
+                  dims.x_offsets);
     }
-    // dy = x' * dout
-    if (dy) {
-      auto M = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
-      auto K = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      BatchedGEMM(!transpose_x,
-                  false,
-                  M,
+  }
+  if (dy) {
+    auto dy_data = dev_ctx.template Alloc<T>(dy);
+    if (transpose_y) {
+      // dy = dout' * x
+      BatchedGemm(true,
+                  transpose_x,
+                  N,
                   K,
+                  M,
+                  1.0,
+                  out_grad_data,
                   N,
+                  dims.out_offsets,
                   x_data,
-                  out_grad_data,
+                  ldx,
+                  dims.x_offsets,
+                  0.0,
                   dy_data,
-                  y_dims[0],
+                  K,
+                  dims.y_offsets);
+    } else {
+      // dy = x' * dout
+      BatchedGemm(!transpose_x,
                   false,
-                  transpose_y);
-    }
-    return;
-  } else if (y_ndim == 2) {
-    // dx = dout * y'
-    if (dx) {
-      auto M = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto K = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      auto N = transpose_x ? x_dims[x_ndim - 2] : x_dims[x_ndim - 1];
-      BatchedGEMM(false,
-                  !transpose_y,
-                  M,
                   K,
                   N,
+                  M,
+                  1.0,
+                  x_data,
+                  ldx,
+                  dims.x_offsets,
                   out_grad_data,
-                  y_data,
-                  dx_data,
-                  x_dims[0],
-                  true,
-                  transpose_x);
-    }
-    // dy = x' * dout
-    if (dy) {
-      auto M = transpose_y ? y_dims[y_ndim - 1] : y_dims[y_ndim - 2];
-      auto K = transpose_x ? x_dims[x_ndim - 1] : x_dims[x_ndim - 2];
-      auto N = transpose_y ? y_dims[y_ndim - 2] : y_dims[y_ndim - 1];
-      GEMM(!transpose_x,
-           false,
-           M,
-           K * x_dims[0],
-           N,
-           x_data,
-           out_grad_data,
-           dy_data,
-           transpose_y);
+                  N,
+                  dims.out_offsets,
+                  0.0,
+                  dy_data,
+                  N,
+                  dims.y_offsets);
     }
-    return;
   }
 }
 
@@ -545,7 +299,12 @@ PD_BUILD_PHI_KERNEL(matmul,
                     custom_kernel::MatmulKernel,
                     phi::dtype::float16,
                     float,
-                    double) {}
+                    double,
+                    int8_t) {
+  if (kernel_key.dtype() == phi::DataType::INT8) {
+    kernel->OutputAt(0).SetDataType(phi::DataType::INT32);
+  }
+}
 
 PD_BUILD_PHI_KERNEL(matmul_grad,
                     custom_cpu,
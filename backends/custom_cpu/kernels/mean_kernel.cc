@@ -12,8 +12,10 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "kernels/funcs/reduce.h"
 #include "paddle/phi/capi/all.h"
-#include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
 
 namespace custom_kernel {
 
@@ -21,15 +23,12 @@ template <typename T>
 void MeanAllKernel(const phi::Context& dev_ctx,
                    const phi::DenseTensor& x,
                    phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto out_data = dev_ctx.template Alloc<T>(out);
   auto x_data = x.data<T>();
   auto numel = x.numel();
 
-  *out_data = 0;
-  for (auto i = 0; i < numel; ++i) {
-    *out_data += x_data[i];
-  }
-  *out_data /= static_cast<T>(numel);
+  ReduceDims(x_data, {numel}, {0}, MeanOp<T>(numel), out_data);
 }
 
 template <typename T>
@@ -37,6 +36,7 @@ void MeanAllGradKernel(const phi::Context& dev_ctx,
                        const phi::DenseTensor& x,
                        const phi::DenseTensor& out_grad,
                        phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
   PD_CHECK(out_grad.numel() == 1UL,
            "Mean Gradient should be scalar. But received "
            "Out@Grad's elements num is %d.",
@@ -44,9 +44,12 @@ void MeanAllGradKernel(const phi::Context& dev_ctx,
   auto x_grad_data = dev_ctx.template Alloc<T>(x_grad);
   auto out_grad_data = out_grad.data<T>();
   auto numel = x_grad->numel();
-  for (auto i = 0; i < numel; ++i) {
-    x_grad_data[i] = *out_grad_data / static_cast<T>(numel);
-  }
+  custom_cpu::ParallelFor(
+      0, numel, custom_cpu::kDefaultGrainSize, [&](int64_t b, int64_t e) {
+        for (auto i = b; i < e; ++i) {
+          x_grad_data[i] = *out_grad_data / static_cast<T>(numel);
+        }
+      });
 }
 
 }  // namespace custom_kernel
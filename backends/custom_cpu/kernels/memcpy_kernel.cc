@@ -14,6 +14,7 @@
 
 #include "kernels/phi_funcs.h"
 #include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
@@ -22,9 +23,14 @@ void MemcpyD2HKernel(const phi::Context& dev_ctx,
                      const phi::DenseTensor& x,
                      int dst_place_type,
                      phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto out_data = dev_ctx.HostAlloc<T>(out);
   auto x_data = x.data<T>();
-  memcpy(out_data, x_data, x.memory_size());
+  // Host and device share one address space, an output that already holds
+  // the input buffer needs no copy.
+  if (out_data != x_data) {
+    memcpy(out_data, x_data, x.numel() * sizeof(T));
+  }
 }
 
 template <typename T>
@@ -32,9 +38,12 @@ void MemcpyH2DKernel(const phi::Context& dev_ctx,
                      const phi::DenseTensor& x,
                      int dst_place_type,
                      phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto out_data = dev_ctx.Alloc<T>(out);
   auto x_data = x.data<T>();
-  memcpy(out_data, x_data, x.memory_size());
+  if (out_data != x_data) {
+    memcpy(out_data, x_data, x.numel() * sizeof(T));
+  }
 }
 
 }  // namespace custom_kernel
@@ -0,0 +1,163 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <type_traits>
+
+#include "kernels/funcs/optimizer.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+using TensorList = std::vector<const phi::DenseTensor*>;
+using OutputList = std::vector<phi::DenseTensor*>;
+
+double L2Decay(const std::string& regularization_method,
+               float regularization_coeff) {
+  return regularization_method == "l2_decay" ? regularization_coeff : 0.0;
+}
+
+template <typename T, typename MT>
+void MomentumStep(const phi::Context& dev_ctx,
+                  const TensorList& param,
+                  const TensorList& grad,
+                  const TensorList& velocity,
+                  const TensorList& learning_rate,
+                  const TensorList& master_param,
+                  const std::vector<double>& l2_decay,
+                  const MomentumConfig& config,
+                  const OutputList& param_out,
+                  const OutputList& velocity_out,
+                  const OutputList& master_param_out) {
+  const size_t n = param.size();
+  const bool use_master = !master_param.empty();
+  PD_CHECK(learning_rate.size() == 1 || learning_rate.size() == n,
+           "The number of learning rates must be 1 or %ld, but received %ld.",
+           static_cast<int64_t>(n),
+           static_cast<int64_t>(learning_rate.size()));
+
+  std::vector<MomentumTensors<T, MT>> tensors(n);
+  for (size_t i = 0; i < n; ++i) {
+    auto& t = tensors[i];
+    t.numel = param[i]->numel();
+    t.grad = grad[i]->data<T>();
+    t.param = param[i]->data<T>();
+    t.velocity = velocity[i]->data<MT>();
+    t.param_out = dev_ctx.template Alloc<T>(param_out[i]);
+    t.velocity_out = dev_ctx.template Alloc<MT>(velocity_out[i]);
+    t.master_param = nullptr;
+    t.master_param_out = nullptr;
+    if (use_master) {
+      t.master_param = master_param[i]->data<MT>();
+      t.master_param_out = dev_ctx.template Alloc<MT>(master_param_out[i]);
+    }
+    auto lr = learning_rate[learning_rate.size() == 1 ? 0 : i];
+    t.lr = ScalarTensorValue(*lr);
+    t.l2_decay = l2_decay[i];
+  }
+  MomentumUpdate(config, tensors);
+}
+
+// float16 and bfloat16 parameters keep an fp32 velocity under multi
+// precision training.
+template <typename T>
+void MomentumDispatch(const phi::Context& dev_ctx,
+                      const TensorList& param,
+                      const TensorList& grad,
+                      const TensorList& velocity,
+                      const TensorList& learning_rate,
+                      const TensorList& master_param,
+                      const std::vector<double>& l2_decay,
+                      const MomentumConfig& config,
+                      const OutputList& param_out,
+                      const OutputList& velocity_out,
+                      const OutputList& master_param_out) {
+  using MPType = typename MPTypeTrait<T>::Type;
+  if (!std::is_same<T, MPType>::value &&
+      velocity[0]->dtype() == phi::capi::CppTypeToPDType<MPType>::Type()) {
+    MomentumStep<T, MPType>(dev_ctx,
+                            param,
+                            grad,
+                            velocity,
+                            learning_rate,
+                            master_param,
+                            l2_decay,
+                            config,
+                            param_out,
+                            velocity_out,
+                            master_param_out);
+  } else {
+    MomentumStep<T, T>(dev_ctx,
+                       param,
+                       grad,
+                       velocity,
+                       learning_rate,
+                       master_param,
+                       l2_decay,
+                       config,
+                       param_out,
+                       velocity_out,
+                       master_param_out);
+  }
+}
+
+}  // namespace
+
+template <typename T>
+void MomentumDenseKernel(const phi::Context& dev_ctx,
+                         const phi::DenseTensor& param,
+                         const phi::DenseTensor& grad,
+                         const phi::DenseTensor& velocity,
+                         const phi::DenseTensor& learning_rate,
+                         const paddle::optional<phi::DenseTensor>& master_param,
+                         float mu,
+                         bool use_nesterov,
+                         const std::string& regularization_method,
+                         float regularization_coeff,
+                         bool multi_precision,
+                         float rescale_grad,
+                         phi::DenseTensor* param_out,
+                         phi::DenseTensor* velocity_out,
+                         phi::DenseTensor* master_param_out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  MomentumConfig config{mu, rescale_grad, use_nesterov};
+  TensorList master;
+  if (multi_precision && master_param) {
+    master.push_back(master_param.get_ptr());
+  }
+  MomentumDispatch<T>(dev_ctx,
+                      {&param},
+                      {&grad},
+                      {&velocity},
+                      {&learning_rate},
+                      master,
+                      {L2Decay(regularization_method, regularization_coeff)},
+                      config,
+                      {param_out},
+                      {velocity_out},
+                      {master_param_out});
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(momentum,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::MomentumDenseKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
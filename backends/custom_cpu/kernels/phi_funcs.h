@@ -20,6 +20,7 @@
 #include <sstream>
 
 #include "paddle/phi/capi/all.h"
+#include "runtime/thread_pool.h"
 
 namespace phi {
 
@@ -299,7 +300,6 @@ static inline void BroadcastTo(const phi::Context& dev_ctx,
   }
 
   auto numel = out->numel();
-  std::vector<size_t> index(out_dims.size(), 0);
   std::vector<size_t> in_step(tmp_dims.size(), 1);
   std::vector<size_t> out_step(out_dims.size(), 1);
   for (auto i = tmp_dims.size() - 1; i > 0; --i) {
@@ -309,27 +309,34 @@ static inline void BroadcastTo(const phi::Context& dev_ctx,
     out_step[i - 1] = out_step[i] * out_dims[i];
   }
 
-  for (auto i = 0; i < numel; ++i) {
-    auto src_index = index;
-    for (auto j = 0; j < tmp_dims.size(); ++j) {
-      if (tmp_dims[j] == 1) {
-        src_index[j] = 0;
-      }
-    }
-
-    out_data[phi::vec_product(index, out_step)] =
-        in_data[phi::vec_product(src_index, in_step)];
-
-    index.back()++;
-    for (auto j = index.size() - 1; j > 0; --j) {
-      if (index[j] >= out_dims[j]) {
-        index[j] = 0;
-        index[j - 1]++;
-      } else {
-        break;
-      }
-    }
-  }
+  custom_cpu::ParallelFor(
+      0, numel, custom_cpu::kDefaultGrainSize, [&](int64_t b, int64_t e) {
+        std::vector<size_t> index(out_dims.size(), 0);
+        for (auto j = 0; j < out_dims.size(); ++j) {
+          index[j] = b / out_step[j] % out_dims[j];
+        }
+        for (auto i = b; i < e; ++i) {
+          auto src_index = index;
+          for (auto j = 0; j < tmp_dims.size(); ++j) {
+            if (tmp_dims[j] == 1) {
+              src_index[j] = 0;
+            }
+          }
+
+          out_data[phi::vec_product(index, out_step)] =
+              in_data[phi::vec_product(src_index, in_step)];
+
+          index.back()++;
+          for (auto j = index.size() - 1; j > 0; --j) {
+            if (index[j] >= out_dims[j]) {
+              index[j] = 0;
+              index[j - 1]++;
+            } else {
+              break;
+            }
+          }
+        }
+      });
 }
 
 static inline std::vector<int64_t> BroadcastDims(
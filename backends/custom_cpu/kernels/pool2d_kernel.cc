@@ -0,0 +1,162 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/pool.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+Conv2dShape MakePool2dShape(const phi::DenseTensor& x,
+                            const phi::DenseTensor& out,
+                            const phi::IntArray& kernel_size,
+                            const std::vector<int64_t>& strides,
+                            const std::vector<int64_t>& paddings,
+                            const std::string& data_format,
+                            bool global_pooling,
+                            bool adaptive,
+                            const std::string& padding_algorithm) {
+  auto in_dims = x.dims();
+  auto out_dims = out.dims();
+  PD_CHECK(in_dims.size() == 4,
+           "pool2d expects a 4-D input, but received %ld-D.",
+           static_cast<int64_t>(in_dims.size()));
+  Conv2dShape s;
+  s.channels_last = data_format == "NHWC";
+  s.batch = in_dims[0];
+  s.in_channels = s.channels_last ? in_dims[3] : in_dims[1];
+  s.in_h = s.channels_last ? in_dims[1] : in_dims[2];
+  s.in_w = s.channels_last ? in_dims[2] : in_dims[3];
+  s.out_channels = s.in_channels;
+  s.out_h = s.channels_last ? out_dims[1] : out_dims[2];
+  s.out_w = s.channels_last ? out_dims[2] : out_dims[3];
+  auto kernel = kernel_size.GetData();
+  s.kernel_h = global_pooling ? s.in_h : kernel[0];
+  s.kernel_w = global_pooling ? s.in_w : kernel[1];
+  s.stride_h = strides[0];
+  s.stride_w = strides[1];
+  s.dilation_h = 1;
+  s.dilation_w = 1;
+  s.groups = 1;
+
+  std::vector<int64_t> pads(paddings);
+  ResolvePadding(padding_algorithm,
+                 s.in_h,
+                 s.in_w,
+                 s.kernel_h,
+                 s.kernel_w,
+                 s.stride_h,
+                 s.stride_w,
+                 &pads,
+                 nullptr);
+  const bool unpadded = global_pooling || adaptive;
+  s.pad_top = unpadded ? 0 : pads[0];
+  s.pad_left = unpadded ? 0 : pads[2];
+  return s;
+}
+
+PoolType ParsePoolType(const std::string& pooling_type) {
+  PD_CHECK(pooling_type == "max" || pooling_type == "avg",
+           "Unsupported pooling type %s, expected max or avg.",
+           pooling_type.c_str());
+  return pooling_type == "max" ? PoolType::kMax : PoolType::kAvg;
+}
+
+}  // namespace
+
+template <typename T>
+void Pool2dKernel(const phi::Context& dev_ctx,
+                  const phi::DenseTensor& x,
+                  const phi::IntArray& kernel_size,
+                  const std::vector<int64_t>& strides,
+                  const std::vector<int64_t>& paddings,
+                  bool ceil_mode,
+                  bool exclusive,
+                  const std::string& data_format,
+                  const std::string& pooling_type,
+                  bool global_pooling,
+                  bool adaptive,
+                  const std::string& padding_algorithm,
+                  phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto shape = MakePool2dShape(x,
+                               *out,
+                               kernel_size,
+                               strides,
+                               paddings,
+                               data_format,
+                               global_pooling,
+                               adaptive,
+                               padding_algorithm);
+  Pool2dForward(shape,
+                ParsePoolType(pooling_type),
+                exclusive,
+                adaptive,
+                x.data<T>(),
+                dev_ctx.template Alloc<T>(out));
+}
+
+template <typename T>
+void Pool2dGradKernel(const phi::Context& dev_ctx,
+                      const phi::DenseTensor& x,
+                      const phi::DenseTensor& out,
+                      const phi::DenseTensor& out_grad,
+                      const phi::IntArray& kernel_size,
+                      const std::vector<int64_t>& strides,
+                      const std::vector<int64_t>& paddings,
+                      bool ceil_mode,
+                      bool exclusive,
+                      const std::string& data_format,
+                      const std::string& pooling_type,
+                      bool global_pooling,
+                      bool adaptive,
+                      const std::string& padding_algorithm,
+                      phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto shape = MakePool2dShape(x,
+                               out,
+                               kernel_size,
+                               strides,
+                               paddings,
+                               data_format,
+                               global_pooling,
+                               adaptive,
+                               padding_algorithm);
+  Pool2dBackward(shape,
+                 ParsePoolType(pooling_type),
+                 exclusive,
+                 adaptive,
+                 x.data<T>(),
+                 out.data<T>(),
+                 out_grad.data<T>(),
+                 dev_ctx.template Alloc<T>(x_grad));
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(pool2d,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::Pool2dKernel,
+                    float,
+                    double) {}
+
+PD_BUILD_PHI_KERNEL(pool2d_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::Pool2dGradKernel,
+                    float,
+                    double) {}
@@ -12,13 +12,15 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
-#include <cmath>
-
-#include "kernels/phi_funcs.h"
+#include "kernels/funcs/reduce.h"
 #include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
+// Folds the elements of x reduced into each output element in row-major
+// order, out[o] = reduce(...reduce(init, x[first])..., x[last]). Output
+// elements are independent and spread over the intra-op thread pool.
 template <typename T>
 void MeanRawKernel(const phi::Context& dev_ctx,
                    const phi::DenseTensor& x,
@@ -26,6 +28,7 @@ void MeanRawKernel(const phi::Context& dev_ctx,
                    bool keep_dim,
                    bool reduce_all,
                    phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto x_dims = x.dims();
   auto reduce_dims = dims.GetData();
   if (reduce_all) {
@@ -43,39 +46,11 @@ void MeanRawKernel(const phi::Context& dev_ctx,
   auto x_data = x.data<T>();
   auto out_data = dev_ctx.template Alloc<T>(out);
 
-  auto numel = x.numel();
-  auto out_dims(x_dims);
-  for (auto d : reduce_dims) {
-    out_dims[d] = 1;
-  }
-  std::vector<size_t> index(x_dims.size(), 0);
-  std::vector<size_t> step(x_dims.size(), 1);
-  std::vector<size_t> dst_step = step;
-  for (auto i = x_dims.size() - 1; i > 0; --i) {
-    step[i - 1] = step[i] * x_dims[i];
-    dst_step[i - 1] = dst_step[i] * out_dims[i];
-  }
-  for (auto d : reduce_dims) {
-    dst_step[d] = 0;
-  }
-  memset(out_data, 0, sizeof(T) * out->numel());
-  size_t reduce_numel = 1;
+  int64_t reduce_numel = 1;
   for (auto d : reduce_dims) {
     reduce_numel *= x_dims[d];
   }
-  for (auto i = 0; i < numel; ++i) {
-    out_data[phi::vec_product(dst_step, index)] +=
-        x_data[phi::vec_product(step, index)] / reduce_numel;
-    index.back()++;
-    for (auto j = index.size() - 1; j > 0; --j) {
-      if (index[j] >= x_dims[j]) {
-        index[j] = 0;
-        index[j - 1]++;
-      } else {
-        break;
-      }
-    }
-  }
+  ReduceDims(x_data, x_dims, reduce_dims, MeanOp<T>(reduce_numel), out_data);
 }
 
 template <typename T>
@@ -99,6 +74,7 @@ void SumRawKernel(const phi::Context& dev_ctx,
                   bool reduce_all,
                   phi::DataType out_dtype,
                   phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto x_dims = x.dims();
   auto reduce_dims = dims.GetData();
   if (reduce_dims.size() == 0) {
@@ -120,36 +96,7 @@ void SumRawKernel(const phi::Context& dev_ctx,
   auto x_data = x.data<T>();
   auto out_data = dev_ctx.template Alloc<T>(out);
 
-  auto numel = x.numel();
-  auto out_dims(x_dims);
-  for (auto d : reduce_dims) {
-    out_dims[d] = 1;
-  }
-  std::vector<size_t> index(x_dims.size(), 0);
-  std::vector<size_t> step(x_dims.size(), 1);
-  std::vector<size_t> dst_step = step;
-  for (auto i = x_dims.size() - 1; i > 0; --i) {
-    step[i - 1] = step[i] * x_dims[i];
-    dst_step[i - 1] = dst_step[i] * out_dims[i];
-  }
-  for (auto d : reduce_dims) {
-    dst_step[d] = 0;
-  }
-
-  memset(out_data, 0, sizeof(T) * out->numel());
-  for (auto i = 0; i < numel; ++i) {
-    out_data[phi::vec_product(dst_step, index)] +=
-        x_data[phi::vec_product(step, index)];
-    index.back()++;
-    for (auto j = index.size() - 1; j > 0; --j) {
-      if (index[j] >= x_dims[j]) {
-        index[j] = 0;
-        index[j - 1]++;
-      } else {
-        break;
-      }
-    }
-  }
+  ReduceDims(x_data, x_dims, reduce_dims, SumOp<T>(), out_data);
 }
 
 template <typename T>
@@ -173,6 +120,7 @@ void MinRawKernel(const phi::Context& dev_ctx,
                   bool keep_dim,
                   bool reduce_all,
                   phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto x_dims = x.dims();
   auto reduce_dims = dims.GetData();
   if (reduce_dims.size() == 0) {
@@ -194,36 +142,7 @@ void MinRawKernel(const phi::Context& dev_ctx,
   auto x_data = x.data<T>();
   auto out_data = dev_ctx.template Alloc<T>(out);
 
-  auto numel = x.numel();
-  auto out_dims(x_dims);
-  for (auto d : reduce_dims) {
-    out_dims[d] = 1;
-  }
-  std::vector<size_t> index(x_dims.size(), 0);
-  std::vector<size_t> step(x_dims.size(), 1);
-  std::vector<size_t> dst_step = step;
-  for (auto i = x_dims.size() - 1; i > 0; --i) {
-    step[i - 1] = step[i] * x_dims[i];
-    dst_step[i - 1] = dst_step[i] * out_dims[i];
-  }
-  for (auto d : reduce_dims) {
-    dst_step[d] = 0;
-  }
-  std::fill(out_data, out_data + out->numel(), std::numeric_limits<T>::max());
-  for (auto i = 0; i < numel; ++i) {
-    out_data[phi::vec_product(dst_step, index)] =
-        std::min(out_data[phi::vec_product(dst_step, index)],
-                 x_data[phi::vec_product(step, index)]);
-    index.back()++;
-    for (auto j = index.size() - 1; j > 0; --j) {
-      if (index[j] >= x_dims[j]) {
-        index[j] = 0;
-        index[j - 1]++;
-      } else {
-        break;
-      }
-    }
-  }
+  ReduceDims(x_data, x_dims, reduce_dims, MinOp<T>(), out_data);
 }
 
 template <typename T>
@@ -246,6 +165,7 @@ void MaxRawKernel(const phi::Context& dev_ctx,
                   bool keep_dim,
                   bool reduce_all,
                   phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto x_dims = x.dims();
   auto reduce_dims = dims.GetData();
   if (reduce_all) {
@@ -263,37 +183,7 @@ void MaxRawKernel(const phi::Context& dev_ctx,
   auto x_data = x.data<T>();
   auto out_data = dev_ctx.template Alloc<T>(out);
 
-  auto numel = x.numel();
-  auto out_dims(x_dims);
-  for (auto d : reduce_dims) {
-    out_dims[d] = 1;
-  }
-  std::vector<size_t> index(x_dims.size(), 0);
-  std::vector<size_t> step(x_dims.size(), 1);
-  std::vector<size_t> dst_step = step;
-  for (auto i = x_dims.size() - 1; i > 0; --i) {
-    step[i - 1] = step[i] * x_dims[i];
-    dst_step[i - 1] = dst_step[i] * out_dims[i];
-  }
-  for (auto d : reduce_dims) {
-    dst_step[d] = 0;
-  }
-  std::fill(
-      out_data, out_data + out->numel(), std::numeric_limits<T>::lowest());
-  for (auto i = 0; i < numel; ++i) {
-    out_data[phi::vec_product(dst_step, index)] =
-        std::max(out_data[phi::vec_product(dst_step, index)],
-                 x_data[phi::vec_product(step, index)]);
-    index.back()++;
-    for (auto j = index.size() - 1; j > 0; --j) {
-      if (index[j] >= x_dims[j]) {
-        index[j] = 0;
-        index[j - 1]++;
-      } else {
-        break;
-      }
-    }
-  }
+  ReduceDims(x_data, x_dims, reduce_dims, MaxOp<T>(), out_data);
 }
 
 template <typename T>
@@ -12,10 +12,10 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
-#include <cstring>
-
+#include "kernels/funcs/strided_copy.h"
 #include "paddle/phi/capi/all.h"
 #include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
@@ -121,11 +121,14 @@ static std::vector<int64_t> ValidateShape(const std::vector<int64_t> shape,
   return output_shape;
 }
 
+// Reshape keeps the element order, so out is x with new dims. The executor
+// shares x into out for this view op where it can, otherwise x is copied.
 template <typename T>
-void ReshapeInferKernel(const phi::Context& dev_ctx,
-                        const phi::DenseTensor& x,
-                        const phi::IntArray& shape,
-                        phi::DenseTensor* out) {
+void ReshapeKernel(const phi::Context& dev_ctx,
+                   const phi::DenseTensor& x,
+                   const phi::IntArray& shape,
+                   phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   auto x_dims = x.dims();
   auto out_dims = ValidateShape(shape.GetData(), x_dims);
   out->Resize(out_dims);
@@ -135,34 +138,29 @@ void ReshapeInferKernel(const phi::Context& dev_ctx,
     out->share_lod(x);
   }
 
-  dev_ctx.Alloc(out, x.dtype());
   if (!(x.initialized() && x.Holder() == out->Holder())) {
-    dev_ctx.Alloc(out, x.dtype());
-    auto dims = out->dims();
-    auto x_data = x.data<T>();
-    auto out_data = out->data<T>();
-
-    memcpy(out_data, x_data, x.numel() * sizeof(T));
-    out->Resize(dims);
+    auto out_data = dev_ctx.template Alloc<T>(out);
+    StridedCopy(
+        x.data<T>(), x.strides(), out_data, phi::CalcStrides(x_dims), x_dims);
     out->ResetLoD(x.lod());
   }
 }
 
 template <typename T>
-void ReshapeKernel(const phi::Context& dev_ctx,
-                   const phi::DenseTensor& x,
-                   const phi::IntArray& shape,
-                   phi::DenseTensor* out,
-                   phi::DenseTensor* xshape) {
-  ReshapeInferKernel<T>(dev_ctx, x, shape, out);
+void ReshapeWithXShapeKernel(const phi::Context& dev_ctx,
+                             const phi::DenseTensor& x,
+                             const phi::IntArray& shape,
+                             phi::DenseTensor* out,
+                             phi::DenseTensor* xshape) {
+  ReshapeKernel<T>(dev_ctx, x, shape, out);
 }
 
 }  // namespace custom_kernel
 
-PD_BUILD_PHI_KERNEL(reshape_infer,
+PD_BUILD_PHI_KERNEL(reshape,
                     custom_cpu,
                     ALL_LAYOUT,
-                    custom_kernel::ReshapeInferKernel,
+                    custom_kernel::ReshapeKernel,
                     float,
                     double,
                     int8_t,
@@ -170,12 +168,14 @@ PD_BUILD_PHI_KERNEL(reshape_infer,
                     int32_t,
                     int64_t,
                     uint8_t,
-                    bool) {}
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
 
-PD_BUILD_PHI_KERNEL(reshape,
+PD_BUILD_PHI_KERNEL(reshape_with_xshape,
                     custom_cpu,
                     ALL_LAYOUT,
-                    custom_kernel::ReshapeKernel,
+                    custom_kernel::ReshapeWithXShapeKernel,
                     float,
                     double,
                     int8_t,
@@ -183,4 +183,6 @@ PD_BUILD_PHI_KERNEL(reshape,
                     int32_t,
                     int64_t,
                     uint8_t,
-                    bool) {}
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
@@ -0,0 +1,220 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <vector>
+
+#include "kernels/funcs/norm.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// The first dim of x that rms_norm normalises, checking that the trailing
+// dims of x match normalized_shape.
+int RmsNormBegin(const phi::DenseTensor& x,
+                 const std::vector<int64_t>& normalized_shape) {
+  auto dims = x.dims();
+  const int begin = static_cast<int>(dims.size() - normalized_shape.size());
+  PD_CHECK(normalized_shape.size() <= dims.size(),
+           "normalized_shape of rms_norm has %ld dims, more than x's %ld.",
+           static_cast<int64_t>(normalized_shape.size()),
+           static_cast<int64_t>(dims.size()));
+  for (size_t i = 0; i < normalized_shape.size(); ++i) {
+    PD_CHECK(dims[begin + i] == normalized_shape[i],
+             "normalized_shape of rms_norm does not match the trailing dims "
+             "of x: %ld vs %ld.",
+             normalized_shape[i],
+             dims[begin + i]);
+  }
+  return begin;
+}
+
+}  // namespace
+
+template <typename T>
+void RmsNormKernel(const phi::Context& dev_ctx,
+                   const phi::DenseTensor& x,
+                   const paddle::optional<phi::DenseTensor>& scale,
+                   const std::vector<int64_t>& normalized_shape,
+                   double epsilon,
+                   phi::DenseTensor* y,
+                   phi::DenseTensor* invvar) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  NormForwardArgs<T> args;
+  NormMatrix(
+      x.dims(), RmsNormBegin(x, normalized_shape), &args.rows, &args.cols);
+  args.rms = true;
+  args.epsilon = epsilon;
+  args.x = x.data<T>();
+  args.scale = NormParamData<T>(scale.get_ptr(), x, "scale");
+  args.out = dev_ctx.template Alloc<T>(y);
+  args.inv_std = invvar ? dev_ctx.template Alloc<CT>(invvar) : nullptr;
+  NormForward(args);
+}
+
+template <typename T>
+void RmsNormGradKernel(const phi::Context& dev_ctx,
+                       const phi::DenseTensor& x,
+                       const paddle::optional<phi::DenseTensor>& scale,
+                       const phi::DenseTensor& invvar,
+                       const phi::DenseTensor& y_grad,
+                       const std::vector<int64_t>& normalized_shape,
+                       double epsilon,
+                       phi::DenseTensor* x_grad,
+                       phi::DenseTensor* scale_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  NormBackwardArgs<T> args;
+  NormMatrix(
+      x.dims(), RmsNormBegin(x, normalized_shape), &args.rows, &args.cols);
+  args.x = x.data<T>();
+  args.scale = NormParamData<T>(scale.get_ptr(), x, "scale");
+  args.inv_std = invvar.data<CT>();
+  args.out_grad = y_grad.data<T>();
+  args.x_grad = x_grad ? dev_ctx.template Alloc<T>(x_grad) : nullptr;
+  args.scale_grad =
+      NormParamGradData<T>(dev_ctx, scale.get_ptr(), x, "scale", scale_grad);
+  NormBackward(args);
+}
+
+// x + bias + residual goes to residual_out and its RMS norm to out, rounded
+// to int8 when quant_scale is positive.
+template <typename T>
+void FusedRmsNormQuantKernel(
+    const phi::Context& dev_ctx,
+    const phi::DenseTensor& x,
+    const paddle::optional<phi::DenseTensor>& bias,
+    const paddle::optional<phi::DenseTensor>& residual,
+    const phi::DenseTensor& norm_weight,
+    const paddle::optional<phi::DenseTensor>& norm_bias,
+    float epsilon,
+    int begin_norm_axis,
+    float quant_scale,
+    int quant_round_type,
+    float quant_max_bound,
+    float quant_min_bound,
+    phi::DenseTensor* out,
+    phi::DenseTensor* residual_out,
+    phi::DenseTensor* inv_var) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  NormForwardArgs<T> args;
+  NormMatrix(x.dims(), begin_norm_axis, &args.rows, &args.cols);
+  args.rms = true;
+  args.epsilon = epsilon;
+  args.x = x.data<T>();
+  args.bias = bias ? bias->data<T>() : nullptr;
+  args.residual = residual ? residual->data<T>() : nullptr;
+  args.scale = NormParamData<T>(&norm_weight, x, "norm_weight");
+  args.shift = NormParamData<T>(norm_bias.get_ptr(), x, "norm_bias");
+  if (quant_scale > 0) {
+    args.quant_out = dev_ctx.template Alloc<int8_t>(out);
+    args.quant = {
+        quant_scale, quant_round_type, quant_max_bound, quant_min_bound};
+  } else {
+    args.out = dev_ctx.template Alloc<T>(out);
+  }
+  if (residual_out && residual) {
+    args.residual_out = dev_ctx.template Alloc<T>(residual_out);
+  }
+  args.inv_std = inv_var ? dev_ctx.template Alloc<CT>(inv_var) : nullptr;
+  NormForward(args);
+}
+
+// Gradients of fused_rms_norm_quant without its bias and residual fusion
+// and without quantization, which, as in phi, are rejected: out is then the
+// RMS norm of x, and norm_bias_grad the column sums of out_grad.
+template <typename T>
+void FusedRmsNormQuantGradKernel(
+    const phi::Context& dev_ctx,
+    const phi::DenseTensor& x,
+    const paddle::optional<phi::DenseTensor>& bias,
+    const paddle::optional<phi::DenseTensor>& residual,
+    const phi::DenseTensor& norm_weight,
+    const paddle::optional<phi::DenseTensor>& norm_bias,
+    const phi::DenseTensor& inv_var,
+    const phi::DenseTensor& out_grad,
+    float epsilon,
+    int begin_norm_axis,
+    float quant_scale,
+    phi::DenseTensor* x_grad,
+    phi::DenseTensor* norm_weight_grad,
+    phi::DenseTensor* norm_bias_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using CT = typename MPTypeTrait<T>::Type;
+  PD_CHECK(!bias && !residual,
+           "fused_rms_norm_quant_grad does not support bias or residual.");
+  PD_CHECK(quant_scale <= 0,
+           "fused_rms_norm_quant_grad does not support quantized outputs, "
+           "but received quant_scale %f.",
+           quant_scale);
+  NormBackwardArgs<T> args;
+  NormMatrix(x.dims(), begin_norm_axis, &args.rows, &args.cols);
+  args.x = x.data<T>();
+  args.scale = NormParamData<T>(&norm_weight, x, "norm_weight");
+  args.inv_std = inv_var.data<CT>();
+  args.out_grad = out_grad.data<T>();
+  args.x_grad = x_grad ? dev_ctx.template Alloc<T>(x_grad) : nullptr;
+  args.scale_grad = NormParamGradData<T>(
+      dev_ctx, &norm_weight, x, "norm_weight", norm_weight_grad);
+  args.shift_grad = NormParamGradData<T>(
+      dev_ctx, norm_bias.get_ptr(), x, "norm_bias", norm_bias_grad);
+  NormBackward(args);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(rms_norm,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::RmsNormKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->OutputAt(1).SetDataType(phi::DataType::FLOAT32);
+}
+
+PD_BUILD_PHI_KERNEL(rms_norm_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::RmsNormGradKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->InputAt(2).SetDataType(phi::DataType::FLOAT32);
+}
+
+PD_BUILD_PHI_KERNEL(fused_rms_norm_quant,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::FusedRmsNormQuantKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->OutputAt(0).SetDataType(phi::DataType::UNDEFINED);
+  kernel->OutputAt(2).SetDataType(phi::DataType::FLOAT32);
+}
+
+PD_BUILD_PHI_KERNEL(fused_rms_norm_quant_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::FusedRmsNormQuantGradKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->InputAt(5).SetDataType(phi::DataType::FLOAT32);
+}
@@ -0,0 +1,105 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/cast.h"
+#include "kernels/funcs/gather.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+// out is x with the rows index[i] of its first dim replaced by the rows of
+// updates: the last of repeated indices wins with overwrite, they are summed
+// otherwise.
+template <typename T>
+void ScatterKernel(const phi::Context& dev_ctx,
+                   const phi::DenseTensor& x,
+                   const phi::DenseTensor& index,
+                   const phi::DenseTensor& updates,
+                   bool overwrite,
+                   phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const T* x_data = x.data<T>();
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  if (out_data != x_data) {
+    CastData(x_data, x.dtype(), out_data, x.dtype(), x.numel());
+  }
+  if (x.numel() == 0) {
+    return;
+  }
+  const int64_t n = x.dims()[0];
+  auto rows = NormalizeIndex(index, n, false, "scatter");
+  ScatterRows(updates.data<T>(),
+              1,
+              rows.size(),
+              x.numel() / n,
+              rows.data(),
+              n,
+              overwrite ? ScatterMode::kAssign : ScatterMode::kSum,
+              out_data);
+}
+
+template <typename T>
+void ScatterGradKernel(const phi::Context& dev_ctx,
+                       const phi::DenseTensor& index,
+                       const phi::DenseTensor& updates,
+                       const phi::DenseTensor& out_grad,
+                       bool overwrite,
+                       phi::DenseTensor* x_grad,
+                       phi::DenseTensor* updates_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const int64_t n = out_grad.dims()[0];
+  const int64_t row = n == 0 ? 0 : out_grad.numel() / n;
+  auto rows = NormalizeIndex(index, n, false, "scatter_grad");
+  if (x_grad) {
+    T* x_grad_data = dev_ctx.template Alloc<T>(x_grad);
+    CastData(out_grad.data<T>(),
+             out_grad.dtype(),
+             x_grad_data,
+             out_grad.dtype(),
+             out_grad.numel());
+    ZeroRows(x_grad_data, n, row * sizeof(T), rows.data(), rows.size());
+  }
+  if (updates_grad) {
+    GatherRows(out_grad.data<T>(),
+               1,
+               n,
+               row * sizeof(T),
+               rows.data(),
+               rows.size(),
+               dev_ctx.template Alloc<T>(updates_grad));
+  }
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(scatter,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::ScatterKernel,
+                    float,
+                    double,
+                    int32_t,
+                    int64_t,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(scatter_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::ScatterGradKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
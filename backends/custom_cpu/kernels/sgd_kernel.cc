@@ -12,7 +12,10 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "kernels/funcs/optimizer.h"
 #include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
 
 namespace custom_kernel {
 
@@ -20,16 +23,34 @@ template <typename T>
 void sgd_dense_param_dense_grad_impl(const phi::DenseTensor& param,
                                      const phi::DenseTensor& learning_rate,
                                      const phi::DenseTensor& grad,
-                                     phi::DenseTensor* param_out) {
+                                     const phi::DenseTensor* master_param,
+                                     phi::DenseTensor* param_out,
+                                     phi::DenseTensor* master_param_out) {
+  // float16 and bfloat16 parameters are updated in float, and in their fp32
+  // master weights when those are given.
+  using MPType = typename MPTypeTrait<T>::Type;
   const auto sz = param_out->numel();
-  const T* lr = learning_rate.data<T>();
+  const MPType lr = static_cast<MPType>(ScalarTensorValue(learning_rate));
   const T* param_data = param.data<T>();
   const T* grad_data = grad.data<T>();
+  const MPType* master_data =
+      master_param ? master_param->data<MPType>() : nullptr;
   T* out_data = param_out->data<T>();
+  MPType* master_out_data =
+      master_param ? master_param_out->data<MPType>() : nullptr;
 
-  for (auto i = 0; i < sz; ++i) {
-    out_data[i] = param_data[i] - *lr * grad_data[i];
-  }
+  custom_cpu::ParallelFor(
+      0, sz, custom_cpu::kDefaultGrainSize, [&](int64_t b, int64_t e) {
+        for (auto i = b; i < e; ++i) {
+          MPType p =
+              master_data ? master_data[i] : static_cast<MPType>(param_data[i]);
+          p -= lr * static_cast<MPType>(grad_data[i]);
+          if (master_out_data) {
+            master_out_data[i] = p;
+          }
+          out_data[i] = static_cast<T>(p);
+        }
+      });
 }
 
 template <typename T>
@@ -41,11 +62,24 @@ void SGDDenseKernel(const phi::Context& dev_ctx,
                     bool multi_precision,
                     phi::DenseTensor* param_out,
                     phi::DenseTensor* master_param_out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  using MPType = typename MPTypeTrait<T>::Type;
   dev_ctx.template Alloc<T>(param_out);
-  sgd_dense_param_dense_grad_impl<T>(param, learning_rate, grad, param_out);
+  const phi::DenseTensor* master = nullptr;
+  if (multi_precision && master_param) {
+    master = master_param.get_ptr();
+    dev_ctx.template Alloc<MPType>(master_param_out);
+  }
+  sgd_dense_param_dense_grad_impl<T>(
+      param, learning_rate, grad, master, param_out, master_param_out);
 }
 }  // namespace custom_kernel
 
-PD_BUILD_PHI_KERNEL(
-    sgd, custom_cpu, ALL_LAYOUT, custom_kernel::SGDDenseKernel, float, double) {
-}
+PD_BUILD_PHI_KERNEL(sgd,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::SGDDenseKernel,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
@@ -12,21 +12,29 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "kernels/funcs/strided_copy.h"
 #include "paddle/phi/capi/all.h"
 #include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
-template <typename T>
-void SliceRawKernel(const phi::Context& ctx,
-                    const phi::DenseTensor& input,
-                    const std::vector<int64_t>& axes,
-                    const phi::IntArray& starts_arr,
-                    const phi::IntArray& ends_arr,
-                    const std::vector<int64_t>& infer_flags,
-                    const std::vector<int64_t>& decrease_axis,
-                    phi::DenseTensor* out) {
-  // Step 1: Get the accurate attribute value of starts and ends
+namespace {
+
+// A slice of the input read in place: dims and strides in elements, offset
+// in elements from the first input element.
+struct SliceView {
+  std::vector<int64_t> dims;
+  std::vector<int64_t> strides;
+  int64_t offset;
+};
+
+SliceView MakeSliceView(const phi::DenseTensor& input,
+                        const std::vector<int64_t>& axes,
+                        const phi::IntArray& starts_arr,
+                        const phi::IntArray& ends_arr,
+                        const std::vector<int64_t>& infer_flags,
+                        const std::vector<int64_t>& decrease_axis) {
   auto starts = starts_arr.GetData();
   auto ends = ends_arr.GetData();
   PD_CHECK(starts.size() == axes.size(),
@@ -34,16 +42,7 @@ void SliceRawKernel(const phi::Context& ctx,
   PD_CHECK(ends.size() == axes.size(),
            "The size of ends must be equal to the size of axes.");
 
-  // Step 2: Compute output
-  auto in = &input;
-  auto in_data = input.data<T>();
-  int rank = input.dims().size();
-
-  auto in_dims = in->dims();
-  auto out_dims = out->dims();
-  auto slice_dims = out_dims;
-
-  // 2.1 Infer output dims
+  auto in_dims = input.dims();
   for (size_t i = 0; i < axes.size(); ++i) {
     // when start == -1 && end == start+1
     if (starts[i] == -1 && ends[i] == 0 && infer_flags[i] == -1) {
@@ -53,49 +52,50 @@ void SliceRawKernel(const phi::Context& ctx,
       }
     }
   }
-
   phi::funcs::CheckAndUpdateSliceAttrs<int64_t>(in_dims, axes, &starts, &ends);
-  slice_dims = phi::funcs::GetSliceDims<int64_t>(
+  auto slice_dims = phi::funcs::GetSliceDims<int64_t>(
       in_dims, axes, starts, ends, nullptr, nullptr);
-  out_dims = phi::funcs::GetDecreasedDims<int64_t>(slice_dims, decrease_axis);
-
-  // 2.2 Get output
-  auto offsets = std::vector<size_t>(rank);
-  auto extents = std::vector<size_t>(rank);
 
-  for (size_t i = 0; i < rank; ++i) {
-    offsets[i] = 0;
-    extents[i] = slice_dims[i];
-  }
+  auto in_strides = input.strides();
+  int64_t offset = 0;
   for (size_t i = 0; i < axes.size(); ++i) {
-    offsets[axes[i]] = starts[i];
-  }
-
-  out->Resize(slice_dims);
-  auto out_data = ctx.template Alloc<T>(out);
-
-  std::vector<size_t> in_step(rank, 1);
-  for (auto i = rank - 1; i > 0; --i) {
-    in_step[i - 1] = in_step[i] * in_dims[i];
+    offset += starts[i] * in_strides[axes[i]];
   }
 
-  auto numel = phi::product(slice_dims);
-  auto index = std::vector<size_t>(offsets.cbegin(), offsets.cend());
-  for (auto i = 0; i < numel; i += slice_dims.back()) {
-    memcpy(out_data + i,
-           in_data + phi::vec_product(index, in_step),
-           sizeof(T) * slice_dims.back());
-    index[index.size() - 2]++;
-    for (auto j = index.size() - 2; j > 0; --j) {
-      if (index[j] >= offsets[j] + extents[j]) {
-        index[j] = offsets[j];
-        index[j - 1] += 1;
-      } else {
-        break;
-      }
+  // Decreased axes have size 1 and are dropped along with their strides.
+  SliceView view{{}, {}, offset};
+  for (size_t i = 0; i < slice_dims.size(); ++i) {
+    if (std::find(decrease_axis.begin(),
+                  decrease_axis.end(),
+                  static_cast<int64_t>(i)) == decrease_axis.end()) {
+      view.dims.push_back(slice_dims[i]);
+      view.strides.push_back(in_strides[i]);
     }
   }
-  out->Resize(out_dims);
+  return view;
+}
+
+}  // namespace
+
+template <typename T>
+void SliceRawKernel(const phi::Context& ctx,
+                    const phi::DenseTensor& input,
+                    const std::vector<int64_t>& axes,
+                    const phi::IntArray& starts_arr,
+                    const phi::IntArray& ends_arr,
+                    const std::vector<int64_t>& infer_flags,
+                    const std::vector<int64_t>& decrease_axis,
+                    phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto view = MakeSliceView(
+      input, axes, starts_arr, ends_arr, infer_flags, decrease_axis);
+  out->Resize(view.dims);
+  auto out_data = ctx.template Alloc<T>(out);
+  StridedCopy(input.data<T>() + view.offset,
+              view.strides,
+              out_data,
+              phi::CalcStrides(view.dims),
+              view.dims);
 }
 
 }  // namespace custom_kernel
@@ -111,4 +111,6 @@ PD_BUILD_PHI_KERNEL(slice,
                     int64_t,
                     uint8_t,
                     float,
-                    double) {}
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
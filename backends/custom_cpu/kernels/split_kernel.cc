@@ -0,0 +1,109 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/strided_copy.h"
+#include "paddle/phi/capi/all.h"
+#include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+int64_t SplitAxis(const phi::DenseTensor& x, const phi::Scalar& axis_scalar) {
+  int64_t rank = x.dims().size();
+  int64_t axis = axis_scalar.to<int64_t>();
+  PD_CHECK(axis >= -rank && axis < rank,
+           "The axis of split must be in [%ld, %ld), but received %ld.",
+           -rank,
+           rank,
+           axis);
+  return axis < 0 ? axis + rank : axis;
+}
+
+// The outputs already carry their shapes, each is the next run of x along
+// `axis`.
+template <typename T>
+void SplitCopy(const phi::Context& dev_ctx,
+               const phi::DenseTensor& x,
+               int64_t axis,
+               const std::vector<phi::DenseTensor*>& outs) {
+  const T* x_data = x.data<T>();
+  auto x_strides = x.strides();
+  int64_t start = 0;
+  for (auto out : outs) {
+    auto dims = out->dims();
+    T* out_data = dev_ctx.template Alloc<T>(out);
+    StridedCopy(x_data + start * x_strides[axis],
+                x_strides,
+                out_data,
+                phi::CalcStrides(dims),
+                dims);
+    start += dims[axis];
+  }
+}
+
+}  // namespace
+
+template <typename T>
+void SplitKernel(const phi::Context& dev_ctx,
+                 const phi::DenseTensor& x,
+                 const phi::IntArray& sections,
+                 const phi::Scalar& axis_scalar,
+                 std::vector<phi::DenseTensor*> outs) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  SplitCopy<T>(dev_ctx, x, SplitAxis(x, axis_scalar), outs);
+}
+
+template <typename T>
+void SplitWithNumKernel(const phi::Context& dev_ctx,
+                        const phi::DenseTensor& x,
+                        int num,
+                        const phi::Scalar& axis_scalar,
+                        std::vector<phi::DenseTensor*> outs) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  SplitCopy<T>(dev_ctx, x, SplitAxis(x, axis_scalar), outs);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(split,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::SplitKernel,
+                    bool,
+                    int8_t,
+                    int16_t,
+                    int32_t,
+                    int64_t,
+                    uint8_t,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(split_with_num,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::SplitWithNumKernel,
+                    bool,
+                    int8_t,
+                    int16_t,
+                    int32_t,
+                    int64_t,
+                    uint8_t,
+                    float,
+                    double,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
@@ -12,8 +12,10 @@
 // See the License for the specific language governing permissions and
 // limitations under the License.
 
+#include "kernels/funcs/strided_copy.h"
 #include "kernels/phi_funcs.h"
 #include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
 
 namespace custom_kernel {
 
@@ -24,6 +26,7 @@ void StridedCopyKernel(const phi::Context& dev_ctx,
                        const std::vector<int64_t>& out_stride,
                        int64_t offset,
                        phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
   out->Resize(dims);
   out->set_strides(out_stride);
   out->set_offset(offset);
@@ -43,36 +46,13 @@ void StridedCopyKernel(const phi::Context& dev_ctx,
   }
 
   const T* input_data = input.data<T>();
-  int input_rank = input.dims().size();
-  const int64_t* input_dims = input.dims().data();
-  const int64_t* input_stride = input.strides().data();
-
   T* output_data = out->data<T>();
   PD_CHECK(output_data != nullptr,
            "StridedCopyKernel's out tensor must complete "
            "mutable data before call kernel.");
 
-  int output_rank = input.dims().size();
-  const int64_t* output_dims = input.dims().data();
-  const int64_t* output_stride = input.dims().data();
-
-  auto numel = input.numel();
-
-  for (int64_t i = 0; i < numel; i++) {
-    int64_t input_offset = 0;
-    int64_t index_tmp = i;
-    for (int dim = input_rank - 1; dim >= 0; --dim) {
-      input_offset += (index_tmp % input_dims[dim]) * input_stride[dim];
-      index_tmp = index_tmp / input_dims[dim];
-    }
-    int64_t output_offset = 0;
-    index_tmp = i;
-    for (int dim = output_rank - 1; dim >= 0; --dim) {
-      output_offset += (index_tmp % output_dims[dim]) * output_stride[dim];
-      index_tmp = index_tmp / output_dims[dim];
-    }
-    output_data[output_offset] = input_data[input_offset];
-  }
+  StridedCopy(
+      input_data, input.strides(), output_data, out_stride, input.dims());
 }
 }  // namespace custom_kernel
 
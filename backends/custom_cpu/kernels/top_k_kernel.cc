@@ -0,0 +1,182 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/sort.h"
+#include "kernels/kernels.h"
+#include "kernels/phi_funcs.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+template <typename T>
+void TopkKernel(const phi::Context& dev_ctx,
+                const phi::DenseTensor& x,
+                const phi::Scalar& k_scalar,
+                int axis,
+                bool largest,
+                bool sorted,
+                phi::DenseTensor* out,
+                phi::DenseTensor* indices) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto in_dims = x.dims();
+  const int rank = in_dims.size();
+  int64_t k = k_scalar.to<int64_t>();
+
+  if (rank == 0) {
+    PD_CHECK(k == 0 || k == 1,
+             "k must be 0 or 1 for a 0-d input, but received %ld.",
+             k);
+    T* out_data = dev_ctx.template Alloc<T>(out);
+    int64_t* ids_data = dev_ctx.template Alloc<int64_t>(indices);
+    if (k == 1) {
+      out_data[0] = x.data<T>()[0];
+      ids_data[0] = 0;
+    }
+    return;
+  }
+
+  axis = phi::funcs::CanonicalAxis(axis, rank);
+  PD_CHECK(k >= 0 && k <= in_dims[axis],
+           "k must be in [0, %ld], but received %ld.",
+           in_dims[axis],
+           k);
+
+  // k may come from a tensor, so the output shape is only known here.
+  std::vector<int64_t> out_dims(in_dims.cbegin(), in_dims.cend());
+  out_dims[axis] = k;
+  out->Resize(out_dims);
+  indices->Resize(out_dims);
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  int64_t* ids_data = dev_ctx.template Alloc<int64_t>(indices);
+  if (out->numel() == 0) {
+    return;
+  }
+
+  if (axis + 1 == rank) {
+    const int64_t width = in_dims[rank - 1];
+    TopKRows(x.data<T>(),
+             x.numel() / width,
+             width,
+             k,
+             largest,
+             sorted,
+             out_data,
+             ids_data);
+    return;
+  }
+
+  // Swap the axis with the last one, select along rows and swap back.
+  std::vector<int> trans(rank);
+  for (int i = 0; i < rank; ++i) {
+    trans[i] = i;
+  }
+  std::swap(trans[axis], trans[rank - 1]);
+  std::vector<int64_t> trans_dims(in_dims.cbegin(), in_dims.cend());
+  std::swap(trans_dims[axis], trans_dims[rank - 1]);
+
+  phi::DenseTensor trans_x;
+  trans_x.Resize(trans_dims);
+  dev_ctx.template Alloc<T>(&trans_x);
+  TransposeKernel<T>(dev_ctx, x, trans, &trans_x);
+
+  const int64_t width = trans_dims[rank - 1];
+  trans_dims[rank - 1] = k;
+  phi::DenseTensor trans_out;
+  trans_out.Resize(trans_dims);
+  T* t_out = dev_ctx.template Alloc<T>(&trans_out);
+  phi::DenseTensor trans_ids;
+  trans_ids.Resize(trans_dims);
+  int64_t* t_ids = dev_ctx.template Alloc<int64_t>(&trans_ids);
+  TopKRows(trans_x.data<T>(),
+           trans_x.numel() / width,
+           width,
+           k,
+           largest,
+           sorted,
+           t_out,
+           t_ids);
+
+  TransposeKernel<T>(dev_ctx, trans_out, trans, out);
+  TransposeKernel<int64_t>(dev_ctx, trans_ids, trans, indices);
+}
+
+template <typename T>
+void TopkGradKernel(const phi::Context& dev_ctx,
+                    const phi::DenseTensor& x,
+                    const phi::DenseTensor& indices,
+                    const phi::DenseTensor& out_grad,
+                    const phi::Scalar& k_scalar,
+                    int axis,
+                    bool largest,
+                    bool sorted,
+                    phi::DenseTensor* x_grad) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  T* x_grad_data = dev_ctx.template Alloc<T>(x_grad);
+  const int64_t numel = x_grad->numel();
+  std::fill(x_grad_data, x_grad_data + numel, static_cast<T>(0));
+  if (numel == 0 || out_grad.numel() == 0) {
+    return;
+  }
+
+  auto in_dims = x.dims();
+  const int rank = in_dims.size();
+  if (rank == 0) {
+    x_grad_data[0] = out_grad.data<T>()[0];
+    return;
+  }
+
+  // x is viewed as [pre, width, post] and the outputs as [pre, k, post], the
+  // selected positions of every row receive their output gradient.
+  axis = phi::funcs::CanonicalAxis(axis, rank);
+  const int64_t width = in_dims[axis];
+  const int64_t pre = phi::funcs::SizeToAxis(axis, in_dims);
+  const int64_t post = numel / (pre * width);
+  const int64_t k = out_grad.numel() / (pre * post);
+  auto dy = out_grad.data<T>();
+  auto ids = indices.data<int64_t>();
+  auto grain_size = custom_cpu::GrainSize(k * post);
+  custom_cpu::ParallelFor(0, pre, grain_size, [&](int64_t b, int64_t e) {
+    for (auto i = b; i < e; ++i) {
+      T* dx = x_grad_data + i * width * post;
+      for (int64_t j = 0; j < k; ++j) {
+        int64_t offset = (i * k + j) * post;
+        for (int64_t q = 0; q < post; ++q) {
+          dx[ids[offset + q] * post + q] = dy[offset + q];
+        }
+      }
+    }
+  });
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(topk,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::TopkKernel,
+                    float,
+                    double,
+                    int,
+                    int64_t) {}
+
+PD_BUILD_PHI_KERNEL(topk_grad,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::TopkGradKernel,
+                    float,
+                    double,
+                    int,
+                    int64_t) {}
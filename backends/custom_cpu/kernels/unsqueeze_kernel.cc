@@ -0,0 +1,79 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "kernels/funcs/strided_copy.h"
+#include "paddle/phi/capi/all.h"
+#include "phi_funcs.h"  //NOLINT
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+// out comes with its unsqueezed dims, which keep the element order of x. The
+// executor shares x into out for this view op where it can, otherwise x is
+// copied.
+template <typename T>
+void UnsqueezeKernel(const phi::Context& dev_ctx,
+                     const phi::DenseTensor& x,
+                     const phi::IntArray& axes,
+                     phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  if (x.initialized() && x.Holder() == out->Holder()) {
+    return;
+  }
+  auto x_dims = x.dims();
+  auto out_data = dev_ctx.template Alloc<T>(out);
+  StridedCopy(
+      x.data<T>(), x.strides(), out_data, phi::CalcStrides(x_dims), x_dims);
+}
+
+template <typename T>
+void UnsqueezeWithXShapeKernel(const phi::Context& dev_ctx,
+                               const phi::DenseTensor& x,
+                               const phi::IntArray& axes,
+                               phi::DenseTensor* out,
+                               phi::DenseTensor* xshape) {
+  UnsqueezeKernel<T>(dev_ctx, x, axes, out);
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(unsqueeze,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::UnsqueezeKernel,
+                    float,
+                    double,
+                    int8_t,
+                    int16_t,
+                    int32_t,
+                    int64_t,
+                    uint8_t,
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
+
+PD_BUILD_PHI_KERNEL(unsqueeze_with_xshape,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::UnsqueezeWithXShapeKernel,
+                    float,
+                    double,
+                    int8_t,
+                    int16_t,
+                    int32_t,
+                    int64_t,
+                    uint8_t,
+                    bool,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {}
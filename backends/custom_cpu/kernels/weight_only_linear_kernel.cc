@@ -0,0 +1,112 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <string>
+
+#include "kernels/funcs/int8_gemm.h"
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Checks that x [..., K] fits the weight [N, K], and returns its rows.
+int64_t LinearRows(const phi::DenseTensor& x, const phi::DenseTensor& weight) {
+  auto w_dims = weight.dims();
+  PD_CHECK(w_dims.size() == 2,
+           "The int8 weight must be 2-D [N, K], but has %ld dims.",
+           static_cast<int64_t>(w_dims.size()));
+  const int64_t K = x.dims()[x.dims().size() - 1];
+  PD_CHECK(K == w_dims[1],
+           "The last dim of x %ld does not match the weight's K %ld.",
+           K,
+           w_dims[1]);
+  return K > 0 ? x.numel() / K : 0;
+}
+
+}  // namespace
+
+// out = x * dequant(weight)' + bias for the weight [N, K] and weight_scale
+// of a custom_cpu weight_quantize. arch is ignored like there.
+template <typename T>
+void WeightOnlyLinearKernel(const phi::Context& dev_ctx,
+                            const phi::DenseTensor& x,
+                            const phi::DenseTensor& weight,
+                            const paddle::optional<phi::DenseTensor>& bias,
+                            const phi::DenseTensor& weight_scale,
+                            const std::string& weight_dtype,
+                            int32_t arch,
+                            int32_t group_size,
+                            phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  PD_CHECK(weight_dtype == "int8",
+           "weight_only_linear on custom_cpu only supports int8 weights, "
+           "but got %s.",
+           weight_dtype.c_str());
+  const int64_t M = LinearRows(x, weight);
+  WeightOnlyGemm(M,
+                 weight.dims()[0],
+                 weight.dims()[1],
+                 x.data<T>(),
+                 weight.data<int8_t>(),
+                 weight_scale.data<T>(),
+                 group_size,
+                 bias ? bias->data<T>() : nullptr,
+                 dev_ctx.template Alloc<T>(out));
+}
+
+template <typename T>
+void LlmInt8LinearKernel(const phi::Context& dev_ctx,
+                         const phi::DenseTensor& x,
+                         const phi::DenseTensor& weight,
+                         const paddle::optional<phi::DenseTensor>& bias,
+                         const phi::DenseTensor& weight_scale,
+                         float threshold,
+                         phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  const int64_t M = LinearRows(x, weight);
+  LlmInt8Gemm(M,
+              weight.dims()[0],
+              weight.dims()[1],
+              x.data<T>(),
+              weight.data<int8_t>(),
+              weight_scale.data<float>(),
+              threshold,
+              bias ? bias->data<T>() : nullptr,
+              dev_ctx.template Alloc<T>(out));
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(weight_only_linear,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::WeightOnlyLinearKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->InputAt(1).SetDataType(phi::DataType::INT8);
+}
+
+PD_BUILD_PHI_KERNEL(llm_int8_linear,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::LlmInt8LinearKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->InputAt(1).SetDataType(phi::DataType::INT8);
+  kernel->InputAt(3).SetDataType(phi::DataType::FLOAT32);
+}
@@ -0,0 +1,170 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <algorithm>
+#include <cmath>
+#include <string>
+#include <vector>
+
+#include "paddle/phi/capi/all.h"
+#include "runtime/profiler.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_kernel {
+
+namespace {
+
+// Checks that the weight of `algo` is int8 with a supported group size, and
+// returns the number of rows of k sharing a scale.
+int64_t WeightGroupSize(const std::string& algo,
+                        int32_t group_size,
+                        int64_t K) {
+  PD_CHECK(algo == "weight_only_int8" || algo == "llm.int8",
+           "custom_cpu only supports the weight_only_int8 and llm.int8 "
+           "algos, but got %s.",
+           algo.c_str());
+  PD_CHECK(group_size == -1 || group_size == 64 || group_size == 128,
+           "group_size must be -1, 64 or 128, but got %d.",
+           group_size);
+  PD_CHECK(group_size == -1 || algo == "weight_only_int8",
+           "llm.int8 only supports per-channel scales.");
+  if (group_size == -1) {
+    return K;
+  }
+  PD_CHECK(K % group_size == 0,
+           "The %ld rows of the weight are not a multiple of group_size %d.",
+           K,
+           group_size);
+  return group_size;
+}
+
+}  // namespace
+
+// Quantizes the weight x [K, N] to out [N, K], one output channel per row,
+// with scale [N], or [K / group_size, N], the absolute max of each channel
+// or group divided by 127. The weight stays row-major: arch only selects the
+// tile layout of phi's GPU kernels and is ignored.
+template <typename T>
+void WeightQuantizeKernel(const phi::Context& dev_ctx,
+                          const phi::DenseTensor& x,
+                          const std::string& algo,
+                          int32_t arch,
+                          int32_t group_size,
+                          phi::DenseTensor* out,
+                          phi::DenseTensor* scale) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto dims = x.dims();
+  PD_CHECK(dims.size() == 2,
+           "The weight of weight_quantize must be 2-D, but has %ld dims.",
+           static_cast<int64_t>(dims.size()));
+  const int64_t K = dims[0];
+  const int64_t N = dims[1];
+  const int64_t group = WeightGroupSize(algo, group_size, K);
+  const int64_t groups = K / group;
+  const T* x_data = x.data<T>();
+
+  std::vector<float> scales(groups * N, 0.0f);
+  for (int64_t k = 0; k < K; ++k) {
+    float* s = scales.data() + k / group * N;
+    for (int64_t n = 0; n < N; ++n) {
+      s[n] = std::max(s[n], std::abs(static_cast<float>(x_data[k * N + n])));
+    }
+  }
+  for (auto& s : scales) {
+    s /= 127.0f;
+  }
+
+  out->Resize({N, K});
+  int8_t* out_data = dev_ctx.template Alloc<int8_t>(out);
+  custom_cpu::ParallelFor(
+      0, N, custom_cpu::GrainSize(K), [&](int64_t begin, int64_t end) {
+        for (int64_t n = begin; n < end; ++n) {
+          for (int64_t k = 0; k < K; ++k) {
+            const float s = scales[k / group * N + n];
+            const float q =
+                s > 0 ? std::round(static_cast<float>(x_data[k * N + n]) / s)
+                      : 0.0f;
+            out_data[n * K + k] =
+                static_cast<int8_t>(std::min(std::max(q, -127.0f), 127.0f));
+          }
+        }
+      });
+
+  if (algo == "llm.int8") {
+    float* scale_data = dev_ctx.template Alloc<float>(scale);
+    std::copy(scales.begin(), scales.end(), scale_data);
+  } else {
+    T* scale_data = dev_ctx.template Alloc<T>(scale);
+    for (int64_t i = 0; i < groups * N; ++i) {
+      scale_data[i] = static_cast<T>(scales[i]);
+    }
+  }
+}
+
+// The inverse of weight_quantize: out [K, N] is x [N, K] transposed and
+// multiplied by its scale, of the type of the scale.
+template <typename T>
+void WeightDequantizeKernel(const phi::Context& dev_ctx,
+                            const phi::DenseTensor& x,
+                            const phi::DenseTensor& scale,
+                            const std::string& algo,
+                            int32_t group_size,
+                            phi::DenseTensor* out) {
+  CUSTOM_CPU_TRACE_KERNEL();
+  auto dims = x.dims();
+  PD_CHECK(dims.size() == 2,
+           "The weight of weight_dequantize must be 2-D, but has %ld dims.",
+           static_cast<int64_t>(dims.size()));
+  const int64_t N = dims[0];
+  const int64_t K = dims[1];
+  const int64_t group = WeightGroupSize(algo, group_size, K);
+  const int8_t* x_data = x.data<int8_t>();
+  const T* scale_data = scale.data<T>();
+
+  out->Resize({K, N});
+  T* out_data = dev_ctx.template Alloc<T>(out);
+  custom_cpu::ParallelFor(
+      0, K, custom_cpu::GrainSize(N), [&](int64_t begin, int64_t end) {
+        for (int64_t k = begin; k < end; ++k) {
+          const T* s = scale_data + k / group * N;
+          for (int64_t n = 0; n < N; ++n) {
+            out_data[k * N + n] =
+                static_cast<T>(static_cast<float>(s[n]) * x_data[n * K + k]);
+          }
+        }
+      });
+}
+
+}  // namespace custom_kernel
+
+PD_BUILD_PHI_KERNEL(weight_quantize,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::WeightQuantizeKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->OutputAt(0).SetDataType(phi::DataType::INT8);
+  kernel->OutputAt(1).SetDataType(phi::DataType::UNDEFINED);
+}
+
+PD_BUILD_PHI_KERNEL(weight_dequantize,
+                    custom_cpu,
+                    ALL_LAYOUT,
+                    custom_kernel::WeightDequantizeKernel,
+                    float,
+                    phi::dtype::float16,
+                    phi::dtype::bfloat16) {
+  kernel->InputAt(0).SetDataType(phi::DataType::INT8);
+}
@@ -0,0 +1,32 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+
+import os
+import paddle
+
+
+def setUp():
+    # Registers the custom ops of the plugin, which the passes insert, from
+    # CUSTOM_DEVICE_ROOT or else the installed paddle_custom_device.
+    root = os.getenv(
+        "CUSTOM_DEVICE_ROOT",
+        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    )
+    for lib in os.listdir(root):
+        if lib.endswith(".so"):
+            paddle.utils.cpp_extension.extension_utils.load_op_meta_info_and_register_op(
+                os.path.join(root, lib)
+            )
@@ -0,0 +1,192 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function, division
+
+import paddle
+from paddle import _C_ops
+
+# PIR ops the fused_elementwise program can express, by the program op they
+# map to. scale, pow and gelu read their attributes in _program_ops.
+_UNARY_OPS = {
+    "pd_op.abs": "abs",
+    "pd_op.exp": "exp",
+    "pd_op.log": "log",
+    "pd_op.sqrt": "sqrt",
+    "pd_op.rsqrt": "rsqrt",
+    "pd_op.reciprocal": "reciprocal",
+    "pd_op.square": "square",
+    "pd_op.sigmoid": "sigmoid",
+    "pd_op.tanh": "tanh",
+    "pd_op.relu": "relu",
+    "pd_op.silu": "silu",
+}
+
+_BINARY_OPS = {
+    "pd_op.add": "add",
+    "pd_op.subtract": "sub",
+    "pd_op.multiply": "mul",
+    "pd_op.divide": "div",
+    "pd_op.maximum": "max",
+    "pd_op.minimum": "min",
+    "pd_op.elementwise_pow": "pow",
+}
+
+_DTYPES = [paddle.float32, paddle.float64, paddle.float16, paddle.bfloat16]
+
+
+def _scale_factor(op):
+    # The scale of pd_op.scale, when it is a constant.
+    source = op.operand_source(1).get_defining_op()
+    if source is None or source.name() != "pd_op.full":
+        return None
+    return source.attrs()["value"]
+
+
+def _fusible(op):
+    name = op.name()
+    if name not in _UNARY_OPS and name not in _BINARY_OPS:
+        if name not in ["pd_op.scale", "pd_op.pow", "pd_op.gelu"]:
+            return False
+        if name == "pd_op.scale" and _scale_factor(op) is None:
+            return False
+    out = op.result(0)
+    return out.dtype in _DTYPES and all(
+        v.dtype == out.dtype
+        for v in op.operands_source()[: 1 if name == "pd_op.scale" else 2]
+    )
+
+
+def _program_ops(op, args):
+    # The program ops computing `op` on the operands `args`, the result of
+    # each but the first being referred to by "$".
+    name = op.name()
+    if name in _UNARY_OPS:
+        return [[_UNARY_OPS[name], args[0]]]
+    if name in _BINARY_OPS:
+        return [[_BINARY_OPS[name], args[0], args[1]]]
+    if name == "pd_op.pow":
+        return [["pow", args[0], repr(float(op.attrs()["y"]))]]
+    if name == "pd_op.gelu":
+        approximate = op.attrs()["approximate"]
+        return [["gelu_tanh" if approximate else "gelu", args[0]]]
+    scale = float(_scale_factor(op))
+    bias = float(op.attrs()["bias"])
+    mul = ["mul", args[0], repr(scale)] if scale != 1.0 else []
+    add = ["add", args[0], repr(bias)] if bias != 0.0 else []
+    steps = [mul, add] if op.attrs()["bias_after_scale"] else [add, mul]
+    steps = [step for step in steps if step]
+    if len(steps) == 2:
+        steps[1][1] = "$"
+    return steps or [["mul", args[0], "1.0"]]
+
+
+def _group(root, grouped, fetch_list):
+    # The fusible producers of root, in program order, whose results are
+    # read by the group alone, grown from root upwards.
+    group = [root]
+    ids = {root.id()}
+    pending = list(root.operands_source())
+    while pending:
+        value = pending.pop()
+        op = value.get_defining_op()
+        if op is None or op.id() in ids or op.id() in grouped:
+            continue
+        if not _fusible(op) or op.result(0).dtype != root.result(0).dtype:
+            continue
+        if not all(user.id() in ids for user in value.all_used_ops()):
+            continue
+        if any(value.is_same(v) for v in fetch_list):
+            continue
+        group.append(op)
+        ids.add(op.id())
+        pending.extend(op.operands_source())
+    order = {op.id(): i for i, op in enumerate(root.get_parent_block().ops)}
+    return sorted(group, key=lambda op: order[op.id()])
+
+
+def _program(group):
+    # The program of the ops of group and the values it reads.
+    inputs = []
+    results = {}
+    statements = []
+
+    def operand(value):
+        op = value.get_defining_op()
+        if op is not None and op.id() in results:
+            return results[op.id()]
+        for i, known in enumerate(inputs):
+            if known.is_same(value):
+                return "x%d" % i
+        inputs.append(value)
+        return "x%d" % (len(inputs) - 1)
+
+    for op in group:
+        arity = 1 if op.name() in ["pd_op.scale", "pd_op.pow"] else 2
+        args = [operand(v) for v in op.operands_source()[:arity]]
+        for statement in _program_ops(op, args):
+            statement = [
+                "t%d" % (len(statements) - 1) if a == "$" else a for a in statement
+            ]
+            statements.append(" ".join(statement))
+        results[op.id()] = "t%d" % (len(statements) - 1)
+    return "; ".join(statements), inputs
+
+
+def elementwise_fuse_pass(program, fetch_list=()):
+    """
+    Replaces the chains of elementwise ops of a PIR program, as the
+    x * sigmoid(x) of custom_silu_fuse_pass or an add, multiply and maximum,
+    by fused_elementwise ops evaluating each chain in one pass over memory.
+
+    A chain is grown upwards from an op whose result leaves it, taking in the
+    producers whose results are read by the chain alone, so that every chain
+    writes a single output. fused_elementwise has no gradient: the pass is
+    meant for inference programs.
+
+    Returns fetch_list with the values the pass replaced swapped for their
+    fused results.
+    """
+    block = program.global_block()
+    grouped = set()
+    replaced = []
+    with paddle.static.program_guard(program):
+        for root in reversed(block.ops):
+            if root.id() in grouped or not _fusible(root):
+                continue
+            group = _group(root, grouped, fetch_list)
+            if len(group) < 2:
+                continue
+            grouped.update(op.id() for op in group)
+            program_text, inputs = _program(group)
+            paddle.pir.set_insertion_point(root)
+            out = _C_ops._run_custom_op("fused_elementwise", inputs, program_text)[0]
+            replaced.append((root.result(0), out))
+            root.result(0).replace_all_uses_with(out)
+            for op in reversed(group):
+                block.remove_op(op)
+        paddle.pir.reset_insertion_point_to_end()
+    # The constants of the fused scales are left unused.
+    for op in reversed(block.ops):
+        if op.name() == "pd_op.full" and not op.result(0).all_used_ops():
+            if not any(op.result(0).is_same(v) for v in fetch_list):
+                block.remove_op(op)
+
+    def swap(value):
+        for old, new in replaced:
+            if old.is_same(value):
+                return new
+        return value
+
+    return [swap(v) for v in fetch_list]
@@ -0,0 +1,316 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/allocator.h"
+
+#include <sys/mman.h>
+
+#include <algorithm>
+#include <cstdlib>
+
+#include "runtime/flags.h"
+#include "runtime/topology.h"
+
+namespace custom_cpu {
+
+constexpr size_t CachingAllocator::kMinBlockSize;
+constexpr size_t CachingAllocator::kSmallSize;
+constexpr size_t CachingAllocator::kLargeSegmentSize;
+constexpr size_t CachingAllocator::kLargeRoundSize;
+constexpr size_t CachingAllocator::kAlignment;
+
+CachingAllocator::~CachingAllocator() {
+  // Blocks still handed out are leaked on purpose, the framework may free
+  // them after the plugin has been torn down.
+  std::lock_guard<std::mutex> lock(mutex_);
+  ReleaseCachedBlocks();
+}
+
+size_t CachingAllocator::RoundSize(size_t size) {
+  if (size <= kSmallSize) {
+    return std::max(kMinBlockSize,
+                    (size + kMinBlockSize - 1) / kMinBlockSize * kMinBlockSize);
+  }
+  return (size + kMinBlockSize - 1) / kMinBlockSize * kMinBlockSize;
+}
+
+void *CachingAllocator::Allocate(size_t size) {
+  if (size == 0) {
+    return nullptr;
+  }
+  size_t rounded = RoundSize(size);
+
+  std::lock_guard<std::mutex> lock(mutex_);
+  stats_.alloc_requests++;
+
+  Block *block = FindFreeBlock(rounded);
+  if (block) {
+    stats_.cache_hits++;
+  } else {
+    stats_.cache_misses++;
+    block = AllocateSegment(rounded);
+    if (!block) {
+      // Give the cache back to the system and retry once before failing.
+      ReleaseCachedBlocks();
+      block = AllocateSegment(rounded);
+    }
+    if (!block) {
+      return nullptr;
+    }
+  }
+
+  block = MaybeSplit(block, rounded);
+  block->allocated = true;
+  allocated_blocks_[block->ptr] = block;
+  stats_.bytes_in_use += block->size;
+  UpdatePeak();
+  return block->ptr;
+}
+
+bool CachingAllocator::Deallocate(void *ptr) {
+  if (ptr == nullptr) {
+    return true;
+  }
+  std::lock_guard<std::mutex> lock(mutex_);
+  auto it = allocated_blocks_.find(ptr);
+  if (it == allocated_blocks_.end()) {
+    return false;
+  }
+  Block *block = it->second;
+  allocated_blocks_.erase(it);
+  stats_.bytes_in_use -= block->size;
+  FreeBlock(block);
+
+  if (max_cached_bytes_ > 0 &&
+      stats_.bytes_reserved - stats_.bytes_in_use > max_cached_bytes_) {
+    ReleaseCachedBlocks();
+  }
+  return true;
+}
+
+void CachingAllocator::EmptyCache() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  ReleaseCachedBlocks();
+}
+
+AllocatorStats CachingAllocator::GetStats() const {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return stats_;
+}
+
+void CachingAllocator::ResetPeakStats() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  stats_.peak_bytes_in_use = stats_.bytes_in_use;
+  stats_.peak_bytes_reserved = stats_.bytes_reserved;
+}
+
+void CachingAllocator::SetMaxCachedBytes(size_t bytes) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  max_cached_bytes_ = bytes;
+}
+
+CachingAllocator::Block *CachingAllocator::FindFreeBlock(size_t size) {
+  if (size <= kSmallSize) {
+    auto it = small_pool_.find(size);
+    if (it == small_pool_.end() || it->second.empty()) {
+      return nullptr;
+    }
+    Block *block = it->second.back();
+    it->second.pop_back();
+    return block;
+  }
+
+  Block key{nullptr, size, false, false, nullptr, nullptr};
+  auto it = large_pool_.lower_bound(&key);
+  if (it == large_pool_.end()) {
+    return nullptr;
+  }
+  Block *block = *it;
+  large_pool_.erase(it);
+  return block;
+}
+
+CachingAllocator::Block *CachingAllocator::AllocateSegment(size_t size) {
+  bool small = size <= kSmallSize;
+  size_t segment_size = small ? size
+                              : std::max(kLargeSegmentSize,
+                                         (size + kLargeRoundSize - 1) /
+                                             kLargeRoundSize * kLargeRoundSize);
+  void *ptr = nullptr;
+  if (!small && numa_node_ >= 0) {
+    ptr = mmap(nullptr,
+               segment_size,
+               PROT_READ | PROT_WRITE,
+               MAP_PRIVATE | MAP_ANONYMOUS,
+               -1,
+               0);
+    if (ptr == MAP_FAILED) {
+      return nullptr;
+    }
+    // Pages are placed on first touch, bind before anything touches them.
+    BindMemoryToNumaNode(ptr, segment_size, numa_node_);
+  } else if (posix_memalign(&ptr, kAlignment, segment_size) != 0) {
+    return nullptr;
+  }
+  stats_.system_allocs++;
+  stats_.bytes_reserved += segment_size;
+  return new Block{
+      static_cast<char *>(ptr), segment_size, false, small, nullptr, nullptr};
+}
+
+CachingAllocator::Block *CachingAllocator::MaybeSplit(Block *block,
+                                                      size_t size) {
+  if (block->small || block->size - size < kMinBlockSize ||
+      block->size - size <= kSmallSize / 2) {
+    // Keep the tail attached, splitting off tiny remainders only fragments
+    // the segment.
+    return block;
+  }
+  Block *remaining = new Block{
+      block->ptr + size, block->size - size, false, false, block, block->next};
+  if (block->next) {
+    block->next->prev = remaining;
+  }
+  block->next = remaining;
+  block->size = size;
+  large_pool_.insert(remaining);
+  return block;
+}
+
+void CachingAllocator::FreeBlock(Block *block) {
+  block->allocated = false;
+  if (block->small) {
+    small_pool_[block->size].push_back(block);
+    return;
+  }
+
+  // Coalesce with free neighbours carved out of the same segment.
+  Block *prev = block->prev;
+  if (prev && !prev->allocated) {
+    large_pool_.erase(prev);
+    prev->size += block->size;
+    prev->next = block->next;
+    if (block->next) {
+      block->next->prev = prev;
+    }
+    delete block;
+    block = prev;
+  }
+  Block *next = block->next;
+  if (next && !next->allocated) {
+    large_pool_.erase(next);
+    block->size += next->size;
+    block->next = next->next;
+    if (next->next) {
+      next->next->prev = block;
+    }
+    delete next;
+  }
+  large_pool_.insert(block);
+}
+
+void CachingAllocator::ReleaseSegment(Block *block) {
+  if (!block->small && numa_node_ >= 0) {
+    munmap(block->ptr, block->size);
+  } else {
+    free(block->ptr);
+  }
+  stats_.system_frees++;
+  stats_.bytes_reserved -= block->size;
+  delete block;
+}
+
+void CachingAllocator::ReleaseCachedBlocks() {
+  for (auto &bin : small_pool_) {
+    for (auto *block : bin.second) {
+      ReleaseSegment(block);
+    }
+  }
+  small_pool_.clear();
+
+  for (auto it = large_pool_.begin(); it != large_pool_.end();) {
+    Block *block = *it;
+    if (block->prev == nullptr && block->next == nullptr) {
+      it = large_pool_.erase(it);
+      ReleaseSegment(block);
+    } else {
+      ++it;
+    }
+  }
+}
+
+void CachingAllocator::UpdatePeak() {
+  stats_.peak_bytes_in_use =
+      std::max(stats_.peak_bytes_in_use, stats_.bytes_in_use);
+  stats_.peak_bytes_reserved =
+      std::max(stats_.peak_bytes_reserved, stats_.bytes_reserved);
+}
+
+namespace {
+
+struct AllocatorRegistry {
+  std::mutex mutex;
+  std::map<std::pair<int, int>, std::unique_ptr<CachingAllocator>> allocators;
+};
+
+AllocatorRegistry &GetRegistry() {
+  // Intentionally leaked so that late frees during process exit still find
+  // their allocator.
+  static auto *registry = new AllocatorRegistry;
+  return *registry;
+}
+
+}  // namespace
+
+bool ZeroCopyEnabled() {
+  static bool enabled = EnvToBool("FLAGS_custom_cpu_zero_copy", false);
+  return enabled;
+}
+
+CachingAllocator *GetAllocator(MemoryKind kind, int device_id) {
+  if (ZeroCopyEnabled()) {
+    kind = MemoryKind::kDevice;
+  }
+  if (kind != MemoryKind::kDevice) {
+    device_id = -1;
+  }
+  auto &registry = GetRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  auto &allocator =
+      registry.allocators[std::make_pair(static_cast<int>(kind), device_id)];
+  if (!allocator) {
+    static size_t max_cached_bytes =
+        EnvToUint64("FLAGS_custom_cpu_max_cached_bytes", 0);
+    int numa_node = -1;
+    if (kind == MemoryKind::kDevice && NumaBindEnabled()) {
+      numa_node = DeviceNumaNode(device_id);
+    }
+    allocator.reset(new CachingAllocator(numa_node));
+    allocator->SetMaxCachedBytes(max_cached_bytes);
+  }
+  return allocator.get();
+}
+
+void ForEachAllocator(
+    const std::function<void(MemoryKind, int, CachingAllocator *)> &fn) {
+  auto &registry = GetRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  for (auto &item : registry.allocators) {
+    fn(static_cast<MemoryKind>(item.first.first),
+       item.first.second,
+       item.second.get());
+  }
+}
+
+}  // namespace custom_cpu
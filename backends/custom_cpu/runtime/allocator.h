@@ -0,0 +1,130 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <functional>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <set>
+#include <unordered_map>
+#include <vector>
+
+namespace custom_cpu {
+
+struct AllocatorStats {
+  uint64_t alloc_requests = 0;
+  uint64_t cache_hits = 0;
+  uint64_t cache_misses = 0;
+  uint64_t system_allocs = 0;
+  uint64_t system_frees = 0;
+  uint64_t bytes_in_use = 0;
+  uint64_t bytes_reserved = 0;
+  uint64_t peak_bytes_in_use = 0;
+  uint64_t peak_bytes_reserved = 0;
+};
+
+// A caching allocator that keeps freed blocks around for reuse.
+//
+// Requests up to kSmallSize are rounded to kMinBlockSize and served from
+// exact size-class free lists; each small size class is carved out of its
+// own system allocation and never split. Larger requests are served from
+// segments of at least kLargeSegmentSize bytes, best-fit, splitting the
+// remainder off as a new free block and coalescing adjacent free blocks of
+// the same segment on release.
+class CachingAllocator {
+ public:
+  static constexpr size_t kMinBlockSize = 512;
+  static constexpr size_t kSmallSize = 1 << 20;
+  static constexpr size_t kLargeSegmentSize = 2 << 20;
+  static constexpr size_t kLargeRoundSize = 2 << 20;
+  static constexpr size_t kAlignment = 64;
+
+  // Large segments of an allocator with a `numa_node` are mapped directly
+  // and bound to that node.
+  explicit CachingAllocator(int numa_node = -1) : numa_node_(numa_node) {}
+  ~CachingAllocator();
+
+  CachingAllocator(const CachingAllocator &) = delete;
+  CachingAllocator &operator=(const CachingAllocator &) = delete;
+
+  void *Allocate(size_t size);
+  bool Deallocate(void *ptr);
+
+  // Returns every completely free segment to the system.
+  void EmptyCache();
+
+  AllocatorStats GetStats() const;
+  void ResetPeakStats();
+
+  // Caps the number of cached (reserved but unused) bytes, 0 means no cap.
+  void SetMaxCachedBytes(size_t bytes);
+
+ private:
+  struct Block {
+    char *ptr;
+    size_t size;
+    bool allocated;
+    bool small;
+    Block *prev;
+    Block *next;
+  };
+
+  struct BlockComparator {
+    bool operator()(const Block *a, const Block *b) const {
+      if (a->size != b->size) return a->size < b->size;
+      return a->ptr < b->ptr;
+    }
+  };
+
+  static size_t RoundSize(size_t size);
+
+  Block *FindFreeBlock(size_t size);
+  Block *AllocateSegment(size_t size);
+  Block *MaybeSplit(Block *block, size_t size);
+  void FreeBlock(Block *block);
+  void ReleaseSegment(Block *block);
+  void ReleaseCachedBlocks();
+  void UpdatePeak();
+
+  mutable std::mutex mutex_;
+  std::map<size_t, std::vector<Block *>> small_pool_;
+  std::set<Block *, BlockComparator> large_pool_;
+  std::unordered_map<void *, Block *> allocated_blocks_;
+  AllocatorStats stats_;
+  size_t max_cached_bytes_ = 0;
+  int numa_node_;
+};
+
+enum class MemoryKind { kDevice = 0, kHost, kUnified };
+
+// Whether pinned host and unified memory are carved from the arena of the
+// device they are allocated for (FLAGS_custom_cpu_zero_copy), so that a
+// buffer of any kind can be handed to the framework as device memory of that
+// device without copying.
+bool ZeroCopyEnabled();
+
+// Returns the allocator serving `kind` memory for device `device_id`; host
+// and unified memory are shared across devices. In zero-copy mode every kind
+// is served by the device arena of `device_id`.
+CachingAllocator *GetAllocator(MemoryKind kind, int device_id);
+
+// Applies `fn` to each allocator created so far.
+void ForEachAllocator(
+    const std::function<void(MemoryKind, int, CachingAllocator *)> &fn);
+
+}  // namespace custom_cpu
@@ -0,0 +1,107 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/copy_engine.h"
+
+#if defined(__SSE2__)
+#include <emmintrin.h>
+#endif
+
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <thread>
+
+#include "runtime/flags.h"
+#include "runtime/thread_pool.h"
+
+namespace custom_cpu {
+
+namespace {
+
+constexpr size_t kCopyChunkBytes = 1 << 20;
+
+size_t NonTemporalCopyBytes() {
+  static size_t bytes = EnvToUint64("FLAGS_custom_cpu_nt_copy_bytes", 4 << 20);
+  return bytes;
+}
+
+ThreadPool &GetCopyThreadPool() {
+  static auto *pool = new ThreadPool([] {
+    size_t hardware = std::max(std::thread::hardware_concurrency(), 1u);
+    size_t threads = EnvToUint64("FLAGS_custom_cpu_copy_threads",
+                                 std::min<size_t>(4, hardware));
+    // The calling thread copies too.
+    return threads > 0 ? threads - 1 : 0;
+  }());
+  return *pool;
+}
+
+void StreamingCopy(char *dst, const char *src, size_t size) {
+#if defined(__SSE2__)
+  size_t head = (16 - reinterpret_cast<uintptr_t>(dst) % 16) % 16;
+  head = std::min(head, size);
+  memcpy(dst, src, head);
+  dst += head;
+  src += head;
+  size -= head;
+  size_t body = size / 64 * 64;
+  for (size_t i = 0; i < body; i += 64) {
+    __m128i a = _mm_loadu_si128(reinterpret_cast<const __m128i *>(src + i));
+    __m128i b =
+        _mm_loadu_si128(reinterpret_cast<const __m128i *>(src + i + 16));
+    __m128i c =
+        _mm_loadu_si128(reinterpret_cast<const __m128i *>(src + i + 32));
+    __m128i d =
+        _mm_loadu_si128(reinterpret_cast<const __m128i *>(src + i + 48));
+    _mm_stream_si128(reinterpret_cast<__m128i *>(dst + i), a);
+    _mm_stream_si128(reinterpret_cast<__m128i *>(dst + i + 16), b);
+    _mm_stream_si128(reinterpret_cast<__m128i *>(dst + i + 32), c);
+    _mm_stream_si128(reinterpret_cast<__m128i *>(dst + i + 48), d);
+  }
+  memcpy(dst + body, src + body, size - body);
+  // Streaming stores are weakly ordered, publish them before returning.
+  _mm_sfence();
+#else
+  memcpy(dst, src, size);
+#endif
+}
+
+}  // namespace
+
+void CopyBuffer(void *dst, const void *src, size_t size, bool non_temporal) {
+  auto out = static_cast<char *>(dst);
+  auto in = static_cast<const char *>(src);
+  bool streaming = non_temporal && NonTemporalCopyBytes() > 0 &&
+                   size >= NonTemporalCopyBytes();
+  size_t chunks = (size + kCopyChunkBytes - 1) / kCopyChunkBytes;
+  auto copy_chunk = [&](size_t chunk) {
+    size_t begin = chunk * kCopyChunkBytes;
+    size_t bytes = std::min(kCopyChunkBytes, size - begin);
+    if (streaming) {
+      StreamingCopy(out + begin, in + begin, bytes);
+    } else {
+      memcpy(out + begin, in + begin, bytes);
+    }
+  };
+  if (chunks <= 1) {
+    if (size > 0) {
+      copy_chunk(0);
+    }
+    return;
+  }
+  GetCopyThreadPool().ParallelFor(chunks, copy_chunk);
+}
+
+}  // namespace custom_cpu
@@ -0,0 +1,27 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+
+namespace custom_cpu {
+
+// Copies `size` bytes. Copies of at least one chunk are split into chunks
+// spread over a small pool of threads dedicated to copies; with
+// `non_temporal`, buffers of at least FLAGS_custom_cpu_nt_copy_bytes are
+// written with streaming stores that bypass the cache of the copying core.
+void CopyBuffer(void *dst, const void *src, size_t size, bool non_temporal);
+
+}  // namespace custom_cpu
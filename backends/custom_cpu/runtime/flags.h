@@ -0,0 +1,54 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <strings.h>
+
+#include <cstdint>
+#include <cstdlib>
+#include <cstring>
+#include <string>
+
+// custom_cpu does not link gflags, runtime options are read straight from
+// FLAGS_* environment variables.
+namespace custom_cpu {
+
+inline bool EnvToBool(const char *name, bool default_value) {
+  const char *value = std::getenv(name);
+  if (value == nullptr || *value == '\0') {
+    return default_value;
+  }
+  return strcmp(value, "0") != 0 && strcasecmp(value, "false") != 0 &&
+         strcasecmp(value, "off") != 0;
+}
+
+inline uint64_t EnvToUint64(const char *name, uint64_t default_value) {
+  const char *value = std::getenv(name);
+  if (value == nullptr || *value == '\0') {
+    return default_value;
+  }
+  return strtoull(value, nullptr, 10);
+}
+
+inline std::string EnvToString(const char *name,
+                               const std::string &default_value) {
+  const char *value = std::getenv(name);
+  if (value == nullptr) {
+    return default_value;
+  }
+  return value;
+}
+
+}  // namespace custom_cpu
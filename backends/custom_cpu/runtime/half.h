@@ -0,0 +1,86 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstdint>
+#include <cstring>
+
+// Scalar conversions between float and the bits of float16 and bfloat16,
+// rounding to nearest even. NaNs stay quiet NaNs.
+namespace custom_cpu {
+
+inline uint32_t FloatBits(float value) {
+  uint32_t bits;
+  std::memcpy(&bits, &value, sizeof(bits));
+  return bits;
+}
+
+inline float BitsToFloat(uint32_t bits) {
+  float value;
+  std::memcpy(&value, &bits, sizeof(value));
+  return value;
+}
+
+inline uint16_t FloatToHalfBits(float value) {
+  uint32_t bits = FloatBits(value);
+  uint16_t sign = (bits >> 16) & 0x8000;
+  bits &= 0x7fffffff;
+  if (bits >= 0x7f800000) {
+    // Inf, or NaN kept quiet with the top of its payload.
+    return sign |
+           (bits > 0x7f800000 ? 0x7e00 | ((bits >> 13) & 0x3ff) : 0x7c00);
+  }
+  if (bits >= 0x477ff000) {
+    return sign | 0x7c00;  // rounds to 65520 or more
+  }
+  if (bits < 0x38800000) {
+    // A half subnormal. Adding 0.5 aligns the value on the 2^-24 half ulp
+    // and lets the FPU round to nearest even.
+    float shifted = BitsToFloat(bits) + 0.5f;
+    return sign | static_cast<uint16_t>(FloatBits(shifted) - 0x3f000000);
+  }
+  // Rebias the exponent and round the 13 dropped bits to nearest even.
+  bits += 0xc8000fff + ((bits >> 13) & 1);
+  return sign | static_cast<uint16_t>(bits >> 13);
+}
+
+inline float HalfBitsToFloat(uint16_t half) {
+  uint32_t sign = static_cast<uint32_t>(half & 0x8000) << 16;
+  uint32_t exponent = (half >> 10) & 0x1f;
+  uint32_t mantissa = half & 0x3ff;
+  if (exponent == 0x1f) {
+    return BitsToFloat(sign | 0x7f800000 | (mantissa << 13));
+  }
+  if (exponent == 0) {
+    float value = mantissa * 5.9604644775390625e-8f;  // 2^-24
+    return sign ? -value : value;
+  }
+  return BitsToFloat(sign | ((exponent + 112) << 23) | (mantissa << 13));
+}
+
+inline uint16_t FloatToBfloat16Bits(float value) {
+  uint32_t bits = FloatBits(value);
+  if ((bits & 0x7fffffff) > 0x7f800000) {
+    return static_cast<uint16_t>(bits >> 16) | 0x40;
+  }
+  bits += 0x7fff + ((bits >> 16) & 1);
+  return static_cast<uint16_t>(bits >> 16);
+}
+
+inline float Bfloat16BitsToFloat(uint16_t value) {
+  return BitsToFloat(static_cast<uint32_t>(value) << 16);
+}
+
+}  // namespace custom_cpu
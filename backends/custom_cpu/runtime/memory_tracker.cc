@@ -0,0 +1,276 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/memory_tracker.h"
+
+#include <execinfo.h>
+
+#include <algorithm>
+#include <atomic>
+#include <cstdlib>
+#include <mutex>
+#include <random>
+#include <unordered_map>
+#include <vector>
+
+#include "runtime/flags.h"
+
+namespace custom_cpu {
+
+namespace {
+
+constexpr int kMaxTrackedDevices = 64;
+constexpr int kMaxStackDepth = 24;
+// SampleAllocation, TrackAllocation and the allocation helper of the runtime.
+constexpr int kSkippedFrames = 3;
+
+struct DeviceCounters {
+  std::atomic<uint64_t> live_bytes{0};
+  std::atomic<uint64_t> peak_bytes{0};
+  std::atomic<uint64_t> live_allocations{0};
+  std::atomic<uint64_t> alloc_count{0};
+  std::atomic<uint64_t> free_count{0};
+  std::atomic<uint64_t> size_histogram[kMemoryHistogramBuckets];
+
+  DeviceCounters() {
+    for (auto &bucket : size_histogram) {
+      bucket.store(0, std::memory_order_relaxed);
+    }
+  }
+};
+
+DeviceCounters *GetCounters(int device_id) {
+  static auto *counters = new DeviceCounters[kMaxTrackedDevices];
+  if (device_id < 0 || device_id >= kMaxTrackedDevices) {
+    return nullptr;
+  }
+  return &counters[device_id];
+}
+
+int HistogramBucket(size_t size) {
+  int bucket = 0;
+  while (size > 1 && bucket < kMemoryHistogramBuckets - 1) {
+    size >>= 1;
+    bucket++;
+  }
+  return bucket;
+}
+
+uint64_t SampleRate() {
+  static uint64_t rate = EnvToUint64("FLAGS_custom_cpu_alloc_sample_rate", 0);
+  return rate;
+}
+
+struct AllocationSite {
+  int device_id;
+  std::vector<void *> frames;
+  uint64_t allocs = 0;
+  uint64_t bytes = 0;
+  uint64_t live_bytes = 0;
+};
+
+struct SampledAllocation {
+  size_t site;
+  size_t size;
+};
+
+struct SiteRegistry {
+  std::mutex mutex;
+  std::vector<AllocationSite> sites;
+  std::unordered_multimap<size_t, size_t> sites_by_hash;
+  std::unordered_map<void *, SampledAllocation> live;
+};
+
+SiteRegistry &GetSiteRegistry() {
+  static auto *registry = new SiteRegistry;
+  return *registry;
+}
+
+size_t HashFrames(int device_id, void *const *frames, int depth) {
+  size_t hash = static_cast<size_t>(device_id);
+  for (int i = 0; i < depth; ++i) {
+    hash = hash * 1000003 ^ reinterpret_cast<uintptr_t>(frames[i]);
+  }
+  return hash;
+}
+
+void SampleAllocation(int device_id, void *ptr, size_t size) {
+  void *frames[kMaxStackDepth];
+  int depth = backtrace(frames, kMaxStackDepth);
+  size_t hash = HashFrames(device_id, frames, depth);
+
+  auto &registry = GetSiteRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  size_t index = registry.sites.size();
+  auto range = registry.sites_by_hash.equal_range(hash);
+  for (auto it = range.first; it != range.second; ++it) {
+    auto &site = registry.sites[it->second];
+    if (site.device_id == device_id &&
+        site.frames.size() == static_cast<size_t>(depth) &&
+        std::equal(site.frames.begin(), site.frames.end(), frames)) {
+      index = it->second;
+      break;
+    }
+  }
+  if (index == registry.sites.size()) {
+    AllocationSite site;
+    site.device_id = device_id;
+    site.frames.assign(frames, frames + depth);
+    registry.sites.push_back(site);
+    registry.sites_by_hash.emplace(hash, index);
+  }
+  auto &site = registry.sites[index];
+  site.allocs++;
+  site.bytes += size;
+  site.live_bytes += size;
+  registry.live[ptr] = {index, size};
+}
+
+void ReleaseSample(void *ptr) {
+  auto &registry = GetSiteRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  auto it = registry.live.find(ptr);
+  if (it == registry.live.end()) {
+    return;
+  }
+  registry.sites[it->second.site].live_bytes -= it->second.size;
+  registry.live.erase(it);
+}
+
+}  // namespace
+
+bool AllocationSamplingEnabled() { return SampleRate() > 0; }
+
+void TrackAllocation(int device_id, void *ptr, size_t size) {
+  auto counters = GetCounters(device_id);
+  if (!counters) {
+    return;
+  }
+  uint64_t live =
+      counters->live_bytes.fetch_add(size, std::memory_order_relaxed) + size;
+  uint64_t peak = counters->peak_bytes.load(std::memory_order_relaxed);
+  while (live > peak && !counters->peak_bytes.compare_exchange_weak(
+                            peak, live, std::memory_order_relaxed)) {
+  }
+  counters->live_allocations.fetch_add(1, std::memory_order_relaxed);
+  counters->alloc_count.fetch_add(1, std::memory_order_relaxed);
+  counters->size_histogram[HistogramBucket(size)].fetch_add(
+      1, std::memory_order_relaxed);
+
+  if (AllocationSamplingEnabled()) {
+    // Gaps between samples are drawn uniformly from [1, 2 * rate - 1], a
+    // fixed period would keep missing allocation patterns repeating with it.
+    static thread_local std::minstd_rand engine(std::random_device{}());
+    static thread_local uint64_t countdown = 0;
+    if (countdown == 0) {
+      countdown = 1 + engine() % (2 * SampleRate() - 1);
+    }
+    if (--countdown == 0) {
+      SampleAllocation(device_id, ptr, size);
+    }
+  }
+}
+
+void TrackDeallocation(int device_id, void *ptr, size_t size) {
+  auto counters = GetCounters(device_id);
+  if (!counters) {
+    return;
+  }
+  counters->live_bytes.fetch_sub(size, std::memory_order_relaxed);
+  counters->live_allocations.fetch_sub(1, std::memory_order_relaxed);
+  counters->free_count.fetch_add(1, std::memory_order_relaxed);
+  if (AllocationSamplingEnabled()) {
+    ReleaseSample(ptr);
+  }
+}
+
+bool GetMemoryStats(int device_id, MemoryStats *stats) {
+  auto counters = GetCounters(device_id);
+  if (!counters) {
+    return false;
+  }
+  stats->live_bytes = counters->live_bytes.load(std::memory_order_relaxed);
+  stats->peak_bytes = counters->peak_bytes.load(std::memory_order_relaxed);
+  stats->live_allocations =
+      counters->live_allocations.load(std::memory_order_relaxed);
+  stats->alloc_count = counters->alloc_count.load(std::memory_order_relaxed);
+  stats->free_count = counters->free_count.load(std::memory_order_relaxed);
+  for (int i = 0; i < kMemoryHistogramBuckets; ++i) {
+    stats->size_histogram[i] =
+        counters->size_histogram[i].load(std::memory_order_relaxed);
+  }
+  return true;
+}
+
+void ResetPeakMemory(int device_id) {
+  auto counters = GetCounters(device_id);
+  if (counters) {
+    counters->peak_bytes.store(
+        counters->live_bytes.load(std::memory_order_relaxed),
+        std::memory_order_relaxed);
+  }
+}
+
+void DumpAllocationSites(int device_id, size_t top, FILE *out) {
+  if (!AllocationSamplingEnabled()) {
+    fprintf(out,
+            "[custom_cpu] allocation sampling is off, set "
+            "FLAGS_custom_cpu_alloc_sample_rate to enable it\n");
+    return;
+  }
+  std::vector<AllocationSite> sites;
+  {
+    auto &registry = GetSiteRegistry();
+    std::lock_guard<std::mutex> lock(registry.mutex);
+    for (auto &site : registry.sites) {
+      if (device_id < 0 || site.device_id == device_id) {
+        sites.push_back(site);
+      }
+    }
+  }
+  std::sort(sites.begin(),
+            sites.end(),
+            [](const AllocationSite &a, const AllocationSite &b) {
+              return a.live_bytes != b.live_bytes ? a.live_bytes > b.live_bytes
+                                                  : a.bytes > b.bytes;
+            });
+  sites.resize(std::min(sites.size(), top));
+
+  uint64_t rate = SampleRate();
+  fprintf(out,
+          "[custom_cpu] top %zu allocation sites (1 in %llu allocations "
+          "sampled, counts scaled)\n",
+          sites.size(),
+          static_cast<unsigned long long>(rate));  // NOLINT
+  for (size_t i = 0; i < sites.size(); ++i) {
+    auto &site = sites[i];
+    fprintf(out,
+            "#%zu device %d: ~%llu live bytes, ~%llu allocations, ~%llu "
+            "bytes allocated\n",
+            i,
+            site.device_id,
+            static_cast<unsigned long long>(site.live_bytes * rate),  // NOLINT
+            static_cast<unsigned long long>(site.allocs * rate),      // NOLINT
+            static_cast<unsigned long long>(site.bytes * rate));      // NOLINT
+    int depth = static_cast<int>(site.frames.size());
+    char **symbols = backtrace_symbols(site.frames.data(), depth);
+    for (int f = std::min(kSkippedFrames, depth); f < depth; ++f) {
+      fprintf(out, "    %s\n", symbols ? symbols[f] : "?");
+    }
+    free(symbols);
+  }
+  fflush(out);
+}
+
+}  // namespace custom_cpu
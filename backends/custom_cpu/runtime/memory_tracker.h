@@ -0,0 +1,53 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <cstdio>
+
+namespace custom_cpu {
+
+// Allocation sizes are bucketed by power of two, bucket i counts sizes in
+// [2^i, 2^(i+1)), the last bucket everything larger.
+constexpr int kMemoryHistogramBuckets = 48;
+
+struct MemoryStats {
+  uint64_t live_bytes;
+  uint64_t peak_bytes;
+  uint64_t live_allocations;
+  uint64_t alloc_count;
+  uint64_t free_count;
+  uint64_t size_histogram[kMemoryHistogramBuckets];
+};
+
+// Records an allocation or release of device memory made by the framework.
+// Counters are updated without locks. With FLAGS_custom_cpu_alloc_sample_rate
+// set to N, one in N allocations also captures its call stack.
+void TrackAllocation(int device_id, void *ptr, size_t size);
+void TrackDeallocation(int device_id, void *ptr, size_t size);
+
+bool GetMemoryStats(int device_id, MemoryStats *stats);
+void ResetPeakMemory(int device_id);
+
+// Whether call stacks are sampled.
+bool AllocationSamplingEnabled();
+
+// Writes the `top` sampled call sites of `device_id` (all devices when
+// negative) holding the most live bytes to `out`. Counts are scaled by the
+// sample rate.
+void DumpAllocationSites(int device_id, size_t top, FILE *out);
+
+}  // namespace custom_cpu
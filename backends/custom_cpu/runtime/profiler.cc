@@ -0,0 +1,164 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/profiler.h"
+
+#include <sys/syscall.h>
+#include <time.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <memory>
+#include <mutex>
+
+#include "runtime/flags.h"
+
+namespace custom_cpu {
+
+std::atomic<bool> tracing_enabled{false};
+
+namespace {
+
+std::atomic<uint32_t> next_correlation_id{1};
+std::atomic<int> trace_device{0};
+
+struct TraceRegistry {
+  std::mutex mutex;
+  std::vector<std::shared_ptr<TraceBuffer>> buffers;
+};
+
+TraceRegistry &GetTraceRegistry() {
+  static auto *registry = new TraceRegistry;
+  return *registry;
+}
+
+size_t TraceBufferCapacity() {
+  static size_t capacity = std::max<uint64_t>(
+      EnvToUint64("FLAGS_custom_cpu_profiler_buffer_size", 1 << 16), 1);
+  return capacity;
+}
+
+uint64_t CurrentThreadId() {
+  static thread_local uint64_t tid = syscall(SYS_gettid);
+  return tid;
+}
+
+// The ring of the calling thread, created and registered on first use. The
+// registry keeps it alive after the thread exits so that late records are
+// still collected.
+TraceBuffer *ThreadTraceBuffer() {
+  static thread_local std::shared_ptr<TraceBuffer> buffer;
+  if (!buffer) {
+    buffer = std::make_shared<TraceBuffer>(TraceBufferCapacity());
+    auto &registry = GetTraceRegistry();
+    std::lock_guard<std::mutex> lock(registry.mutex);
+    registry.buffers.push_back(buffer);
+  }
+  return buffer.get();
+}
+
+}  // namespace
+
+TraceBuffer::TraceBuffer(size_t capacity) : records_(capacity) {}
+
+bool TraceBuffer::Push(const TraceRecord &record) {
+  uint64_t head = head_.load(std::memory_order_relaxed);
+  uint64_t tail = tail_.load(std::memory_order_acquire);
+  if (head - tail >= records_.size()) {
+    dropped_.fetch_add(1, std::memory_order_relaxed);
+    return false;
+  }
+  records_[head % records_.size()] = record;
+  head_.store(head + 1, std::memory_order_release);
+  return true;
+}
+
+size_t TraceBuffer::Drain(const std::function<void(const TraceRecord &)> &fn) {
+  uint64_t tail = tail_.load(std::memory_order_relaxed);
+  uint64_t head = head_.load(std::memory_order_acquire);
+  for (uint64_t i = tail; i < head; ++i) {
+    fn(records_[i % records_.size()]);
+  }
+  tail_.store(head, std::memory_order_release);
+  return head - tail;
+}
+
+uint64_t TraceNowNs() {
+  struct timespec ts;
+  clock_gettime(CLOCK_REALTIME, &ts);
+  return static_cast<uint64_t>(ts.tv_sec) * 1000000000ULL + ts.tv_nsec;
+}
+
+void SetTraceDevice(int device_id) {
+  trace_device.store(device_id, std::memory_order_relaxed);
+}
+
+int TraceDevice() { return trace_device.load(std::memory_order_relaxed); }
+
+void StartTracing() {
+  // Discard whatever was recorded by a previous session.
+  CollectTraceRecords([](const TraceRecord &) {});
+  tracing_enabled.store(true, std::memory_order_release);
+}
+
+void StopTracing() { tracing_enabled.store(false, std::memory_order_release); }
+
+uint64_t CollectTraceRecords(
+    const std::function<void(const TraceRecord &)> &fn) {
+  auto &registry = GetTraceRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  uint64_t dropped = 0;
+  auto &buffers = registry.buffers;
+  for (auto it = buffers.begin(); it != buffers.end();) {
+    size_t drained = (*it)->Drain(fn);
+    dropped += (*it)->TakeDropped();
+    if (it->use_count() == 1 && drained == 0) {
+      // The owning thread has exited and its ring is empty.
+      it = buffers.erase(it);
+    } else {
+      ++it;
+    }
+  }
+  return dropped;
+}
+
+TraceScope::TraceScope(TraceKind kind,
+                       const char *name,
+                       uint64_t bytes,
+                       int device_id,
+                       uint64_t stream_id)
+    : active_(TracingEnabled()) {
+  if (!active_) {
+    return;
+  }
+  record_.name = name;
+  record_.kind = kind;
+  record_.device_id = device_id < 0 ? TraceDevice() : device_id;
+  record_.stream_id = stream_id;
+  record_.thread_id = CurrentThreadId();
+  record_.bytes = bytes;
+  record_.correlation_id =
+      next_correlation_id.fetch_add(1, std::memory_order_relaxed);
+  record_.start_ns = TraceNowNs();
+}
+
+TraceScope::~TraceScope() {
+  if (!active_) {
+    return;
+  }
+  record_.end_ns = TraceNowNs();
+  ThreadTraceBuffer()->Push(record_);
+}
+
+}  // namespace custom_cpu
@@ -0,0 +1,102 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <atomic>
+#include <cstddef>
+#include <cstdint>
+#include <functional>
+#include <vector>
+
+namespace custom_cpu {
+
+enum class TraceKind : uint8_t { kKernel, kMemcpy, kAllocation, kCollective };
+
+// One traced activity. `name` must point to storage that outlives the
+// profiling session, e.g. a string literal or __func__.
+struct TraceRecord {
+  const char *name;
+  TraceKind kind;
+  int32_t device_id;
+  uint64_t stream_id;
+  uint64_t thread_id;
+  uint64_t start_ns;
+  uint64_t end_ns;
+  uint64_t bytes;
+  uint32_t correlation_id;
+};
+
+// Single producer / single consumer ring owned by one thread. The owner
+// pushes without locking, the collector drains it. Records pushed while
+// the ring is full are dropped and counted.
+class TraceBuffer {
+ public:
+  explicit TraceBuffer(size_t capacity);
+
+  bool Push(const TraceRecord &record);
+  size_t Drain(const std::function<void(const TraceRecord &)> &fn);
+  uint64_t TakeDropped() { return dropped_.exchange(0); }
+
+ private:
+  std::vector<TraceRecord> records_;
+  alignas(64) std::atomic<uint64_t> head_{0};
+  alignas(64) std::atomic<uint64_t> tail_{0};
+  std::atomic<uint64_t> dropped_{0};
+};
+
+extern std::atomic<bool> tracing_enabled;
+
+inline bool TracingEnabled() {
+  return tracing_enabled.load(std::memory_order_relaxed);
+}
+
+// Wall clock in nanoseconds, the clock of the framework host tracer.
+uint64_t TraceNowNs();
+
+// Device last selected through the runtime, used for kernel records.
+void SetTraceDevice(int device_id);
+int TraceDevice();
+
+void StartTracing();
+void StopTracing();
+
+// Hands every record collected since StartTracing to `fn` and returns the
+// number of records dropped because a ring was full.
+uint64_t CollectTraceRecords(
+    const std::function<void(const TraceRecord &)> &fn);
+
+// Records the activity covering its lifetime when tracing is enabled.
+class TraceScope {
+ public:
+  TraceScope(TraceKind kind,
+             const char *name,
+             uint64_t bytes = 0,
+             int device_id = -1,
+             uint64_t stream_id = 0);
+  ~TraceScope();
+
+  TraceScope(const TraceScope &) = delete;
+  TraceScope &operator=(const TraceScope &) = delete;
+
+ private:
+  TraceRecord record_;
+  bool active_;
+};
+
+}  // namespace custom_cpu
+
+// Records the enclosing kernel on the device timeline of the profiler.
+#define CUSTOM_CPU_TRACE_KERNEL() \
+  custom_cpu::TraceScope kernel_trace(custom_cpu::TraceKind::kKernel, __func__)
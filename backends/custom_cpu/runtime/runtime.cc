@@ -14,19 +14,34 @@
 
 #include <errno.h>
 #include <fcntl.h>
-#include <semaphore.h>
+#include <sched.h>
 #include <sys/types.h>
-#include <sys/wait.h>
 #include <unistd.h>
 
+#include <algorithm>
+#include <chrono>
 #include <cstdint>
 #include <cstdio>
 #include <cstring>
 #include <iostream>
-
+#include <map>
+#include <mutex>
+#include <random>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include "paddle/phi/api/profiler/trace_event.h"
 #include "paddle/phi/backends/device_ext.h"
-
-#define MEMORY_FRACTION 0.5f
+#include "runtime/allocator.h"
+#include "runtime/copy_engine.h"
+#include "runtime/flags.h"
+#include "runtime/memory_tracker.h"
+#include "runtime/profiler.h"
+#include "runtime/stream.h"
+#include "runtime/thread_pool.h"
+#include "runtime/topology.h"
+#include "runtime/xccl.h"
 
 static int global_current_device = 0;
 
@@ -42,11 +57,14 @@ C_Status Init() {
 
 C_Status InitDevice(const C_Device device) {
   global_current_device = device->id;
+  custom_cpu::SetTraceDevice(device->id);
+  custom_cpu::InitIntraOpThreadPool(device->id);
   return C_SUCCESS;
 }
 
 C_Status SetDevice(const C_Device device) {
   global_current_device = device->id;
+  custom_cpu::SetTraceDevice(device->id);
   return C_SUCCESS;
 }
 
@@ -57,58 +75,164 @@ C_Status GetDevice(const C_Device device) {
 
 C_Status DestroyDevice(const C_Device device) { return C_SUCCESS; }
 
-C_Status Finalize() { return C_SUCCESS; }
+C_Status Finalize() {
+  if (custom_cpu::AllocationSamplingEnabled()) {
+    custom_cpu::DumpAllocationSites(-1, 10, stderr);
+  }
+  custom_cpu::ForEachAllocator(
+      [](custom_cpu::MemoryKind, int, custom_cpu::CachingAllocator *allocator) {
+        allocator->EmptyCache();
+      });
+  return C_SUCCESS;
+}
 
 C_Status GetDevicesCount(size_t *count) {
-  *count = 2;
+  *count = custom_cpu::DeviceCount();
   return C_SUCCESS;
 }
 
 C_Status GetDevicesList(size_t *devices) {
-  devices[0] = 0;
-  devices[1] = 1;
+  for (size_t i = 0; i < custom_cpu::DeviceCount(); ++i) {
+    devices[i] = i;
+  }
   return C_SUCCESS;
 }
 
-C_Status MemCpy(const C_Device device,
-                void *dst,
-                const void *src,
-                size_t size) {
-  memcpy(dst, src, size);
+// Device and host share one address space, so a copy whose source and
+// destination coincide (a tensor shared between places) is a no-op. Copies
+// between devices are streamed past the cache, their destination is read by
+// the other device.
+static void CopyMemory(const char *kind,
+                       int device_id,
+                       C_Stream stream,
+                       void *dst,
+                       const void *src,
+                       size_t size,
+                       bool peer = false) {
+  if (dst != src && size > 0) {
+    custom_cpu::TraceScope trace(custom_cpu::TraceKind::kMemcpy,
+                                 kind,
+                                 size,
+                                 device_id,
+                                 stream ? stream->id : 0);
+    custom_cpu::CopyBuffer(dst, src, size, peer);
+  }
+}
+
+static C_Status AsyncCopyMemory(const char *kind,
+                                int device_id,
+                                C_Stream stream,
+                                void *dst,
+                                const void *src,
+                                size_t size,
+                                bool peer = false) {
+  if (dst == src || size == 0) {
+    return C_SUCCESS;
+  }
+  custom_cpu::RunOnStream(stream, [=] {
+    CopyMemory(kind, device_id, stream, dst, src, size, peer);
+  });
   return C_SUCCESS;
 }
 
-C_Status AsyncMemCpy(const C_Device device,
-                     C_Stream stream,
-                     void *dst,
-                     const void *src,
-                     size_t size) {
-  memcpy(dst, src, size);
+C_Status MemCpyH2D(const C_Device device,
+                   void *dst,
+                   const void *src,
+                   size_t size) {
+  CopyMemory("MEMCPY_HtoD", device->id, nullptr, dst, src, size);
+  return C_SUCCESS;
+}
+
+C_Status MemCpyD2H(const C_Device device,
+                   void *dst,
+                   const void *src,
+                   size_t size) {
+  CopyMemory("MEMCPY_DtoH", device->id, nullptr, dst, src, size);
+  return C_SUCCESS;
+}
+
+C_Status MemCpyD2D(const C_Device device,
+                   void *dst,
+                   const void *src,
+                   size_t size) {
+  CopyMemory("MEMCPY_DtoD", device->id, nullptr, dst, src, size);
   return C_SUCCESS;
 }
 
+C_Status AsyncMemCpyH2D(const C_Device device,
+                        C_Stream stream,
+                        void *dst,
+                        const void *src,
+                        size_t size) {
+  return AsyncCopyMemory("MEMCPY_HtoD", device->id, stream, dst, src, size);
+}
+
+C_Status AsyncMemCpyD2H(const C_Device device,
+                        C_Stream stream,
+                        void *dst,
+                        const void *src,
+                        size_t size) {
+  return AsyncCopyMemory("MEMCPY_DtoH", device->id, stream, dst, src, size);
+}
+
+C_Status AsyncMemCpyD2D(const C_Device device,
+                        C_Stream stream,
+                        void *dst,
+                        const void *src,
+                        size_t size) {
+  return AsyncCopyMemory("MEMCPY_DtoD", device->id, stream, dst, src, size);
+}
+
 C_Status MemCpyP2P(const C_Device dst_device,
                    const C_Device src_device,
                    void *dst,
                    const void *src,
                    size_t size) {
-  memcpy(dst, src, size);
+  CopyMemory("MEMCPY_PtoP", dst_device->id, nullptr, dst, src, size, true);
   return C_SUCCESS;
 }
 
+// Runs on `stream`, the stream of the destination device, completion is
+// observed by recording an event on it after the copy.
 C_Status AsyncMemCpyP2P(const C_Device dst_device,
                         const C_Device src_device,
                         C_Stream stream,
                         void *dst,
                         const void *src,
                         size_t size) {
-  memcpy(dst, src, size);
-  return C_SUCCESS;
+  return AsyncCopyMemory(
+      "MEMCPY_PtoP", dst_device->id, stream, dst, src, size, true);
 }
 
-C_Status Allocate(const C_Device device, void **ptr, size_t size) {
-  auto data = malloc(size);
+static bool UseCachingAllocator() {
+  static bool use_caching_allocator =
+      custom_cpu::EnvToBool("FLAGS_custom_cpu_caching_allocator", true);
+  return use_caching_allocator;
+}
+
+static custom_cpu::CachingAllocator *GetAllocator(custom_cpu::MemoryKind kind,
+                                                  const C_Device device) {
+  return custom_cpu::GetAllocator(kind,
+                                  device ? device->id : global_current_device);
+}
+
+static C_Status AllocateImpl(custom_cpu::MemoryKind kind,
+                             const char *name,
+                             const C_Device device,
+                             void **ptr,
+                             size_t size) {
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kAllocation,
+                               name,
+                               size,
+                               device ? device->id : global_current_device);
+  void *data = UseCachingAllocator()
+                   ? GetAllocator(kind, device)->Allocate(size)
+                   : malloc(size);
   if (data) {
+    if (kind == custom_cpu::MemoryKind::kDevice) {
+      custom_cpu::TrackAllocation(
+          device ? device->id : global_current_device, data, size);
+    }
     *ptr = data;
     return C_SUCCESS;
   } else {
@@ -117,59 +241,249 @@ C_Status Allocate(const C_Device device, void **ptr, size_t size) {
   return C_FAILED;
 }
 
+static C_Status DeallocateImpl(custom_cpu::MemoryKind kind,
+                               const char *name,
+                               const C_Device device,
+                               void *ptr,
+                               size_t size) {
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kAllocation,
+                               name,
+                               size,
+                               device ? device->id : global_current_device);
+  if (kind == custom_cpu::MemoryKind::kDevice) {
+    custom_cpu::TrackDeallocation(
+        device ? device->id : global_current_device, ptr, size);
+  }
+  if (!UseCachingAllocator()) {
+    free(ptr);
+    return C_SUCCESS;
+  }
+  if (GetAllocator(kind, device)->Deallocate(ptr)) {
+    return C_SUCCESS;
+  }
+  // In zero-copy mode host and unified blocks belong to the device that was
+  // current when they were allocated, which may have changed since.
+  bool found = false;
+  if (custom_cpu::ZeroCopyEnabled()) {
+    custom_cpu::ForEachAllocator([&](custom_cpu::MemoryKind,
+                                     int,
+                                     custom_cpu::CachingAllocator *allocator) {
+      found = found || allocator->Deallocate(ptr);
+    });
+  }
+  return found ? C_SUCCESS : C_FAILED;
+}
+
+C_Status Allocate(const C_Device device, void **ptr, size_t size) {
+  return AllocateImpl(
+      custom_cpu::MemoryKind::kDevice, "Allocate", device, ptr, size);
+}
+
 C_Status Deallocate(const C_Device device, void *ptr, size_t size) {
-  free(ptr);
-  return C_SUCCESS;
+  return DeallocateImpl(
+      custom_cpu::MemoryKind::kDevice, "Deallocate", device, ptr, size);
+}
+
+C_Status HostAllocate(const C_Device device, void **ptr, size_t size) {
+  return AllocateImpl(
+      custom_cpu::MemoryKind::kHost, "HostAllocate", device, ptr, size);
+}
+
+C_Status HostDeallocate(const C_Device device, void *ptr, size_t size) {
+  return DeallocateImpl(
+      custom_cpu::MemoryKind::kHost, "HostDeallocate", device, ptr, size);
+}
+
+C_Status UnifiedAllocate(const C_Device device, void **ptr, size_t size) {
+  return AllocateImpl(
+      custom_cpu::MemoryKind::kUnified, "UnifiedAllocate", device, ptr, size);
+}
+
+C_Status UnifiedDeallocate(const C_Device device, void *ptr, size_t size) {
+  return DeallocateImpl(
+      custom_cpu::MemoryKind::kUnified, "UnifiedDeallocate", device, ptr, size);
+}
+
+// Entry points for tuning the caching allocator from outside the framework,
+// e.g. through ctypes. A negative device id applies to every allocator.
+extern "C" {
+
+void custom_cpu_empty_cache(int device_id) {
+  custom_cpu::ForEachAllocator([&](custom_cpu::MemoryKind kind,
+                                   int id,
+                                   custom_cpu::CachingAllocator *allocator) {
+    if (device_id < 0 || id == device_id) {
+      allocator->EmptyCache();
+    }
+  });
+}
+
+int custom_cpu_allocator_stats(int kind,
+                               int device_id,
+                               custom_cpu::AllocatorStats *stats) {
+  if (kind < 0 || kind > static_cast<int>(custom_cpu::MemoryKind::kUnified) ||
+      stats == nullptr) {
+    return -1;
+  }
+  *stats = custom_cpu::GetAllocator(static_cast<custom_cpu::MemoryKind>(kind),
+                                    device_id)
+               ->GetStats();
+  return 0;
+}
+
+int custom_cpu_memory_stats(int device_id, custom_cpu::MemoryStats *stats) {
+  if (stats == nullptr || !custom_cpu::GetMemoryStats(device_id, stats)) {
+    return -1;
+  }
+  return 0;
+}
+
+void custom_cpu_reset_peak_memory(int device_id) {
+  custom_cpu::ResetPeakMemory(device_id);
+}
+
+void custom_cpu_dump_allocation_sites(int device_id, int top) {
+  custom_cpu::DumpAllocationSites(device_id, std::max(top, 0), stderr);
+}
+
+// Runs fn(b, e, arg) over the chunks of custom_cpu::ParallelFor. A nonzero
+// return of fn is raised as an exception inside the pool, so that callers
+// can check its propagation. Returns 0 on success and -1 if fn failed.
+int custom_cpu_parallel_for(int64_t begin,
+                            int64_t end,
+                            int64_t grain_size,
+                            int (*fn)(int64_t, int64_t, void *),
+                            void *arg) {
+  try {
+    custom_cpu::ParallelFor(begin, end, grain_size, [&](int64_t b, int64_t e) {
+      if (fn(b, e, arg) != 0) {
+        throw std::runtime_error("custom_cpu_parallel_for: fn failed");
+      }
+    });
+  } catch (const std::runtime_error &) {
+    return -1;
+  }
+  return 0;
+}
+
+// Parses `list` with custom_cpu::ParseCpuList, stores up to `capacity` CPUs
+// in `cpus` and returns how many it parsed.
+int custom_cpu_parse_cpu_list(const char *list, int *cpus, int capacity) {
+  auto parsed = custom_cpu::ParseCpuList(list);
+  std::copy_n(parsed.begin(),
+              std::min<size_t>(parsed.size(), std::max(capacity, 0)),
+              cpus);
+  return static_cast<int>(parsed.size());
+}
+
+// Copies `size` bytes with custom_cpu::CopyBuffer, which paddle only
+// reaches with aligned allocations.
+void custom_cpu_copy_buffer(void *dst,
+                            const void *src,
+                            size_t size,
+                            int non_temporal) {
+  custom_cpu::CopyBuffer(dst, src, size, non_temporal != 0);
 }
 
+}  // extern "C"
+
 C_Status CreateStream(const C_Device device, C_Stream *stream) {
-  stream = nullptr;
+  *stream = custom_cpu::CreateStream(device->id);
   return C_SUCCESS;
 }
 
 C_Status DestroyStream(const C_Device device, C_Stream stream) {
+  if (stream) {
+    custom_cpu::DestroyStream(stream);
+  }
+  return C_SUCCESS;
+}
+
+C_Status QueryStream(const C_Device device, C_Stream stream) {
+  if (stream == nullptr || stream->Query()) {
+    return C_SUCCESS;
+  }
+  return C_ERROR;
+}
+
+C_Status AddCallback(const C_Device device,
+                     C_Stream stream,
+                     C_Callback callback,
+                     void *user_data) {
+  C_Device_st device_copy = *device;
+  custom_cpu::RunOnStream(stream, [=]() mutable {
+    C_Status status = C_SUCCESS;
+    callback(&device_copy, stream, user_data, &status);
+  });
   return C_SUCCESS;
 }
 
 C_Status CreateEvent(const C_Device device, C_Event *event) {
+  *event = new C_Event_st;
   return C_SUCCESS;
 }
 
 C_Status RecordEvent(const C_Device device, C_Stream stream, C_Event event) {
+  auto state = event->state;
+  auto ticket = state->NextTicket();
+  custom_cpu::RunOnStream(stream, [=] { state->Complete(ticket); });
   return C_SUCCESS;
 }
 
 C_Status DestroyEvent(const C_Device device, C_Event event) {
+  delete event;
   return C_SUCCESS;
 }
 
-C_Status SyncDevice(const C_Device device) { return C_SUCCESS; }
+C_Status QueryEvent(const C_Device device, C_Event event) {
+  auto state = event->state;
+  return state->Query(state->LastTicket()) ? C_SUCCESS : C_ERROR;
+}
+
+C_Status SyncDevice(const C_Device device) {
+  custom_cpu::SynchronizeDevice(device->id);
+  return C_SUCCESS;
+}
 
 C_Status SyncStream(const C_Device device, C_Stream stream) {
+  if (stream) {
+    stream->Synchronize();
+  }
   return C_SUCCESS;
 }
 
-C_Status SyncEvent(const C_Device device, C_Event event) { return C_SUCCESS; }
+C_Status SyncEvent(const C_Device device, C_Event event) {
+  auto state = event->state;
+  state->Wait(state->LastTicket());
+  return C_SUCCESS;
+}
 
 C_Status StreamWaitEvent(const C_Device device,
                          C_Stream stream,
                          C_Event event) {
+  auto state = event->state;
+  auto ticket = state->LastTicket();
+  if (stream == nullptr) {
+    state->Wait(ticket);
+  } else {
+    stream->Enqueue([=] { state->Wait(ticket); });
+  }
   return C_SUCCESS;
 }
 
 C_Status VisibleDevices(size_t *devices) { return C_SUCCESS; }
 
-C_Status DeviceMemStats(const C_Device device,
-                        size_t *total_memory,
-                        size_t *free_memory) {
-  float memusage;
+static void ReadMemInfo(int node, size_t *total_memory, size_t *free_memory) {
+  if (custom_cpu::NumaNodeMemInfo(node, total_memory, free_memory)) {
+    return;
+  }
   FILE *fp;
   char buffer[1024];
   size_t byte_read;
   char *pos;
 
   fp = fopen("/proc/meminfo", "r");
-  byte_read = fread(buffer, 1, sizeof(buffer), fp);
+  byte_read = fread(buffer, 1, sizeof(buffer) - 1, fp);
   fclose(fp);
   buffer[byte_read] = '\0';
   pos = strstr(buffer, "MemTotal:");
@@ -178,7 +492,48 @@ C_Status DeviceMemStats(const C_Device device,
   sscanf(pos, "MemFree: %lu kB", free_memory);
   *total_memory = *total_memory * 1024;
   *free_memory = *free_memory * 1024;
-  *free_memory = *free_memory * MEMORY_FRACTION;
+}
+
+// The framework polls memory stats, e.g. when sizing allocator chunks. The
+// kernel regenerates meminfo on every read, so readings are reused for a
+// short while.
+static void CachedMemInfo(int node, size_t *total_memory, size_t *free_memory) {
+  constexpr auto kRefreshInterval = std::chrono::milliseconds(100);
+  struct Reading {
+    std::chrono::steady_clock::time_point time;
+    size_t total;
+    size_t free;
+  };
+  static std::mutex mutex;
+  static std::map<int, Reading> readings;
+
+  auto now = std::chrono::steady_clock::now();
+  std::lock_guard<std::mutex> lock(mutex);
+  auto it = readings.find(node);
+  if (it == readings.end() || now - it->second.time > kRefreshInterval) {
+    Reading reading{now, 0, 0};
+    ReadMemInfo(node, &reading.total, &reading.free);
+    it = readings.insert(std::make_pair(node, reading)).first;
+    it->second = reading;
+  }
+  *total_memory = it->second.total;
+  *free_memory = it->second.free;
+}
+
+C_Status DeviceMemStats(const C_Device device,
+                        size_t *total_memory,
+                        size_t *free_memory) {
+  int node = custom_cpu::DeviceNumaNode(device->id);
+  CachedMemInfo(node, total_memory, free_memory);
+
+  // Devices sharing a node share its free memory.
+  size_t devices_on_node = 0;
+  for (size_t i = 0; i < custom_cpu::DeviceCount(); ++i) {
+    if (custom_cpu::DeviceNumaNode(i) == node) {
+      devices_on_node++;
+    }
+  }
+  *free_memory = *free_memory / std::max<size_t>(devices_on_node, 1);
 
   return C_SUCCESS;
 }
@@ -188,15 +543,6 @@ C_Status DeviceMinChunkSize(const C_Device device, size_t *size) {
   return C_SUCCESS;
 }
 
-struct C_CCLComm_st {
-  size_t rank;
-  size_t nranks;
-  sem_t *sig;
-  sem_t *sig_2;
-  std::string sig_name;
-  std::string sig_2_name;
-};
-
 // for unittest
 C_Status XcclGetUniqueIdSize(size_t *sz) {
   *sz = sizeof(size_t);
@@ -204,9 +550,12 @@ C_Status XcclGetUniqueIdSize(size_t *sz) {
 }
 
 C_Status XcclGetUniqueId(C_CCLRootId *unique_id) {
+  // The id names the shared memory segment, it must differ between jobs
+  // running on the same host.
+  static std::mt19937 engine{std::random_device{}()};
   auto ptr = reinterpret_cast<int8_t *>(unique_id->data);
-  for (auto i = 0; i < unique_id->sz - 1; ++i) {
-    ptr[i] = static_cast<int8_t>(std::rand() % ('z' - 'a') + 'a');
+  for (size_t i = 0; i < unique_id->sz - 1; ++i) {
+    ptr[i] = static_cast<int8_t>(engine() % ('z' - 'a') + 'a');
   }
   ptr[unique_id->sz - 1] = '\0';
   return C_SUCCESS;
@@ -216,28 +565,34 @@ C_Status XcclCommInitRank(size_t ranks,
                           C_CCLRootId *unique_id,
                           size_t rank,
                           C_CCLComm *comm) {
-  auto sig = sem_open(static_cast<char *>(unique_id->data), O_CREAT, 0644, 0);
-  auto sig_2 =
-      sem_open(static_cast<char *>(unique_id->data) + 1, O_CREAT, 0644, 0);
-  *comm =
-      new C_CCLComm_st({rank,
-                        ranks,
-                        sig,
-                        sig_2,
-                        std::string(static_cast<char *>(unique_id->data)),
-                        std::string(static_cast<char *>(unique_id->data) + 1)});
+  auto name = std::string("/custom_cpu_xccl_") +
+              std::string(static_cast<char *>(unique_id->data));
+  auto communicator = new custom_cpu::ShmCommunicator(name, ranks, rank);
+  if (!communicator->ok()) {
+    delete communicator;
+    *comm = nullptr;
+    return C_FAILED;
+  }
+  *comm = new C_CCLComm_st({rank, ranks, communicator});
   return C_SUCCESS;
 }
 
 C_Status XcclDestroyComm(C_CCLComm comm) {
   if (comm) {
-    sem_unlink(comm->sig_name.c_str());
-    sem_unlink(comm->sig_2_name.c_str());
+    delete comm->communicator;
     delete comm;
   }
   return C_SUCCESS;
 }
 
+// Collectives run on the calling thread once the work queued on `stream`
+// has drained.
+static void XcclWaitStream(C_Stream stream) {
+  if (stream) {
+    stream->Synchronize();
+  }
+}
+
 C_Status XcclAllReduce(void *send_buf,
                        void *recv_buf,
                        size_t count,
@@ -245,20 +600,14 @@ C_Status XcclAllReduce(void *send_buf,
                        C_CCLReduceOp op,
                        C_CCLComm comm,
                        C_Stream stream) {
-  sem_post(comm->sig);
-
-  if (comm->rank == 0) {
-    for (auto i = 0; i < comm->nranks; ++i) {
-      sem_wait(comm->sig);
-    }
-
-    for (auto i = 0; i < comm->nranks; ++i) {
-      sem_post(comm->sig_2);
-    }
-  }
-
-  sem_wait(comm->sig_2);
-  return C_SUCCESS;
+  XcclWaitStream(stream);
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kCollective,
+                               "XcclAllReduce",
+                               count * custom_cpu::DataTypeSize(data_type),
+                               -1,
+                               stream ? stream->id : 0);
+  return comm->communicator->AllReduce(
+      send_buf, recv_buf, count, data_type, op);
 }
 
 C_Status XcclBroadcast(void *buf,
@@ -267,22 +616,227 @@ C_Status XcclBroadcast(void *buf,
                        size_t root,
                        C_CCLComm comm,
                        C_Stream stream) {
-  sem_post(comm->sig);
+  XcclWaitStream(stream);
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kCollective,
+                               "XcclBroadcast",
+                               count * custom_cpu::DataTypeSize(data_type),
+                               -1,
+                               stream ? stream->id : 0);
+  return comm->communicator->Broadcast(buf, count, data_type, root);
+}
 
-  if (comm->rank == 0) {
-    for (auto i = 0; i < comm->nranks; ++i) {
-      sem_wait(comm->sig);
-    }
+C_Status XcclReduce(void *send_buf,
+                    void *recv_buf,
+                    size_t count,
+                    C_DataType data_type,
+                    C_CCLReduceOp op,
+                    size_t root,
+                    C_CCLComm comm,
+                    C_Stream stream) {
+  XcclWaitStream(stream);
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kCollective,
+                               "XcclReduce",
+                               count * custom_cpu::DataTypeSize(data_type),
+                               -1,
+                               stream ? stream->id : 0);
+  return comm->communicator->Reduce(
+      send_buf, recv_buf, count, data_type, op, root);
+}
+
+C_Status XcclAllGather(void *send_buf,
+                       void *recv_buf,
+                       size_t count,
+                       C_DataType data_type,
+                       C_CCLComm comm,
+                       C_Stream stream) {
+  XcclWaitStream(stream);
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kCollective,
+                               "XcclAllGather",
+                               count * custom_cpu::DataTypeSize(data_type),
+                               -1,
+                               stream ? stream->id : 0);
+  return comm->communicator->AllGather(send_buf, recv_buf, count, data_type);
+}
 
-    for (auto i = 0; i < comm->nranks; ++i) {
-      sem_post(comm->sig_2);
+C_Status XcclReduceScatter(void *send_buf,
+                           void *recv_buf,
+                           size_t count,
+                           C_DataType data_type,
+                           C_CCLReduceOp op,
+                           C_CCLComm comm,
+                           C_Stream stream) {
+  XcclWaitStream(stream);
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kCollective,
+                               "XcclReduceScatter",
+                               count * custom_cpu::DataTypeSize(data_type),
+                               -1,
+                               stream ? stream->id : 0);
+  return comm->communicator->ReduceScatter(
+      send_buf, recv_buf, count, data_type, op);
+}
+
+struct XcclP2POp {
+  bool is_send;
+  char *buf;
+  size_t bytes;
+  size_t peer;
+  C_CCLComm comm;
+  size_t done;
+};
+
+// Sends and receives issued between XcclGroupStart and XcclGroupEnd are
+// deferred and progressed together, so that paired exchanges larger than a
+// channel chunk cannot deadlock.
+static thread_local int xccl_group_depth = 0;
+static thread_local std::vector<XcclP2POp> xccl_group_ops;
+
+static bool XcclProgress(XcclP2POp *op) {
+  auto communicator = op->comm->communicator;
+  return op->is_send ? communicator->ProgressSend(
+                           op->peer, op->buf, op->bytes, &op->done)
+                     : communicator->ProgressRecv(
+                           op->peer, op->buf, op->bytes, &op->done);
+}
+
+static void XcclRunP2P(const char *name, std::vector<XcclP2POp> *ops) {
+  size_t bytes = 0;
+  for (auto &op : *ops) {
+    bytes += op.bytes;
+  }
+  custom_cpu::TraceScope trace(custom_cpu::TraceKind::kCollective, name, bytes);
+  size_t pending = ops->size();
+  std::vector<bool> finished(ops->size(), false);
+  while (pending > 0) {
+    for (size_t i = 0; i < ops->size(); ++i) {
+      if (finished[i]) {
+        continue;
+      }
+      // Transfers between the same pair of ranks share one channel and must
+      // complete in issue order.
+      auto &op = (*ops)[i];
+      bool blocked = false;
+      for (size_t j = 0; j < i && !blocked; ++j) {
+        auto &prev = (*ops)[j];
+        blocked = !finished[j] && prev.is_send == op.is_send &&
+                  prev.peer == op.peer && prev.comm == op.comm;
+      }
+      if (!blocked && XcclProgress(&op)) {
+        finished[i] = true;
+        pending--;
+      }
     }
+    if (pending > 0) {
+      sched_yield();
+    }
+  }
+}
+
+static C_Status XcclP2P(bool is_send,
+                        void *buf,
+                        size_t count,
+                        C_DataType data_type,
+                        size_t peer,
+                        C_CCLComm comm,
+                        C_Stream stream) {
+  size_t elem_size = custom_cpu::DataTypeSize(data_type);
+  if (elem_size == 0 || peer >= comm->nranks) {
+    return C_FAILED;
+  }
+  XcclP2POp op{
+      is_send, static_cast<char *>(buf), count * elem_size, peer, comm, 0};
+  XcclWaitStream(stream);
+  if (xccl_group_depth > 0) {
+    xccl_group_ops.push_back(op);
+    return C_SUCCESS;
   }
+  std::vector<XcclP2POp> ops{op};
+  XcclRunP2P(is_send ? "XcclSend" : "XcclRecv", &ops);
+  return C_SUCCESS;
+}
+
+C_Status XcclGroupStart() {
+  xccl_group_depth++;
+  return C_SUCCESS;
+}
 
-  sem_wait(comm->sig_2);
+C_Status XcclGroupEnd() {
+  if (xccl_group_depth == 0) {
+    return C_FAILED;
+  }
+  if (--xccl_group_depth == 0) {
+    std::vector<XcclP2POp> ops;
+    ops.swap(xccl_group_ops);
+    XcclRunP2P("XcclGroupEnd", &ops);
+  }
   return C_SUCCESS;
 }
 
+C_Status XcclSend(void *send_buf,
+                  size_t count,
+                  C_DataType data_type,
+                  size_t dest_rank,
+                  C_CCLComm comm,
+                  C_Stream stream) {
+  return XcclP2P(true, send_buf, count, data_type, dest_rank, comm, stream);
+}
+
+C_Status XcclRecv(void *recv_buf,
+                  size_t count,
+                  C_DataType data_type,
+                  size_t src_rank,
+                  C_CCLComm comm,
+                  C_Stream stream) {
+  return XcclP2P(false, recv_buf, count, data_type, src_rank, comm, stream);
+}
+
+static void AddTraceRecord(const custom_cpu::TraceRecord &record,
+                           C_Profiler prof) {
+  // Every record is a runtime call of the thread it ran on. The framework
+  // only keeps device events whose correlation id matches such a call, like
+  // a kernel and the launch that queued it.
+  phi::RuntimeTraceEvent runtime_event;
+  runtime_event.name = record.name;
+  runtime_event.type = phi::TracerEventType::CudaRuntime;
+  runtime_event.start_ns = record.start_ns;
+  runtime_event.end_ns = record.end_ns;
+  runtime_event.process_id = getpid();
+  runtime_event.thread_id = record.thread_id;
+  runtime_event.correlation_id = record.correlation_id;
+  runtime_event.callback_id = 0;
+  profiler_add_runtime_trace_event(prof, &runtime_event);
+  if (record.kind == custom_cpu::TraceKind::kAllocation) {
+    return;
+  }
+
+  phi::DeviceTraceEvent event;
+  event.name = record.name;
+  event.start_ns = record.start_ns;
+  event.end_ns = record.end_ns;
+  event.device_id = record.device_id;
+  event.context_id = 0;
+  event.stream_id = record.stream_id;
+  event.correlation_id = record.correlation_id;
+  if (record.kind == custom_cpu::TraceKind::kMemcpy) {
+    event.type = phi::TracerEventType::Memcpy;
+    event.memcpy_info.num_bytes = record.bytes;
+    snprintf(
+        event.memcpy_info.copy_kind, phi::kMemKindMaxLen, "%s", record.name);
+    snprintf(event.memcpy_info.src_kind, phi::kMemKindMaxLen, "%s", "");
+    snprintf(event.memcpy_info.dst_kind, phi::kMemKindMaxLen, "%s", "");
+  } else {
+    event.type = record.kind == custom_cpu::TraceKind::kCollective
+                     ? phi::TracerEventType::Communication
+                     : phi::TracerEventType::Kernel;
+    // Zero the launch and occupancy details a CPU kernel does not have,
+    // they are printed in the chrome trace.
+    event.kernel_info = phi::KernelEventInfo();
+    event.kernel_info.queued = record.start_ns;
+    event.kernel_info.submitted = record.start_ns;
+    event.kernel_info.completed = record.end_ns;
+  }
+  profiler_add_device_trace_event(prof, &event);
+}
+
 C_Status ProfilerInitialize(C_Profiler prof, void **user_data) {
   return C_SUCCESS;
 }
@@ -293,13 +847,30 @@ C_Status ProfilerFinalize(C_Profiler prof, void *user_data) {
 
 C_Status ProfilerPrepare(C_Profiler prof, void *user_data) { return C_SUCCESS; }
 
-C_Status ProfilerStart(C_Profiler prof, void *user_data) { return C_SUCCESS; }
+C_Status ProfilerStart(C_Profiler prof, void *user_data) {
+  custom_cpu::StartTracing();
+  return C_SUCCESS;
+}
 
-C_Status ProfilerStop(C_Profiler prof, void *user_data) { return C_SUCCESS; }
+C_Status ProfilerStop(C_Profiler prof, void *user_data) {
+  custom_cpu::StopTracing();
+  return C_SUCCESS;
+}
 
 C_Status ProfilerCollectData(C_Profiler prof,
                              uint64_t start_ns,
                              void *user_data) {
+  uint64_t dropped = custom_cpu::CollectTraceRecords(
+      [&](const custom_cpu::TraceRecord &record) {
+        if (record.start_ns >= start_ns) {
+          AddTraceRecord(record, prof);
+        }
+      });
+  if (dropped > 0) {
+    std::cerr << "[custom_cpu] profiler dropped " << dropped
+              << " records, raise FLAGS_custom_cpu_profiler_buffer_size"
+              << std::endl;
+  }
   return C_SUCCESS;
 }
 
@@ -322,30 +893,33 @@ void InitPlugin(CustomRuntimeParams *params) {
 
   params->interface->create_stream = CreateStream;
   params->interface->destroy_stream = DestroyStream;
+  params->interface->query_stream = QueryStream;
+  params->interface->stream_add_callback = AddCallback;
 
   params->interface->create_event = CreateEvent;
   params->interface->destroy_event = DestroyEvent;
   params->interface->record_event = RecordEvent;
+  params->interface->query_event = QueryEvent;
 
   params->interface->synchronize_device = SyncDevice;
   params->interface->synchronize_stream = SyncStream;
   params->interface->synchronize_event = SyncEvent;
   params->interface->stream_wait_event = StreamWaitEvent;
 
-  params->interface->memory_copy_h2d = MemCpy;
-  params->interface->memory_copy_d2d = MemCpy;
-  params->interface->memory_copy_d2h = MemCpy;
+  params->interface->memory_copy_h2d = MemCpyH2D;
+  params->interface->memory_copy_d2d = MemCpyD2D;
+  params->interface->memory_copy_d2h = MemCpyD2H;
   params->interface->memory_copy_p2p = MemCpyP2P;
-  params->interface->async_memory_copy_h2d = AsyncMemCpy;
-  params->interface->async_memory_copy_d2d = AsyncMemCpy;
-  params->interface->async_memory_copy_d2h = AsyncMemCpy;
+  params->interface->async_memory_copy_h2d = AsyncMemCpyH2D;
+  params->interface->async_memory_copy_d2d = AsyncMemCpyD2D;
+  params->interface->async_memory_copy_d2h = AsyncMemCpyD2H;
   params->interface->async_memory_copy_p2p = AsyncMemCpyP2P;
   params->interface->device_memory_allocate = Allocate;
-  params->interface->host_memory_allocate = Allocate;
-  params->interface->unified_memory_allocate = Allocate;
+  params->interface->host_memory_allocate = HostAllocate;
+  params->interface->unified_memory_allocate = UnifiedAllocate;
   params->interface->device_memory_deallocate = Deallocate;
-  params->interface->host_memory_deallocate = Deallocate;
-  params->interface->unified_memory_deallocate = Deallocate;
+  params->interface->host_memory_deallocate = HostDeallocate;
+  params->interface->unified_memory_deallocate = UnifiedDeallocate;
 
   params->interface->get_device_count = GetDevicesCount;
   params->interface->get_device_list = GetDevicesList;
@@ -358,6 +932,13 @@ void InitPlugin(CustomRuntimeParams *params) {
   params->interface->xccl_destroy_comm = XcclDestroyComm;
   params->interface->xccl_all_reduce = XcclAllReduce;
   params->interface->xccl_broadcast = XcclBroadcast;
+  params->interface->xccl_reduce = XcclReduce;
+  params->interface->xccl_all_gather = XcclAllGather;
+  params->interface->xccl_reduce_scatter = XcclReduceScatter;
+  params->interface->xccl_group_start = XcclGroupStart;
+  params->interface->xccl_group_end = XcclGroupEnd;
+  params->interface->xccl_send = XcclSend;
+  params->interface->xccl_recv = XcclRecv;
 
   params->interface->profiler_collect_trace_data = ProfilerCollectData;
   params->interface->profiler_initialize = ProfilerInitialize;
@@ -0,0 +1,172 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/stream.h"
+
+#include <algorithm>
+#include <atomic>
+#include <set>
+
+#include "runtime/flags.h"
+#include "runtime/topology.h"
+
+namespace custom_cpu {
+
+uint64_t EventState::NextTicket() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return ++recorded_;
+}
+
+void EventState::Complete(uint64_t ticket) {
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    completed_ = std::max(completed_, ticket);
+  }
+  cv_.notify_all();
+}
+
+void EventState::Wait(uint64_t ticket) {
+  std::unique_lock<std::mutex> lock(mutex_);
+  cv_.wait(lock, [&] { return completed_ >= ticket; });
+}
+
+bool EventState::Query(uint64_t ticket) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return completed_ >= ticket;
+}
+
+uint64_t EventState::LastTicket() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return recorded_;
+}
+
+bool AsyncStreamEnabled() {
+  static bool enabled = EnvToBool("FLAGS_custom_cpu_async_stream", false);
+  return enabled;
+}
+
+namespace {
+
+struct StreamRegistry {
+  std::mutex mutex;
+  std::set<C_Stream> streams;
+};
+
+StreamRegistry &GetStreamRegistry() {
+  static auto *registry = new StreamRegistry;
+  return *registry;
+}
+
+}  // namespace
+
+C_Stream CreateStream(int device_id) {
+  auto stream = new C_Stream_st(device_id);
+  auto &registry = GetStreamRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  registry.streams.insert(stream);
+  return stream;
+}
+
+void DestroyStream(C_Stream stream) {
+  {
+    auto &registry = GetStreamRegistry();
+    std::lock_guard<std::mutex> lock(registry.mutex);
+    registry.streams.erase(stream);
+  }
+  delete stream;
+}
+
+void SynchronizeDevice(int device_id) {
+  auto &registry = GetStreamRegistry();
+  std::lock_guard<std::mutex> lock(registry.mutex);
+  for (auto stream : registry.streams) {
+    if (stream->device_id == device_id) {
+      stream->Synchronize();
+    }
+  }
+}
+
+void RunOnStream(C_Stream stream, std::function<void()> task) {
+  if (stream) {
+    stream->Enqueue(std::move(task));
+  } else {
+    task();
+  }
+}
+
+}  // namespace custom_cpu
+
+C_Stream_st::C_Stream_st(int device_id) : device_id(device_id) {
+  static std::atomic<uint64_t> next_id{1};
+  id = next_id.fetch_add(1);
+  if (custom_cpu::AsyncStreamEnabled()) {
+    worker_ = std::thread(&C_Stream_st::WorkerLoop, this);
+  }
+}
+
+C_Stream_st::~C_Stream_st() {
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    stop_ = true;
+  }
+  task_cv_.notify_all();
+  if (worker_.joinable()) {
+    worker_.join();
+  }
+}
+
+void C_Stream_st::Enqueue(std::function<void()> task) {
+  if (!worker_.joinable()) {
+    task();
+    return;
+  }
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    tasks_.push_back(std::move(task));
+  }
+  task_cv_.notify_one();
+}
+
+void C_Stream_st::Synchronize() {
+  std::unique_lock<std::mutex> lock(mutex_);
+  idle_cv_.wait(lock, [&] { return tasks_.empty() && running_ == 0; });
+}
+
+bool C_Stream_st::Query() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return tasks_.empty() && running_ == 0;
+}
+
+void C_Stream_st::WorkerLoop() {
+  custom_cpu::PinThreadToDevice(device_id);
+  std::unique_lock<std::mutex> lock(mutex_);
+  while (true) {
+    task_cv_.wait(lock, [&] { return stop_ || !tasks_.empty(); });
+    if (tasks_.empty()) {
+      // stop_ is only honoured once the queue has drained.
+      break;
+    }
+    auto task = std::move(tasks_.front());
+    tasks_.pop_front();
+    running_++;
+    lock.unlock();
+    task();
+    lock.lock();
+    running_--;
+    if (tasks_.empty()) {
+      idle_cv_.notify_all();
+    }
+  }
+  idle_cv_.notify_all();
+}
@@ -0,0 +1,98 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <condition_variable>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <thread>
+
+#include "paddle/phi/backends/device_ext.h"
+
+namespace custom_cpu {
+
+// Completion state shared between an event handle and the stream tasks that
+// record or wait on it, so that destroying the handle never races with a
+// pending task.
+class EventState {
+ public:
+  // Returns the ticket that completes once the work queued before this call
+  // has finished.
+  uint64_t NextTicket();
+  void Complete(uint64_t ticket);
+  void Wait(uint64_t ticket);
+  bool Query(uint64_t ticket);
+  uint64_t LastTicket();
+
+ private:
+  std::mutex mutex_;
+  std::condition_variable cv_;
+  uint64_t recorded_ = 0;
+  uint64_t completed_ = 0;
+};
+
+// Whether streams run their work on a worker thread. phi kernels of this
+// plugin execute on the calling thread and are not ordered against the
+// stream queue, so asynchronous execution is opt-in.
+bool AsyncStreamEnabled();
+
+}  // namespace custom_cpu
+
+struct C_Event_st {
+  std::shared_ptr<custom_cpu::EventState> state =
+      std::make_shared<custom_cpu::EventState>();
+};
+
+// A stream owns one worker thread consuming a FIFO task queue.
+struct C_Stream_st {
+  explicit C_Stream_st(int device_id);
+  ~C_Stream_st();
+
+  C_Stream_st(const C_Stream_st &) = delete;
+  C_Stream_st &operator=(const C_Stream_st &) = delete;
+
+  void Enqueue(std::function<void()> task);
+  void Synchronize();
+  bool Query();
+
+  int device_id;
+  // Small sequential id naming the stream in profiler traces.
+  uint64_t id;
+
+ private:
+  void WorkerLoop();
+
+  std::mutex mutex_;
+  std::condition_variable task_cv_;
+  std::condition_variable idle_cv_;
+  std::deque<std::function<void()>> tasks_;
+  size_t running_ = 0;
+  bool stop_ = false;
+  std::thread worker_;
+};
+
+namespace custom_cpu {
+
+C_Stream CreateStream(int device_id);
+void DestroyStream(C_Stream stream);
+void SynchronizeDevice(int device_id);
+
+// Runs `task` in stream order, or immediately when `stream` is null.
+void RunOnStream(C_Stream stream, std::function<void()> task);
+
+}  // namespace custom_cpu
@@ -0,0 +1,206 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/thread_pool.h"
+
+#include <atomic>
+#include <exception>
+#include <memory>
+
+#include "runtime/flags.h"
+#include "runtime/topology.h"
+
+namespace custom_cpu {
+
+namespace {
+
+thread_local bool in_parallel_region = false;
+
+// Marks the current thread as running pool work for its lifetime.
+class ParallelRegionGuard {
+ public:
+  ParallelRegionGuard() : previous_(in_parallel_region) {
+    in_parallel_region = true;
+  }
+  ~ParallelRegionGuard() { in_parallel_region = previous_; }
+
+ private:
+  bool previous_;
+};
+
+size_t IntraOpPoolSize(int device_id) {
+  size_t threads = EnvToUint64("FLAGS_custom_cpu_num_threads", 0);
+  if (threads > 0) {
+    return threads;
+  }
+  if (NumaBindEnabled()) {
+    int node = DeviceNumaNode(device_id);
+    for (auto &numa_node : NumaNodes()) {
+      if (numa_node.id == node) {
+        return std::max<size_t>(numa_node.cpus.size(), 1);
+      }
+    }
+  }
+  return std::max(std::thread::hardware_concurrency(), 1u);
+}
+
+ThreadPool &GetIntraOpThreadPool(int device_id) {
+  static auto *pool = new ThreadPool(
+      // The calling thread works too.
+      IntraOpPoolSize(device_id) - 1,
+      [device_id] { PinThreadToDevice(device_id); });
+  return *pool;
+}
+
+}  // namespace
+
+ThreadPool::ThreadPool(size_t num_threads, std::function<void()> on_start) {
+  for (size_t i = 0; i < num_threads; ++i) {
+    workers_.emplace_back(&ThreadPool::WorkerLoop, this, on_start);
+  }
+}
+
+ThreadPool::~ThreadPool() {
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    stop_ = true;
+  }
+  cv_.notify_all();
+  for (auto &worker : workers_) {
+    worker.join();
+  }
+}
+
+void ThreadPool::WorkerLoop(const std::function<void()> &on_start) {
+  if (on_start) {
+    on_start();
+  }
+  std::unique_lock<std::mutex> lock(mutex_);
+  while (true) {
+    cv_.wait(lock, [&] { return stop_ || !tasks_.empty(); });
+    if (tasks_.empty()) {
+      break;
+    }
+    auto task = std::move(tasks_.front());
+    tasks_.pop_front();
+    lock.unlock();
+    task();
+    lock.lock();
+  }
+}
+
+void ThreadPool::ParallelFor(size_t n, const std::function<void(size_t)> &fn) {
+  if (n == 0) {
+    return;
+  }
+  size_t helpers = std::min(workers_.size(), n - 1);
+  if (helpers == 0 || in_parallel_region) {
+    for (size_t i = 0; i < n; ++i) {
+      fn(i);
+    }
+    return;
+  }
+
+  // Indices are claimed dynamically so a slow thread does not hold back the
+  // whole loop. The state is shared with helpers that may only start after
+  // the caller has finished all the work.
+  struct Job {
+    std::atomic<size_t> next{0};
+    std::atomic<bool> failed{false};
+    std::mutex mutex;
+    std::condition_variable cv;
+    size_t done = 0;
+    std::exception_ptr error;
+  };
+  auto job = std::make_shared<Job>();
+  size_t total = n;
+  auto run = [job, total, &fn] {
+    ParallelRegionGuard guard;
+    size_t finished = 0;
+    for (size_t i = job->next++; i < total; i = job->next++) {
+      // Once an index failed the remaining ones are only counted, the first
+      // exception is rethrown to the caller.
+      if (!job->failed.load(std::memory_order_relaxed)) {
+        try {
+          fn(i);
+        } catch (...) {
+          std::lock_guard<std::mutex> lock(job->mutex);
+          if (!job->error) {
+            job->error = std::current_exception();
+          }
+          job->failed = true;
+        }
+      }
+      finished++;
+    }
+    if (finished > 0) {
+      std::lock_guard<std::mutex> lock(job->mutex);
+      job->done += finished;
+      if (job->done == total) {
+        job->cv.notify_all();
+      }
+    }
+  };
+  {
+    std::lock_guard<std::mutex> lock(mutex_);
+    for (size_t i = 0; i < helpers; ++i) {
+      tasks_.push_back(run);
+    }
+  }
+  cv_.notify_all();
+  run();
+  std::unique_lock<std::mutex> lock(job->mutex);
+  job->cv.wait(lock, [&] { return job->done == total; });
+  if (job->error) {
+    std::rethrow_exception(job->error);
+  }
+}
+
+bool InParallelRegion() { return in_parallel_region; }
+
+void InitIntraOpThreadPool(int device_id) { GetIntraOpThreadPool(device_id); }
+
+size_t IntraOpThreads() { return GetIntraOpThreadPool(0).num_threads() + 1; }
+
+size_t ParallelChunks(int64_t begin, int64_t end, int64_t grain_size) {
+  if (end - begin <= 0 || in_parallel_region) {
+    return 1;
+  }
+  int64_t grains = (end - begin) / std::max<int64_t>(grain_size, 1);
+  return static_cast<size_t>(
+      std::max<int64_t>(std::min<int64_t>(grains, IntraOpThreads()), 1));
+}
+
+void ParallelFor(int64_t begin,
+                 int64_t end,
+                 int64_t grain_size,
+                 const std::function<void(int64_t, int64_t)> &fn) {
+  if (begin >= end) {
+    return;
+  }
+  size_t chunks = ParallelChunks(begin, end, grain_size);
+  if (chunks <= 1) {
+    fn(begin, end);
+    return;
+  }
+  int64_t chunk_size = (end - begin + chunks - 1) / chunks;
+  GetIntraOpThreadPool(0).ParallelFor(chunks, [&](size_t chunk) {
+    int64_t chunk_begin = begin + static_cast<int64_t>(chunk) * chunk_size;
+    if (chunk_begin < end) {
+      fn(chunk_begin, std::min(end, chunk_begin + chunk_size));
+    }
+  });
+}
+
+}  // namespace custom_cpu
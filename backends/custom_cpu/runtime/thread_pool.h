@@ -0,0 +1,135 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <algorithm>
+#include <condition_variable>
+#include <cstddef>
+#include <cstdint>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+namespace custom_cpu {
+
+// A pool of worker threads. The calling thread takes part in every
+// ParallelFor, so a pool of size 0 runs inline.
+class ThreadPool {
+ public:
+  // `on_start` runs first on every worker, e.g. to pin it to a NUMA node.
+  explicit ThreadPool(size_t num_threads,
+                      std::function<void()> on_start = nullptr);
+  ~ThreadPool();
+
+  ThreadPool(const ThreadPool &) = delete;
+  ThreadPool &operator=(const ThreadPool &) = delete;
+
+  // Calls fn(i) for every i in [0, n) and returns once all calls finished.
+  // Calls made from inside fn run inline instead of waiting on the pool. The
+  // first exception thrown by fn is rethrown once all calls returned.
+  void ParallelFor(size_t n, const std::function<void(size_t)> &fn);
+
+  size_t num_threads() const { return workers_.size(); }
+
+ private:
+  void WorkerLoop(const std::function<void()> &on_start);
+
+  std::mutex mutex_;
+  std::condition_variable cv_;
+  std::deque<std::function<void()>> tasks_;
+  std::vector<std::thread> workers_;
+  bool stop_ = false;
+};
+
+// Iterations of a cheap elementwise loop worth handing to another thread.
+constexpr int64_t kDefaultGrainSize = 1 << 15;
+
+// Grain size of a loop whose iterations each cost about `cost` elements.
+inline int64_t GrainSize(int64_t cost) {
+  return std::max<int64_t>(kDefaultGrainSize / std::max<int64_t>(cost, 1), 1);
+}
+
+// Whether the calling thread is running a ParallelFor task.
+bool InParallelRegion();
+
+// Creates the intra-op pool shared by all kernels, sized by
+// FLAGS_custom_cpu_num_threads or else the cores of the NUMA node of
+// `device_id`, whose workers are pinned to that node. Only the first call
+// has an effect, kernels running before any device is initialized use
+// device 0.
+void InitIntraOpThreadPool(int device_id);
+
+// Threads, the caller included, an intra-op ParallelFor spreads work over.
+size_t IntraOpThreads();
+
+// Number of chunks [begin, end) is split into, each holding at least
+// `grain_size` iterations unless the range is smaller. Returns 1 inside a
+// parallel region.
+size_t ParallelChunks(int64_t begin, int64_t end, int64_t grain_size);
+
+// Splits [begin, end) into ParallelChunks contiguous ranges and calls
+// fn(chunk_begin, chunk_end) for each over the intra-op pool. Ranges shorter
+// than two grains run inline on the calling thread.
+void ParallelFor(int64_t begin,
+                 int64_t end,
+                 int64_t grain_size,
+                 const std::function<void(int64_t, int64_t)> &fn);
+
+// Upper bound of the chunks ParallelReduce splits a range into. Unlike the
+// chunks of ParallelFor they depend on the range and grain size only, so a
+// floating point reduction gives the same result for any number of threads
+// and inside a parallel region.
+constexpr int64_t kMaxReduceChunks = 64;
+
+// Computes reduce(...reduce(identity, f(b0, e0, identity)), f(b1, e1,
+// identity)...) over up to kMaxReduceChunks chunks of at least `grain_size`
+// iterations, spread over the intra-op pool. Partial results are combined in
+// chunk order on the calling thread.
+template <typename T, typename F, typename R>
+T ParallelReduce(int64_t begin,
+                 int64_t end,
+                 int64_t grain_size,
+                 const T &identity,
+                 const F &f,
+                 const R &reduce) {
+  if (begin >= end) {
+    return identity;
+  }
+  int64_t chunks = std::min<int64_t>(
+      std::max<int64_t>((end - begin) / std::max<int64_t>(grain_size, 1), 1),
+      kMaxReduceChunks);
+  if (chunks == 1) {
+    return reduce(identity, f(begin, end, identity));
+  }
+  int64_t chunk_size = (end - begin + chunks - 1) / chunks;
+  std::vector<T> partials(chunks, identity);
+  ParallelFor(0, chunks, 1, [&](int64_t first, int64_t last) {
+    for (int64_t c = first; c < last; ++c) {
+      int64_t b = begin + c * chunk_size;
+      if (b < end) {
+        partials[c] = f(b, std::min(end, b + chunk_size), identity);
+      }
+    }
+  });
+  T result = identity;
+  for (auto &partial : partials) {
+    result = reduce(result, partial);
+  }
+  return result;
+}
+
+}  // namespace custom_cpu
@@ -0,0 +1,207 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/topology.h"
+
+#include <dirent.h>
+#include <pthread.h>
+#include <sched.h>
+#include <sys/syscall.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <cctype>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <sstream>
+
+#include "runtime/flags.h"
+
+namespace custom_cpu {
+
+namespace {
+
+constexpr const char *kNodeRoot = "/sys/devices/system/node";
+// From linux/mempolicy.h, not every toolchain ships numaif.h.
+constexpr int kMpolPreferred = 1;
+// Bound of the CPU ids accepted in cpu lists, the kernel's NR_CPUS limit.
+constexpr long kMaxCpus = 8192;  // NOLINT
+
+std::string ReadFile(const std::string &path) {
+  std::ifstream file(path);
+  std::stringstream content;
+  content << file.rdbuf();
+  return content.str();
+}
+
+std::vector<NumaNode> LoadNumaNodes() {
+  std::vector<NumaNode> nodes;
+  DIR *dir = opendir(kNodeRoot);
+  if (dir) {
+    while (auto entry = readdir(dir)) {
+      int id;
+      char tail;
+      if (sscanf(entry->d_name, "node%d%c", &id, &tail) != 1) {
+        continue;
+      }
+      auto cpus = ParseCpuList(
+          ReadFile(std::string(kNodeRoot) + "/" + entry->d_name + "/cpulist"));
+      if (!cpus.empty()) {
+        // Memory-only nodes cannot run a device.
+        nodes.push_back({id, cpus});
+      }
+    }
+    closedir(dir);
+  }
+  std::sort(nodes.begin(),
+            nodes.end(),
+            [](const NumaNode &a, const NumaNode &b) { return a.id < b.id; });
+  if (nodes.empty()) {
+    NumaNode node{0, {}};
+    long ncpus = sysconf(_SC_NPROCESSORS_ONLN);
+    for (int cpu = 0; cpu < std::max(ncpus, 1L); ++cpu) {
+      node.cpus.push_back(cpu);
+    }
+    nodes.push_back(node);
+  }
+  return nodes;
+}
+
+}  // namespace
+
+std::vector<int> ParseCpuList(const std::string &list) {
+  std::vector<int> cpus;
+  std::stringstream stream(list);
+  std::string range;
+  while (std::getline(stream, range, ',')) {
+    // Whole ranges "a" or "a-b" with 0 <= a <= b only, anything else such as
+    // "-1", "3-1" or "5x" is skipped.
+    const char *pos = range.c_str();
+    while (isspace(static_cast<unsigned char>(*pos))) {
+      ++pos;
+    }
+    if (!isdigit(static_cast<unsigned char>(*pos))) {
+      continue;
+    }
+    char *tail;
+    long first = strtol(pos, &tail, 10);  // NOLINT
+    long last = first;                    // NOLINT
+    if (*tail == '-') {
+      pos = tail + 1;
+      if (!isdigit(static_cast<unsigned char>(*pos))) {
+        continue;
+      }
+      last = strtol(pos, &tail, 10);
+    }
+    while (isspace(static_cast<unsigned char>(*tail))) {
+      ++tail;
+    }
+    if (*tail != '\0' || last < first || last >= kMaxCpus) {
+      continue;
+    }
+    for (long cpu = first; cpu <= last; ++cpu) {  // NOLINT
+      cpus.push_back(static_cast<int>(cpu));
+    }
+  }
+  return cpus;
+}
+
+const std::vector<NumaNode> &NumaNodes() {
+  static auto *nodes = new std::vector<NumaNode>(LoadNumaNodes());
+  return *nodes;
+}
+
+size_t DeviceCount() {
+  static size_t count = [] {
+    size_t value = EnvToUint64("FLAGS_custom_cpu_device_count", 0);
+    return value > 0 ? value : std::max<size_t>(NumaNodes().size(), 2);
+  }();
+  return count;
+}
+
+int DeviceNumaNode(int device_id) {
+  auto &nodes = NumaNodes();
+  return nodes[static_cast<size_t>(std::max(device_id, 0)) % nodes.size()].id;
+}
+
+bool NumaBindEnabled() {
+  static bool enabled =
+      NumaNodes().size() > 1 && EnvToBool("FLAGS_custom_cpu_numa_bind", true);
+  return enabled;
+}
+
+bool BindMemoryToNumaNode(void *ptr, size_t size, int node) {
+  constexpr size_t kMaskBits = sizeof(unsigned long) * 8;  // NOLINT
+  if (node < 0 || static_cast<size_t>(node) >= kMaskBits * 16) {
+    return false;
+  }
+  unsigned long mask[16] = {0};  // NOLINT
+  mask[node / kMaskBits] = 1UL << (node % kMaskBits);
+  // Preferred rather than strict binding, a full node falls back to the
+  // others instead of failing the allocation.
+  return syscall(
+             SYS_mbind, ptr, size, kMpolPreferred, mask, kMaskBits * 16, 0) ==
+         0;
+}
+
+void PinThreadToDevice(int device_id) {
+  if (!NumaBindEnabled()) {
+    return;
+  }
+  int node = DeviceNumaNode(device_id);
+  for (auto &numa_node : NumaNodes()) {
+    if (numa_node.id != node) {
+      continue;
+    }
+    cpu_set_t cpuset;
+    CPU_ZERO(&cpuset);
+    for (int cpu : numa_node.cpus) {
+      if (cpu < CPU_SETSIZE) {
+        CPU_SET(cpu, &cpuset);
+      }
+    }
+    pthread_setaffinity_np(pthread_self(), sizeof(cpuset), &cpuset);
+  }
+}
+
+bool NumaNodeMemInfo(int node, size_t *total, size_t *free) {
+  std::ifstream file(std::string(kNodeRoot) + "/node" + std::to_string(node) +
+                     "/meminfo");
+  if (!file) {
+    return false;
+  }
+  bool has_total = false, has_free = false;
+  std::string line;
+  while (std::getline(file, line)) {
+    // "Node 0 MemTotal:       4816632 kB"
+    char key[64];
+    unsigned long long kb;  // NOLINT
+    int id;
+    if (sscanf(line.c_str(), "Node %d %63s %llu", &id, key, &kb) != 3) {
+      continue;
+    }
+    if (strcmp(key, "MemTotal:") == 0) {
+      *total = kb * 1024;
+      has_total = true;
+    } else if (strcmp(key, "MemFree:") == 0) {
+      *free = kb * 1024;
+      has_free = true;
+    }
+  }
+  return has_total && has_free;
+}
+
+}  // namespace custom_cpu
@@ -0,0 +1,59 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+#include <string>
+#include <vector>
+
+namespace custom_cpu {
+
+struct NumaNode {
+  int id;
+  std::vector<int> cpus;
+};
+
+// NUMA nodes with CPUs, read once from /sys/devices/system/node. A host
+// without NUMA information is reported as node 0 holding every online CPU.
+const std::vector<NumaNode> &NumaNodes();
+
+// Number of custom_cpu devices: FLAGS_custom_cpu_device_count when set,
+// otherwise one per NUMA node but at least two, the layout of hosts
+// without NUMA support.
+size_t DeviceCount();
+
+// NUMA node backing `device_id`. Devices are assigned to nodes round-robin.
+int DeviceNumaNode(int device_id);
+
+// Whether memory and threads of devices are bound to their node, i.e. the
+// host has more than one node and FLAGS_custom_cpu_numa_bind is on.
+bool NumaBindEnabled();
+
+// Prefers `node` for the pages of [ptr, ptr + size), which must be page
+// aligned. Returns false if the kernel refused the policy.
+bool BindMemoryToNumaNode(void *ptr, size_t size, int node);
+
+// Restricts the calling thread to the CPUs of the node of `device_id` when
+// binding is enabled.
+void PinThreadToDevice(int device_id);
+
+// Reads MemTotal and MemFree of `node` in bytes.
+bool NumaNodeMemInfo(int node, size_t *total, size_t *free);
+
+// Parses a kernel cpu list such as "0-3,8,10-11". Malformed or reversed
+// ranges are skipped, an empty list gives no CPUs.
+std::vector<int> ParseCpuList(const std::string &list);
+
+}  // namespace custom_cpu
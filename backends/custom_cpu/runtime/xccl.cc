@@ -0,0 +1,589 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "runtime/xccl.h"
+
+#include <errno.h>
+#include <fcntl.h>
+#include <sched.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include <algorithm>
+#include <atomic>
+#include <cstring>
+#include <iostream>
+#include <vector>
+
+#include "runtime/flags.h"
+#include "runtime/half.h"
+
+namespace custom_cpu {
+
+namespace {
+
+constexpr uint64_t kShmMagic = 0x63706378636c6c31ULL;  // "cpcxcll1"
+constexpr size_t kCacheLine = 64;
+constexpr size_t kPageSize = 4096;
+constexpr int kSpinBeforeYield = 1024;
+// Ranks may be launched seconds apart, give up attaching after ~5 minutes.
+constexpr int kAttachRetries = 300000;
+
+size_t AlignUp(size_t value, size_t alignment) {
+  return (value + alignment - 1) / alignment * alignment;
+}
+
+void SpinWait(int *spins) {
+  if (++*spins > kSpinBeforeYield) {
+    sched_yield();
+  }
+}
+
+template <typename T>
+struct NativeElem {
+  using Storage = T;
+  using Acc = T;
+  static Acc Load(Storage v) { return v; }
+  static Storage Store(Acc v) { return v; }
+};
+
+struct Float16Elem {
+  using Storage = uint16_t;
+  using Acc = float;
+  static Acc Load(Storage v) { return HalfBitsToFloat(v); }
+  static Storage Store(Acc v) { return FloatToHalfBits(v); }
+};
+
+struct BFloat16Elem {
+  using Storage = uint16_t;
+  using Acc = float;
+  static Acc Load(Storage v) { return Bfloat16BitsToFloat(v); }
+  static Storage Store(Acc v) { return FloatToBfloat16Bits(v); }
+};
+
+struct SumOp {
+  template <typename T>
+  T operator()(T a, T b) const {
+    return a + b;
+  }
+};
+
+struct ProdOp {
+  template <typename T>
+  T operator()(T a, T b) const {
+    return a * b;
+  }
+};
+
+struct MaxOp {
+  template <typename T>
+  T operator()(T a, T b) const {
+    return a < b ? b : a;
+  }
+};
+
+struct MinOp {
+  template <typename T>
+  T operator()(T a, T b) const {
+    return b < a ? b : a;
+  }
+};
+
+// dst[i] = op(srcs[0][i], ..., srcs[n-1][i]), accumulated blockwise in Acc so
+// that half precision inputs are only rounded once.
+template <typename Elem, typename Op>
+void ReduceBuffers(const char *const *srcs,
+                   size_t nsrcs,
+                   char *dst,
+                   size_t count,
+                   bool average) {
+  using Storage = typename Elem::Storage;
+  using Acc = typename Elem::Acc;
+  constexpr size_t kBlock = 1024;
+  Acc acc[kBlock];
+  Op op;
+  auto out = reinterpret_cast<Storage *>(dst);
+  for (size_t begin = 0; begin < count; begin += kBlock) {
+    size_t n = std::min(kBlock, count - begin);
+    auto first = reinterpret_cast<const Storage *>(srcs[0]) + begin;
+    for (size_t i = 0; i < n; ++i) {
+      acc[i] = Elem::Load(first[i]);
+    }
+    for (size_t s = 1; s < nsrcs; ++s) {
+      auto src = reinterpret_cast<const Storage *>(srcs[s]) + begin;
+      for (size_t i = 0; i < n; ++i) {
+        acc[i] = op(acc[i], Elem::Load(src[i]));
+      }
+    }
+    if (average) {
+      for (size_t i = 0; i < n; ++i) {
+        acc[i] = acc[i] / static_cast<Acc>(nsrcs);
+      }
+    }
+    for (size_t i = 0; i < n; ++i) {
+      out[begin + i] = Elem::Store(acc[i]);
+    }
+  }
+}
+
+template <typename Elem>
+bool ReduceBuffersByOp(const char *const *srcs,
+                       size_t nsrcs,
+                       char *dst,
+                       size_t count,
+                       C_CCLReduceOp op) {
+  switch (op) {
+    case C_CCLReduceOp::SUM:
+      ReduceBuffers<Elem, SumOp>(srcs, nsrcs, dst, count, false);
+      return true;
+    case C_CCLReduceOp::AVG:
+      ReduceBuffers<Elem, SumOp>(srcs, nsrcs, dst, count, true);
+      return true;
+    case C_CCLReduceOp::PRODUCT:
+      ReduceBuffers<Elem, ProdOp>(srcs, nsrcs, dst, count, false);
+      return true;
+    case C_CCLReduceOp::MAX:
+      ReduceBuffers<Elem, MaxOp>(srcs, nsrcs, dst, count, false);
+      return true;
+    case C_CCLReduceOp::MIN:
+      ReduceBuffers<Elem, MinOp>(srcs, nsrcs, dst, count, false);
+      return true;
+    default:
+      return false;
+  }
+}
+
+bool ReduceBuffersByType(const char *const *srcs,
+                         size_t nsrcs,
+                         char *dst,
+                         size_t count,
+                         C_DataType dtype,
+                         C_CCLReduceOp op) {
+  switch (dtype) {
+    case C_DataType::FLOAT32:
+      return ReduceBuffersByOp<NativeElem<float>>(srcs, nsrcs, dst, count, op);
+    case C_DataType::FLOAT64:
+      return ReduceBuffersByOp<NativeElem<double>>(srcs, nsrcs, dst, count, op);
+    case C_DataType::FLOAT16:
+      return ReduceBuffersByOp<Float16Elem>(srcs, nsrcs, dst, count, op);
+    case C_DataType::BFLOAT16:
+      return ReduceBuffersByOp<BFloat16Elem>(srcs, nsrcs, dst, count, op);
+    case C_DataType::INT8:
+      return ReduceBuffersByOp<NativeElem<int8_t>>(srcs, nsrcs, dst, count, op);
+    case C_DataType::UINT8:
+      return ReduceBuffersByOp<NativeElem<uint8_t>>(
+          srcs, nsrcs, dst, count, op);
+    case C_DataType::INT16:
+      return ReduceBuffersByOp<NativeElem<int16_t>>(
+          srcs, nsrcs, dst, count, op);
+    case C_DataType::INT32:
+      return ReduceBuffersByOp<NativeElem<int32_t>>(
+          srcs, nsrcs, dst, count, op);
+    case C_DataType::INT64:
+      return ReduceBuffersByOp<NativeElem<int64_t>>(
+          srcs, nsrcs, dst, count, op);
+    case C_DataType::BOOL:
+      // Logical or / and on 0/1 bytes.
+      if (op == C_CCLReduceOp::SUM || op == C_CCLReduceOp::MAX) {
+        ReduceBuffers<NativeElem<uint8_t>, MaxOp>(
+            srcs, nsrcs, dst, count, false);
+        return true;
+      } else if (op == C_CCLReduceOp::PRODUCT || op == C_CCLReduceOp::MIN) {
+        ReduceBuffers<NativeElem<uint8_t>, MinOp>(
+            srcs, nsrcs, dst, count, false);
+        return true;
+      }
+      return false;
+    default:
+      return false;
+  }
+}
+
+}  // namespace
+
+struct ShmHeader {
+  std::atomic<uint64_t> magic;
+  uint64_t nranks;
+  uint64_t chunk_bytes;
+  uint64_t p2p_chunk_bytes;
+  alignas(kCacheLine) std::atomic<uint32_t> barrier_count;
+  alignas(kCacheLine) std::atomic<uint32_t> barrier_generation;
+};
+
+struct P2PChannel {
+  alignas(kCacheLine) std::atomic<uint32_t> ready;
+  uint64_t size;
+};
+
+size_t DataTypeSize(C_DataType dtype) {
+  switch (dtype) {
+    case C_DataType::BOOL:
+    case C_DataType::UINT8:
+    case C_DataType::INT8:
+      return 1;
+    case C_DataType::UINT16:
+    case C_DataType::INT16:
+    case C_DataType::FLOAT16:
+    case C_DataType::BFLOAT16:
+      return 2;
+    case C_DataType::UINT32:
+    case C_DataType::INT32:
+    case C_DataType::FLOAT32:
+      return 4;
+    case C_DataType::UINT64:
+    case C_DataType::INT64:
+    case C_DataType::FLOAT64:
+    case C_DataType::COMPLEX64:
+      return 8;
+    case C_DataType::COMPLEX128:
+      return 16;
+    default:
+      return 0;
+  }
+}
+
+ShmCommunicator::ShmCommunicator(const std::string &name,
+                                 size_t nranks,
+                                 size_t rank)
+    : name_(name), nranks_(nranks), rank_(rank) {
+  chunk_bytes_ = AlignUp(
+      EnvToUint64("FLAGS_custom_cpu_xccl_chunk_bytes", 1 << 20), kPageSize);
+  p2p_chunk_bytes_ =
+      AlignUp(EnvToUint64("FLAGS_custom_cpu_xccl_p2p_chunk_bytes", 256 << 10),
+              kPageSize);
+  size_t channel_bytes =
+      AlignUp(sizeof(P2PChannel), kCacheLine) + p2p_chunk_bytes_;
+  total_bytes_ = AlignUp(sizeof(ShmHeader), kPageSize) +
+                 nranks_ * nranks_ * channel_bytes +
+                 2 * (nranks_ + 1) * chunk_bytes_;
+
+  int fd = -1;
+  if (rank_ == 0) {
+    fd = shm_open(name_.c_str(), O_CREAT | O_EXCL | O_RDWR, 0600);
+    if (fd < 0 && errno == EEXIST) {
+      // Left behind by a crashed job that used the same id.
+      shm_unlink(name_.c_str());
+      fd = shm_open(name_.c_str(), O_CREAT | O_EXCL | O_RDWR, 0600);
+    }
+    if (fd >= 0 && ftruncate(fd, total_bytes_) != 0) {
+      close(fd);
+      fd = -1;
+    }
+  } else {
+    for (int i = 0; i < kAttachRetries && fd < 0; ++i) {
+      fd = shm_open(name_.c_str(), O_RDWR, 0600);
+      if (fd >= 0) {
+        struct stat st;
+        if (fstat(fd, &st) != 0 ||
+            static_cast<size_t>(st.st_size) != total_bytes_) {
+          close(fd);
+          fd = -1;
+        }
+      }
+      if (fd < 0) {
+        usleep(1000);
+      }
+    }
+  }
+  if (fd < 0) {
+    std::cerr << "[custom_cpu] failed to open xccl shared memory " << name_
+              << ": " << strerror(errno) << std::endl;
+    return;
+  }
+
+  void *addr =
+      mmap(nullptr, total_bytes_, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+  close(fd);
+  if (addr == MAP_FAILED) {
+    std::cerr << "[custom_cpu] failed to map xccl shared memory " << name_
+              << ": " << strerror(errno) << std::endl;
+    return;
+  }
+  base_ = static_cast<char *>(addr);
+  header_ = reinterpret_cast<ShmHeader *>(base_);
+
+  if (rank_ == 0) {
+    header_->nranks = nranks_;
+    header_->chunk_bytes = chunk_bytes_;
+    header_->p2p_chunk_bytes = p2p_chunk_bytes_;
+    header_->barrier_count.store(0, std::memory_order_relaxed);
+    header_->barrier_generation.store(0, std::memory_order_relaxed);
+    header_->magic.store(kShmMagic, std::memory_order_release);
+  } else {
+    int spins = 0;
+    while (header_->magic.load(std::memory_order_acquire) != kShmMagic) {
+      SpinWait(&spins);
+    }
+    if (header_->nranks != nranks_ || header_->chunk_bytes != chunk_bytes_ ||
+        header_->p2p_chunk_bytes != p2p_chunk_bytes_) {
+      std::cerr << "[custom_cpu] xccl configuration differs between ranks"
+                << std::endl;
+      munmap(base_, total_bytes_);
+      base_ = nullptr;
+      header_ = nullptr;
+      return;
+    }
+  }
+
+  Barrier();
+  if (rank_ == 0) {
+    // Every rank holds a mapping now, the name is no longer needed.
+    shm_unlink(name_.c_str());
+  }
+}
+
+ShmCommunicator::~ShmCommunicator() {
+  if (base_) {
+    munmap(base_, total_bytes_);
+  }
+}
+
+void ShmCommunicator::Barrier() {
+  uint32_t generation =
+      header_->barrier_generation.load(std::memory_order_acquire);
+  if (header_->barrier_count.fetch_add(1, std::memory_order_acq_rel) + 1 ==
+      nranks_) {
+    header_->barrier_count.store(0, std::memory_order_relaxed);
+    header_->barrier_generation.fetch_add(1, std::memory_order_acq_rel);
+    return;
+  }
+  int spins = 0;
+  while (header_->barrier_generation.load(std::memory_order_acquire) ==
+         generation) {
+    SpinWait(&spins);
+  }
+}
+
+char *ShmCommunicator::Slot(size_t buffer, size_t rank) const {
+  size_t channel_bytes =
+      AlignUp(sizeof(P2PChannel), kCacheLine) + p2p_chunk_bytes_;
+  char *buffers = base_ + AlignUp(sizeof(ShmHeader), kPageSize) +
+                  nranks_ * nranks_ * channel_bytes;
+  return buffers + (buffer * (nranks_ + 1) + rank) * chunk_bytes_;
+}
+
+char *ShmCommunicator::Result(size_t buffer) const {
+  return Slot(buffer, nranks_);
+}
+
+P2PChannel *ShmCommunicator::Channel(size_t src, size_t dst) const {
+  size_t channel_bytes =
+      AlignUp(sizeof(P2PChannel), kCacheLine) + p2p_chunk_bytes_;
+  return reinterpret_cast<P2PChannel *>(base_ +
+                                        AlignUp(sizeof(ShmHeader), kPageSize) +
+                                        (src * nranks_ + dst) * channel_bytes);
+}
+
+// Steps alternate between the two staging buffers. Every step contains a
+// barrier that a rank only reaches after reading the previous step, so a
+// buffer is never rewritten while a peer still reads it. All ranks issue the
+// same sequence of collectives, hence the same sequence of steps.
+size_t ShmCommunicator::NextBuffer() { return step_++ % 2; }
+
+C_Status ShmCommunicator::ReduceImpl(const void *send_buf,
+                                     void *recv_buf,
+                                     size_t count,
+                                     C_DataType dtype,
+                                     C_CCLReduceOp op,
+                                     bool all,
+                                     size_t root) {
+  size_t elem_size = DataTypeSize(dtype);
+  if (elem_size == 0) {
+    return C_FAILED;
+  }
+  auto send = static_cast<const char *>(send_buf);
+  auto recv = static_cast<char *>(recv_buf);
+  size_t chunk_elems = chunk_bytes_ / elem_size;
+  std::vector<const char *> srcs(nranks_);
+  C_Status status = C_SUCCESS;
+
+  for (size_t offset = 0; offset < count; offset += chunk_elems) {
+    size_t n = std::min(chunk_elems, count - offset);
+    size_t buffer = NextBuffer();
+    memcpy(Slot(buffer, rank_), send + offset * elem_size, n * elem_size);
+    Barrier();
+
+    size_t per_rank = (n + nranks_ - 1) / nranks_;
+    size_t begin = std::min(n, rank_ * per_rank);
+    size_t end = std::min(n, begin + per_rank);
+    if (end > begin) {
+      for (size_t r = 0; r < nranks_; ++r) {
+        srcs[r] = Slot(buffer, r) + begin * elem_size;
+      }
+      if (!ReduceBuffersByType(srcs.data(),
+                               nranks_,
+                               Result(buffer) + begin * elem_size,
+                               end - begin,
+                               dtype,
+                               op)) {
+        status = C_FAILED;
+      }
+    }
+    Barrier();
+
+    if (all || rank_ == root) {
+      memcpy(recv + offset * elem_size, Result(buffer), n * elem_size);
+    }
+  }
+  return status;
+}
+
+C_Status ShmCommunicator::AllReduce(const void *send_buf,
+                                    void *recv_buf,
+                                    size_t count,
+                                    C_DataType dtype,
+                                    C_CCLReduceOp op) {
+  return ReduceImpl(send_buf, recv_buf, count, dtype, op, true, 0);
+}
+
+C_Status ShmCommunicator::Reduce(const void *send_buf,
+                                 void *recv_buf,
+                                 size_t count,
+                                 C_DataType dtype,
+                                 C_CCLReduceOp op,
+                                 size_t root) {
+  return ReduceImpl(send_buf, recv_buf, count, dtype, op, false, root);
+}
+
+C_Status ShmCommunicator::Broadcast(void *buf,
+                                    size_t count,
+                                    C_DataType dtype,
+                                    size_t root) {
+  size_t elem_size = DataTypeSize(dtype);
+  if (elem_size == 0) {
+    return C_FAILED;
+  }
+  auto data = static_cast<char *>(buf);
+  size_t chunk_elems = chunk_bytes_ / elem_size;
+
+  for (size_t offset = 0; offset < count; offset += chunk_elems) {
+    size_t n = std::min(chunk_elems, count - offset);
+    size_t buffer = NextBuffer();
+    if (rank_ == root) {
+      memcpy(Slot(buffer, 0), data + offset * elem_size, n * elem_size);
+    }
+    Barrier();
+    if (rank_ != root) {
+      memcpy(data + offset * elem_size, Slot(buffer, 0), n * elem_size);
+    }
+  }
+  return C_SUCCESS;
+}
+
+C_Status ShmCommunicator::AllGather(const void *send_buf,
+                                    void *recv_buf,
+                                    size_t count,
+                                    C_DataType dtype) {
+  size_t elem_size = DataTypeSize(dtype);
+  if (elem_size == 0) {
+    return C_FAILED;
+  }
+  auto send = static_cast<const char *>(send_buf);
+  auto recv = static_cast<char *>(recv_buf);
+  size_t chunk_elems = chunk_bytes_ / elem_size;
+
+  for (size_t offset = 0; offset < count; offset += chunk_elems) {
+    size_t n = std::min(chunk_elems, count - offset);
+    size_t buffer = NextBuffer();
+    memcpy(Slot(buffer, rank_), send + offset * elem_size, n * elem_size);
+    Barrier();
+    for (size_t r = 0; r < nranks_; ++r) {
+      memcpy(recv + (r * count + offset) * elem_size,
+             Slot(buffer, r),
+             n * elem_size);
+    }
+  }
+  return C_SUCCESS;
+}
+
+C_Status ShmCommunicator::ReduceScatter(const void *send_buf,
+                                        void *recv_buf,
+                                        size_t count,
+                                        C_DataType dtype,
+                                        C_CCLReduceOp op) {
+  size_t elem_size = DataTypeSize(dtype);
+  if (elem_size == 0) {
+    return C_FAILED;
+  }
+  auto send = static_cast<const char *>(send_buf);
+  auto recv = static_cast<char *>(recv_buf);
+  // Each slot holds one sub-chunk per destination rank.
+  size_t sub_elems = chunk_bytes_ / nranks_ / elem_size;
+  size_t sub_bytes = sub_elems * elem_size;
+  std::vector<const char *> srcs(nranks_);
+  C_Status status = C_SUCCESS;
+
+  for (size_t offset = 0; offset < count; offset += sub_elems) {
+    size_t n = std::min(sub_elems, count - offset);
+    size_t buffer = NextBuffer();
+    for (size_t r = 0; r < nranks_; ++r) {
+      memcpy(Slot(buffer, rank_) + r * sub_bytes,
+             send + (r * count + offset) * elem_size,
+             n * elem_size);
+    }
+    Barrier();
+    for (size_t r = 0; r < nranks_; ++r) {
+      srcs[r] = Slot(buffer, r) + rank_ * sub_bytes;
+    }
+    if (!ReduceBuffersByType(
+            srcs.data(), nranks_, recv + offset * elem_size, n, dtype, op)) {
+      status = C_FAILED;
+    }
+  }
+  return status;
+}
+
+bool ShmCommunicator::ProgressSend(size_t peer,
+                                   const char *buf,
+                                   size_t bytes,
+                                   size_t *done) {
+  auto channel = Channel(rank_, peer);
+  while (*done < bytes) {
+    if (channel->ready.load(std::memory_order_acquire) != 0) {
+      return false;
+    }
+    size_t n = std::min(p2p_chunk_bytes_, bytes - *done);
+    memcpy(reinterpret_cast<char *>(channel) +
+               AlignUp(sizeof(P2PChannel), kCacheLine),
+           buf + *done,
+           n);
+    channel->size = n;
+    channel->ready.store(1, std::memory_order_release);
+    *done += n;
+  }
+  return true;
+}
+
+bool ShmCommunicator::ProgressRecv(size_t peer,
+                                   char *buf,
+                                   size_t bytes,
+                                   size_t *done) {
+  auto channel = Channel(peer, rank_);
+  while (*done < bytes) {
+    if (channel->ready.load(std::memory_order_acquire) == 0) {
+      return false;
+    }
+    size_t n = std::min<size_t>(channel->size, bytes - *done);
+    memcpy(buf + *done,
+           reinterpret_cast<char *>(channel) +
+               AlignUp(sizeof(P2PChannel), kCacheLine),
+           n);
+    channel->ready.store(0, std::memory_order_release);
+    *done += n;
+  }
+  return true;
+}
+
+}  // namespace custom_cpu
@@ -0,0 +1,109 @@
+// Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <string>
+
+#include "paddle/phi/backends/device_ext.h"
+
+namespace custom_cpu {
+
+struct ShmHeader;
+struct P2PChannel;
+
+// Collectives between the processes of one job, exchanged through a POSIX
+// shared memory segment named after the unique id.
+//
+// Every collective is cut into chunks that are staged in double-buffered
+// per-rank slots, so chunk k+1 is written while the peers still consume
+// chunk k. Reductions are split evenly so that each rank reduces 1/nranks
+// of every chunk (reduce-scatter followed by an all-gather of the result).
+class ShmCommunicator {
+ public:
+  ShmCommunicator(const std::string &name, size_t nranks, size_t rank);
+  ~ShmCommunicator();
+
+  ShmCommunicator(const ShmCommunicator &) = delete;
+  ShmCommunicator &operator=(const ShmCommunicator &) = delete;
+
+  bool ok() const { return base_ != nullptr; }
+  size_t rank() const { return rank_; }
+  size_t nranks() const { return nranks_; }
+
+  C_Status AllReduce(const void *send_buf,
+                     void *recv_buf,
+                     size_t count,
+                     C_DataType dtype,
+                     C_CCLReduceOp op);
+  C_Status Reduce(const void *send_buf,
+                  void *recv_buf,
+                  size_t count,
+                  C_DataType dtype,
+                  C_CCLReduceOp op,
+                  size_t root);
+  C_Status Broadcast(void *buf, size_t count, C_DataType dtype, size_t root);
+  C_Status AllGather(const void *send_buf,
+                     void *recv_buf,
+                     size_t count,
+                     C_DataType dtype);
+  C_Status ReduceScatter(const void *send_buf,
+                         void *recv_buf,
+                         size_t count,
+                         C_DataType dtype,
+                         C_CCLReduceOp op);
+
+  // Point-to-point transfers make progress without blocking so that the
+  // sends and receives of a group can be interleaved.
+  bool ProgressSend(size_t peer, const char *buf, size_t bytes, size_t *done);
+  bool ProgressRecv(size_t peer, char *buf, size_t bytes, size_t *done);
+
+  void Barrier();
+
+ private:
+  char *Slot(size_t buffer, size_t rank) const;
+  char *Result(size_t buffer) const;
+  P2PChannel *Channel(size_t src, size_t dst) const;
+  size_t NextBuffer();
+
+  C_Status ReduceImpl(const void *send_buf,
+                      void *recv_buf,
+                      size_t count,
+                      C_DataType dtype,
+                      C_CCLReduceOp op,
+                      bool all,
+                      size_t root);
+
+  std::string name_;
+  size_t nranks_;
+  size_t rank_;
+  size_t chunk_bytes_;
+  size_t p2p_chunk_bytes_;
+  size_t total_bytes_ = 0;
+  uint64_t step_ = 0;
+  char *base_ = nullptr;
+  ShmHeader *header_ = nullptr;
+};
+
+size_t DataTypeSize(C_DataType dtype);
+
+}  // namespace custom_cpu
+
+struct C_CCLComm_st {
+  size_t rank;
+  size_t nranks;
+  custom_cpu::ShmCommunicator *communicator;
+};
@@ -0,0 +1,102 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Run on every rank by test_collective_xccl.py through
+# paddle.distributed.launch. Each rank derives the inputs of all ranks from
+# their seeds, so it checks its own results against numpy.
+
+from __future__ import print_function
+
+import os
+import numpy as np
+import paddle
+import paddle.distributed as dist
+
+# Sizes below and above the chunk sizes of the collectives and of send and
+# recv, none of them a multiple of the number of ranks.
+SIZES = [1, 7, 1021, 3 * 4096 + 5, (1 << 18) + 3]
+
+
+def inputs(size, dtype, nranks, seed=0):
+    return [
+        np.random.RandomState([seed, rank, size]).uniform(-1, 1, [size]).astype(dtype)
+        for rank in range(nranks)
+    ]
+
+
+def check(actual, expect, dtype):
+    tol = 1e-2 if dtype == "float16" else 1e-6
+    np.testing.assert_allclose(
+        actual.astype("float32"),
+        expect.astype("float32"),
+        rtol=tol,
+        atol=tol,
+    )
+
+
+def main():
+    dist.init_parallel_env()
+    rank = dist.get_rank()
+    nranks = dist.get_world_size()
+    for dtype in ["float32", "float16"]:
+        for size in SIZES:
+            xs = inputs(size, dtype, nranks)
+            wide = [x.astype("float32") for x in xs]
+
+            x = paddle.to_tensor(xs[rank])
+            dist.all_reduce(x)
+            check(x.numpy(), np.sum(wide, 0), dtype)
+
+            x = paddle.to_tensor(xs[rank])
+            dist.all_reduce(x, op=dist.ReduceOp.MAX)
+            np.testing.assert_array_equal(x.numpy(), np.max(xs, 0))
+
+            x = paddle.to_tensor(xs[rank])
+            dist.broadcast(x, src=nranks - 1)
+            np.testing.assert_array_equal(x.numpy(), xs[-1])
+
+            gathered = []
+            dist.all_gather(gathered, paddle.to_tensor(xs[rank]))
+            for r in range(nranks):
+                np.testing.assert_array_equal(gathered[r].numpy(), xs[r])
+
+            # Every rank contributes one block per rank, block r of the sum
+            # lands on rank r.
+            blocks = [inputs(size, dtype, nranks, r + 1) for r in range(nranks)]
+            out = paddle.empty([size], dtype)
+            dist.reduce_scatter(out, [paddle.to_tensor(b[rank]) for b in blocks])
+            check(
+                out.numpy(),
+                np.sum([b.astype("float32") for b in blocks[rank]], 0),
+                dtype,
+            )
+
+            # Ranks pass their input around a ring.
+            peer_to = (rank + 1) % nranks
+            peer_from = (rank - 1) % nranks
+            received = paddle.empty([size], dtype)
+            if rank % 2 == 0:
+                dist.send(paddle.to_tensor(xs[rank]), dst=peer_to)
+                dist.recv(received, src=peer_from)
+            else:
+                dist.recv(received, src=peer_from)
+                dist.send(paddle.to_tensor(xs[rank]), dst=peer_to)
+            np.testing.assert_array_equal(received.numpy(), xs[peer_from])
+    dist.barrier()
+    print("rank %d of %d ok" % (rank, nranks))
+
+
+if __name__ == "__main__":
+    paddle.set_device("custom_cpu:%s" % os.getenv("FLAGS_selected_custom_cpus", "0"))
+    main()
@@ -0,0 +1,55 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Checks ops on custom_cpu against paddle's own CPU kernels in dygraph,
+# forward and backward.
+
+from __future__ import print_function
+
+import numpy as np
+import paddle
+
+
+def run(place, fn, inputs, args=()):
+    """Runs fn(*inputs, *args) on `place` and returns its outputs, followed
+    by the gradients of the floating point `inputs` for a seeded random
+    gradient of the first output. `args` are passed without gradient."""
+    paddle.disable_static(place)
+    tensors = [paddle.to_tensor(x, stop_gradient=x.dtype.kind != "f") for x in inputs]
+    outs = fn(*tensors, *[paddle.to_tensor(a) for a in args])
+    if isinstance(outs, paddle.Tensor):
+        outs = [outs]
+    result = [out.numpy() for out in outs]
+    params = [t for t in tensors if not t.stop_gradient]
+    if params:
+        out_grad = np.random.RandomState(0).uniform(-1, 1, outs[0].shape)
+        grads = paddle.grad(
+            outs[:1], params, [paddle.to_tensor(out_grad, outs[0].dtype)]
+        )
+        result += [g.numpy() for g in grads]
+    paddle.enable_static()
+    return result
+
+
+def check_parity(fn, inputs, args=(), tol=1e-5):
+    """Compares run() on custom_cpu with paddle's CPU kernels, exactly when
+    `tol` is 0."""
+    expect = run(paddle.CPUPlace(), fn, inputs, args)
+    actual = run(paddle.CustomPlace("custom_cpu", 0), fn, inputs, args)
+    assert len(expect) == len(actual)
+    for e, a in zip(expect, actual):
+        if tol:
+            np.testing.assert_allclose(a, e, rtol=tol, atol=tol)
+        else:
+            np.testing.assert_array_equal(a, e)
@@ -0,0 +1,201 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+
+
+def train(place, make_optimizer, steps=3):
+    paddle.disable_static(place)
+    paddle.seed(2024)
+    np.random.seed(2024)
+    params = []
+    for shape in [[37, 19], [5], [1000]]:
+        p = paddle.create_parameter(shape, "float32")
+        p.set_value(np.random.uniform(-1, 1, shape).astype("float32"))
+        params.append(p)
+    opt = make_optimizer(params)
+    for step in range(steps):
+        loss = sum((p * p * (step + 1)).sum() for p in params)
+        loss.backward()
+        opt.step()
+        opt.clear_grad()
+    result = [p.numpy() for p in params]
+    paddle.enable_static()
+    return result
+
+
+class TestOptimizerAPI(unittest.TestCase):
+    def check(self, make_optimizer):
+        expect = train(paddle.CPUPlace(), make_optimizer)
+        actual = train(paddle.CustomPlace("custom_cpu", 0), make_optimizer)
+        for e, a in zip(expect, actual):
+            np.testing.assert_allclose(a, e, rtol=1e-5, atol=1e-6)
+
+    def test_adam(self):
+        self.check(lambda ps: paddle.optimizer.Adam(0.01, parameters=ps))
+
+    def test_adam_amsgrad(self):
+        self.check(lambda ps: paddle.optimizer.Adam(0.01, parameters=ps, amsgrad=True))
+
+    def test_adamw(self):
+        self.check(
+            lambda ps: paddle.optimizer.AdamW(0.01, parameters=ps, weight_decay=0.1)
+        )
+
+    def test_momentum(self):
+        self.check(lambda ps: paddle.optimizer.Momentum(0.01, parameters=ps))
+
+    def test_momentum_nesterov_l2(self):
+        self.check(
+            lambda ps: paddle.optimizer.Momentum(
+                0.01,
+                parameters=ps,
+                use_nesterov=True,
+                weight_decay=paddle.regularizer.L2Decay(0.01),
+            )
+        )
+
+
+def round_to(x, dtype):
+    """Rounds float32 `x` to float16 or bfloat16, returned as float32."""
+    if dtype == "float16":
+        return x.astype("float16").astype("float32")
+    bits = x.astype("float32").view("uint32").astype("uint64")
+    bits = (bits + 0x7FFF + ((bits >> 16) & 1)) >> 16 << 16
+    return bits.astype("uint32").view("float32")
+
+
+def adam_update(weight_decay=0.0, beta1=0.9, beta2=0.999, eps=1e-8):
+    def update(p, g, state, lr, t):
+        m = state.get("m", 0) * beta1 + (1 - beta1) * g
+        v = state.get("v", 0) * beta2 + (1 - beta2) * g * g
+        state.update(m=m, v=v)
+        p = p - lr * weight_decay * p
+        lr_t = lr * np.sqrt(1 - beta2**t) / (1 - beta1**t)
+        return p - lr_t * m / (np.sqrt(v) + eps * np.sqrt(1 - beta2**t))
+
+    return update
+
+
+def momentum_update(mu=0.9, nesterov=False, l2=0.0):
+    def update(p, g, state, lr, t):
+        g = g + l2 * p
+        v = state.get("v", 0) * mu + g
+        state.update(v=v)
+        return p - lr * (g + mu * v if nesterov else v)
+
+    return update
+
+
+# float16 and bfloat16 parameters with float32 master weights, which paddle
+# has no CPU kernels for, checked against numpy.
+class TestMultiPrecision(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def check(self, make_optimizer, update, steps=3, lr=0.01):
+        for dtype in ["float16", "bfloat16"]:
+            inits = [
+                round_to(np.random.uniform(-1, 1, shape).astype("float32"), dtype)
+                for shape in [[37, 19], [5], [1000]]
+            ]
+            params = []
+            for init in inits:
+                p = paddle.create_parameter(
+                    init.shape,
+                    dtype,
+                    default_initializer=paddle.nn.initializer.Constant(),
+                )
+                p.set_value(paddle.to_tensor(init).astype(dtype))
+                params.append(p)
+            opt = make_optimizer(lr, params)
+            coeffs = [
+                np.random.uniform(-1, 1, init.shape).astype("float32") for init in inits
+            ]
+            masters = [init.copy() for init in inits]
+            states = [{} for _ in inits]
+            for step in range(steps):
+                # The loss is computed in float32, the gradients are rounded
+                # to the parameter dtype by the backward of the cast. It is
+                # linear so that the gradients do not depend on how close
+                # the master weights are to a rounding boundary.
+                wide = [p.astype("float32") for p in params]
+                loss = sum(
+                    (w * paddle.to_tensor(c) * (step + 1)).sum()
+                    for w, c in zip(wide, coeffs)
+                )
+                loss.backward()
+                opt.step()
+                opt.clear_grad()
+                for i, master in enumerate(masters):
+                    g = round_to(coeffs[i] * np.float32(step + 1), dtype)
+                    masters[i] = update(master, g, states[i], lr, step + 1)
+            tol = 1e-2 if dtype == "float16" else 2e-2
+            for p, master in zip(params, masters):
+                actual = opt._master_weights[p.name]
+                self.assertEqual(actual.dtype, paddle.float32)
+                np.testing.assert_allclose(actual.numpy(), master, rtol=1e-5, atol=1e-6)
+                np.testing.assert_allclose(
+                    p.astype("float32").numpy(),
+                    round_to(master, dtype),
+                    rtol=tol,
+                    atol=tol,
+                )
+
+    def test_adam(self):
+        self.check(
+            lambda lr, ps: paddle.optimizer.Adam(
+                lr, parameters=ps, multi_precision=True
+            ),
+            adam_update(),
+        )
+
+    def test_adamw(self):
+        self.check(
+            lambda lr, ps: paddle.optimizer.AdamW(
+                lr, parameters=ps, weight_decay=0.1, multi_precision=True
+            ),
+            adam_update(weight_decay=0.1),
+        )
+
+    def test_momentum(self):
+        self.check(
+            lambda lr, ps: paddle.optimizer.Momentum(
+                lr, parameters=ps, multi_precision=True
+            ),
+            momentum_update(),
+        )
+
+    def test_momentum_nesterov_l2(self):
+        self.check(
+            lambda lr, ps: paddle.optimizer.Momentum(
+                lr,
+                parameters=ps,
+                use_nesterov=True,
+                weight_decay=paddle.regularizer.L2Decay(0.1),
+                multi_precision=True,
+            ),
+            momentum_update(nesterov=True, l2=0.1),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
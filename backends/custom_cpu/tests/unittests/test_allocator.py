@@ -0,0 +1,219 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import ctypes
+import os
+import subprocess
+import sys
+import unittest
+import numpy as np
+import paddle
+
+KIND_DEVICE = 0
+KIND_HOST = 1
+
+
+class AllocatorStats(ctypes.Structure):
+    _fields_ = [
+        (name, ctypes.c_uint64)
+        for name in [
+            "alloc_requests",
+            "cache_hits",
+            "cache_misses",
+            "system_allocs",
+            "system_frees",
+            "bytes_in_use",
+            "bytes_reserved",
+            "peak_bytes_in_use",
+            "peak_bytes_reserved",
+        ]
+    ]
+
+
+class MemoryStats(ctypes.Structure):
+    _fields_ = [
+        (name, ctypes.c_uint64)
+        for name in [
+            "live_bytes",
+            "peak_bytes",
+            "live_allocations",
+            "alloc_count",
+            "free_count",
+        ]
+    ] + [("size_histogram", ctypes.c_uint64 * 48)]
+
+
+def plugin():
+    # The plugin is loaded by paddle already, dlopen hands back its handle.
+    return ctypes.CDLL(
+        os.path.join(os.environ["CUSTOM_DEVICE_ROOT"], "libpaddle-custom-cpu.so")
+    )
+
+
+def allocator_stats(device_id=0, kind=KIND_DEVICE):
+    stats = AllocatorStats()
+    ret = plugin().custom_cpu_allocator_stats(kind, device_id, ctypes.byref(stats))
+    assert ret == 0
+    return stats
+
+
+class TestCachingAllocator(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_cache_reuse(self):
+        x = paddle.ones([3 << 20])
+        del x
+        # Hands the block of x back from paddle's allocator to the plugin.
+        paddle.device.empty_cache()
+        before = allocator_stats()
+        self.assertGreaterEqual(before.bytes_reserved - before.bytes_in_use, 12 << 20)
+        x = paddle.ones([3 << 20])
+        after = allocator_stats()
+        self.assertEqual(after.cache_hits, before.cache_hits + 1)
+        self.assertEqual(after.system_allocs, before.system_allocs)
+        np.testing.assert_array_equal(x.numpy(), np.ones([3 << 20], "float32"))
+
+        del x
+        paddle.device.empty_cache()
+        plugin().custom_cpu_empty_cache(-1)
+        emptied = allocator_stats()
+        self.assertEqual(emptied.bytes_reserved, emptied.bytes_in_use)
+        self.assertGreater(emptied.system_frees, after.system_frees)
+        self.assertGreaterEqual(emptied.peak_bytes_reserved, 12 << 20)
+
+    def test_invalid_kind(self):
+        stats = AllocatorStats()
+        self.assertEqual(
+            plugin().custom_cpu_allocator_stats(3, 0, ctypes.byref(stats)), -1
+        )
+
+
+def memory_stats(device_id=0):
+    stats = MemoryStats()
+    assert plugin().custom_cpu_memory_stats(device_id, ctypes.byref(stats)) == 0
+    return stats
+
+
+class TestMemoryTracker(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_live_and_peak(self):
+        paddle.device.empty_cache()
+        before = memory_stats()
+        x = paddle.ones([3 << 20])
+        during = memory_stats()
+        # Paddle rounds the request up a little, still a single allocation
+        # in [8MB, 16MB).
+        self.assertGreaterEqual(during.live_bytes - before.live_bytes, 12 << 20)
+        self.assertEqual(during.live_allocations, before.live_allocations + 1)
+        self.assertEqual(during.alloc_count, before.alloc_count + 1)
+        self.assertEqual(during.size_histogram[23], before.size_histogram[23] + 1)
+        self.assertGreaterEqual(during.peak_bytes, during.live_bytes)
+
+        del x
+        paddle.device.empty_cache()
+        after = memory_stats()
+        self.assertEqual(after.live_bytes, before.live_bytes)
+        self.assertEqual(after.free_count, during.free_count + 1)
+        plugin().custom_cpu_reset_peak_memory(0)
+        self.assertEqual(memory_stats().peak_bytes, after.live_bytes)
+
+    def test_invalid_device(self):
+        stats = MemoryStats()
+        self.assertEqual(
+            plugin().custom_cpu_memory_stats(1 << 20, ctypes.byref(stats)), -1
+        )
+
+
+class TestStaticFetch(unittest.TestCase):
+    def test_odd_sizes(self):
+        # The blocks backing the outputs of the binary kernels are rounded up
+        # by the allocator, fetching them must copy the tensor bytes only.
+        paddle.enable_static()
+        for shape in [[1], [7, 13], [3, 5, 37]]:
+            main = paddle.static.Program()
+            with paddle.static.program_guard(main, paddle.static.Program()):
+                x = paddle.static.data("x", shape, "float32")
+                out = x * paddle.exp(x)
+            exe = paddle.static.Executor(paddle.CustomPlace("custom_cpu", 0))
+            data = np.random.uniform(-1, 1, shape).astype("float32")
+            (result,) = exe.run(main, feed={"x": data}, fetch_list=[out])
+            np.testing.assert_allclose(result, data * np.exp(data), rtol=1e-6)
+
+
+@unittest.skipUnless(
+    os.getenv("FLAGS_custom_cpu_zero_copy") == "1", "run by TestZeroCopy"
+)
+class TestZeroCopyOps(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static()
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_per_device_arenas(self):
+        x = np.random.uniform(-1, 1, [300, 257]).astype("float32")
+        expect = np.tanh(x @ x.T).sum(0)
+        outs = []
+        for device_id in [0, 1]:
+            place = paddle.CustomPlace("custom_cpu", device_id)
+            before = allocator_stats(device_id)
+            other = allocator_stats(1 - device_id)
+            t = paddle.to_tensor(x, place=place)
+            out = paddle.tanh(paddle.matmul(t, t, transpose_y=True)).sum(0)
+            after = allocator_stats(device_id)
+            self.assertGreater(after.bytes_in_use, before.bytes_in_use)
+            # Each device keeps its own arena, host memory of a device is
+            # carved from it.
+            self.assertEqual(
+                allocator_stats(1 - device_id).bytes_reserved,
+                other.bytes_reserved,
+            )
+            host = allocator_stats(device_id, KIND_HOST)
+            self.assertEqual(host.bytes_reserved, after.bytes_reserved)
+            np.testing.assert_allclose(out.numpy(), expect, rtol=1e-4, atol=1e-4)
+            outs.append(out)
+        moved = outs[0]._copy_to(paddle.CustomPlace("custom_cpu", 1), True)
+        np.testing.assert_array_equal(moved.numpy(), outs[1].numpy())
+        np.testing.assert_array_equal(outs[1].cpu().numpy(), outs[1].numpy())
+
+
+class TestZeroCopy(unittest.TestCase):
+    def test_ops(self):
+        # The flag is read once per process, the ops run in a child.
+        env = dict(os.environ, FLAGS_custom_cpu_zero_copy="1")
+        env["FLAGS_custom_cpu_device_count"] = "2"
+        proc = subprocess.run(
+            [sys.executable, __file__, "TestZeroCopyOps", "TestStaticFetch"],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = proc.stdout.decode(errors="replace")
+        self.assertEqual(proc.returncode, 0, output)
+        self.assertNotIn("skipped", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
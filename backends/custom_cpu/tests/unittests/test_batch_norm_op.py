@@ -0,0 +1,64 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle.nn.functional as F
+from op_parity import check_parity
+
+
+class TestBatchNormAPI(unittest.TestCase):
+    def check(self, shape, data_format):
+        channels = shape[1] if data_format == "NCHW" else shape[-1]
+        inputs = [
+            np.random.uniform(-1, 1, shape).astype("float32"),
+            np.random.uniform(-1, 1, [channels]).astype("float32"),
+            np.random.uniform(-1, 1, [channels]).astype("float32"),
+        ]
+        # The running statistics, updated in place when training.
+        stats = [
+            np.random.uniform(-1, 1, [channels]).astype("float32"),
+            np.random.uniform(0.5, 2, [channels]).astype("float32"),
+        ]
+        for training in [True, False]:
+
+            def fn(x, scale, bias, mean, variance):
+                out = F.batch_norm(
+                    x,
+                    mean,
+                    variance,
+                    scale,
+                    bias,
+                    training=training,
+                    momentum=0.8,
+                    data_format=data_format,
+                )
+                return [out, mean, variance]
+
+            check_parity(fn, inputs, stats)
+
+    def test_nchw(self):
+        self.check([4, 5, 6, 7], "NCHW")
+
+    def test_nhwc(self):
+        self.check([4, 6, 7, 5], "NHWC")
+
+    def test_2d(self):
+        self.check([16, 7], "NCHW")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+from paddle.incubate.nn.functional import block_multihead_attention
+
+
+def rope_tables(max_seq_len, head_dim):
+    inv_freq = 1.0 / (10000 ** (np.arange(0, head_dim, 2) / head_dim))
+    angles = np.arange(max_seq_len)[:, None] * inv_freq[None]
+    tables = np.stack([np.cos(angles), np.sin(angles)])
+    return tables[:, None, :, None, :].astype("float32")
+
+
+def apply_rope(x, positions, tables, neox):
+    cos = tables[0, 0, positions, 0][:, None]
+    sin = tables[1, 0, positions, 0][:, None]
+    half = x.shape[-1] // 2
+    y = x.copy()
+    if neox:
+        x0, x1 = x[..., :half], x[..., half:]
+        y[..., :half] = x0 * cos - x1 * sin
+        y[..., half:] = x1 * cos + x0 * sin
+    else:
+        x0, x1 = x[..., 0::2], x[..., 1::2]
+        y[..., 0::2] = x0 * cos - x1 * sin
+        y[..., 1::2] = x1 * cos + x0 * sin
+    return y
+
+
+def causal_attention(q, k, v):
+    # q [q_len, heads, dim], k and v [k_len, kv_heads, dim], the queries
+    # being the last q_len positions.
+    q_len, heads, dim = q.shape
+    k_len, kv_heads, _ = k.shape
+    group = heads // kv_heads
+    out = np.zeros_like(q)
+    for h in range(heads):
+        s = q[:, h] @ k[:, h // group].T / np.sqrt(dim)
+        for i in range(q_len):
+            s[i, k_len - q_len + i + 1 :] = -np.inf
+        p = np.exp(s - s.max(1, keepdims=True))
+        out[:, h] = (p / p.sum(1, keepdims=True)) @ v[:, h // group]
+    return out
+
+
+class TestBlockMultiheadAttention(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        self.heads, self.kv_heads, self.dim = 8, 2, 32
+        self.block_size, self.max_seq_len = 16, 64
+        self.lens = [37, 5]
+        batch = len(self.lens)
+        blocks = self.max_seq_len // self.block_size
+        rng = np.random.RandomState(0)
+        self.block_tables = rng.permutation(batch * blocks)
+        self.block_tables = self.block_tables.reshape(batch, blocks)
+        self.rng = rng
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def step(self, caches, this_time, encoder, decoder, neox, mask=None):
+        batch = len(this_time)
+        tokens = sum(this_time)
+        width = (self.heads + 2 * self.kv_heads) * self.dim
+        qkv = self.rng.uniform(-1, 1, [tokens, width]).astype("float32")
+        cu_seqlens = np.concatenate([[0], np.cumsum(this_time)])
+
+        def ints(a):
+            return paddle.to_tensor(np.array(a, "int32").reshape([-1, 1]))
+
+        cu_seqlens_t = paddle.to_tensor(cu_seqlens.astype("int32"))
+        out = block_multihead_attention(
+            paddle.to_tensor(qkv),
+            caches[0],
+            caches[1],
+            ints(encoder),
+            ints(decoder),
+            ints(this_time),
+            paddle.zeros([tokens], "int32"),
+            paddle.zeros([batch], "int32"),
+            cu_seqlens_t,
+            cu_seqlens_t,
+            paddle.to_tensor(self.block_tables.astype("int32")),
+            rope_emb=paddle.to_tensor(self.tables),
+            mask=mask,
+            max_seq_len=self.max_seq_len,
+            block_size=self.block_size,
+            use_neox_style=neox,
+        )[0]
+        return qkv, cu_seqlens, out.numpy()
+
+    def check(self, neox, with_mask=False):
+        self.tables = rope_tables(self.max_seq_len, self.dim)
+        blocks = self.block_tables.size
+        shape = [blocks, self.kv_heads, self.block_size, self.dim]
+        caches = [paddle.zeros(shape), paddle.zeros(shape)]
+        history = [([], []) for _ in self.lens]
+        mask = None
+        if with_mask:
+            size = max(self.lens)
+            mask = np.triu(np.full([size, size], -1e4, "float32"), 1)
+            mask = np.tile(mask, [len(self.lens), 1, 1, 1])
+            mask = paddle.to_tensor(mask)
+        zeros = [0] * len(self.lens)
+        ones = [1] * len(self.lens)
+        steps = [
+            (self.lens, self.lens, zeros),
+            (ones, zeros, self.lens),
+            (ones, zeros, [n + 1 for n in self.lens]),
+        ]
+        for this_time, encoder, decoder in steps:
+            qkv, cu_seqlens, out = self.step(
+                caches, this_time, encoder, decoder, neox, mask
+            )
+            for b, n in enumerate(this_time):
+                rows = qkv[cu_seqlens[b] : cu_seqlens[b + 1]]
+                rows = rows.reshape([n, -1, self.dim])
+                start = 0 if encoder[b] else decoder[b]
+                positions = np.arange(start, start + n)
+                q = rows[:, : self.heads]
+                q = apply_rope(q, positions, self.tables, neox)
+                k = rows[:, self.heads : self.heads + self.kv_heads]
+                history[b][0].append(apply_rope(k, positions, self.tables, neox))
+                history[b][1].append(rows[:, self.heads + self.kv_heads :])
+                keys, values = [np.concatenate(h) for h in history[b]]
+                expect = causal_attention(q, keys, values)
+                np.testing.assert_allclose(
+                    out[cu_seqlens[b] : cu_seqlens[b + 1]],
+                    expect.reshape([n, -1]),
+                    rtol=1e-4,
+                    atol=1e-4,
+                )
+
+    def test_rope(self):
+        self.check(neox=False)
+
+    def test_neox_rope(self):
+        self.check(neox=True)
+
+    def test_mask(self):
+        self.check(neox=False, with_mask=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
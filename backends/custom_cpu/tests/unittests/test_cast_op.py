@@ -115,6 +115,40 @@ class TestCastOpFp32ToBf16(OpTest):
         self.check_output()
 
 
+class TestCastOpFp64ToFp64(OpTest):
+    def setUp(self):
+        ipt = np.random.random(size=[10, 10]) + 1e-12
+        self.inputs = {"X": ipt}
+        self.outputs = {"Out": ipt}
+        self.attrs = {
+            "in_dtype": int(core.VarDesc.VarType.FP64),
+            "out_dtype": int(core.VarDesc.VarType.FP64),
+        }
+        self.op_type = "cast"
+        self.__class__.no_need_check_grad = True
+
+    def test_check_output(self):
+        self.check_output(atol=0)
+
+
+class TestCastOpFp32ToInt8Saturate(OpTest):
+    def setUp(self):
+        ipt = np.random.uniform(-1000, 1000, size=[10, 10]).astype("float32")
+        ipt[0, :3] = [np.nan, np.inf, -np.inf]
+        self.inputs = {"X": ipt}
+        out = np.trunc(np.clip(np.nan_to_num(ipt, nan=0.0), -128, 127))
+        self.outputs = {"Out": out.astype("int8")}
+        self.attrs = {
+            "in_dtype": int(core.VarDesc.VarType.FP32),
+            "out_dtype": int(core.VarDesc.VarType.INT8),
+        }
+        self.op_type = "cast"
+        self.__class__.no_need_check_grad = True
+
+    def test_check_output(self):
+        self.check_output()
+
+
 class TestCastOpError(unittest.TestCase):
     def test_errors(self):
         with program_guard(Program(), Program()):
@@ -0,0 +1,73 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import glob
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+# The shared-memory collectives of the plugin, run by collective_xccl.py on
+# every rank of a paddle.distributed.launch job.
+class TestCollectiveXccl(unittest.TestCase):
+    def launch(self, nranks, **flags):
+        env = dict(os.environ)
+        env["FLAGS_custom_cpu_device_count"] = str(nranks)
+        env.update({key: str(value) for key, value in flags.items()})
+        script = os.path.join(os.path.dirname(__file__), "collective_xccl.py")
+        with tempfile.TemporaryDirectory() as log_dir:
+            proc = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "paddle.distributed.launch",
+                    "--devices",
+                    ",".join(str(i) for i in range(nranks)),
+                    "--log_dir",
+                    log_dir,
+                    script,
+                ],
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=600,
+            )
+            logs = ""
+            for path in sorted(glob.glob(os.path.join(log_dir, "workerlog.*"))):
+                with open(path) as f:
+                    logs += f.read()
+        self.assertEqual(
+            proc.returncode, 0, proc.stdout.decode(errors="replace") + logs
+        )
+        for rank in range(nranks):
+            self.assertIn("rank %d of %d ok" % (rank, nranks), logs)
+
+    def test_two_ranks_small_chunks(self):
+        # Every collective is pipelined through many chunks.
+        self.launch(
+            2,
+            FLAGS_custom_cpu_xccl_chunk_bytes=4096,
+            FLAGS_custom_cpu_xccl_p2p_chunk_bytes=4096,
+        )
+
+    def test_four_ranks(self):
+        self.launch(4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -74,5 +74,24 @@ class TestConcatOp2(TestConcatOp):
         self.axis = 1
 
 
+class TestConcatOp3(TestConcatOp):
+    def init_test_data(self):
+        self.x0 = np.random.random((1, 3, 4, 5)).astype(self.dtype)
+        self.x1 = np.random.random((4, 3, 4, 5)).astype(self.dtype)
+        self.x2 = np.random.random((2, 3, 4, 5)).astype(self.dtype)
+        self.axis = 0
+
+
+class TestConcatAPI(unittest.TestCase):
+    def test_large(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        cache = np.random.random((2, 4, 300, 64)).astype("float32")
+        new = np.random.random((2, 4, 7, 64)).astype("float32")
+        for x, axis in [((cache, new), 2), ((cache, cache[:1]), 0)]:
+            out = paddle.concat([paddle.to_tensor(v) for v in x], axis)
+            np.testing.assert_array_equal(out.numpy(), np.concatenate(x, axis))
+        paddle.enable_static()
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,58 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle.nn.functional as F
+from op_parity import check_parity
+
+
+class TestConv2dAPI(unittest.TestCase):
+    def check(self, x_shape, w_shape, data_format="NCHW", **kwargs):
+        x = np.random.uniform(-1, 1, x_shape).astype("float32")
+        w = np.random.uniform(-1, 1, w_shape).astype("float32")
+
+        def fn(x, w):
+            return F.conv2d(x, w, data_format=data_format, **kwargs)
+
+        check_parity(fn, [x, w], tol=1e-4)
+
+    def test_conv(self):
+        self.check([2, 4, 9, 11], [8, 4, 3, 3], padding=1)
+        self.check([2, 9, 11, 4], [8, 4, 3, 3], "NHWC", padding=1)
+
+    def test_winograd(self):
+        self.check([2, 16, 9, 7], [24, 16, 3, 3], padding=1)
+        self.check([2, 9, 7, 16], [24, 16, 3, 3], "NHWC")
+
+    def test_stride_dilation(self):
+        self.check([2, 3, 17, 15], [6, 3, 5, 5], stride=2, padding=2)
+        self.check([2, 4, 20, 19], [5, 4, 3, 3], stride=(2, 3), padding=1, dilation=2)
+        self.check([1, 3, 10, 9], [4, 3, 3, 3], stride=2, padding="SAME")
+
+    def test_pointwise(self):
+        self.check([2, 6, 5, 8], [12, 8, 1, 1], "NHWC")
+
+    def test_groups(self):
+        self.check([2, 6, 8, 8], [4, 3, 3, 3], padding=1, groups=2)
+
+    def test_depthwise(self):
+        self.check([2, 8, 9, 10], [8, 1, 3, 3], padding=1, groups=8)
+        self.check([2, 9, 10, 4], [8, 1, 3, 3], "NHWC", stride=2, padding=1, groups=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import ctypes
+import os
+import subprocess
+import sys
+import unittest
+import numpy as np
+import paddle
+
+MB = 1 << 20
+# Odd sizes around the 1 MB chunks the copy engine splits copies into.
+SIZES = [MB - 1, MB + 1, 4 * MB + 17]
+# Bytes around the destination that a copy must leave alone.
+GUARD = 64
+
+
+def copy_buffer(dst, src, size, non_temporal):
+    lib = ctypes.CDLL(
+        os.path.join(os.environ["CUSTOM_DEVICE_ROOT"], "libpaddle-custom-cpu.so")
+    )
+    lib.custom_cpu_copy_buffer.argtypes = [
+        ctypes.c_void_p,
+        ctypes.c_void_p,
+        ctypes.c_size_t,
+        ctypes.c_int,
+    ]
+    lib.custom_cpu_copy_buffer.restype = None
+    lib.custom_cpu_copy_buffer(dst, src, size, non_temporal)
+
+
+@unittest.skipUnless(
+    os.getenv("FLAGS_custom_cpu_copy_threads") == "4", "run by TestCopyEngine"
+)
+class TestCopyEngineOps(unittest.TestCase):
+    def test_unaligned(self):
+        rng = np.random.RandomState(0)
+        for size in SIZES:
+            src = rng.randint(0, 256, [size + 2 * GUARD], "uint8")
+            for src_offset, dst_offset in [(0, 0), (1, 7), (13, 2), (GUARD, 3)]:
+                for non_temporal in [0, 1]:
+                    dst = np.zeros([size + 2 * GUARD], "uint8")
+                    copy_buffer(
+                        dst.ctypes.data + dst_offset,
+                        src.ctypes.data + src_offset,
+                        size,
+                        non_temporal,
+                    )
+                    msg = "size %d offsets %d %d non_temporal %d" % (
+                        size,
+                        src_offset,
+                        dst_offset,
+                        non_temporal,
+                    )
+                    np.testing.assert_array_equal(
+                        dst[dst_offset : dst_offset + size],
+                        src[src_offset : src_offset + size],
+                        err_msg=msg,
+                    )
+                    self.assertFalse(dst[:dst_offset].any(), msg)
+                    self.assertFalse(dst[dst_offset + size :].any(), msg)
+
+    def test_devices(self):
+        paddle.disable_static()
+        rng = np.random.RandomState(1)
+        dev0 = paddle.CustomPlace("custom_cpu", 0)
+        dev1 = paddle.CustomPlace("custom_cpu", 1)
+        for size in SIZES:
+            x = rng.randint(0, 256, [size], "uint8")
+            host = paddle.to_tensor(x, place=paddle.CPUPlace())
+            h2d = host._copy_to(dev0, True)
+            d2d = h2d._copy_to(dev0, True)
+            p2p = d2d._copy_to(dev1, True)
+            d2h = p2p.cpu()
+            for name, t in [("h2d", h2d), ("d2d", d2d), ("p2p", p2p), ("d2h", d2h)]:
+                np.testing.assert_array_equal(
+                    t.numpy(), x, err_msg="%s size %d" % (name, size)
+                )
+        paddle.enable_static()
+
+
+class TestCopyEngine(unittest.TestCase):
+    def run_ops(self, nt_copy_bytes):
+        # Four copy threads so that chunks are spread even on small hosts;
+        # the flags are read once per process, the copies run in a child.
+        env = dict(
+            os.environ,
+            FLAGS_custom_cpu_copy_threads="4",
+            FLAGS_custom_cpu_nt_copy_bytes=str(nt_copy_bytes),
+            FLAGS_custom_cpu_device_count="2",
+        )
+        proc = subprocess.run(
+            [sys.executable, __file__, "TestCopyEngineOps"],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = proc.stdout.decode(errors="replace")
+        self.assertEqual(proc.returncode, 0, output)
+        self.assertNotIn("skipped", output)
+
+    def test_streaming(self):
+        # Every non-temporal copy takes the streaming store path.
+        self.run_ops(1)
+
+    def test_default_threshold(self):
+        # Only 4 MB + 17 reaches the default threshold.
+        self.run_ops(4 * MB)
+
+    def test_memcpy(self):
+        self.run_ops(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
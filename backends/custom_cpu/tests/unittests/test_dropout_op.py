@@ -0,0 +1,84 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+
+
+class TestDropoutAPI(unittest.TestCase):
+    def setUp(self):
+        self.place = paddle.CustomPlace("custom_cpu", 0)
+        self.x_np = np.random.uniform(1.0, 2.0, [100, 1000]).astype("float32")
+
+    def test_upscale_in_train(self):
+        paddle.disable_static(self.place)
+        x = paddle.to_tensor(self.x_np, stop_gradient=False)
+        out = F.dropout(x, p=0.3)
+        out.sum().backward()
+        out_np = out.numpy()
+        keep = out_np != 0
+        self.assertAlmostEqual(keep.mean(), 0.7, delta=0.01)
+        np.testing.assert_allclose(out_np[keep], self.x_np[keep] / 0.7, rtol=1e-6)
+        np.testing.assert_allclose(x.grad.numpy(), keep / 0.7, rtol=1e-6)
+
+        out = F.dropout(x, p=0.3, training=False)
+        np.testing.assert_array_equal(out.numpy(), self.x_np)
+        paddle.enable_static()
+
+    def test_downscale_in_infer(self):
+        paddle.disable_static(self.place)
+        x = paddle.to_tensor(self.x_np)
+        out = F.dropout(x, p=0.4, mode="downscale_in_infer").numpy()
+        keep = out != 0
+        self.assertAlmostEqual(keep.mean(), 0.6, delta=0.01)
+        np.testing.assert_array_equal(out[keep], self.x_np[keep])
+
+        out = F.dropout(x, p=0.4, training=False, mode="downscale_in_infer")
+        np.testing.assert_allclose(out.numpy(), self.x_np * 0.6, rtol=1e-6)
+        paddle.enable_static()
+
+    def test_drop_all(self):
+        paddle.disable_static(self.place)
+        out = F.dropout(paddle.to_tensor(self.x_np), p=1.0)
+        np.testing.assert_array_equal(out.numpy(), np.zeros_like(self.x_np))
+        paddle.enable_static()
+
+
+class TestGaussianAPI(unittest.TestCase):
+    def test_dygraph_check(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        for dtype in ["float32", "float64"]:
+            out = paddle.normal(1.0, 2.0, [100000]).astype(dtype).numpy()
+            self.assertAlmostEqual(out.mean(), 1.0, delta=0.05)
+            self.assertAlmostEqual(out.std(), 2.0, delta=0.05)
+        paddle.enable_static()
+
+
+class TestBernoulliAPI(unittest.TestCase):
+    def test_dygraph_check(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        p = np.random.uniform(0.0, 1.0, [4]).astype("float32")
+        x = paddle.to_tensor(np.tile(p, [50000, 1]))
+        out = paddle.bernoulli(x).numpy()
+        self.assertTrue(np.isin(out, [0.0, 1.0]).all())
+        np.testing.assert_allclose(out.mean(axis=0), p, atol=0.01)
+        paddle.enable_static()
+
+
+if __name__ == "__main__":
+    unittest.main()
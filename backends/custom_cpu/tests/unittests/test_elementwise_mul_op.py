@@ -178,6 +178,17 @@ class TestElementwiseMulOp_broadcast_5(ElementwiseMulOp):
         self.init_kernel_type()
 
 
+class TestElementwiseMulOp_broadcast_6(ElementwiseMulOp):
+    def setUp(self):
+        self.op_type = "elementwise_mul"
+        self.inputs = {
+            "X": np.random.rand(64, 1, 48).astype(np.float64),
+            "Y": np.random.rand(1, 3, 48).astype(np.float64),
+        }
+        self.outputs = {"Out": self.inputs["X"] * self.inputs["Y"]}
+        self.init_kernel_type()
+
+
 # @unittest.skipIf(not core.is_compiled_with_cuda(),
 #                  "core is not compiled with CUDA")
 # class TestElementwiseMulOpFp16(ElementwiseMulOp):
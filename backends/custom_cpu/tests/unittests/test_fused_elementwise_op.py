@@ -0,0 +1,146 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import math
+import os
+import sys
+import unittest
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+from paddle import _C_ops
+
+try:
+    from paddle_custom_device.custom_cpu.passes import (
+        elementwise_fuse_pass,
+        setUp as setUpModule,  # noqa: F401
+    )
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+    from passes import elementwise_fuse_pass, setUp as setUpModule  # noqa: F401
+
+
+def fused_elementwise(x, program):
+    return _C_ops._run_custom_op("fused_elementwise", x, program)[0]
+
+
+def gelu(x):
+    return 0.5 * x * (1 + np.vectorize(math.erf)(x / np.sqrt(2)))
+
+
+class TestFusedElementwise(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_silu(self):
+        x = np.random.uniform(-3, 3, [37, 300]).astype("float32")
+        out = fused_elementwise([paddle.to_tensor(x)], "sigmoid x0; mul x0 t0")
+        np.testing.assert_allclose(
+            out.numpy(), x / (1 + np.exp(-x)), rtol=1e-5, atol=1e-6
+        )
+
+    def test_broadcast(self):
+        x = np.random.uniform(-3, 3, [37, 300]).astype("float32")
+        y = np.random.uniform(-3, 3, [300]).astype("float32")
+        z = np.random.uniform(-3, 3, [37, 1]).astype("float32")
+        out = fused_elementwise(
+            [paddle.to_tensor(v) for v in [x, y, z]],
+            "add x0 x1; mul t0 2; max t1 x2; relu t2",
+        )
+        np.testing.assert_allclose(
+            out.numpy(), np.maximum(np.maximum((x + y) * 2, z), 0), rtol=1e-6
+        )
+        # Ops on z alone are constant along the rows of the output.
+        out = fused_elementwise(
+            [paddle.to_tensor(x), paddle.to_tensor(z)], "exp x1; sub x0 t0"
+        )
+        np.testing.assert_allclose(out.numpy(), x - np.exp(z), rtol=1e-5, atol=1e-6)
+
+    def test_low_precision(self):
+        x = np.random.uniform(-3, 3, [37, 300]).astype("float32")
+        z = np.random.uniform(-3, 3, [37, 1]).astype("float32")
+        expect = ((gelu(x) - z) * np.tanh(z)) ** 2
+        for dtype in ["float16", "bfloat16", "float64"]:
+            out = fused_elementwise(
+                [
+                    paddle.to_tensor(x).astype(dtype),
+                    paddle.to_tensor(z).astype(dtype),
+                ],
+                "gelu x0; sub t0 x1; tanh x1; mul t1 t2; square t3",
+            )
+            self.assertEqual(out.dtype, getattr(paddle, dtype))
+            np.testing.assert_allclose(
+                out.astype("float32").numpy(), expect, rtol=3e-2, atol=3e-2
+            )
+
+
+class TestElementwiseFusePass(unittest.TestCase):
+    def setUp(self):
+        paddle.enable_static()
+
+    def tearDown(self):
+        paddle.disable_static()
+
+    def check(self, fn, inputs, fused_ops):
+        main = paddle.static.Program()
+        with paddle.static.program_guard(main, paddle.static.Program()):
+            args = [
+                paddle.static.data("x%d" % i, x.shape, x.dtype)
+                for i, x in enumerate(inputs)
+            ]
+            outs = fn(*args)
+        feed = {"x%d" % i: x for i, x in enumerate(inputs)}
+        exe = paddle.static.Executor(paddle.CustomPlace("custom_cpu", 0))
+        expect = exe.run(main, feed=feed, fetch_list=outs)
+        outs = elementwise_fuse_pass(main, outs)
+        names = [op.name() for op in main.global_block().ops]
+        self.assertEqual(names.count("custom_op.fused_elementwise"), fused_ops)
+        actual = exe.run(main, feed=feed, fetch_list=outs)
+        for e, a in zip(expect, actual):
+            np.testing.assert_allclose(a, e, rtol=1e-5, atol=1e-6)
+
+    def test_silu(self):
+        x = np.random.uniform(-3, 3, [8, 64]).astype("float32")
+        self.check(lambda x: [x * F.sigmoid(x)], [x], 1)
+
+    def test_mlp(self):
+        x = np.random.uniform(-1, 1, [8, 64]).astype("float32")
+        w = np.random.uniform(-1, 1, [64, 128]).astype("float32")
+        b = np.random.uniform(-1, 1, [128]).astype("float32")
+
+        def mlp(x, w, b):
+            h = F.gelu(paddle.matmul(x, w) + b)
+            return [paddle.maximum(h * 0.5 + 1.0, paddle.exp(b))]
+
+        self.check(mlp, [x, w, b], 1)
+
+    def test_shared_values(self):
+        x = np.random.uniform(-3, 3, [8, 64]).astype("float32")
+
+        # t is read outside the chain that would take it in, so both chains
+        # end at it and keep it as an output.
+        def fn(x):
+            t = paddle.tanh(x) + x
+            return [t, paddle.square(t) - 1.0]
+
+        self.check(fn, [x], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+from op_parity import check_parity
+
+
+class TestGatherScatter(unittest.TestCase):
+    def test_embedding(self):
+        w = np.random.uniform(-1, 1, [50, 24]).astype("float32")
+        # Repeated ids accumulate into one row of the weight gradient.
+        ids = np.random.randint(0, 50, [6, 70]).astype("int64")
+        for padding_idx in [None, 3, -1]:
+            ids[0, :4] = [3, 49, 3, 49]
+            check_parity(
+                lambda w, ids: F.embedding(ids, w, padding_idx=padding_idx),
+                [w],
+                [ids],
+            )
+
+    def test_gather(self):
+        x = np.random.uniform(-1, 1, [4, 30, 5]).astype("float32")
+        index = np.array([2, 29, 2, 0, 29, 7], "int32")
+        for axis in [0, 1, -1]:
+            i = index % x.shape[axis]
+            check_parity(lambda x, i: paddle.gather(x, i, axis=axis), [x], [i])
+        check_parity(lambda x, i: paddle.index_select(x, i, 1), [x], [index])
+
+    def test_gather_nd(self):
+        x = np.random.uniform(-1, 1, [6, 7, 8]).astype("float32")
+        index = np.stack(
+            [np.random.randint(0, 6, [5, 9]), np.random.randint(-7, 7, [5, 9])],
+            -1,
+        )
+        check_parity(paddle.gather_nd, [x], [index])
+        check_parity(paddle.gather_nd, [x], [index[..., :1]])
+
+    def test_scatter(self):
+        x = np.random.uniform(-1, 1, [12, 9]).astype("float32")
+        updates = np.random.uniform(-1, 1, [7, 9]).astype("float32")
+        index = np.array([4, 0, 11, 4, 4, 3, 0], "int64")
+        for overwrite in [True, False]:
+            check_parity(
+                lambda x, u, i: paddle.scatter(x, i, u, overwrite=overwrite),
+                [x, updates],
+                [index],
+            )
+
+    def test_index_put(self):
+        x = np.random.uniform(-1, 1, [5, 6, 4]).astype("float32")
+        rows = np.array([[0], [3], [0]], "int64")
+        cols = np.array([1, -2, 1, 5], "int64")
+        mask = np.random.uniform(size=[5, 6]) > 0.5
+        for accumulate in [True, False]:
+
+            def fn(x, v, *indices):
+                return paddle.index_put(x, indices, v, accumulate)
+
+            check_parity(
+                fn,
+                [x, np.random.uniform(-1, 1, [3, 4, 4]).astype("float32")],
+                [rows, cols],
+            )
+            # value broadcast along the indexed rows.
+            check_parity(
+                fn,
+                [x, np.random.uniform(-1, 1, [4]).astype("float32")],
+                [mask],
+            )
+
+    def test_large_table(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        w = np.random.uniform(-1, 1, [20000, 64]).astype("float32")
+        ids = np.random.randint(0, 20000, [4096]).astype("int64")
+        out = F.embedding(paddle.to_tensor(ids), paddle.to_tensor(w))
+        np.testing.assert_array_equal(out.numpy(), w[ids])
+        paddle.enable_static()
+
+
+if __name__ == "__main__":
+    unittest.main()
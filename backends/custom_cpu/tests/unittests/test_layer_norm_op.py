@@ -0,0 +1,132 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+from paddle import _C_ops
+from op_parity import check_parity, run
+
+
+class TestLayerNormAPI(unittest.TestCase):
+    def check(self, shape, begin_norm_axis):
+        normalized_shape = shape[begin_norm_axis:]
+        cols = int(np.prod(normalized_shape))
+        inputs = [
+            np.random.uniform(-1, 1, shape).astype("float32"),
+            np.random.uniform(-1, 1, [cols]).astype("float32"),
+            np.random.uniform(-1, 1, [cols]).astype("float32"),
+        ]
+        check_parity(
+            lambda x, scale, bias: F.layer_norm(x, normalized_shape, scale, bias, 1e-5),
+            inputs,
+        )
+        check_parity(
+            lambda x: F.layer_norm(x, normalized_shape, None, None, 1e-5),
+            inputs[:1],
+        )
+
+    def test_last_dim(self):
+        self.check([4, 6, 37], 2)
+
+    def test_trailing_dims(self):
+        self.check([5, 6, 7], 1)
+
+    def test_float32_params(self):
+        # AMP O2 keeps the scale and bias of float16 and bfloat16 models in
+        # float32, checked against the float32 norm.
+        place = paddle.CustomPlace("custom_cpu", 0)
+        inputs = [
+            np.random.uniform(-1, 1, [4, 6, 37]).astype("float32"),
+            np.random.uniform(-1, 1, [37]).astype("float32"),
+            np.random.uniform(-1, 1, [37]).astype("float32"),
+        ]
+        expect = run(
+            place,
+            lambda x, scale, bias: F.layer_norm(x, [37], scale, bias, 1e-5),
+            inputs,
+        )
+        for dtype, tol in [("float16", 1e-2), ("bfloat16", 5e-2)]:
+            paddle.disable_static(place)
+            x, scale, bias = [paddle.to_tensor(a, stop_gradient=False) for a in inputs]
+            x_low = x.astype(dtype)
+            out = F.layer_norm(x_low, [37], scale, bias, 1e-5)
+            out_grad = np.random.RandomState(0).uniform(-1, 1, out.shape)
+            grads = paddle.grad(
+                [out],
+                [x_low, scale, bias],
+                [paddle.to_tensor(out_grad.astype("float32")).astype(dtype)],
+            )
+            self.assertEqual(out.dtype, x_low.dtype)
+            self.assertEqual(grads[1].dtype, paddle.float32)
+            actual = [out] + grads
+            for e, a in zip(expect, actual):
+                np.testing.assert_allclose(
+                    a.astype("float32").numpy(), e, rtol=tol, atol=tol
+                )
+            paddle.enable_static()
+
+
+class TestFusedBiasResidualLayerNorm(unittest.TestCase):
+    def setUp(self):
+        self.inputs = [
+            np.random.uniform(-1, 1, [7, 96]).astype("float32"),
+            np.random.uniform(-1, 1, [96]).astype("float32"),
+            np.random.uniform(-1, 1, [7, 96]).astype("float32"),
+            np.random.uniform(-1, 1, [96]).astype("float32"),
+            np.random.uniform(-1, 1, [96]).astype("float32"),
+        ]
+
+    def run_op(self, place, quant_scale):
+        paddle.disable_static(place)
+        x, bias, residual, weight, norm_bias = [
+            paddle.to_tensor(a) for a in self.inputs
+        ]
+        outs = _C_ops.fused_bias_residual_layernorm(
+            x,
+            bias,
+            residual,
+            weight,
+            norm_bias,
+            1e-5,
+            0.5,
+            1,
+            quant_scale,
+            0,
+            127.0,
+            -127.0,
+        )
+        result = [t.numpy() for t in outs]
+        paddle.enable_static()
+        return result
+
+    def test_cpu_parity(self):
+        expect = self.run_op(paddle.CPUPlace(), -1.0)
+        actual = self.run_op(paddle.CustomPlace("custom_cpu", 0), -1.0)
+        for e, a in zip(expect, actual):
+            np.testing.assert_allclose(a, e, rtol=1e-5, atol=1e-5)
+
+    def test_quant(self):
+        out = self.run_op(paddle.CustomPlace("custom_cpu", 0), -1.0)[0]
+        quant = self.run_op(paddle.CustomPlace("custom_cpu", 0), 0.05)[0]
+        self.assertEqual(quant.dtype, np.int8)
+        expect = np.clip(np.rint(127 * 0.05 * out), -127, 127)
+        np.testing.assert_allclose(quant, expect, atol=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
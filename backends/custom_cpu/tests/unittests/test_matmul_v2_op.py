@@ -268,6 +268,53 @@ class TestMatMul2Dx3D_TransXY(TestMatMulOp):
         self.trans_y = True
 
 
+class TestMatMul3Dx3D(TestMatMulOp):
+    def config(self):
+        self.x_shape = (3, 11, 12)
+        self.y_shape = (3, 12, 13)
+        self.trans_x = False
+        self.trans_y = False
+
+
+class TestMatMul3Dx3D_TransXY(TestMatMulOp):
+    def config(self):
+        self.x_shape = (3, 12, 11)
+        self.y_shape = (3, 13, 12)
+        self.trans_x = True
+        self.trans_y = True
+
+
+class TestMatMulBroadcast4Dx3D(TestMatMulOp):
+    def config(self):
+        self.x_shape = (2, 1, 11, 12)
+        self.y_shape = (3, 12, 13)
+        self.trans_x = False
+        self.trans_y = False
+
+
+class TestMatMulBroadcast3Dx4D_TransX(TestMatMulOp):
+    def config(self):
+        self.x_shape = (3, 1, 12, 11)
+        self.y_shape = (2, 1, 12, 13)
+        self.trans_x = True
+        self.trans_y = False
+
+
+class TestMatMulLarge2Dx2D(TestMatMulOp):
+    """
+    spans several cache blocks of the GEMM engine
+    """
+
+    def config(self):
+        self.x_shape = (100, 300)
+        self.y_shape = (300, 270)
+        self.trans_x = False
+        self.trans_y = False
+
+    def test_check_grad(self):
+        pass
+
+
 if __name__ == "__main__":
     paddle.enable_static()
     unittest.main()
@@ -0,0 +1,49 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle.nn.functional as F
+from op_parity import check_parity
+
+
+class TestPool2dAPI(unittest.TestCase):
+    def check(self, fn):
+        for data_format in ["NCHW", "NHWC"]:
+            shape = [2, 5, 9, 11] if data_format == "NCHW" else [2, 9, 11, 5]
+            x = np.random.uniform(-1, 1, shape).astype("float32")
+            check_parity(lambda x: fn(x, data_format), [x], tol=1e-6)
+
+    def test_max_pool(self):
+        self.check(lambda x, f: F.max_pool2d(x, 3, 2, 1, data_format=f))
+        self.check(lambda x, f: F.max_pool2d(x, 2, 2, ceil_mode=True, data_format=f))
+
+    def test_avg_pool(self):
+        self.check(lambda x, f: F.avg_pool2d(x, 3, 2, 1, data_format=f))
+        self.check(
+            lambda x, f: F.avg_pool2d(
+                x, 2, 2, ceil_mode=True, exclusive=False, data_format=f
+            )
+        )
+        self.check(lambda x, f: F.avg_pool2d(x, 3, 2, "SAME", data_format=f))
+
+    def test_adaptive_pool(self):
+        self.check(lambda x, f: F.adaptive_avg_pool2d(x, (3, 4), data_format=f))
+        self.check(lambda x, f: F.adaptive_avg_pool2d(x, 1, data_format=f))
+
+
+if __name__ == "__main__":
+    unittest.main()
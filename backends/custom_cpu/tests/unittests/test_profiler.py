@@ -0,0 +1,90 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import glob
+import json
+import re
+import tempfile
+import threading
+import unittest
+import numpy as np
+import paddle
+import paddle.profiler as profiler
+
+
+def profile(fn):
+    """Runs fn under paddle.profiler and returns the (name, category) of the
+    events of its chrome trace, with durations stripped from the names."""
+    with tempfile.TemporaryDirectory() as tmp:
+        prof = profiler.Profiler(
+            targets=[
+                profiler.ProfilerTarget.CPU,
+                profiler.ProfilerTarget.CUSTOM_DEVICE,
+            ],
+            on_trace_ready=profiler.export_chrome_tracing(tmp),
+        )
+        prof.start()
+        fn()
+        prof.step()
+        prof.stop()
+        (path,) = glob.glob(tmp + "/*.json")
+        with open(path) as f:
+            events = json.load(f)["traceEvents"]
+    return {
+        (re.sub(r"\[.*\]$", "", e["name"]), e.get("cat")) for e in events if "name" in e
+    }
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        self.x = np.random.uniform(-1, 1, [64, 64]).astype("float32")
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_kernels(self):
+        x = paddle.to_tensor(self.x)
+
+        def fn():
+            paddle.nn.functional.softmax(paddle.matmul(x, x)).numpy()
+
+        events = profile(fn)
+        self.assertIn(("MatmulKernel", "Kernel"), events)
+        self.assertIn(("SoftmaxKernel", "Kernel"), events)
+        self.assertIn(("MEMCPY_DtoH", "Memcpy"), events)
+
+    def test_threads(self):
+        # Each thread records into its own ring.
+        x = paddle.to_tensor(self.x)
+
+        def worker():
+            paddle.device.set_device("custom_cpu:0")
+            paddle.add(x, x).numpy()
+
+        def fn():
+            thread = threading.Thread(target=worker)
+            thread.start()
+            paddle.matmul(x, x).numpy()
+            thread.join()
+
+        events = profile(fn)
+        self.assertIn(("MatmulKernel", "Kernel"), events)
+        self.assertIn(("AddRawKernel", "Kernel"), events)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import os
+import unittest
+import numpy as np
+import paddle
+from paddle import _C_ops
+from paddle.utils.cpp_extension import load_op_meta_info_and_register_op
+
+
+def setUpModule():
+    # quant_int8 and dequant_int8 are custom operators of the plugin.
+    load_op_meta_info_and_register_op(
+        os.path.join(os.environ["CUSTOM_DEVICE_ROOT"], "libpaddle-custom-cpu.so")
+    )
+
+
+def quant_int8(x, shift, smooth, scale, round_type):
+    return _C_ops._run_custom_op(
+        "quant_int8", x, shift, smooth, scale, round_type, 127.0, -127.0
+    )[0]
+
+
+def dequant_int8(x, out_scale, dtype):
+    return _C_ops._run_custom_op("dequant_int8", x, out_scale, dtype)[0]
+
+
+# The A8W8 pipeline of the llama smooth quant passes: activations quantized
+# by quant_int8, an int8 matmul accumulated in int32 and dequant_int8.
+class TestQuantInt8(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_quant_int8(self):
+        x = np.random.uniform(-2, 2, [6, 40]).astype("float32")
+        shift = np.random.uniform(-1, 1, [40]).astype("float32")
+        smooth = np.random.uniform(0.5, 1, [40]).astype("float32")
+        # With 127 * scale == 1 these are ties, to even for round_type 0
+        # and away from zero otherwise.
+        scale = np.float32(1 / 127)
+        x[0, :3] = [2.5, -2.5, 3.5]
+        shift[:3] = 0
+        smooth[:3] = 1
+        y = np.float32(127) * scale * ((x + shift) * smooth)
+        rounded = [np.rint(y), np.sign(y) * np.floor(np.abs(y) + 0.5)]
+        for round_type in [0, 1]:
+            out = quant_int8(
+                paddle.to_tensor(x),
+                paddle.to_tensor(shift),
+                paddle.to_tensor(smooth),
+                float(scale),
+                round_type,
+            )
+            self.assertEqual(out.dtype, paddle.int8)
+            np.testing.assert_array_equal(
+                out.numpy(), np.clip(rounded[round_type], -127, 127)
+            )
+
+    def test_a8w8_matmul(self):
+        x = np.random.uniform(-1, 1, [2, 9, 96]).astype("float32")
+        w = np.random.randint(-127, 128, [96, 80]).astype("int8")
+        out_scale = np.random.uniform(0, 1e-3, [80]).astype("float32")
+        for dtype in ["float32", "float16", "bfloat16"]:
+            xq = quant_int8(paddle.to_tensor(x).astype(dtype), None, None, 1, 1)
+            acc = paddle.matmul(xq, paddle.to_tensor(w))
+            self.assertEqual(acc.dtype, paddle.int32)
+            out = dequant_int8(acc, paddle.to_tensor(out_scale), dtype)
+            xq = xq.numpy().astype("int64")
+            np.testing.assert_array_equal(acc.numpy(), xq @ w.astype("int64"))
+            np.testing.assert_allclose(
+                out.astype("float32").numpy(),
+                (xq @ w.astype("int64")) * out_scale,
+                rtol=1e-2,
+            )
+
+    def test_int8_matmul_transpose(self):
+        x = np.random.randint(-128, 128, [35, 70]).astype("int8")
+        y = np.random.randint(-128, 128, [3, 33, 70]).astype("int8")
+        out = paddle.matmul(
+            paddle.to_tensor(x.T.copy()),
+            paddle.to_tensor(y),
+            transpose_x=True,
+            transpose_y=True,
+        )
+        expect = x.astype("int64") @ y.astype("int64").transpose([0, 2, 1])
+        np.testing.assert_array_equal(out.numpy(), expect)
+
+
+if __name__ == "__main__":
+    unittest.main()
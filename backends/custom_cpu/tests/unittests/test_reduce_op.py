@@ -180,6 +180,18 @@ class TestSumOp8D(OpTest):
         self.check_grad(["X"], "Out", check_eager=False)
 
 
+class TestSumOpInterleavedDims(OpTest):
+    def setUp(self):
+        self.python_api = paddle.sum
+        self.op_type = "reduce_sum"
+        self.inputs = {"X": np.random.random((6, 4, 5, 300)).astype("float64")}
+        self.attrs = {"dim": (0, 2)}
+        self.outputs = {"Out": self.inputs["X"].sum(axis=(0, 2))}
+
+    def test_check_output(self):
+        self.check_output(check_eager=False)
+
+
 @skip_check_grad_ci(
     reason="reduce_max is discontinuous non-derivable function,"
     " its gradient check is not supported by unittest framework."
@@ -0,0 +1,178 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+import paddle.nn.functional as F
+from paddle import _C_ops
+
+
+def rms_norm_ref(x, weight, out_grad, epsilon):
+    inv_std = 1 / np.sqrt((x * x).mean(-1) + epsilon)
+    x_hat = x * inv_std[..., None]
+    g = out_grad * weight
+    x_grad = inv_std[..., None] * (g - x_hat * (g * x_hat).mean(-1, keepdims=True))
+    weight_grad = (out_grad * x_hat).reshape(-1, x.shape[-1]).sum(0)
+    return x_hat * weight, inv_std, x_grad, weight_grad
+
+
+# Paddle has no CPU kernel of rms_norm, so it is checked against numpy.
+class TestRmsNormAPI(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def check(self, dtype, rtol, weight_dtype=None):
+        x = np.random.uniform(-1, 1, [6, 5, 64]).astype("float32")
+        weight = np.random.uniform(-1, 1, [64]).astype("float32")
+        out_grad = np.random.uniform(-1, 1, x.shape).astype("float32")
+        x_t = paddle.to_tensor(x).astype(dtype)
+        weight_t = paddle.to_tensor(weight).astype(weight_dtype or dtype)
+        x_t.stop_gradient = False
+        weight_t.stop_gradient = False
+        out, inv_std = F.rms_norm(x_t, [64], weight_t, 1e-6)
+        self.assertEqual(inv_std.dtype, paddle.float32)
+        grads = paddle.grad(
+            [out], [x_t, weight_t], [paddle.to_tensor(out_grad).astype(dtype)]
+        )
+        self.assertEqual(out.dtype, x_t.dtype)
+        self.assertEqual(grads[1].dtype, weight_t.dtype)
+        actual = [out, inv_std] + grads
+        expect = rms_norm_ref(x, weight, out_grad, 1e-6)
+        for e, a in zip(expect, actual):
+            np.testing.assert_allclose(
+                a.astype("float32").numpy(), e, rtol=rtol, atol=rtol
+            )
+
+    def test_float32(self):
+        self.check("float32", 1e-5)
+
+    def test_float16(self):
+        self.check("float16", 1e-2)
+
+    def test_bfloat16(self):
+        self.check("bfloat16", 5e-2)
+
+    def test_float32_weight(self):
+        # AMP O2 keeps the weights of float16 and bfloat16 models in float32.
+        self.check("float16", 1e-2, "float32")
+        self.check("bfloat16", 5e-2, "float32")
+
+    def test_weight_dtype_mismatch(self):
+        x = paddle.ones([2, 8], "float16")
+        with self.assertRaises(Exception):
+            F.rms_norm(x, [8], paddle.ones([8], "bfloat16"))
+
+
+class TestFusedRmsNormQuant(unittest.TestCase):
+    def run_op(self, place, quant_scale, dtype="float32"):
+        paddle.disable_static(place)
+        x, bias, residual, weight, norm_bias = [
+            paddle.to_tensor(a) for a in self.inputs
+        ]
+        x, bias, residual = [t.astype(dtype) for t in [x, bias, residual]]
+        outs = _C_ops.fused_rms_norm_quant(
+            x,
+            bias,
+            residual,
+            weight,
+            norm_bias,
+            1e-5,
+            1,
+            quant_scale,
+            0,
+            127.0,
+            -127.0,
+        )
+        if dtype != "float32":
+            outs = [t.astype("float32") for t in outs]
+        result = [t.numpy() for t in outs]
+        paddle.enable_static()
+        return result
+
+    def setUp(self):
+        self.inputs = [
+            np.random.uniform(-1, 1, [7, 96]).astype("float32"),
+            np.random.uniform(-1, 1, [96]).astype("float32"),
+            np.random.uniform(-1, 1, [7, 96]).astype("float32"),
+            np.random.uniform(-1, 1, [96]).astype("float32"),
+            np.random.uniform(-1, 1, [96]).astype("float32"),
+        ]
+
+    def test_cpu_parity(self):
+        expect = self.run_op(paddle.CPUPlace(), -1.0)
+        actual = self.run_op(paddle.CustomPlace("custom_cpu", 0), -1.0)
+        for e, a in zip(expect, actual):
+            np.testing.assert_allclose(a, e, rtol=1e-5, atol=1e-5)
+        quant = self.run_op(paddle.CustomPlace("custom_cpu", 0), 0.05)[0]
+        self.assertEqual(quant.dtype, np.int8)
+        expect = np.clip(np.rint(127 * 0.05 * actual[0]), -127, 127)
+        np.testing.assert_allclose(quant, expect, atol=1)
+
+    def test_float32_weight(self):
+        place = paddle.CustomPlace("custom_cpu", 0)
+        expect = self.run_op(place, -1.0)
+        for dtype, tol in [("float16", 1e-2), ("bfloat16", 5e-2)]:
+            actual = self.run_op(place, -1.0, dtype)
+            for e, a in zip(expect, actual):
+                np.testing.assert_allclose(a, e, rtol=tol, atol=tol)
+
+    def run_grad(self, residual=None):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        x, _, _, weight, norm_bias = [
+            paddle.to_tensor(a, stop_gradient=False) for a in self.inputs
+        ]
+        out = _C_ops.fused_rms_norm_quant(
+            x,
+            None,
+            residual,
+            weight,
+            norm_bias,
+            1e-5,
+            1,
+            -1.0,
+            0,
+            127.0,
+            -127.0,
+        )[0]
+        out_grad = np.random.uniform(-1, 1, out.shape).astype("float32")
+        try:
+            grads = paddle.grad(
+                [out], [x, weight, norm_bias], [paddle.to_tensor(out_grad)]
+            )
+        finally:
+            paddle.enable_static()
+        return out_grad, [g.numpy() for g in grads]
+
+    def test_grad(self):
+        out_grad, actual = self.run_grad()
+        x, weight = self.inputs[0], self.inputs[3]
+        _, _, x_grad, weight_grad = rms_norm_ref(x, weight, out_grad, 1e-5)
+        expect = [x_grad, weight_grad, out_grad.sum(0)]
+        for e, a in zip(expect, actual):
+            np.testing.assert_allclose(a, e, rtol=1e-5, atol=1e-5)
+
+    def test_grad_residual(self):
+        # As in phi, the backward of the residual fusion is not implemented.
+        with self.assertRaises(Exception):
+            self.run_grad(paddle.to_tensor(self.inputs[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
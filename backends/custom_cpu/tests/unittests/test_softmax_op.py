@@ -132,6 +132,19 @@ class TestSoftmaxOp6(TestSoftmaxOp):
         return 3
 
 
+class TestSoftmaxOpWideRow(TestSoftmaxOp):
+    def get_x_shape(self):
+        return [3, 1000]
+
+
+class TestSoftmaxOpWideStrided(TestSoftmaxOp):
+    def get_x_shape(self):
+        return [2, 300, 3]
+
+    def get_axis(self):
+        return 1
+
+
 class TestSoftmaxAPI(unittest.TestCase):
     def setUp(self):
         self.place = paddle.CustomPlace("custom_cpu", 0)
@@ -186,5 +199,24 @@ class TestSoftmaxAPI(unittest.TestCase):
         paddle.enable_static()
 
 
+class TestLogSoftmaxAPI(unittest.TestCase):
+    def setUp(self):
+        self.place = paddle.CustomPlace("custom_cpu", 0)
+        self.x_np = np.random.uniform(-10.0, 10.0, [4, 700]).astype("float32")
+
+    def test_dygraph_check(self):
+        paddle.disable_static(self.place)
+        for axis in [-1, 0]:
+            x = paddle.to_tensor(self.x_np, stop_gradient=False)
+            out = F.log_softmax(x, axis=axis)
+            out_ref = np.log(ref_softmax(self.x_np, axis=axis))
+            np.testing.assert_allclose(out.numpy(), out_ref, rtol=1e-5, atol=1e-5)
+
+            (x_grad,) = paddle.grad(out, x)
+            x_grad_ref = 1.0 - np.exp(out_ref) * self.x_np.shape[axis]
+            np.testing.assert_allclose(x_grad.numpy(), x_grad_ref, rtol=1e-4, atol=1e-4)
+        paddle.enable_static()
+
+
 if __name__ == "__main__":
     unittest.main()
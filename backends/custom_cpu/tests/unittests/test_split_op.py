@@ -0,0 +1,51 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+from op_parity import check_parity
+
+
+class TestSplitAPI(unittest.TestCase):
+    def check(self, fn, dtype="float32"):
+        x = (np.random.uniform(-1, 1, [4, 6, 8, 5]) * 10).astype(dtype)
+        check_parity(fn, [x], tol=0)
+
+    def test_sections(self):
+        self.check(lambda x: paddle.split(x, [1, 3], axis=0))
+        self.check(lambda x: paddle.split(x, [2, -1, 3], axis=2))
+        self.check(lambda x: paddle.split(x, [1, 4], axis=-1), "int64")
+
+    def test_num(self):
+        self.check(lambda x: paddle.split(x, 3, axis=1))
+        self.check(lambda x: paddle.split(x, 5, axis=3), "float64")
+        self.check(lambda x: paddle.chunk(x, 2, axis=2), "bool")
+
+    def test_dense_views(self):
+        # Without stride kernels slice, squeeze and unsqueeze run the dense
+        # kernels and copy.
+        paddle.set_flags({"FLAGS_use_stride_kernel": False})
+        try:
+            self.check(lambda x: [x[1:3, :, 2:7], x[:, 2, :, -1]])
+            self.check(lambda x: [paddle.squeeze(x[:, :1], 1)])
+            self.check(lambda x: [paddle.unsqueeze(x, [0, 3])], "float64")
+        finally:
+            paddle.set_flags({"FLAGS_use_stride_kernel": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+import unittest
+import numpy as np
+import paddle
+from paddle.base import core
+
+# Large enough that a copy is still queued when the next one is issued.
+SIZE = 16 << 20
+
+
+def copy_on(stream, tensor, place):
+    """Queues a non-blocking copy of `tensor` to `place` on `stream`."""
+    with paddle.device.stream_guard(stream):
+        return tensor._copy_to(place, False)
+
+
+@unittest.skipUnless(
+    os.getenv("FLAGS_custom_cpu_async_stream") == "1", "run by TestAsyncStream"
+)
+class TestAsyncStreamOps(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static()
+        self.place = paddle.CustomPlace("custom_cpu", 0)
+        self.x = np.random.uniform(-1, 1, [SIZE]).astype("float32")
+        self.host = paddle.to_tensor(self.x, place=paddle.CPUPlace())
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_fifo(self):
+        # Each copy reads the output of the one queued before it.
+        stream = paddle.device.Stream(self.place)
+        y = copy_on(stream, self.host, self.place)
+        for _ in range(4):
+            y = copy_on(stream, y, self.place)
+        stream.synchronize()
+        self.assertTrue(stream.query())
+        np.testing.assert_array_equal(y.numpy(), self.x)
+
+    def test_event_across_streams(self):
+        producer = paddle.device.Stream(self.place)
+        consumer = paddle.device.Stream(self.place)
+        # paddle.device.Event does not construct for custom devices.
+        event = core.CustomDeviceEvent(self.place)
+        y = copy_on(producer, self.host, self.place)
+        event.record(producer.stream_base)
+        consumer.stream_base.wait_event(event)
+        z = copy_on(consumer, y, self.place)
+        # Only the consumer is synchronized, the wait orders it after the
+        # producer's copy.
+        consumer.synchronize()
+        self.assertTrue(event.query())
+        np.testing.assert_array_equal(z.numpy(), self.x)
+
+    def test_synchronize_drains(self):
+        stream = paddle.device.Stream(self.place)
+        events = []
+        outs = []
+        for _ in range(8):
+            outs.append(copy_on(stream, self.host, self.place))
+            events.append(core.CustomDeviceEvent(self.place))
+            events[-1].record(stream.stream_base)
+        stream.synchronize()
+        self.assertTrue(stream.query())
+        self.assertTrue(all(event.query() for event in events))
+        for out in outs:
+            np.testing.assert_array_equal(out.numpy(), self.x)
+
+
+class TestAsyncStream(unittest.TestCase):
+    def test_ops(self):
+        # The flag is read once per process, the streams run in a child.
+        env = dict(os.environ, FLAGS_custom_cpu_async_stream="1")
+        proc = subprocess.run(
+            [sys.executable, __file__, "TestAsyncStreamOps"],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = proc.stdout.decode(errors="replace")
+        self.assertEqual(proc.returncode, 0, output)
+        self.assertNotIn("skipped", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
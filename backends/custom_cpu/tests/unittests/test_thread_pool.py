@@ -0,0 +1,171 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import ctypes
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import numpy as np
+import paddle
+
+ParallelForFn = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_void_p
+)
+
+
+def load_plugin():
+    lib = ctypes.CDLL(
+        os.path.join(os.environ["CUSTOM_DEVICE_ROOT"], "libpaddle-custom-cpu.so")
+    )
+    lib.custom_cpu_parallel_for.argtypes = [
+        ctypes.c_int64,
+        ctypes.c_int64,
+        ctypes.c_int64,
+        ParallelForFn,
+        ctypes.c_void_p,
+    ]
+    lib.custom_cpu_parallel_for.restype = ctypes.c_int
+    return lib
+
+
+def reductions():
+    """Float reductions whose summation order depends on how they are split."""
+    rng = np.random.RandomState(0)
+    # A wide dynamic range makes float sums sensitive to their order.
+    x = (rng.uniform(-1, 1, [1 << 20]) * 10.0 ** rng.randint(-4, 5, [1 << 20])).astype(
+        "float32"
+    )
+    paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+    t = paddle.to_tensor(x)
+    cols = paddle.to_tensor(x.reshape([-1, 4]))
+    rows = paddle.to_tensor(x.reshape([2, -1]))
+    norm_x = paddle.to_tensor(x.reshape([-1, 256]), stop_gradient=False)
+    weight = paddle.ones([256])
+    weight.stop_gradient = False
+    out = paddle.nn.functional.layer_norm(norm_x, [256], weight=weight)
+    (weight_grad,) = paddle.grad([out], [weight], [paddle.to_tensor(norm_x.numpy())])
+    result = {
+        "sum": paddle.sum(t).numpy(),
+        "mean": paddle.mean(t).numpy(),
+        "column_sum": paddle.sum(cols, axis=0).numpy(),
+        "row_sum": paddle.sum(rows, axis=1).numpy(),
+        "layer_norm_weight_grad": weight_grad.numpy(),
+    }
+    paddle.enable_static()
+    return result
+
+
+@unittest.skipUnless(os.getenv("CUSTOM_CPU_REDUCE_OUT"), "run by TestReduceThreads")
+class TestReduceOps(unittest.TestCase):
+    def test_save(self):
+        np.savez(os.environ["CUSTOM_CPU_REDUCE_OUT"], **reductions())
+
+
+class TestReduceThreads(unittest.TestCase):
+    def run_with_threads(self, threads, path):
+        # The pool size is read once per process, each count runs in a child.
+        env = dict(
+            os.environ,
+            FLAGS_custom_cpu_num_threads=str(threads),
+            CUSTOM_CPU_REDUCE_OUT=path,
+        )
+        proc = subprocess.run(
+            [sys.executable, __file__, "TestReduceOps"],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = proc.stdout.decode(errors="replace")
+        self.assertEqual(proc.returncode, 0, output)
+        self.assertNotIn("skipped", output)
+        return np.load(path)
+
+    def test_same_result(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            single = self.run_with_threads(1, os.path.join(tmp, "1.npz"))
+            multi = self.run_with_threads(4, os.path.join(tmp, "4.npz"))
+            for name in single.files:
+                np.testing.assert_array_equal(multi[name], single[name], err_msg=name)
+
+
+class TestParallelFor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Running an op initializes the device and with it the intra-op pool.
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        paddle.ones([2]).numpy()
+        paddle.enable_static()
+        cls.lib = load_plugin()
+
+    def parallel_for(self, begin, end, grain_size, fn):
+        # Keep the callback alive for the duration of the call.
+        callback = ParallelForFn(fn)
+        return self.lib.custom_cpu_parallel_for(begin, end, grain_size, callback, None)
+
+    def test_covers_range(self):
+        hits = np.zeros([1000], "int64")
+
+        def fn(b, e, arg):
+            hits[b:e] += 1
+            return 0
+
+        self.assertEqual(self.parallel_for(0, 1000, 7, fn), 0)
+        np.testing.assert_array_equal(hits, np.ones([1000], "int64"))
+
+    def test_nested(self):
+        hits = np.zeros([64, 100], "int64")
+        inline = []
+
+        def outer(b, e, arg):
+            for i in range(b, e):
+                caller = threading.get_ident()
+
+                def inner(ib, ie, arg, i=i):
+                    # Nested calls run inline on the worker instead of
+                    # waiting for the pool they are running on.
+                    inline.append(threading.get_ident() == caller)
+                    hits[i, ib:ie] += 1
+                    return 0
+
+                if self.parallel_for(0, 100, 1, inner) != 0:
+                    return 1
+            return 0
+
+        self.assertEqual(self.parallel_for(0, 64, 1, outer), 0)
+        np.testing.assert_array_equal(hits, np.ones([64, 100], "int64"))
+        self.assertTrue(all(inline))
+
+    def test_exception(self):
+        def fn(b, e, arg):
+            return 1 if b <= 500 < e else 0
+
+        self.assertEqual(self.parallel_for(0, 1000, 1, fn), -1)
+        # The pool stays usable after a failed call.
+        hits = np.zeros([1000], "int64")
+
+        def count(b, e, arg):
+            hits[b:e] += 1
+            return 0
+
+        self.assertEqual(self.parallel_for(0, 1000, 1, count), 0)
+        np.testing.assert_array_equal(hits, np.ones([1000], "int64"))
+
+
+if __name__ == "__main__":
+    unittest.main()
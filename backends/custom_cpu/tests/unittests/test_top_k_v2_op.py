@@ -0,0 +1,113 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+from op_test import OpTest
+import paddle
+
+paddle.enable_static()
+
+
+def get_places(self):
+    return [paddle.CustomPlace("custom_cpu", 0)]
+
+
+OpTest._get_places = get_places
+
+
+def numpy_topk(x, k=1, axis=-1, largest=True):
+    if axis < 0:
+        axis = len(x.shape) + axis
+    if largest:
+        indices = np.argsort(-x, axis=axis, kind="stable")
+    else:
+        indices = np.argsort(x, axis=axis, kind="stable")
+    indices = indices.take(indices=range(0, k), axis=axis)
+    value = np.take_along_axis(x, indices, axis=axis)
+    return value, indices
+
+
+class TestTopkOp(OpTest):
+    def init_args(self):
+        self.k = 3
+        self.axis = 1
+        self.largest = True
+
+    def get_x_shape(self):
+        return [10, 20]
+
+    def setUp(self):
+        self.op_type = "top_k_v2"
+        self.python_api = paddle.topk
+        self.dtype = np.float64
+        self.init_args()
+        np.random.seed(0)
+        self.input_data = np.random.rand(*self.get_x_shape())
+        self.inputs = {"X": self.input_data}
+        self.attrs = {"k": self.k, "axis": self.axis, "largest": self.largest}
+        output, indices = numpy_topk(
+            self.input_data, axis=self.axis, k=self.k, largest=self.largest
+        )
+        self.outputs = {"Out": output, "Indices": indices}
+
+    def test_check_output(self):
+        self.check_output()
+
+    def test_check_grad(self):
+        self.check_grad(["X"], "Out")
+
+
+class TestTopkOpSmallest(TestTopkOp):
+    def init_args(self):
+        self.k = 3
+        self.axis = 1
+        self.largest = False
+
+
+class TestTopkOpInnerAxis(TestTopkOp):
+    def init_args(self):
+        self.k = 2
+        self.axis = 0
+        self.largest = True
+
+    def get_x_shape(self):
+        return [6, 4, 5]
+
+
+class TestTopkOpLargeRow(TestTopkOp):
+    def init_args(self):
+        self.k = 5
+        self.axis = -1
+        self.largest = True
+
+    def get_x_shape(self):
+        return [4, 1000]
+
+
+class TestTopkAPI(unittest.TestCase):
+    def test_dygraph_nan(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+        x = np.array([[1.0, np.nan, 3.0, -1.0, 3.0]], dtype="float32")
+        values, indices = paddle.topk(paddle.to_tensor(x), k=3)
+        np.testing.assert_array_equal(indices.numpy(), [[1, 2, 4]])
+        values, indices = paddle.topk(paddle.to_tensor(x), k=2, largest=False)
+        np.testing.assert_array_equal(indices.numpy(), [[3, 0]])
+        paddle.enable_static()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import ctypes
+import glob
+import os
+import subprocess
+import sys
+import unittest
+import paddle
+
+
+def parse_cpu_list(text):
+    lib = ctypes.CDLL(
+        os.path.join(os.environ["CUSTOM_DEVICE_ROOT"], "libpaddle-custom-cpu.so")
+    )
+    lib.custom_cpu_parse_cpu_list.argtypes = [
+        ctypes.c_char_p,
+        ctypes.POINTER(ctypes.c_int),
+        ctypes.c_int,
+    ]
+    lib.custom_cpu_parse_cpu_list.restype = ctypes.c_int
+    cpus = (ctypes.c_int * 64)()
+    count = lib.custom_cpu_parse_cpu_list(text.encode(), cpus, len(cpus))
+    return list(cpus[: min(count, len(cpus))])
+
+
+def numa_nodes():
+    """Number of NUMA nodes with CPUs, the default device count is based on."""
+    nodes = 0
+    for path in glob.glob("/sys/devices/system/node/node[0-9]*/cpulist"):
+        with open(path) as f:
+            nodes += bool(f.read().strip())
+    return max(nodes, 1)
+
+
+class TestParseCpuList(unittest.TestCase):
+    def test_ranges(self):
+        self.assertEqual(parse_cpu_list("0-3,8,10-11"), [0, 1, 2, 3, 8, 10, 11])
+        # As read from sysfs, with a trailing newline.
+        self.assertEqual(parse_cpu_list("4-5\n"), [4, 5])
+        self.assertEqual(parse_cpu_list("7"), [7])
+
+    def test_empty(self):
+        self.assertEqual(parse_cpu_list(""), [])
+        self.assertEqual(parse_cpu_list("\n"), [])
+
+    def test_malformed(self):
+        for text in ["abc", "-1", "3-1", "5x", "1-", "-", "1-2-3", "99999999"]:
+            self.assertEqual(parse_cpu_list(text), [], text)
+        # Malformed ranges are skipped, the valid ones are kept.
+        self.assertEqual(parse_cpu_list("0,x,2-3,,5-4,6"), [0, 2, 3, 6])
+
+
+@unittest.skipUnless(os.getenv("EXPECTED_DEVICE_COUNT"), "run by TestDeviceCount")
+class TestDeviceCountOps(unittest.TestCase):
+    def test_count(self):
+        devices = paddle.device.get_available_custom_device()
+        self.assertEqual(
+            len([d for d in devices if d.startswith("custom_cpu")]),
+            int(os.environ["EXPECTED_DEVICE_COUNT"]),
+            devices,
+        )
+
+
+class TestDeviceCount(unittest.TestCase):
+    def check(self, flag, expected):
+        # The count is read once per process, each value runs in a child.
+        env = dict(os.environ, EXPECTED_DEVICE_COUNT=str(expected))
+        env.pop("FLAGS_custom_cpu_device_count", None)
+        if flag is not None:
+            env["FLAGS_custom_cpu_device_count"] = flag
+        proc = subprocess.run(
+            [sys.executable, __file__, "TestDeviceCountOps"],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        output = proc.stdout.decode(errors="replace")
+        self.assertEqual(proc.returncode, 0, output)
+        self.assertNotIn("skipped", output)
+
+    def test_default(self):
+        # One device per NUMA node, and at least two.
+        self.check(None, max(numa_nodes(), 2))
+        self.check("0", max(numa_nodes(), 2))
+
+    def test_override(self):
+        self.check("1", 1)
+        self.check("3", 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
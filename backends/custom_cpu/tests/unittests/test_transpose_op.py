@@ -122,6 +122,12 @@ class TestCase9(TestTransposeOp):
         self.axis = (6, 1, 3, 5, 0, 2, 4, 7)
 
 
+class TestCase10(TestTransposeOp):
+    def initTestCase(self):
+        self.shape = (2, 8, 37, 45)
+        self.axis = (0, 2, 3, 1)
+
+
 class TestTransposeOpBool(TestTransposeOp):
     def test_check_grad(self):
         pass
@@ -467,6 +467,21 @@ class TestUniformRandomDygraphMode(unittest.TestCase):
                 self.assertTrue((x_np[i] > 0 and x_np[i] < 1.0))
 
 
+class TestUniformRandomSeedDygraphMode(unittest.TestCase):
+    def test_check_output(self):
+        with base.dygraph.guard(paddle.CustomPlace("custom_cpu", 0)):
+            place = paddle.CustomPlace("custom_cpu", 0)
+            x = paddle._C_ops.uniform([4097], "float32", -1.0, 1.0, 10, place)
+            y = paddle._C_ops.uniform([4097], "float32", -1.0, 1.0, 10, place)
+            np.testing.assert_array_equal(x.numpy(), y.numpy())
+
+            # Unseeded calls continue the global stream.
+            x = paddle.uniform([4097], min=-1.0, max=1.0).numpy()
+            y = paddle.uniform([4097], min=-1.0, max=1.0).numpy()
+            self.assertFalse((x == y).all())
+            self.assertTrue((x >= -1.0).all() and (x < 1.0).all())
+
+
 class TestUniformRandomBatchSizeLikeOpError(unittest.TestCase):
     def test_errors(self):
         main_prog = Program()
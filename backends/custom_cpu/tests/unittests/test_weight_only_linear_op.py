@@ -0,0 +1,120 @@
+#   Copyright (c) 2024 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import print_function
+
+import unittest
+import numpy as np
+import paddle
+from paddle.nn.quant import (
+    llm_int8_linear,
+    weight_dequantize,
+    weight_only_linear,
+    weight_quantize,
+)
+
+
+def quantize_ref(w, group_size):
+    # w [K, N] to the int8 [N, K] and scales [K / group_size, N] of a
+    # row-major weight_quantize.
+    k, n = w.shape
+    group_size = k if group_size == -1 else group_size
+    groups = np.abs(w).reshape(k // group_size, group_size, n).max(1)
+    scale = groups / 127
+    q = np.round(w / np.repeat(scale, group_size, 0))
+    return q.T.astype("int8"), scale
+
+
+def dequantize_ref(q, scale):
+    return q.T * np.repeat(scale, q.shape[1] // scale.shape[0], 0)
+
+
+# Paddle's CPU kernels of weight_only_linear and llm_int8_linear are missing
+# and its weight_quantize lays the weight out for GPUs, so they are checked
+# against numpy.
+class TestWeightOnlyLinear(unittest.TestCase):
+    def setUp(self):
+        paddle.disable_static(paddle.CustomPlace("custom_cpu", 0))
+
+    def tearDown(self):
+        paddle.enable_static()
+
+    def test_weight_quantize(self):
+        w = np.random.uniform(-1, 1, [256, 48]).astype("float32")
+        for group_size in [-1, 64, 128]:
+            q, scale = weight_quantize(paddle.to_tensor(w), group_size=group_size)
+            q_ref, scale_ref = quantize_ref(w, group_size)
+            self.assertEqual(q.dtype, paddle.int8)
+            np.testing.assert_allclose(
+                scale.numpy().reshape(scale_ref.shape), scale_ref, rtol=1e-6
+            )
+            np.testing.assert_allclose(q.numpy(), q_ref, atol=1)
+            d = weight_dequantize(q, scale, group_size=group_size)
+            np.testing.assert_allclose(
+                d.numpy(), dequantize_ref(q.numpy(), scale_ref), rtol=1e-6
+            )
+
+    def check(self, dtype, rows, group_size, rtol):
+        w = np.random.uniform(-1, 1, [256, 96]).astype("float32")
+        x = np.random.uniform(-1, 1, [rows, 256]).astype("float32")
+        bias = np.random.uniform(-1, 1, [96]).astype("float32")
+        q, scale = weight_quantize(
+            paddle.to_tensor(w).astype(dtype), group_size=group_size
+        )
+        self.assertEqual(scale.dtype, paddle.to_tensor(x).astype(dtype).dtype)
+        out = weight_only_linear(
+            paddle.to_tensor(x).astype(dtype),
+            q,
+            bias=paddle.to_tensor(bias).astype(dtype),
+            weight_scale=scale,
+            group_size=group_size,
+        )
+        scale = scale.astype("float32").numpy()
+        expect = x @ dequantize_ref(q.numpy(), scale.reshape(-1, 96)) + bias
+        np.testing.assert_allclose(
+            out.astype("float32").numpy(), expect, rtol=rtol, atol=rtol
+        )
+
+    def test_float32(self):
+        for rows in [1, 7, 40]:
+            for group_size in [-1, 64]:
+                self.check("float32", rows, group_size, 1e-4)
+
+    def test_float16(self):
+        self.check("float16", 5, -1, 2e-2)
+        self.check("float16", 33, 128, 2e-2)
+
+    def test_bfloat16(self):
+        self.check("bfloat16", 5, 64, 1e-1)
+        self.check("bfloat16", 33, -1, 1e-1)
+
+    def test_llm_int8_linear(self):
+        w = np.random.uniform(-1, 1, [128, 64]).astype("float32")
+        x = np.random.uniform(-1, 1, [9, 128]).astype("float32")
+        x[:, 5] *= 20
+        q, scale = weight_quantize(paddle.to_tensor(w), algo="llm.int8")
+        out = llm_int8_linear(paddle.to_tensor(x), q, weight_scale=scale, threshold=6.0)
+        # The outlier column 5 is multiplied in float, the others through
+        # int8 rows quantized by their absolute max.
+        q, scale = q.numpy().astype("float32"), scale.numpy()
+        inlier = np.ones(128, bool)
+        inlier[5] = False
+        row_max = np.abs(x[:, inlier]).max(1, keepdims=True)
+        xq = np.round(x * inlier * 127 / row_max)
+        expect = (xq @ q.T * row_max / 127 + x[:, 5:6] * q[:, 5]) * scale
+        np.testing.assert_allclose(out.numpy(), expect, rtol=1e-4, atol=1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()